@@ -2,12 +2,19 @@ import pandas as pd
 import os
 import sys
 import argparse
-from docx import Document
-from docx.shared import Pt
-from docx.oxml.ns import qn
+import contextlib
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from datetime import datetime
 import re
+from ledger_session import group_value, session_for
+from template_cache import is_legacy_template, open_template
+from report_pipeline import ReportPipeline, save_document
+from docx_merge import MergedDocument, merged_output_path, save_merged
+from run_styles import add_styled_run, style_run
+import archive_output
+import run_metrics
+from run_metrics import METRICS_CONFIG
+from memory_profile import PROFILE_CONFIG, profiling
 
 def find_column_with_keyword(df, keyword):
     """查找包含指定关键字的列"""
@@ -36,10 +43,7 @@ def replace_text_in_paragraph(paragraph, old_text, new_text):
         for i, part in enumerate(parts):
             if i > 0:
                 # 添加替换的文本（设置楷体五号字体）
-                run = paragraph.add_run(new_text)
-                run.font.name = "楷体"
-                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                run.font.size = Pt(10.5)
+                run = add_styled_run(paragraph, new_text)
 
             if part:
                 # 添加原始文本部分（保持原有格式）
@@ -110,8 +114,9 @@ def get_output_filename(word_template_path, order_number):
     # 生成输出文件名
     return f"{template_name}_{order_number}_生成结果.docx"
 
-def process_excel_to_word(excel_path, word_template_path, output_path=None, project_name=None, client_name=None, inspection_method=None):
-    """将Excel数据填入Word文档
+def build_renderer(excel_path, word_template_path, output_path=None, project_name=None, client_name=None, inspection_method=None, session=None,
+                         merge_output=None, profiler=None):
+    """准备生成：读取Excel、建立列映射、确定委托单编号，返回逐组生成报告的 GroupRenderer
     
     Args:
         excel_path: Excel表格路径
@@ -120,18 +125,21 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
         project_name: 工程名称，用于替换文档中的"工程名称参数值"
         client_name: 委托单位，用于替换文档中的"委托单位参数值"
         inspection_method: 检测方法，用于替换文档中的"检测方法参数"
+        session: 共享读取会话（可选，ledger_session.LedgerSession），多个生成器共用同一工作簿时只读取分组一次
+        merge_output: 合并输出（可选）：True 时所有委托单填入同一个文档"输出目录/<模板名>_合并.docx"，也可直接指定文件路径；各委托单之间分节
+        profiler: 内存分析器（可选，memory_profile.MemoryProfiler，由调用方开始和结束记录）
     
     Returns:
-        bool: 处理是否成功
+        GroupRenderer: 逐组生成器（准备失败时返回None）
     """
     # 检查文件是否存在
     if not os.path.exists(excel_path):
         print(f"错误: Excel文件不存在: {excel_path}")
-        return False
+        return None
         
     if not os.path.exists(word_template_path):
         print(f"错误: Word模板文件不存在: {word_template_path}")
-        return False
+        return None
     
     # 创建输出目录
     if output_path:
@@ -149,7 +157,9 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
     
     # 读取Excel数据
     print(f"正在读取Excel文件: {excel_path}")
-    df = pd.read_excel(excel_path)
+    session = session_for(session, excel_path)
+    with profiler.stage("读取Excel") if profiler else contextlib.nullcontext(), run_metrics.stage('read'):
+        df = session.read_excel() if session else pd.read_excel(excel_path)
     
     # 打印所有列名，帮助调试
     print(f"Excel表格列名: {list(df.columns)}")
@@ -205,20 +215,24 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
     # 按委托单编号分组处理数据
     if '委托单编号' not in column_mapping:
         print("错误: 无法找到委托单编号列")
-        return False
+        return None
     
     # 获取所有唯一的委托单编号
     order_numbers = df[column_mapping['委托单编号']].dropna().unique().tolist()
     print(f"找到{len(order_numbers)}个不同的委托单编号")
     
-    success_count = 0
+    # 使用共享会话时直接取用已分组的数据
+    order_partitions = session.partitions(column_mapping['委托单编号']) if session else None
     
-    # 对每个委托单编号生成一份报告
-    for order_number in order_numbers:
+    # 准备阶段：提取每个委托单编号的数据
+    def prepare_order(order_number):
         print(f"\n处理委托单编号: {order_number}")
         
         # 筛选该委托单编号的数据
-        order_df = df[df[column_mapping['委托单编号']] == order_number]
+        if order_partitions is not None:
+            order_df = order_partitions[order_number].copy()
+        else:
+            order_df = df[df[column_mapping['委托单编号']] == order_number]
         print(f"该委托单编号有{len(order_df)}条记录")
         
         # 为该委托单编号生成输出文件名
@@ -228,9 +242,9 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
         # 1) 获取该组数据中最晚的完成日期
         date_col = column_mapping.get('完成日期')
         if date_col:
-            # 确保日期列是日期类型
-            order_df[date_col] = pd.to_datetime(order_df[date_col], errors='coerce')
-            latest_date = order_df[date_col].max()
+            # 转换为日期类型后取最晚日期（多个模板共用会话时每个委托单只计算一次）
+            latest_date = group_value(session, ('最晚完成日期', date_col), order_number,
+                                      lambda: pd.to_datetime(order_df[date_col], errors='coerce').max())
             
             if pd.isna(latest_date):
                 print(f"警告: 委托单编号 {order_number} 没有有效的完成日期")
@@ -256,33 +270,53 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
         # 获取单元名称（第一个非空值）
         unit_name = ""
         if '单元名称' in column_mapping:
-            unit_names = order_df[column_mapping['单元名称']].dropna().tolist()
+            unit_names = group_value(session, ('单元名称', column_mapping['单元名称']), order_number,
+                                     lambda: tuple(order_df[column_mapping['单元名称']].dropna()))
             if unit_names:
                 unit_name = unit_names[0]
                 print(f"找到单元名称: {unit_name}")
-        
+
+        return {
+            'order_number': order_number,
+            'report_output_path': report_output_path,
+            'date': (year, month, day),
+            'row_count': len(order_df),
+            'inspection_numbers': inspection_numbers,
+            'weld_numbers': weld_numbers,
+            'welder_numbers': welder_numbers,
+            'repair_results': repair_results,
+            'failure_counts': failure_counts,
+            'notes': notes,
+            'unit_name': unit_name,
+        }
+
+    # 填充阶段：打开模板并填充该委托单编号的Word文档
+    def fill_order(prepared):
+        order_number = prepared['order_number']
+        year, month, day = prepared['date']
+        inspection_numbers = prepared['inspection_numbers']
+        weld_numbers = prepared['weld_numbers']
+        welder_numbers = prepared['welder_numbers']
+        repair_results = prepared['repair_results']
+        failure_counts = prepared['failure_counts']
+        notes = prepared['notes']
+        unit_name = prepared['unit_name']
+
         # 打开Word文档
         print(f"正在处理Word文档: {word_template_path}")
         
         # 检查文件扩展名，使用不同的方法处理.doc和.docx文件
-        if word_template_path.lower().endswith('.doc'):
-            # 对于.doc文件，需要先转换为.docx
-            temp_docx_path = word_template_path + 'x'
-            print(f"检测到.doc文件，尝试转换为.docx: {temp_docx_path}")
-            
+        if is_legacy_template(word_template_path):
+            # 对于.doc文件，只在第一次使用时转换为.docx并缓存，之后的委托单共用转换结果
             try:
-                # 尝试直接打开.doc文件
-                doc = Document(word_template_path)
-                doc.save(temp_docx_path)
-                print(f"成功转换.doc为.docx")
-                doc = Document(temp_docx_path)
+                doc = open_template(word_template_path)
             except Exception as e:
                 print(f"无法直接打开.doc文件: {e}")
                 print("请将.doc文件转换为.docx格式后重试")
-                continue
+                return None
         else:
-            # 对于.docx文件，直接打开
-            doc = Document(word_template_path)
+            # 对于.docx文件，从共享的模板缓存创建
+            doc = open_template(word_template_path)
         
         # 替换文档中的参数值
         if project_name or client_name or inspection_method:
@@ -305,11 +339,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                     if original_text.strip() == "工程名称参数值":
                         # 清空段落内容并重新添加
                         paragraph.clear()
-                        run = paragraph.add_run(project_name)
                         # 设置楷体五号字体
-                        run.font.name = "楷体"
-                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                        run.font.size = Pt(10.5)
+                        run = add_styled_run(paragraph, project_name)
                         print(f"已将段落中的'工程名称参数值'替换为'{project_name}'并设置为楷体五号字体")
                     else:
                         # 如果段落包含其他内容，需要精确替换
@@ -323,11 +354,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                     if original_text.strip() == "委托单位参数值":
                         # 清空段落内容并重新添加
                         paragraph.clear()
-                        run = paragraph.add_run(client_name)
                         # 设置楷体五号字体
-                        run.font.name = "楷体"
-                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                        run.font.size = Pt(10.5)
+                        run = add_styled_run(paragraph, client_name)
                         print(f"已将段落中的'委托单位参数值'替换为'{client_name}'并设置为楷体五号字体")
                     else:
                         # 如果段落包含其他内容，需要精确替换
@@ -341,11 +369,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                     if original_text.strip() == "检测方法参数":
                         # 清空段落内容并重新添加
                         paragraph.clear()
-                        run = paragraph.add_run(inspection_method)
                         # 设置楷体五号字体
-                        run.font.name = "楷体"
-                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                        run.font.size = Pt(10.5)
+                        run = add_styled_run(paragraph, inspection_method)
                         print(f"已将段落中的'检测方法参数'替换为'{inspection_method}'并设置为楷体五号字体")
                     else:
                         # 如果段落包含其他内容，需要精确替换
@@ -359,11 +384,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                     if original_text.strip() == "检测级别值":
                         # 清空段落内容并重新添加
                         paragraph.clear()
-                        run = paragraph.add_run(detection_level)
                         # 设置楷体五号字体
-                        run.font.name = "楷体"
-                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                        run.font.size = Pt(10.5)
+                        run = add_styled_run(paragraph, detection_level)
                         print(f"已将段落中的'检测级别值'替换为'{detection_level}'并设置为楷体五号字体")
                     else:
                         # 如果段落包含其他内容，需要精确替换
@@ -382,11 +404,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                 if original_text.strip() == "工程名称参数值":
                                     # 清空段落内容并重新添加
                                     paragraph.clear()
-                                    run = paragraph.add_run(project_name)
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, project_name)
                                     print(f"已将表格单元格中的'工程名称参数值'替换为'{project_name}'并设置为楷体五号字体")
                                 else:
                                     # 如果段落包含其他内容，需要精确替换
@@ -400,11 +419,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                 if original_text.strip() == "委托单位参数值":
                                     # 清空段落内容并重新添加
                                     paragraph.clear()
-                                    run = paragraph.add_run(client_name)
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, client_name)
                                     print(f"已将表格单元格中的'委托单位参数值'替换为'{client_name}'并设置为楷体五号字体")
                                 else:
                                     # 如果段落包含其他内容，需要精确替换
@@ -418,11 +434,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                 if original_text.strip() == "检测方法参数":
                                     # 清空段落内容并重新添加
                                     paragraph.clear()
-                                    run = paragraph.add_run(inspection_method)
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, inspection_method)
                                     print(f"已将表格单元格中的'检测方法参数'替换为'{inspection_method}'并设置为楷体五号字体")
                                 else:
                                     # 如果段落包含其他内容，需要精确替换
@@ -436,11 +449,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                 if original_text.strip() == "检测级别值":
                                     # 清空段落内容并重新添加
                                     paragraph.clear()
-                                    run = paragraph.add_run(detection_level)
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, detection_level)
                                     print(f"已将表格单元格中的'检测级别值'替换为'{detection_level}'并设置为楷体五号字体")
                                 else:
                                     # 如果段落包含其他内容，需要精确替换
@@ -506,11 +516,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                         if cell.paragraphs:
                             paragraph = cell.paragraphs[0]
                             paragraph.clear()
-                            run = paragraph.add_run(str(order_number))
                             # 设置楷体五号字体
-                            run.font.name = "楷体"
-                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                            run.font.size = Pt(10.5)
+                            run = add_styled_run(paragraph, str(order_number))
                             print(f"已将单元格内容从 '{original_content}' 修改为 '{order_number}'并设置为楷体五号字体")
                             notification_number_updated = True
                             break
@@ -548,11 +555,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                             if last_cell.paragraphs:
                                 paragraph = last_cell.paragraphs[0]
                                 paragraph.clear()
-                                run = paragraph.add_run(str(order_number))
                                 # 设置楷体五号字体
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                run = add_styled_run(paragraph, str(order_number))
                                 print(f"已将单元格内容从 '{original_content}' 修改为 '{order_number}'并设置为楷体五号字体")
                                 notification_number_updated = True
                                 break
@@ -585,11 +589,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                 if right_cell.paragraphs and unit_name:
                                     paragraph = right_cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(unit_name)
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, unit_name)
                                     print(f"已将单元名称 {unit_name} 填入单位工程名称右侧单元格并设置为楷体五号字体")
                                     found_in_table = True
                                     break
@@ -619,10 +620,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                     else:
                         # 如果没有冒号，直接添加
                         paragraph.clear()
-                        run = paragraph.add_run(new_text)
-                        run.font.name = "楷体"
-                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                        run.font.size = Pt(10.5)
+                        run = add_styled_run(paragraph, new_text)
                     print(f"已将单元名称 {unit_name} 添加到单位工程名称段落并设置为楷体五号字体")
         
         # 处理表格
@@ -660,10 +658,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                             paragraph.add_run(before_text)
 
                                         # 添加日期部分，设置楷体五号字体
-                                        date_run = paragraph.add_run(new_date)
-                                        date_run.font.name = "楷体"
-                                        date_run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                        date_run.font.size = Pt(10.5)
+                                        date_run = add_styled_run(paragraph, new_date)
 
                                         current_pos = match.end()
 
@@ -681,11 +676,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                             print("未在检测人单元格中找到日期段落，尝试其他方法...")
                             # 添加新段落
                             p = cell.add_paragraph()
-                            run = p.add_run(f"{year}年{month}月{day}日")
                             # 设置楷体五号字体
-                            run.font.name = "楷体"
-                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                            run.font.size = Pt(10.5)
+                            run = add_styled_run(p, f"{year}年{month}月{day}日")
                             print("已添加检测人日期并设置为楷体五号字体")
                     
                     # 2) 处理"审核"日期
@@ -718,10 +710,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                             paragraph.add_run(before_text)
 
                                         # 添加日期部分，设置楷体五号字体
-                                        date_run = paragraph.add_run(new_date)
-                                        date_run.font.name = "楷体"
-                                        date_run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                        date_run.font.size = Pt(10.5)
+                                        date_run = add_styled_run(paragraph, new_date)
 
                                         current_pos = match.end()
 
@@ -739,11 +728,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                             print("未在审核单元格中找到日期段落，尝试其他方法...")
                             # 添加新段落
                             p = cell.add_paragraph()
-                            run = p.add_run(f"{year}年{month}月{day}日")
                             # 设置楷体五号字体
-                            run.font.name = "楷体"
-                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                            run.font.size = Pt(10.5)
+                            run = add_styled_run(p, f"{year}年{month}月{day}日")
                             print("已添加审核日期并设置为楷体五号字体")
             
             # 查找表头行，确定各列的位置
@@ -803,7 +789,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                 print(f"找到{len(data_rows)}行可用于填充数据")
                 
                 # 确定需要填充的数据行数
-                data_count = len(order_df)
+                data_count = prepared['row_count']
                 print(f"需要填充{data_count}行数据")
                 
                 # 如果Word表格中的行数不足，需要添加新行
@@ -818,6 +804,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                         # 在表格末尾添加一行
                         new_row = table.add_row()
                         data_rows.append(len(table.rows) - 1)  # 添加新行的索引
+                    run_metrics.count('rows_added', rows_needed)
                 
                 # 处理每一行数据
                 for i in range(data_count):
@@ -833,11 +820,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(order_number))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, str(order_number))
                                     print(f"已更新第{row_idx+1}行委托单编号: {order_number}")
 
                         # 2. 填写检测批号（填入"/"）
@@ -848,11 +832,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run("/")
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, "/")
                                     print(f"已更新第{row_idx+1}行检测批号: /")
 
                         # 3. 填写单线号（检件编号）
@@ -863,11 +844,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(inspection_numbers[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, str(inspection_numbers[i]))
                                     print(f"已更新第{row_idx+1}行单线号: {inspection_numbers[i]}")
                         
                         # 4. 填写焊口号
@@ -878,11 +856,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(weld_numbers[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, str(weld_numbers[i]))
                                     print(f"已更新第{row_idx+1}行焊口号: {weld_numbers[i]}")
 
                         # 5. 填写焊工号
@@ -893,11 +868,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(welder_numbers[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, str(welder_numbers[i]))
                                     print(f"已更新第{row_idx+1}行焊工号: {welder_numbers[i]}")
 
                         # 6. 填写检测结果（返修补片）
@@ -915,9 +887,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                     else:
                                         run = paragraph.add_run(str(repair_result))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    style_run(run)
                                     print(f"已更新第{row_idx+1}行检测结果")
 
                         # 7. 填写返修张/处数（实际不合格）
@@ -946,11 +916,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                             # 如果转换失败，保持原值
                                             text_value = str(failure_count)
 
-                                    run = paragraph.add_run(text_value)
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, text_value)
                                     print(f"已更新第{row_idx+1}行返修张/处数: {text_value}")
 
                         # 8. 填写备注
@@ -968,9 +935,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                     else:
                                         run = paragraph.add_run(str(note))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    style_run(run)
                                     print(f"已更新第{row_idx+1}行备注")
 
                 # 在单线号数据内容的下一行添加"以下空白"
@@ -985,37 +950,60 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                             if cell.paragraphs:
                                 paragraph = cell.paragraphs[0]
                                 paragraph.clear()
-                                run = paragraph.add_run("以下空白")
                                 # 设置楷体五号字体
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                run = add_styled_run(paragraph, "以下空白")
                                 set_cell_center_alignment(cell)  # 设置居中
                                 print(f"已在第{next_empty_row_idx+1}行单线号列添加'以下空白'并设置居中")
                     else:
                         # 如果没有足够的行，添加新行
                         new_row = table.add_row()
+                        run_metrics.count('rows_added')
                         single_line_col_idx = column_indices["单线号"]
                         if single_line_col_idx < len(new_row.cells):
                             cell = new_row.cells[single_line_col_idx]
                             if cell.paragraphs:
                                 paragraph = cell.paragraphs[0]
                                 paragraph.clear()
-                                run = paragraph.add_run("以下空白")
                                 # 设置楷体五号字体
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                run = add_styled_run(paragraph, "以下空白")
                                 set_cell_center_alignment(cell)  # 设置居中
                                 print(f"已添加新行并在单线号列添加'以下空白'并设置居中")
 
-        # 保存文档
-        doc.save(report_output_path)
-        print(f"文档已保存至: {report_output_path}")
-        success_count += 1
+        run_metrics.count('rows_filled', prepared['row_count'])
+        return doc, prepared['report_output_path']
+
+    # 对每个委托单编号生成一份报告：准备、填充与保存分阶段流水线执行；
+    # 合并输出时只用一个写入线程，按委托单顺序追加到合并文档，全部完成后只保存一次
+    merged = MergedDocument() if merge_output else None
+    pipeline = ReportPipeline(prepare_order, fill_order,
+                              write=merged.write if merged else save_document,
+                              writer_count=1 if merged else None, profiler=profiler)
     
-    print(f"\n处理完成: 共处理{len(order_numbers)}个委托单编号，成功生成{success_count}份报告")
-    return success_count > 0
+    def finish(success_count, group_count):
+        if merged is not None:
+            template_name = os.path.splitext(os.path.basename(word_template_path))[0]
+            return save_merged(merged, merged_output_path(output_dir, template_name, merge_output), group_count)
+        
+        run_metrics.record_reports(success_count, failed=group_count - success_count)
+        print(f"\n处理完成: 共处理{group_count}个委托单编号，成功生成{success_count}份报告")
+        return success_count > 0
+    
+    return pipeline.renderer('NDT_result', order_numbers, finish)
+
+def process_excel_to_word(excel_path, word_template_path, output_path=None, project_name=None, client_name=None, inspection_method=None, session=None,
+                         merge_output=None, profile_memory=None):
+    """将Excel数据填入Word文档（参数见 build_renderer）
+
+    Args:
+        profile_memory: 内存分析报告输出目录（可选，设置时按阶段和分组记录内存分配）
+    
+    Returns:
+        bool: 处理是否成功
+    """
+    with profiling(profile_memory) as profiler:
+        renderer = build_renderer(excel_path, word_template_path, output_path, project_name, client_name,
+                                  inspection_method, session=session, merge_output=merge_output, profiler=profiler)
+        return renderer.run() if renderer else False
 
 def main():
     # 创建命令行参数解析器
@@ -1032,15 +1020,28 @@ def main():
                         help='委托单位，用于替换文档中的"委托单位参数值"')
     parser.add_argument('-m', '--method', 
                         help='检测方法，用于替换文档中的"检测方法参数"')
+    parser.add_argument('--metrics-dir', default=METRICS_CONFIG['output_dir'],
+                        help=f"运行指标输出目录 (默认: {METRICS_CONFIG['output_dir']})")
+    parser.add_argument('--archive',
+                        help='把报告直接写入该归档文件（.zip、.tar、.tar.gz），不写单独的文件')
+    parser.add_argument('--merge', nargs='?', const=True, metavar='FILE',
+                        help='所有委托单填入同一个文档（各委托单之间分节），可指定文件路径 (默认: 输出目录/<模板名>_合并.docx)')
+    parser.add_argument('--profile-memory', nargs='?', const=PROFILE_CONFIG['output_dir'], metavar='DIR',
+                        help=f"按阶段和分组记录内存分配，报告写入DIR (默认: {PROFILE_CONFIG['output_dir']})")
     
     # 解析命令行参数
     args = parser.parse_args()
     
     # 处理Excel到Word的转换
-    success = process_excel_to_word(args.excel, args.word, args.output, args.project, args.client, args.method)
+    with archive_output.archive(args.archive) as sink, run_metrics.collect('NDT_result', args.metrics_dir) as metrics:
+        success = process_excel_to_word(args.excel, args.word, args.output, args.project, args.client, args.method,
+                                        merge_output=args.merge, profile_memory=args.profile_memory)
+        metrics.success = success
+        if sink is not None:
+            sink.success = success
     
-    # 返回状态码
-    sys.exit(0 if success else 1)
+    # 返回状态码（开启归档输出而未能生成归档时同样视为失败）
+    sys.exit(0 if success and archive_output.published(sink) else 1)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -12,12 +12,21 @@ import os
 import sys
 import pandas as pd
 from docx import Document
-from docx.shared import Pt
-from docx.oxml.ns import qn
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 import argparse
 import re
 from datetime import datetime
+from ledger_session import group_value, session_for
+from columnar_extract import text_column, unqualified_column
+from report_pipeline import ReportPipeline
+from run_styles import add_styled_run
+from keyword_matcher import KeywordMatcher, scan_table
+import archive_output
+import run_metrics
+from run_metrics import METRICS_CONFIG
+
+# 需要填入日期的单元格关键字（施工单位、监理单位、项目部/装置、检测单位）
+DATE_CELL_MATCHER = KeywordMatcher(["施工单位：", "监理单位：", "项目部/装置：", "检测单位："])
 
 def set_cell_center_alignment(cell):
     """设置单元格文本居中对齐"""
@@ -50,10 +59,7 @@ def replace_text_in_paragraph(paragraph, old_text, new_text):
         for i, part in enumerate(parts):
             if i > 0:
                 # 添加替换的文本（设置楷体五号字体）
-                run = paragraph.add_run(new_text)
-                run.font.name = "楷体"
-                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                run.font.size = Pt(10.5)
+                run = add_styled_run(paragraph, new_text)
 
             if part:
                 # 添加原始文本部分（保持原有格式）
@@ -87,10 +93,7 @@ def update_date_in_cell(cell, year, month, day):
                         paragraph.add_run(before_text)
 
                     # 添加日期部分，设置楷体五号字体
-                    date_run = paragraph.add_run(new_date)
-                    date_run.font.name = "楷体"
-                    date_run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                    date_run.font.size = Pt(10.5)
+                    date_run = add_styled_run(paragraph, new_date)
 
                     current_pos = match.end()
 
@@ -121,16 +124,13 @@ def update_date_in_cell(cell, year, month, day):
                 paragraph.add_run(current_text)
 
             # 添加日期，设置楷体五号字体
-            date_run = paragraph.add_run(f"{year}年{month}月{day}日")
-            date_run.font.name = "楷体"
-            date_run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-            date_run.font.size = Pt(10.5)
+            date_run = add_styled_run(paragraph, f"{year}年{month}月{day}日")
             print(f"已添加日期: {year}年{month}月{day}日并设置为楷体五号字体")
 
-def process_excel_to_word(excel_path, word_template_path, output_path=None, 
+def build_renderer(excel_path, word_template_path, output_path=None, 
                          project_name=None, client_name=None, inspection_unit=None, 
-                         inspection_standard=None, inspection_method=None):
-    """将Excel数据填入Word文档 - Mode1模式
+                         inspection_standard=None, inspection_method=None, session=None):
+    """准备生成 - Mode1模式：读取Excel、建立列映射、按委托单编号分组，返回逐组生成报告的 GroupRenderer
     
     Args:
         excel_path: Excel表格路径
@@ -141,18 +141,19 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         inspection_unit: 检测单位，用于替换文档中的"检测单位值"
         inspection_standard: 检测标准，用于替换文档中的"检测标准值"
         inspection_method: 检测方法，用于替换文档中的"检测方法值"
+        session: 共享读取会话（可选，ledger_session.LedgerSession），多个生成器共用同一工作簿时只读取分组一次
     
     Returns:
-        bool: 处理是否成功
+        GroupRenderer: 逐组生成器（准备失败时返回None）
     """
     # 检查文件是否存在
     if not os.path.exists(excel_path):
         print(f"错误: Excel文件不存在: {excel_path}")
-        return False
+        return None
         
     if not os.path.exists(word_template_path):
         print(f"错误: Word模板文件不存在: {word_template_path}")
-        return False
+        return None
     
     # 创建输出目录
     if output_path:
@@ -171,7 +172,9 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
     try:
         # 读取Excel文件
         print(f"正在读取Excel文件: {excel_path}")
-        df = pd.read_excel(excel_path)
+        session = session_for(session, excel_path)
+        with run_metrics.stage('read'):
+            df = session.read_excel() if session else pd.read_excel(excel_path)
         print(f"Excel文件读取成功，共{len(df)}行数据")
         
         # 显示列名以便调试
@@ -246,56 +249,125 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         for col in required_columns:
             if col not in column_mapping:
                 print(f"错误: 未找到必需的列: '{col}'")
-                return False
+                return None
         
         # 按委托单编号分组
         order_column = column_mapping['委托单编号']
-        grouped = df.groupby(order_column)
+        if session:
+            # 使用共享会话中已分组的数据
+            grouped = session.partitions(order_column, sort=True).items()
+        else:
+            grouped = df.groupby(order_column)
         
         print(f"\n按委托单编号分组，共{len(grouped)}组:")
         for order_number, group in grouped:
             print(f"  委托单编号: {order_number}, 数据行数: {len(group)}")
         
         # 处理每个委托单编号的数据
-        success_count = 0
-        error_count = 0
+        groups = {order_number: group_data for order_number, group_data in grouped}
         
-        for order_number, group_data in grouped:
-            try:
-                print(f"\n==== 处理委托单编号: {order_number} ====")
-                print(f"该组数据行数: {len(group_data)}")
-                
-                # 加载Word模板
-                doc = Document(word_template_path)
-                print("Word模板加载成功")
-                
-                # 获取完成日期的最晚日期
-                completion_date_column = column_mapping.get('完成日期')
-                if completion_date_column:
-                    completion_dates = group_data[completion_date_column].dropna()
-                    if not completion_dates.empty:
-                        # 转换为日期类型并找到最晚日期
-                        try:
-                            completion_dates_converted = pd.to_datetime(completion_dates, errors='coerce')
-                            latest_completion_date = completion_dates_converted.max()
-                            
-                            if pd.notna(latest_completion_date):
-                                year = latest_completion_date.year
-                                month = latest_completion_date.month
-                                day = latest_completion_date.day
-                                print(f"最晚完成日期: {year}年{month}月{day}日")
-                            else:
-                                print("警告: 无法解析完成日期")
-                                year, month, day = 2024, 1, 1
-                        except Exception as e:
-                            print(f"日期转换错误: {e}")
+        # 准备阶段：提取该委托单编号的日期、单值和表格数据
+        def prepare_order(order_number):
+            group_data = groups[order_number]
+            print(f"\n==== 处理委托单编号: {order_number} ====")
+            print(f"该组数据行数: {len(group_data)}")
+            
+            # 获取完成日期的最晚日期
+            completion_date_column = column_mapping.get('完成日期')
+            if completion_date_column:
+                completion_dates = group_data[completion_date_column].dropna()
+                if not completion_dates.empty:
+                    # 转换为日期类型并找到最晚日期
+                    try:
+                        # 多个模板共用会话时每个委托单只计算一次
+                        latest_completion_date = group_value(
+                            session, ('最晚完成日期', completion_date_column), order_number,
+                            lambda: pd.to_datetime(group_data[completion_date_column], errors='coerce').max())
+                        
+                        if pd.notna(latest_completion_date):
+                            year = latest_completion_date.year
+                            month = latest_completion_date.month
+                            day = latest_completion_date.day
+                            print(f"最晚完成日期: {year}年{month}月{day}日")
+                        else:
+                            print("警告: 无法解析完成日期")
                             year, month, day = 2024, 1, 1
-                    else:
-                        print("警告: 完成日期列为空")
+                    except Exception as e:
+                        print(f"日期转换错误: {e}")
                         year, month, day = 2024, 1, 1
                 else:
-                    print("警告: 未找到完成日期列")
+                    print("警告: 完成日期列为空")
                     year, month, day = 2024, 1, 1
+            else:
+                print("警告: 未找到完成日期列")
+                year, month, day = 2024, 1, 1
+            
+            # 获取合格级别值
+            qualification_level = ""
+            if '合格级别' in column_mapping:
+                qual_values = group_value(session, ('合格级别', column_mapping['合格级别']), order_number,
+                                          lambda: tuple(group_data[column_mapping['合格级别']].dropna()))
+                if qual_values:
+                    qualification_level = str(qual_values[0])
+                    print(f"合格级别值: {qualification_level}")
+            
+            # 获取单元名称值
+            unit_name = ""
+            if '单元名称' in column_mapping:
+                unit_values = group_value(session, ('单元名称', column_mapping['单元名称']), order_number,
+                                          lambda: tuple(group_data[column_mapping['单元名称']].dropna()))
+                if unit_values:
+                    unit_name = str(unit_values[0])
+                    print(f"单元名称值: {unit_name}")
+
+            # 准备数据（按列一次性提取）
+            def extract_text(key, default=""):
+                return text_column(group_data, column_mapping[key], default) if key in column_mapping else []
+
+            pipe_numbers = extract_text('检件编号')          # 管线/检件编号
+            weld_numbers = extract_text('焊口编号')          # 焊口编号
+            materials = extract_text('材质')                 # 材质
+            specifications = extract_text('规格')            # 规格
+            film_specs = extract_text('底片规格/张数')        # 底片规格/数量（张）
+            qualified_counts = extract_text('合格张数', "0")  # 合格
+
+            # 不合格张数（张数-合格张数）
+            unqualified_counts = [str(count) for count in unqualified_column(
+                group_data, column_mapping.get('张数'), column_mapping.get('合格张数'))]
+
+
+            return {
+                'order_number': order_number,
+                'date': (year, month, day),
+                'row_count': len(group_data),
+                'qualification_level': qualification_level,
+                'unit_name': unit_name,
+                'pipe_numbers': pipe_numbers,
+                'weld_numbers': weld_numbers,
+                'materials': materials,
+                'specifications': specifications,
+                'film_specs': film_specs,
+                'qualified_counts': qualified_counts,
+                'unqualified_counts': unqualified_counts,
+            }
+        
+        # 填充阶段：加载Word模板并填充该委托单编号的文档
+        def fill_order(prepared):
+            order_number = prepared['order_number']
+            year, month, day = prepared['date']
+            qualification_level = prepared['qualification_level']
+            unit_name = prepared['unit_name']
+            pipe_numbers = prepared['pipe_numbers']
+            weld_numbers = prepared['weld_numbers']
+            materials = prepared['materials']
+            specifications = prepared['specifications']
+            film_specs = prepared['film_specs']
+            qualified_counts = prepared['qualified_counts']
+            unqualified_counts = prepared['unqualified_counts']
+            try:
+                # 加载Word模板
+                doc = Document(word_template_path)
+                print("Word模板加载成功")
                 
                 # 替换文档中的参数值
                 if any([project_name, client_name, inspection_unit, inspection_standard, inspection_method]):
@@ -317,11 +389,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                             if original_text.strip() == "工程名称值":
                                 # 清空段落内容并重新添加
                                 paragraph.clear()
-                                run = paragraph.add_run(project_name)
                                 # 设置楷体五号字体
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                run = add_styled_run(paragraph, project_name)
                                 print(f"已将段落中的'工程名称值'替换为'{project_name}'并设置为楷体五号字体")
                             else:
                                 # 如果段落包含其他内容，需要精确替换
@@ -335,11 +404,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                             if original_text.strip() == "委托单位值":
                                 # 清空段落内容并重新添加
                                 paragraph.clear()
-                                run = paragraph.add_run(client_name)
                                 # 设置楷体五号字体
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                run = add_styled_run(paragraph, client_name)
                                 set_paragraph_center_alignment(paragraph)
                                 print(f"已将段落中的'委托单位值'替换为'{client_name}'并设置为楷体五号字体和居中")
                             else:
@@ -355,11 +421,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                             if original_text.strip() == "检测单位值":
                                 # 清空段落内容并重新添加
                                 paragraph.clear()
-                                run = paragraph.add_run(inspection_unit)
                                 # 设置楷体五号字体
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                run = add_styled_run(paragraph, inspection_unit)
                                 set_paragraph_center_alignment(paragraph)
                                 print(f"已将段落中的'检测单位值'替换为'{inspection_unit}'并设置为楷体五号字体和居中")
                             else:
@@ -375,11 +438,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                             if original_text.strip() == "检测标准值":
                                 # 清空段落内容并重新添加
                                 paragraph.clear()
-                                run = paragraph.add_run(inspection_standard)
                                 # 设置楷体五号字体
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                run = add_styled_run(paragraph, inspection_standard)
                                 set_paragraph_center_alignment(paragraph)
                                 print(f"已将段落中的'检测标准值'替换为'{inspection_standard}'并设置为楷体五号字体和居中")
                             else:
@@ -395,11 +455,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                             if original_text.strip() == "检测方法值":
                                 # 清空段落内容并重新添加
                                 paragraph.clear()
-                                run = paragraph.add_run(inspection_method)
                                 # 设置楷体五号字体
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                run = add_styled_run(paragraph, inspection_method)
                                 set_paragraph_center_alignment(paragraph)
                                 print(f"已将段落中的'检测方法值'替换为'{inspection_method}'并设置为楷体五号字体和居中")
                             else:
@@ -420,11 +477,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                         if original_text.strip() == "工程名称值":
                                             # 清空段落内容并重新添加
                                             paragraph.clear()
-                                            run = paragraph.add_run(project_name)
                                             # 设置楷体五号字体
-                                            run.font.name = "楷体"
-                                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                            run.font.size = Pt(10.5)
+                                            run = add_styled_run(paragraph, project_name)
                                             set_cell_center_alignment(cell)
                                             print(f"已将表格中的'工程名称值'替换为'{project_name}'并设置为楷体五号字体和居中")
                                         else:
@@ -440,11 +494,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                         if original_text.strip() == "委托单位值":
                                             # 清空段落内容并重新添加
                                             paragraph.clear()
-                                            run = paragraph.add_run(client_name)
                                             # 设置楷体五号字体
-                                            run.font.name = "楷体"
-                                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                            run.font.size = Pt(10.5)
+                                            run = add_styled_run(paragraph, client_name)
                                             set_cell_center_alignment(cell)
                                             print(f"已将表格中的'委托单位值'替换为'{client_name}'并设置为楷体五号字体和居中")
                                         else:
@@ -460,11 +511,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                         if original_text.strip() == "检测单位值":
                                             # 清空段落内容并重新添加
                                             paragraph.clear()
-                                            run = paragraph.add_run(inspection_unit)
                                             # 设置楷体五号字体
-                                            run.font.name = "楷体"
-                                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                            run.font.size = Pt(10.5)
+                                            run = add_styled_run(paragraph, inspection_unit)
                                             set_cell_center_alignment(cell)
                                             print(f"已将表格中的'检测单位值'替换为'{inspection_unit}'并设置为楷体五号字体和居中")
                                         else:
@@ -480,11 +528,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                         if original_text.strip() == "检测标准值":
                                             # 清空段落内容并重新添加
                                             paragraph.clear()
-                                            run = paragraph.add_run(inspection_standard)
                                             # 设置楷体五号字体
-                                            run.font.name = "楷体"
-                                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                            run.font.size = Pt(10.5)
+                                            run = add_styled_run(paragraph, inspection_standard)
                                             set_cell_center_alignment(cell)
                                             print(f"已将表格中的'检测标准值'替换为'{inspection_standard}'并设置为楷体五号字体和居中")
                                         else:
@@ -500,11 +545,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                         if original_text.strip() == "检测方法值":
                                             # 清空段落内容并重新添加
                                             paragraph.clear()
-                                            run = paragraph.add_run(inspection_method)
                                             # 设置楷体五号字体
-                                            run.font.name = "楷体"
-                                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                            run.font.size = Pt(10.5)
+                                            run = add_styled_run(paragraph, inspection_method)
                                             set_cell_center_alignment(cell)
                                             print(f"已将表格中的'检测方法值'替换为'{inspection_method}'并设置为楷体五号字体和居中")
                                         else:
@@ -516,22 +558,6 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                 # 处理单值替换（合格级别、单元名称、完成日期）
                 print("\n==== 开始处理单值替换 ====")
                 
-                # 获取合格级别值
-                qualification_level = ""
-                if '合格级别' in column_mapping:
-                    qual_values = group_data[column_mapping['合格级别']].dropna()
-                    if not qual_values.empty:
-                        qualification_level = str(qual_values.iloc[0])
-                        print(f"合格级别值: {qualification_level}")
-                
-                # 获取单元名称值
-                unit_name = ""
-                if '单元名称' in column_mapping:
-                    unit_values = group_data[column_mapping['单元名称']].dropna()
-                    if not unit_values.empty:
-                        unit_name = str(unit_values.iloc[0])
-                        print(f"单元名称值: {unit_name}")
-
                 # 获取委托单编号值（同一个委托单编号只需选一个）
                 order_number_value = order_number  # 直接使用当前处理的委托单编号
                 print(f"委托单编号值: {order_number_value}")
@@ -545,11 +571,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                         if original_text.strip() == "合格级别值":
                             # 清空段落内容并重新添加
                             paragraph.clear()
-                            run = paragraph.add_run(qualification_level)
                             # 设置楷体五号字体
-                            run.font.name = "楷体"
-                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                            run.font.size = Pt(10.5)
+                            run = add_styled_run(paragraph, qualification_level)
                             set_paragraph_center_alignment(paragraph)
                             print(f"已将'合格级别值'替换为'{qualification_level}'并设置为楷体五号字体和居中")
                         else:
@@ -565,11 +588,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                         if original_text.strip() == "单元名称值":
                             # 清空段落内容并重新添加
                             paragraph.clear()
-                            run = paragraph.add_run(unit_name)
                             # 设置楷体五号字体
-                            run.font.name = "楷体"
-                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                            run.font.size = Pt(10.5)
+                            run = add_styled_run(paragraph, unit_name)
                             print(f"已将'单元名称值'替换为'{unit_name}'并设置为楷体五号字体")
                         else:
                             # 如果段落包含其他内容，需要精确替换
@@ -583,11 +603,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                         if original_text.strip() == "委托单编号值":
                             # 清空段落内容并重新添加
                             paragraph.clear()
-                            run = paragraph.add_run(order_number_value)
                             # 设置楷体五号字体
-                            run.font.name = "楷体"
-                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                            run.font.size = Pt(10.5)
+                            run = add_styled_run(paragraph, order_number_value)
                             set_paragraph_center_alignment(paragraph)
                             print(f"已将'委托单编号值'替换为'{order_number_value}'并设置为楷体五号字体和居中")
                         else:
@@ -604,11 +621,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                         if original_text.strip() == "完成日期值":
                             # 清空段落内容并重新添加
                             paragraph.clear()
-                            run = paragraph.add_run(completion_date_str)
                             # 设置楷体五号字体
-                            run.font.name = "楷体"
-                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                            run.font.size = Pt(10.5)
+                            run = add_styled_run(paragraph, completion_date_str)
                             set_paragraph_center_alignment(paragraph)
                             print(f"已将'完成日期值'替换为'{completion_date_str}'并设置为楷体五号字体和居中")
                         else:
@@ -629,11 +643,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     if original_text.strip() == "合格级别值":
                                         # 清空段落内容并重新添加
                                         paragraph.clear()
-                                        run = paragraph.add_run(qualification_level)
                                         # 设置楷体五号字体
-                                        run.font.name = "楷体"
-                                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                        run.font.size = Pt(10.5)
+                                        run = add_styled_run(paragraph, qualification_level)
                                         set_cell_center_alignment(cell)
                                         print(f"已将表格中的'合格级别值'替换为'{qualification_level}'并设置为楷体五号字体和居中")
                                     else:
@@ -649,11 +660,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     if original_text.strip() == "单元名称值":
                                         # 清空段落内容并重新添加
                                         paragraph.clear()
-                                        run = paragraph.add_run(unit_name)
                                         # 设置楷体五号字体
-                                        run.font.name = "楷体"
-                                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                        run.font.size = Pt(10.5)
+                                        run = add_styled_run(paragraph, unit_name)
                                         print(f"已将表格中的'单元名称值'替换为'{unit_name}'并设置为楷体五号字体")
                                     else:
                                         # 如果段落包含其他内容，需要精确替换
@@ -667,11 +675,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     if original_text.strip() == "委托单编号值":
                                         # 清空段落内容并重新添加
                                         paragraph.clear()
-                                        run = paragraph.add_run(order_number_value)
                                         # 设置楷体五号字体
-                                        run.font.name = "楷体"
-                                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                        run.font.size = Pt(10.5)
+                                        run = add_styled_run(paragraph, order_number_value)
                                         set_cell_center_alignment(cell)
                                         print(f"已将表格中的'委托单编号值'替换为'{order_number_value}'并设置为楷体五号字体和居中")
                                     else:
@@ -688,11 +693,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     if original_text.strip() == "完成日期值":
                                         # 清空段落内容并重新添加
                                         paragraph.clear()
-                                        run = paragraph.add_run(completion_date_str)
                                         # 设置楷体五号字体
-                                        run.font.name = "楷体"
-                                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                        run.font.size = Pt(10.5)
+                                        run = add_styled_run(paragraph, completion_date_str)
                                         set_cell_center_alignment(cell)
                                         print(f"已将表格中的'完成日期值'替换为'{completion_date_str}'并设置为楷体五号字体和居中")
                                     else:
@@ -703,14 +705,12 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
 
                 # 处理日期填入（施工单位、监理单位、项目部/装置、检测单位）
                 print("\n==== 开始处理日期填入 ====")
-                date_keywords = ["施工单位：", "监理单位：", "项目部/装置：", "检测单位："]
 
                 for table in doc.tables:
-                    for row in table.rows:
-                        for cell in row.cells:
-                            cell_text = cell.text.strip()
-                            for keyword in date_keywords:
-                                if keyword in cell_text:
+                    for _, cells in scan_table(table, DATE_CELL_MATCHER):
+                        for _, cell, _, hits in cells:
+                            for keyword in DATE_CELL_MATCHER.keywords:
+                                if keyword in hits:
                                     print(f"找到{keyword}单元格")
                                     # 更新单元格中的日期
                                     update_date_in_cell(cell, year, month, day)
@@ -718,69 +718,6 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                 # 处理表格数据填入
                 print("\n==== 开始处理表格数据填入 ====")
 
-                # 准备数据
-                pipe_numbers = []  # 管线/检件编号
-                weld_numbers = []  # 焊口编号
-                materials = []     # 材质
-                specifications = [] # 规格
-                film_specs = []    # 底片规格/数量（张）
-                qualified_counts = [] # 合格
-                unqualified_counts = [] # 不合格
-
-                for idx, row in group_data.iterrows():
-                    # 检件编号
-                    if '检件编号' in column_mapping:
-                        pipe_num = row[column_mapping['检件编号']]
-                        pipe_numbers.append(str(pipe_num) if pd.notna(pipe_num) else "")
-
-                    # 焊口编号
-                    if '焊口编号' in column_mapping:
-                        weld_num = row[column_mapping['焊口编号']]
-                        weld_numbers.append(str(weld_num) if pd.notna(weld_num) else "")
-
-                    # 材质
-                    if '材质' in column_mapping:
-                        material = row[column_mapping['材质']]
-                        materials.append(str(material) if pd.notna(material) else "")
-
-                    # 规格
-                    if '规格' in column_mapping:
-                        spec = row[column_mapping['规格']]
-                        specifications.append(str(spec) if pd.notna(spec) else "")
-
-                    # 底片规格/张数
-                    if '底片规格/张数' in column_mapping:
-                        film_spec = row[column_mapping['底片规格/张数']]
-                        film_specs.append(str(film_spec) if pd.notna(film_spec) else "")
-
-                    # 合格张数
-                    if '合格张数' in column_mapping:
-                        qualified = row[column_mapping['合格张数']]
-                        qualified_counts.append(str(qualified) if pd.notna(qualified) else "0")
-
-                    # 不合格张数（张数-合格张数）
-                    total_count = 0
-                    qualified_count = 0
-
-                    if '张数' in column_mapping:
-                        total = row[column_mapping['张数']]
-                        if pd.notna(total):
-                            try:
-                                total_count = int(float(total))
-                            except:
-                                total_count = 0
-
-                    if '合格张数' in column_mapping:
-                        qualified = row[column_mapping['合格张数']]
-                        if pd.notna(qualified):
-                            try:
-                                qualified_count = int(float(qualified))
-                            except:
-                                qualified_count = 0
-
-                    unqualified_count = max(0, total_count - qualified_count)
-                    unqualified_counts.append(str(unqualified_count))
-
                 print(f"准备填入表格的数据行数: {len(pipe_numbers)}")
 
                 # 查找并填入表格数据
@@ -876,11 +813,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                             if cell.paragraphs:
                                                 paragraph = cell.paragraphs[0]
                                                 paragraph.clear()
-                                                run = paragraph.add_run(pipe_numbers[i])
                                                 # 设置楷体五号字体
-                                                run.font.name = "楷体"
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                run.font.size = Pt(10.5)
+                                                run = add_styled_run(paragraph, pipe_numbers[i])
                                                 print(f"已更新第{row_idx+1}行管线/检件编号: {pipe_numbers[i]}")
 
                                     if "焊口编号" in column_indices and i < len(weld_numbers):
@@ -890,11 +824,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                             if cell.paragraphs:
                                                 paragraph = cell.paragraphs[0]
                                                 paragraph.clear()
-                                                run = paragraph.add_run(weld_numbers[i])
                                                 # 设置楷体五号字体
-                                                run.font.name = "楷体"
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                run.font.size = Pt(10.5)
+                                                run = add_styled_run(paragraph, weld_numbers[i])
                                                 print(f"已更新第{row_idx+1}行焊口编号: {weld_numbers[i]}")
 
                                     if "材质" in column_indices and i < len(materials):
@@ -904,11 +835,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                             if cell.paragraphs:
                                                 paragraph = cell.paragraphs[0]
                                                 paragraph.clear()
-                                                run = paragraph.add_run(materials[i])
                                                 # 设置楷体五号字体
-                                                run.font.name = "楷体"
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                run.font.size = Pt(10.5)
+                                                run = add_styled_run(paragraph, materials[i])
                                                 print(f"已更新第{row_idx+1}行材质: {materials[i]}")
 
                                     if "规格" in column_indices and i < len(specifications):
@@ -918,11 +846,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                             if cell.paragraphs:
                                                 paragraph = cell.paragraphs[0]
                                                 paragraph.clear()
-                                                run = paragraph.add_run(specifications[i])
                                                 # 设置楷体五号字体
-                                                run.font.name = "楷体"
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                run.font.size = Pt(10.5)
+                                                run = add_styled_run(paragraph, specifications[i])
                                                 print(f"已更新第{row_idx+1}行规格: {specifications[i]}")
 
                                     if "底片规格/数量（张）" in column_indices and i < len(film_specs):
@@ -932,11 +857,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                             if cell.paragraphs:
                                                 paragraph = cell.paragraphs[0]
                                                 paragraph.clear()
-                                                run = paragraph.add_run(film_specs[i])
                                                 # 设置楷体五号字体
-                                                run.font.name = "楷体"
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                run.font.size = Pt(10.5)
+                                                run = add_styled_run(paragraph, film_specs[i])
                                                 print(f"已更新第{row_idx+1}行底片规格/数量: {film_specs[i]}")
 
                                     if "合格" in column_indices and i < len(qualified_counts):
@@ -946,11 +868,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                             if cell.paragraphs:
                                                 paragraph = cell.paragraphs[0]
                                                 paragraph.clear()
-                                                run = paragraph.add_run(qualified_counts[i])
                                                 # 设置楷体五号字体
-                                                run.font.name = "楷体"
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                run.font.size = Pt(10.5)
+                                                run = add_styled_run(paragraph, qualified_counts[i])
                                                 print(f"已更新第{row_idx+1}行合格: {qualified_counts[i]}")
 
                                     if "不合格" in column_indices and i < len(unqualified_counts):
@@ -960,11 +879,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                             if cell.paragraphs:
                                                 paragraph = cell.paragraphs[0]
                                                 paragraph.clear()
-                                                run = paragraph.add_run(unqualified_counts[i])
                                                 # 设置楷体五号字体
-                                                run.font.name = "楷体"
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                run.font.size = Pt(10.5)
+                                                run = add_styled_run(paragraph, unqualified_counts[i])
                                                 print(f"已更新第{row_idx+1}行不合格: {unqualified_counts[i]}")
                             else:
                                 print(f"警告: 表格行数不足，无法填充第{i+1}条数据")
@@ -981,11 +897,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     if cell.paragraphs:
                                         paragraph = cell.paragraphs[0]
                                         paragraph.clear()
-                                        run = paragraph.add_run("以下空白")
                                         # 设置楷体五号字体
-                                        run.font.name = "楷体"
-                                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                        run.font.size = Pt(10.5)
+                                        run = add_styled_run(paragraph, "以下空白")
                                         set_cell_center_alignment(cell)
                                         print(f"已在第{next_empty_row_idx+1}行焊口编号列添加'以下空白'并设置居中")
 
@@ -1043,10 +956,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                             # 添加"说明："标签（保持原有格式）
                             paragraph.add_run("说明：")
                             # 添加统计信息（设置楷体五号字体）
-                            run = paragraph.add_run(summary_text)
-                            run.font.name = "楷体"
-                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                            run.font.size = Pt(10.5)
+                            run = add_styled_run(paragraph, summary_text)
                         else:
                             # 使用精确替换
                             replace_text_in_paragraph(paragraph, paragraph.text, paragraph.text + summary_text)
@@ -1074,10 +984,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     # 添加"说明："标签（保持原有格式）
                                     target_paragraph.add_run("说明：")
                                     # 添加统计信息（设置楷体五号字体）
-                                    run = target_paragraph.add_run(summary_text)
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(target_paragraph, summary_text)
                                     print(f"已在表格'说明'后添加统计信息: {summary_text}")
                                     summary_added = True
                                 elif "说明" in target_paragraph.text and "共检测" in target_paragraph.text:
@@ -1087,28 +994,43 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                 # 保存文档
                 report_output_path = os.path.join(output_dir, f"{order_number}_RT结果通知单台账_Mode1.docx")
                 
-                try:
-                    print(f"\n正在保存文档到: {report_output_path}")
-                    doc.save(report_output_path)
-                    print(f"文档已成功保存至: {report_output_path}")
-                    success_count += 1
-                except Exception as e:
-                    print(f"错误: 无法保存文档: {e}")
-                    error_count += 1
+                print(f"\n正在保存文档到: {report_output_path}")
+                run_metrics.count('rows_filled', prepared['row_count'])
+                return doc, report_output_path
                     
             except Exception as e:
                 print(f"错误: 处理委托单编号 {order_number} 时出错: {e}")
-                error_count += 1
+                return None
         
-        print(f"\n==== 处理完成 ====")
-        print(f"成功处理: {success_count} 个文档")
-        print(f"处理失败: {error_count} 个文档")
+        # 准备、填充与保存分阶段流水线执行
+        pipeline = ReportPipeline(prepare_order, fill_order)
         
-        return error_count == 0
+        def finish(success_count, group_count):
+            error_count = group_count - success_count
+            run_metrics.record_reports(success_count, failed=error_count)
+            print(f"\n==== 处理完成 ====")
+            print(f"成功处理: {success_count} 个文档")
+            print(f"处理失败: {error_count} 个文档")
+            
+            return error_count == 0
+        
+        return pipeline.renderer('NDT_result_mode1', list(groups), finish)
         
     except Exception as e:
         print(f"错误: 处理过程中出现异常: {e}")
-        return False
+        return None
+
+def process_excel_to_word(excel_path, word_template_path, output_path=None, 
+                         project_name=None, client_name=None, inspection_unit=None, 
+                         inspection_standard=None, inspection_method=None, session=None):
+    """将Excel数据填入Word文档 - Mode1模式（参数见 build_renderer）
+    
+    Returns:
+        bool: 处理是否成功
+    """
+    renderer = build_renderer(excel_path, word_template_path, output_path, project_name, client_name,
+                              inspection_unit, inspection_standard, inspection_method, session=session)
+    return renderer.run() if renderer else False
 
 def main():
     # 创建命令行参数解析器
@@ -1129,19 +1051,27 @@ def main():
                         help='检测标准，用于替换文档中的"检测标准值"')
     parser.add_argument('-m', '--method', 
                         help='检测方法，用于替换文档中的"检测方法值"')
+    parser.add_argument('--metrics-dir', default=METRICS_CONFIG['output_dir'],
+                        help=f"运行指标输出目录 (默认: {METRICS_CONFIG['output_dir']})")
+    parser.add_argument('--archive',
+                        help='把报告直接写入该归档文件（.zip、.tar、.tar.gz），不写单独的文件')
     
     # 解析命令行参数
     args = parser.parse_args()
     
     # 处理Excel到Word的转换
-    success = process_excel_to_word(
-        args.excel, args.word, args.output, 
-        args.project, args.client, args.unit, 
-        args.standard, args.method
-    )
+    with archive_output.archive(args.archive) as sink, run_metrics.collect('NDT_result_mode1', args.metrics_dir) as metrics:
+        success = process_excel_to_word(
+            args.excel, args.word, args.output, 
+            args.project, args.client, args.unit, 
+            args.standard, args.method
+        )
+        metrics.success = success
+        if sink is not None:
+            sink.success = success
     
-    # 返回状态码
-    sys.exit(0 if success else 1)
+    # 返回状态码（开启归档输出而未能生成归档时同样视为失败）
+    sys.exit(0 if success and archive_output.published(sink) else 1)
 
 if __name__ == "__main__":
     main()
@@ -3,13 +3,60 @@ import os
 import sys
 import argparse
 from docx import Document
-from docx.shared import Pt
-from docx.oxml.ns import qn
 from datetime import datetime
 import re
+import time
+from ledger_session import session_for
+from run_journal import RunJournal, hash_group_input, STATUS_SUCCESS, STATUS_FAILED, STATUS_SKIPPED
+from run_plan import GeneratorPlan, PlanEntry, resolve_columns, ray_type_groups, print_plan
+from docx_writer import save_docx
+from run_styles import add_styled_run, style_run
+from table_builder import TableGrid
+from keyword_matcher import KeywordMatcher, scan_table
+import archive_output
+import run_metrics
+from run_metrics import METRICS_CONFIG
 from dataclasses import dataclass
 from typing import Dict, List, Tuple, Optional
 
+# 需要查找的列关键字
+COLUMN_KEYWORDS = {
+    '完成日期': '完成日期',
+    '委托单编号': '委托单编号',
+    '检件编号': '检件编号',
+    '焊口编号': '焊口编号',
+    '焊工号': '焊工号',
+    '合格级别': '合格级别',
+    '检测比例': '检测比例',
+    'γ射线': 'γ射线',
+    '焊接方法': '焊接方法',
+    '检测时机': '检测时机',
+    '规格': '规格'
+}
+
+# 未按表头找到时回退使用的列位置
+COLUMN_POSITIONS = {
+    '完成日期': 'B', 
+    '委托单编号': 'C', 
+    '检件编号': 'D', 
+    '焊口编号': 'E', 
+    '焊工号': 'F',
+    '合格级别': 'I',
+    '检测比例': 'J',
+    'γ射线': 'P',
+    '焊接方法': 'R',
+    '检测时机': 'V',
+    '规格': 'G'
+}
+
+# 双列表格的"检测部位信息"标记行（下一行为表头）和判断表格格式的关键列
+DETECTION_INFO_MARKER = "检测部位信息"
+FORMAT_KEY_COLUMNS = ('检件编号', '焊缝编号', '焊工号', '序号')
+
+# 模板表格扫描使用的关键字（标记行、表头列名）
+TABLE_HEADER_MATCHER = KeywordMatcher((DETECTION_INFO_MARKER, "以下空白", "透照参数序号") + FORMAT_KEY_COLUMNS +
+                                      ("焊口编号", "焊缝", "焊口", "编号", "备注"))
+
 def find_column_with_keyword(df, keyword):
     """查找包含指定关键字的列"""
     matching_cols = [col for col in df.columns if keyword.lower() in col.lower()]
@@ -24,10 +71,7 @@ def set_font_style(paragraph, font_name="楷体", font_size=10.5):
         font_size: 字体大小，默认为10.5磅（五号字）
     """
     for run in paragraph.runs:
-        run.font.name = font_name
-        run.font.size = Pt(font_size)
-        # 设置中文字体
-        run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
+        style_run(run, font_name, font_size)
 
 def normalize_text(text):
     """标准化文本以便更好的匹配"""
@@ -74,6 +118,13 @@ class DataAllocation:
     left_numbers: List[int]  # 左侧序号
     right_numbers: List[int]  # 右侧序号
 
+def find_detection_info_row(table, grid: Optional[TableGrid] = None) -> int:
+    """查找"检测部位信息"所在的行，找不到时返回-1"""
+    for row_idx, cells in scan_table(table, TABLE_HEADER_MATCHER, grid):
+        if any(DETECTION_INFO_MARKER in hits for _, _, _, hits in cells):
+            return row_idx
+    return -1
+
 def detect_table_format(table) -> str:
     """
     检测表格格式
@@ -86,50 +137,34 @@ def detect_table_format(table) -> str:
     """
     try:
         # 检测关键字
-        key_columns = ['检件编号', '焊缝编号', '焊工号', '序号']
+        key_columns = FORMAT_KEY_COLUMNS
         column_counts = {}
+        grid = TableGrid(table)
 
-        print(f"开始检测表格格式，表格共有{len(table.rows)}行")
+        def count_key_columns(cells):
+            for _, _, _, hits in cells:
+                for key_col in key_columns:
+                    if key_col in hits:
+                        column_counts[key_col] = column_counts.get(key_col, 0) + 1
+
+        print(f"开始检测表格格式，表格共有{len(grid)}行")
 
         # 首先查找"检测部位信息"行
-        detection_info_row = -1
-        for row_idx in range(len(table.rows)):
-            row = table.rows[row_idx]
-            for cell in row.cells:
-                if "检测部位信息" in cell.text.strip():
-                    detection_info_row = row_idx
-                    print(f"找到检测部位信息表格在第{row_idx+1}行")
-                    break
-            if detection_info_row >= 0:
-                break
+        detection_info_row = find_detection_info_row(table, grid)
+        if detection_info_row >= 0:
+            print(f"找到检测部位信息表格在第{detection_info_row+1}行")
 
         # 如果找到检测部位信息行，检查下一行的表头
-        if detection_info_row >= 0 and detection_info_row + 1 < len(table.rows):
+        if detection_info_row >= 0 and detection_info_row + 1 < len(grid):
             header_row_idx = detection_info_row + 1
-            row = table.rows[header_row_idx]
-            print(f"检查表头行第{header_row_idx+1}行，共{len(row.cells)}列")
-
-            for cell_idx, cell in enumerate(row.cells):
-                cell_text = cell.text.strip()
-                if cell_text:  # 只处理非空单元格
-                    for key_col in key_columns:
-                        if key_col in cell_text:
-                            column_counts[key_col] = column_counts.get(key_col, 0) + 1
-                            # print(f"在第{header_row_idx+1}行第{cell_idx+1}列找到'{key_col}': {cell_text}")
+            print(f"检查表头行第{header_row_idx+1}行，共{len(grid.cells(header_row_idx))}列")
+            for _, cells in scan_table(table, TABLE_HEADER_MATCHER, grid, header_row_idx, header_row_idx + 1):
+                count_key_columns(cells)
         else:
             # 如果没找到检测部位信息行，使用原来的逻辑检查前几行
             print("未找到检测部位信息行，使用通用检测逻辑")
-            search_rows = min(20, len(table.rows))  # 扩大搜索范围到前20行
-            for row_idx in range(search_rows):
-                row = table.rows[row_idx]
-
-                for cell_idx, cell in enumerate(row.cells):
-                    cell_text = cell.text.strip()
-                    if cell_text:  # 只处理非空单元格
-                        for key_col in key_columns:
-                            if key_col in cell_text:
-                                column_counts[key_col] = column_counts.get(key_col, 0) + 1
-                                # print(f"在第{row_idx+1}行第{cell_idx+1}列找到'{key_col}': {cell_text}")
+            for _, cells in scan_table(table, TABLE_HEADER_MATCHER, grid, stop=20):  # 扩大搜索范围到前20行
+                count_key_columns(cells)
 
         # 如果任何关键列出现2次或以上，则认为是双列表格
         # 特别关注序号列，如果序号出现3次以上，很可能是双列
@@ -151,6 +186,24 @@ def detect_table_format(table) -> str:
         print("回退到单列格式")
         return 'single_column'
 
+def header_column_key(hits) -> Optional[str]:
+    """按表头单元格命中的关键字确定列名 - 注意顺序很重要，先检查更具体的列名"""
+    if "透照参数序号" in hits:
+        return "透照参数序号"
+    if "序号" in hits:
+        return "序号"
+    if "检件编号" in hits:
+        return "检件编号"
+    if ("焊缝编号" in hits or "焊口编号" in hits or
+            ("焊缝" in hits and "编号" in hits) or
+            ("焊口" in hits and "编号" in hits)):
+        return "焊缝编号"
+    if "焊工号" in hits:
+        return "焊工号"
+    if "备注" in hits:
+        return "备注"
+    return None
+
 def analyze_double_column_structure(table) -> Optional[TableStructure]:
     """
     分析双列表格结构
@@ -166,72 +219,26 @@ def analyze_double_column_structure(table) -> Optional[TableStructure]:
         left_columns = {}
         right_columns = {}
         header_row_index = -1
+        grid = TableGrid(table)
 
         # 首先查找"检测部位信息"行
-        detection_info_row = -1
-        for row_idx in range(len(table.rows)):
-            row = table.rows[row_idx]
-            for cell in row.cells:
-                if "检测部位信息" in cell.text.strip():
-                    detection_info_row = row_idx
-                    print(f"找到检测部位信息表格在第{row_idx+1}行")
-                    break
-            if detection_info_row >= 0:
-                break
+        detection_info_row = find_detection_info_row(table, grid)
+        if detection_info_row >= 0:
+            print(f"找到检测部位信息表格在第{detection_info_row+1}行")
 
         # 如果找到检测部位信息行，分析下一行的表头
-        if detection_info_row >= 0 and detection_info_row + 1 < len(table.rows):
+        if detection_info_row >= 0 and detection_info_row + 1 < len(grid):
             header_row_index = detection_info_row + 1
-            row = table.rows[header_row_index]
+            total_cols = len(grid.cells(header_row_index))
             found_columns = {}
-            print(f"分析表头行第{header_row_index+1}行，共{len(row.cells)}列")
-
-            for j, cell in enumerate(row.cells):
-                cell_text = cell.text.strip()
-                # 调试：只打印可能包含焊缝编号的列
-                # if "焊缝" in cell_text or "焊口" in cell_text or j in [12, 13, 14, 15]:
-                #     print(f"  列{j+1}: '{cell_text}'")
-
-                # 检测关键列 - 注意顺序很重要，先检查更具体的列名
-                if "透照参数序号" in cell_text:
-                    if "透照参数序号" not in found_columns:
-                        found_columns["透照参数序号"] = [j]
-                    else:
-                        found_columns["透照参数序号"].append(j)
-                    print(f"找到透照参数序号列: 第{header_row_index+1}行第{j+1}列")
-                elif "序号" in cell_text:
-                    if "序号" not in found_columns:
-                        found_columns["序号"] = [j]
-                    else:
-                        found_columns["序号"].append(j)
-                    print(f"找到序号列: 第{header_row_index+1}行第{j+1}列")
-                elif "检件编号" in cell_text:
-                    if "检件编号" not in found_columns:
-                        found_columns["检件编号"] = [j]
-                    else:
-                        found_columns["检件编号"].append(j)
-                    print(f"找到检件编号列: 第{header_row_index+1}行第{j+1}列")
-                elif ("焊缝编号" in cell_text or "焊口编号" in cell_text or
-                      ("焊缝" in cell_text and "编号" in cell_text) or
-                      ("焊口" in cell_text and "编号" in cell_text)):
-                    key = "焊缝编号"
-                    if key not in found_columns:
-                        found_columns[key] = [j]
-                    else:
-                        found_columns[key].append(j)
-                    print(f"找到焊缝编号列: 第{header_row_index+1}行第{j+1}列")
-                elif "焊工号" in cell_text:
-                    if "焊工号" not in found_columns:
-                        found_columns["焊工号"] = [j]
-                    else:
-                        found_columns["焊工号"].append(j)
-                    print(f"找到焊工号列: 第{header_row_index+1}行第{j+1}列")
-                elif "备注" in cell_text:
-                    if "备注" not in found_columns:
-                        found_columns["备注"] = [j]
-                    else:
-                        found_columns["备注"].append(j)
-                    print(f"找到备注列: 第{header_row_index+1}行第{j+1}列")
+            print(f"分析表头行第{header_row_index+1}行，共{total_cols}列")
+
+            for _, cells in scan_table(table, TABLE_HEADER_MATCHER, grid, header_row_index, header_row_index + 1):
+                for j, _, _, hits in cells:
+                    key = header_column_key(hits)
+                    if key is not None:
+                        found_columns.setdefault(key, []).append(j)
+                        print(f"找到{key}列: 第{header_row_index+1}行第{j+1}列")
 
             # 分配左右列 - 基于新模板的实际结构
             # 新模板结构：序号@列1, 检件编号@列2-11, 焊工号@列16-20, 序号@列21-23, 序号@列31, 检件编号@列32-41, 焊工号@列44-47, 序号@列48-49
@@ -265,7 +272,6 @@ def analyze_double_column_structure(table) -> Optional[TableStructure]:
                         elif len(col_indices) == 1:
                             # 如果只有一个，根据位置判断是左侧还是右侧
                             col_idx = col_indices[0]
-                            total_cols = len(row.cells)
                             if col_idx < total_cols // 2:
                                 left_columns[col_name] = col_idx
                             else:
@@ -277,26 +283,16 @@ def analyze_double_column_structure(table) -> Optional[TableStructure]:
         else:
             print("未找到检测部位信息行，尝试通用方法...")
             # 回退到原来的通用方法
-            for i, row in enumerate(table.rows):
+            for i, cells in scan_table(table, TABLE_HEADER_MATCHER, grid):
                 found_columns = {}
-                print(f"分析第{i+1}行，共{len(row.cells)}列")
-
-                for j, cell in enumerate(row.cells):
-                    cell_text = cell.text.strip()
+                print(f"分析第{i+1}行，共{len(cells)}列")
 
+                for j, _, _, hits in cells:
                     # 检测关键列
-                    if "序号" in cell_text:
-                        if "序号" not in found_columns:
-                            found_columns["序号"] = [j]
-                        else:
-                            found_columns["序号"].append(j)
-                        print(f"找到序号列: 第{i+1}行第{j+1}列")
-                    elif "检件编号" in cell_text:
-                        if "检件编号" not in found_columns:
-                            found_columns["检件编号"] = [j]
-                        else:
-                            found_columns["检件编号"].append(j)
-                        print(f"找到检件编号列: 第{i+1}行第{j+1}列")
+                    key = "序号" if "序号" in hits else "检件编号" if "检件编号" in hits else None
+                    if key is not None:
+                        found_columns.setdefault(key, []).append(j)
+                        print(f"找到{key}列: 第{i+1}行第{j+1}列")
 
                 # 如果找到了双列结构，设置列映射
                 if any(len(cols) >= 2 for cols in found_columns.values()):
@@ -321,13 +317,11 @@ def analyze_double_column_structure(table) -> Optional[TableStructure]:
         data_start_row = header_row_index + 1
         max_rows_per_side = 0
 
-        # 计算每侧的最大行数
-        for i in range(data_start_row, len(table.rows)):
-            if i < len(table.rows):
-                # 检查是否遇到"以下空白"行
-                if len(table.rows[i].cells) > 0 and "以下空白" in table.rows[i].cells[0].text:
-                    break
-                max_rows_per_side += 1
+        # 计算每侧的最大行数（遇到"以下空白"行为止）
+        for _, cells in scan_table(table, TABLE_HEADER_MATCHER, grid, start=data_start_row):
+            if cells and "以下空白" in cells[0][3]:
+                break
+            max_rows_per_side += 1
 
         # 双列表格的总容量是每侧行数的两倍
         total_capacity = max_rows_per_side * 2
@@ -422,6 +416,7 @@ def fill_double_column_table(table, structure: TableStructure, data_allocation:
             row_idx = structure.data_start_row + i
             if row_idx >= len(table.rows):
                 table.add_row()
+                run_metrics.count('rows_added')
 
         # 第一步：填充所有序号（先左侧，再右侧，保持连续性）
         print("第一步：填充序号...")
@@ -820,18 +815,12 @@ def mark_timing_checkbox(option):
                             # 如果没有复选框符号，在选项前添加
                             marked_line = f'☑{line}'
 
-                        run = paragraph.add_run(marked_line)
-                        run.font.name = "宋体"
-                        run.font.size = Pt(9.5)
-                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "宋体")
+                        run = add_styled_run(paragraph, marked_line, "宋体", 9.5)
                         # print(f"已标记选项: '{marked_line}'")
                     else:
                         # 其他行保持原样
                         if line:
-                            run = paragraph.add_run(line)
-                            run.font.name = "宋体"
-                            run.font.size = Pt(9.5)
-                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "宋体")
+                            run = add_styled_run(paragraph, line, "宋体", 9.5)
 
                     # 如果不是最后一行，添加换行
                     if i < len(lines) - 1:
@@ -1056,10 +1045,7 @@ def mark_field_checkbox(option):
                             # 没有变化，使用默认字体
                             run = paragraph.add_run(marked_line)
                             try:
-                                run.font.name = "宋体"
-                                run.font.size = Pt(9.5)
-                                if run._element.rPr is not None:
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "宋体")
+                                style_run(run, "宋体", 9.5)
                             except:
                                 pass  # 忽略字体设置错误
 
@@ -1085,11 +1071,7 @@ def add_mixed_font_text(paragraph, text):
 
             # 如果是打勾符号，使用小五号字体
             if char == '☑':
-                run = paragraph.add_run(char)
-                run.font.name = "楷体"
-                run.font.size = Pt(9)  # 小五号字体
-                if run._element.rPr is not None:
-                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "宋体")
+                add_styled_run(paragraph, char, "楷体", 9, "宋体")
                 i += 1
             else:
                 # 收集连续的非打勾符号字符
@@ -1100,20 +1082,12 @@ def add_mixed_font_text(paragraph, text):
 
                 # 添加普通文本，使用五号字体
                 if normal_text:
-                    run = paragraph.add_run(normal_text)
-                    run.font.name = "宋体"
-                    run.font.size = Pt(9.5)  # 五号字体
-                    if run._element.rPr is not None:
-                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "宋体")
+                    add_styled_run(paragraph, normal_text, "宋体", 9.5)
 
     except Exception as e:
         print(f"设置混合字体时出错: {e}")
         # 如果出错，回退到普通方式
-        run = paragraph.add_run(text)
-        run.font.name = "宋体"
-        run.font.size = Pt(9.5)
-        if run._element.rPr is not None:
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), "宋体")
+        add_styled_run(paragraph, text, "宋体", 9.5)
 
 def mark_specific_option_in_line(line, option_text, original_line):
     """在一行文本中精确标记特定选项，不影响其他选项"""
@@ -1390,7 +1364,8 @@ def get_output_filename(word_template_path, order_number, ray_type):
 def process_excel_to_word(excel_path, word_template_path, output_path=None, 
                        project_name=None, entrusting_unit=None, 
                        operation_guide_number=None, contracting_unit=None, 
-                       equipment_model=None):
+                       equipment_model=None, session=None, resume=False,
+                       retry_failed=False, journal_path=None, only_groups=None):
     """将Excel数据填入Word文档
     
     Args:
@@ -1402,6 +1377,11 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         operation_guide_number: 操作指导书编号，用于替换文档中的"操作指导书编号值"
         contracting_unit: 承包单位，用于替换文档中的"承包单位值"
         equipment_model: 设备型号，用于替换文档中的"设备型号值"
+        session: 共享读取会话（可选，ledger_session.LedgerSession），多个生成器共用同一工作簿时只读取分组一次
+        resume: 断点续跑，跳过运行记录中已成功生成且输入未变化的分组
+        retry_failed: 只处理上一次运行中失败的分组
+        journal_path: 运行记录数据库路径（默认: 生成器/运行记录/run_journal.db）
+        only_groups: 只处理指定的分组键集合（"委托单编号_射线类型"），为None时处理全部分组
     
     Returns:
         bool: 处理是否成功
@@ -1432,7 +1412,9 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
     # 读取Excel数据
     print(f"正在读取Excel文件: {excel_path}")
     try:
-        df = pd.read_excel(excel_path)
+        session = session_for(session, excel_path)
+        with run_metrics.stage('read'):
+            df = session.read_excel() if session else pd.read_excel(excel_path)
         print(f"成功读取Excel文件，共有{len(df)}行数据")
     except Exception as e:
         print(f"错误: 无法读取Excel文件: {e}")
@@ -1472,19 +1454,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
     print(f"Excel表格列名: {list(df.columns)}")
     
     # 定义需要查找的列关键字
-    column_keywords = {
-        '完成日期': '完成日期',
-        '委托单编号': '委托单编号',
-        '检件编号': '检件编号',
-        '焊口编号': '焊口编号',
-        '焊工号': '焊工号',
-        '合格级别': '合格级别',
-        '检测比例': '检测比例',
-        'γ射线': 'γ射线',
-        '焊接方法': '焊接方法',
-        '检测时机': '检测时机',
-        '规格': '规格'
-    }
+    column_keywords = COLUMN_KEYWORDS
     
     # 查找每个关键字对应的实际列名
     column_mapping = {}
@@ -1501,19 +1471,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
     if missing_columns:
         print(f"警告: 未找到以下列: {', '.join(missing_columns)}")
         # 尝试使用列位置
-        possible_columns = {
-            '完成日期': 'B', 
-            '委托单编号': 'C', 
-            '检件编号': 'D', 
-            '焊口编号': 'E', 
-            '焊工号': 'F',
-            '合格级别': 'I',
-            '检测比例': 'J',
-            'γ射线': 'P',
-            '焊接方法': 'R',
-            '检测时机': 'V',
-            '规格': 'G'
-        }
+        possible_columns = COLUMN_POSITIONS
         
         for key in missing_columns:
             col_letter = possible_columns.get(key)
@@ -1528,22 +1486,32 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         print("错误: 无法找到委托单编号列")
         return False
     
-    if 'γ射线' not in column_mapping:
+    # 没有γ射线列时所有记录都按X射线处理（不修改台账数据，共享会话的分组中同样没有该列）
+    gamma_column = column_mapping.get('γ射线')
+    if gamma_column is None:
         print("警告: 无法找到γ射线列，将默认所有记录为X射线")
-        # 增加一个全为空的列作为γ射线列
-        df['γ射线'] = None
-        column_mapping['γ射线'] = 'γ射线'
     
     # 根据委托单编号和射线类型分组数据
     groups = []
     order_numbers = df[column_mapping['委托单编号']].dropna().unique()
+
+    # 只处理指定分组时（如工作队列的单个任务），只为这些分组的委托单整理数据
+    if only_groups is not None:
+        order_numbers = [order_number for order_number in order_numbers
+                         if any(f"{order_number}_{ray_type}" in only_groups for ray_type in ('X射线', 'γ射线'))]
+    
+    # 使用共享会话时直接取用已分组的数据
+    order_partitions = session.partitions(column_mapping['委托单编号']) if session else None
     
     for order_number in order_numbers:
         # 获取该委托单编号的所有数据
-        order_df = df[df[column_mapping['委托单编号']] == order_number]
+        if order_partitions is not None:
+            order_df = order_partitions[order_number].copy()
+        else:
+            order_df = df[df[column_mapping['委托单编号']] == order_number]
         
         # 获取该委托单编号下的所有射线类型
-        ray_types = order_df[column_mapping['γ射线']].dropna().unique()
+        ray_types = order_df[gamma_column].dropna().unique() if gamma_column is not None else []
         
         # 如果没有明确的γ射线值，则视为X射线
         if len(ray_types) == 0:
@@ -1556,7 +1524,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         else:
             # 有γ射线值的处理为γ射线
             for ray_type in ray_types:
-                ray_df = order_df[order_df[column_mapping['γ射线']] == ray_type]
+                ray_df = order_df[order_df[gamma_column] == ray_type]
                 groups.append({
                     'order_number': order_number,
                     'ray_type': 'γ射线',
@@ -1565,7 +1533,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                 print(f"委托单编号 {order_number} 的射线类型 γ射线 有 {len(ray_df)} 条记录")
             
             # 没有γ射线值的处理为X射线
-            x_ray_df = order_df[order_df[column_mapping['γ射线']].isna()]
+            x_ray_df = order_df[order_df[gamma_column].isna()]
             if len(x_ray_df) > 0:
                 groups.append({
                     'order_number': order_number,
@@ -1576,25 +1544,62 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
     
     print(f"共有 {len(groups)} 个组合需要生成报告")
     
+    # 运行记录：登记本次运行，用于断点续跑和失败重试
+    journal = RunJournal(journal_path)
+    failed_keys = None
+    if retry_failed:
+        last_run_id = journal.last_run_id('Radio_test', excel_path, output_dir)
+        failed_keys = journal.failed_groups(last_run_id)
+        print(f"仅重试上次运行失败的组合，共{len(failed_keys)}个: {sorted(failed_keys)}")
+        if not failed_keys:
+            print("上次运行没有失败的组合，无需重试")
+            journal.close()
+            return True
+    run_id = journal.start_run('Radio_test', excel_path, word_template_path, output_dir)
+    
     # 处理每个分组
     success_count = 0
     error_count = 0
+    skipped_count = 0
     
     for group in groups:
         order_number = group['order_number']
         ray_type = group['ray_type']
         group_df = group['data']
+        group_key = f"{order_number}_{ray_type}"
+        
+        if failed_keys is not None and group_key not in failed_keys:
+            continue
+        if only_groups is not None and group_key not in only_groups:
+            continue
         
         print(f"\n{'='*50}")
         print(f"处理委托单编号: {order_number}, 射线类型: {ray_type}")
         print(f"{'='*50}")
         
+        group_start = time.perf_counter()
+        input_hash = None
+        report_output_path = None
         try:
             # 为该分组生成输出文件名
             output_filename = get_output_filename(word_template_path, order_number, ray_type)
             report_output_path = os.path.join(output_dir, output_filename)
             print(f"输出文件路径: {report_output_path}")
             
+            # 曝光参数表（X射线、γ射线）变化时同样需要重新生成
+            input_hash = hash_group_input(group_df, word_template_path,
+                                          input_files=(xray_params_path, gamma_params_path),
+                                          project_name=project_name, entrusting_unit=entrusting_unit,
+                                          operation_guide_number=operation_guide_number,
+                                          contracting_unit=contracting_unit, equipment_model=equipment_model)
+            # 归档输出时每份报告都要写入本次的归档，不跳过
+            if (resume and archive_output.current() is None
+                    and journal.is_completed('Radio_test', group_key, input_hash, report_output_path)):
+                print(f"该组合已生成且数据未变化，跳过: {report_output_path}")
+                journal.record_group(run_id, 'Radio_test', group_key, input_hash, report_output_path, STATUS_SKIPPED)
+                skipped_count += 1
+                continue
+            
             # 打开Word文档
             print(f"正在处理Word文档: {word_template_path}")
             
@@ -1606,6 +1611,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
             except Exception as e:
                 print(f"无法打开Word文档: {e}")
                 error_count += 1
+                journal.record_group(run_id, 'Radio_test', group_key, input_hash, report_output_path,
+                                     STATUS_FAILED, time.perf_counter() - group_start, f"无法打开Word文档: {e}")
                 continue
             
             # 填充文档的其余部分将在这里添加...
@@ -1937,9 +1944,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                                                 run = paragraph.add_run(date_part)
                                                                 if date_part.isdigit():
                                                                     # 数字部分设置为楷体五号
-                                                                    run.font.name = "楷体"
-                                                                    run.font.size = Pt(10.5)
-                                                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
+                                                                    style_run(run)
                                                                 # 汉字部分保持默认格式
                                                     else:
                                                         # 非日期部分，保持原有格式
@@ -1956,28 +1961,19 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     p = cell.add_paragraph()
 
                                     # 添加年份数字（楷体五号）
-                                    run_year = p.add_run(str(year))
-                                    run_year.font.name = "楷体"
-                                    run_year.font.size = Pt(10.5)
-                                    run_year._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
+                                    run_year = add_styled_run(p, str(year))
 
                                     # 添加"年"字（保持原格式）
                                     p.add_run("年")
 
                                     # 添加月份数字（楷体五号）
-                                    run_month = p.add_run(str(month))
-                                    run_month.font.name = "楷体"
-                                    run_month.font.size = Pt(10.5)
-                                    run_month._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
+                                    run_month = add_styled_run(p, str(month))
 
                                     # 添加"月"字（保持原格式）
                                     p.add_run("月")
 
                                     # 添加日期数字（楷体五号）
-                                    run_day = p.add_run(str(day))
-                                    run_day.font.name = "楷体"
-                                    run_day.font.size = Pt(10.5)
-                                    run_day._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
+                                    run_day = add_styled_run(p, str(day))
 
                                     # 添加"日"字（保持原格式）
                                     p.add_run("日")
@@ -2214,6 +2210,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                 # 在表格末尾添加一行
                                 new_row = table.add_row()
                                 data_rows.append(len(table.rows) - 1)  # 添加新行的索引
+                            run_metrics.count('rows_added', rows_needed)
 
                         # 处理每一行数据
                         for i in range(data_count):
@@ -2455,22 +2452,33 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
             # 保存文档
             try:
                 print(f"\n正在保存文档到: {report_output_path}")
-                doc.save(report_output_path)
+                save_docx(doc, report_output_path)
                 print(f"文档已成功保存至: {report_output_path}")
                 success_count += 1
+                run_metrics.count('rows_filled', len(group_df))
+                journal.record_group(run_id, 'Radio_test', group_key, input_hash, report_output_path,
+                                     STATUS_SUCCESS, time.perf_counter() - group_start)
             except Exception as e:
                 print(f"错误: 无法保存文档: {e}")
                 error_count += 1
+                journal.record_group(run_id, 'Radio_test', group_key, input_hash, report_output_path,
+                                     STATUS_FAILED, time.perf_counter() - group_start, f"无法保存文档: {e}")
                 
         except Exception as e:
             print(f"错误: 处理委托单编号 {order_number} 和射线类型 {ray_type} 时出错: {e}")
             error_count += 1
+            journal.record_group(run_id, 'Radio_test', group_key, input_hash, report_output_path,
+                                 STATUS_FAILED, time.perf_counter() - group_start, str(e))
+    
+    journal.finish_run(run_id)
+    journal.close()
+    run_metrics.record_reports(success_count, failed=error_count, skipped=skipped_count)
     
-    print(f"\n处理完成: 共处理{len(groups)}个组合，成功生成{success_count}份报告，失败{error_count}份")
+    print(f"\n处理完成: 共处理{len(groups)}个组合，成功生成{success_count}份报告，跳过{skipped_count}份，失败{error_count}份")
     if error_count > 0:
         print(f"警告: 有{error_count}个组合处理失败，请检查日志")
     
-    return success_count > 0
+    return success_count + skipped_count > 0
 
 def find_xray_params_by_spec(xray_params_df, spec_value):
     """
@@ -2578,6 +2586,54 @@ def find_gamma_params_by_spec(gamma_params_df, spec_value):
     print(f"警告: 在γ射线参数表中未找到匹配的规格: '{spec_value}'")
     return {}
 
+def plan_excel_to_word(excel_path, word_template_path, output_path=None, session=None):
+    """生成计划（试运行）：只读取台账、分组并分析模板表格结构，不生成任何文档
+
+    Args:
+        excel_path: Excel表格路径
+        word_template_path: Word模板文档路径
+        output_path: 输出目录（如果为None，使用默认输出目录）
+        session: 共享读取会话（可选，ledger_session.LedgerSession）
+
+    Returns:
+        GeneratorPlan: 生成计划，Excel或模板不存在、缺少委托单编号列时返回None
+    """
+    start = time.perf_counter()
+    if not os.path.exists(excel_path):
+        print(f"错误: Excel文件不存在: {excel_path}")
+        return None
+    if not os.path.exists(word_template_path):
+        print(f"错误: Word模板文件不存在: {word_template_path}")
+        return None
+    output_dir = output_path or os.path.join("生成器", "输出报告", "4_射线检测记录")
+
+    session = session_for(session, excel_path)
+    df = session.read_excel() if session else pd.read_excel(excel_path)
+    column_mapping, columns = resolve_columns(df, COLUMN_KEYWORDS, COLUMN_POSITIONS, find_column_with_keyword)
+    if '委托单编号' not in column_mapping:
+        print("错误: 无法找到委托单编号列")
+        return None
+
+    # 双列表格的容量：左右两侧各 max_rows_per_side 行，超出的数据不会填入
+    capacity = None
+    template_type = ''
+    for table in Document(word_template_path).tables:
+        if detect_table_format(table) == 'double_column':
+            structure = analyze_double_column_structure(table)
+            if structure:
+                capacity = structure.max_rows_per_side * 2
+                template_type = f"双列表格（每侧{structure.max_rows_per_side}行）"
+            break
+
+    plan = GeneratorPlan('Radio_test', excel_path, len(df), columns, overflow_action='溢出行将被忽略')
+    for order_number, ray_type, group_df in ray_type_groups(df, column_mapping['委托单编号'],
+                                                           column_mapping.get('γ射线')):
+        output_file = os.path.join(output_dir, get_output_filename(word_template_path, order_number, ray_type))
+        plan.entries.append(PlanEntry(order_number, ray_type, len(group_df), output_file, word_template_path,
+                                      template_type=template_type, capacity=capacity))
+    plan.seconds = time.perf_counter() - start
+    return plan
+
 def main():
     # 创建命令行参数解析器
     parser = argparse.ArgumentParser(description='将Excel数据填入Word文档')
@@ -2599,20 +2655,43 @@ def main():
                         help='承包单位，用于替换文档中的"承包单位值"')
     parser.add_argument('-m', '--equipment_model', 
                         help='设备型号，用于替换文档中的"设备型号值"')
+    parser.add_argument('--resume', action='store_true',
+                        help='断点续跑：跳过已成功生成且数据未变化的组合')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='只重新生成上一次运行中失败的组合')
+    parser.add_argument('--journal',
+                        help='运行记录数据库路径 (默认: 生成器/运行记录/run_journal.db)')
+    parser.add_argument('--plan', action='store_true',
+                        help='只输出生成计划（报告数量、模板容量、列查找结果），不生成文档')
+    parser.add_argument('--metrics-dir', default=METRICS_CONFIG['output_dir'],
+                        help=f"运行指标输出目录 (默认: {METRICS_CONFIG['output_dir']})")
+    parser.add_argument('--archive',
+                        help='把报告直接写入该归档文件（.zip、.tar、.tar.gz），不写单独的文件')
     
     # 解析命令行参数
     args = parser.parse_args()
     
+    if args.plan:
+        plan = plan_excel_to_word(args.excel, args.word, args.output)
+        if plan is not None:
+            print_plan(plan)
+        sys.exit(0 if plan is not None else 1)
+    
     # 处理Excel到Word的转换
-    success = process_excel_to_word(
-        args.excel, args.word, args.output,
-        args.project, args.entrusting_unit,
-        args.guide_number, args.contracting_unit,
-        args.equipment_model
-    )
+    with archive_output.archive(args.archive) as sink, run_metrics.collect('Radio_test', args.metrics_dir) as metrics:
+        success = process_excel_to_word(
+            args.excel, args.word, args.output,
+            args.project, args.entrusting_unit,
+            args.guide_number, args.contracting_unit,
+            args.equipment_model, resume=args.resume,
+            retry_failed=args.retry_failed, journal_path=args.journal
+        )
+        metrics.success = success
+        if sink is not None:
+            sink.success = success
     
-    # 返回状态码
-    sys.exit(0 if success else 1)
+    # 返回状态码（开启归档输出而未能生成归档时同样视为失败）
+    sys.exit(0 if success and archive_output.published(sink) else 1)
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,26 @@
 import pandas as pd
+import numpy as np
 import os
 import sys
 import argparse
 from docx import Document
-from docx.shared import Pt
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
 from datetime import datetime
 import re
-import gc
+import time
+from ledger_session import session_for
+from columnar_extract import text_column, sheet_count_column
+from group_scheduler import estimate_group_cost, template_capacity, run_scheduled, RESERVED_ROW_MATCHER
+from keyword_matcher import KeywordMatcher, scan_table
+from table_builder import TableGrid, is_large_table
+from run_plan import GeneratorPlan, PlanEntry, resolve_columns, ray_type_groups, print_plan
+from docx_writer import save_docx
+from memory_governor import MemoryGovernor
+from run_styles import add_styled_run, style_run
+import archive_output
+import run_metrics
+from run_metrics import METRICS_CONFIG
 import logging
 from dataclasses import dataclass
 from typing import List, Dict, Optional, Tuple
@@ -49,6 +61,18 @@ class InspectionRowRequirement:
     start_row_index: int
     film_numbers: List[str]
 
+@dataclass
+class RowPlan:
+    """行展开计划：第k个表格行对应的检件序号与片号"""
+    inspection_index: np.ndarray      # 每个表格行对应的数据行序号
+    film_numbers: List[str]           # 每个表格行的片号（空字符串表示不填写）
+    rows_per_inspection: np.ndarray   # 每条数据行展开的表格行数
+    start_rows: np.ndarray            # 每条数据行的第一个表格行
+
+    @property
+    def total_rows(self) -> int:
+        return len(self.film_numbers)
+
 class DataRowCalculator:
     """数据行计算器 - 计算检件所需的行数"""
 
@@ -70,46 +94,77 @@ class DataRowCalculator:
             return 1  # 其他情况默认1行
 
     @staticmethod
-    def calculate_total_rows(inspection_numbers: List[str], sheet_counts: List[int]) -> Tuple[int, List[InspectionRowRequirement]]:
+    def calculate_rows_for_counts(sheet_counts) -> np.ndarray:
+        """按张数数组批量计算每个检件所需行数，规则与 calculate_rows_for_inspection 一致"""
+        counts = np.asarray(sheet_counts, dtype=np.int64)
+        expands = (counts == 2) | (counts == 3) | (counts >= 6)
+        return np.where(expands, counts, 1)
+
+    @staticmethod
+    def build_row_plan(sheet_counts) -> RowPlan:
+        """把分组的张数数组一次性展开为行计划
+
+        片号规则：
+        - 张数为2、3时依次填写 1, 2(, 3)
+        - 张数≥6时依次填写 1-2, 2-3, ..., (N-1)-N, N-1
+        - 其他张数只占一行，片号为空
+
+        Args:
+            sheet_counts: 各数据行的张数
+
+        Returns:
+            RowPlan: 行展开计划
+        """
+        counts = np.asarray(sheet_counts, dtype=np.int64)
+        rows = DataRowCalculator.calculate_rows_for_counts(counts)
+        total_rows = int(rows.sum())
+        start_rows = np.cumsum(rows) - rows
+
+        inspection_index = np.repeat(np.arange(len(counts)), rows)
+        row_counts = counts[inspection_index]
+        position = np.arange(total_rows) - start_rows[inspection_index]  # 行在所属检件中的序号
+
+        film_numbers = np.full(total_rows, "", dtype=object)
+        numbered = (row_counts == 2) | (row_counts == 3)
+        film_numbers[numbered] = (position[numbered] + 1).astype(str)
+        last = row_counts - 1 == position
+        pairs = (row_counts >= 6) & ~last
+        film_numbers[pairs] = np.char.add(np.char.add((position[pairs] + 1).astype(str), "-"),
+                                          (position[pairs] + 2).astype(str))
+        closing = (row_counts >= 6) & last
+        film_numbers[closing] = np.char.add(row_counts[closing].astype(str), "-1")
+
+        return RowPlan(inspection_index, film_numbers.tolist(), rows, start_rows)
+
+    @staticmethod
+    def calculate_total_rows(inspection_numbers: List[str], sheet_counts: List[int],
+                             row_plan: Optional[RowPlan] = None) -> Tuple[int, List[InspectionRowRequirement]]:
         """计算所有检件所需的总行数
 
         Args:
             inspection_numbers: 检件编号列表
             sheet_counts: 对应的张数列表
+            row_plan: 已计算的行展开计划（可选，不传时根据张数计算）
 
         Returns:
             (总行数, 检件行需求列表)
         """
-        total_rows = 0
-        requirements = []
-        current_start_row = 0
-
-        for inspection_num, sheet_count in zip(inspection_numbers, sheet_counts):
-            # 确保sheet_count是整数
-            sheet_count = int(float(sheet_count)) if sheet_count is not None else 1
-            required_rows = DataRowCalculator.calculate_rows_for_inspection(sheet_count)
-
-            # 生成片号列表
-            film_numbers = []
-            if sheet_count >= 6:
-                # 为每张生成片号
-                for j in range(sheet_count):
-                    film_numbers.append(f"{inspection_num}-{j+1}")
-            else:
-                # 使用检件编号作为片号
-                film_numbers = [str(inspection_num)] * int(required_rows)
+        if row_plan is None:
+            row_plan = DataRowCalculator.build_row_plan(sheet_counts)
 
-            requirement = InspectionRowRequirement(
+        total_rows = row_plan.total_rows
+        requirements = []
+        for i, inspection_num in enumerate(inspection_numbers):
+            sheet_count = int(sheet_counts[i])
+            required_rows = int(row_plan.rows_per_inspection[i])
+            start_row = int(row_plan.start_rows[i])
+            requirements.append(InspectionRowRequirement(
                 inspection_number=inspection_num,
                 sheet_count=sheet_count,
                 required_rows=required_rows,
-                start_row_index=current_start_row,
-                film_numbers=film_numbers
-            )
-
-            requirements.append(requirement)
-            total_rows += required_rows
-            current_start_row += required_rows
+                start_row_index=start_row,
+                film_numbers=row_plan.film_numbers[start_row:start_row + required_rows]
+            ))
 
             if LOGGING_CONFIG['log_expansion_details']:
                 print(f"检件 {inspection_num}: 张数={sheet_count}, 需要行数={required_rows}")
@@ -233,19 +288,9 @@ class TableCapacityAnalyzer:
         available_rows = []
 
         # 从表头行之后开始查找可用行
-        for i in range(self.header_row_index + 1, len(table.rows)):
-            row = table.rows[i]
-
-            # 检查行是否为空或包含特殊标记
-            is_empty_or_usable = True
-            for cell in row.cells:
-                cell_text = cell.text.strip()
-                # 如果单元格包含特殊标记，则不可用
-                if cell_text and any(marker in cell_text for marker in ['以下空白', '合计', '总计', '备注']):
-                    is_empty_or_usable = False
-                    break
-
-            if is_empty_or_usable:
+        for i, cells in scan_table(table, RESERVED_ROW_MATCHER, start=self.header_row_index + 1):
+            # 如果单元格包含特殊标记（以下空白、合计、签字栏等），则不可用
+            if not any(hits for _, _, _, hits in cells):
                 available_rows.append(i)
 
         if LOGGING_CONFIG['log_expansion_details']:
@@ -254,17 +299,19 @@ class TableCapacityAnalyzer:
 
         return len(available_rows), available_rows
 
-    def calculate_required_rows(self, inspection_data: List[str], sheet_counts: List[int]) -> Tuple[int, List[InspectionRowRequirement]]:
+    def calculate_required_rows(self, inspection_data: List[str], sheet_counts: List[int],
+                                row_plan: Optional[RowPlan] = None) -> Tuple[int, List[InspectionRowRequirement]]:
         """计算填充所有数据所需的总行数
 
         Args:
             inspection_data: 检件编号列表
             sheet_counts: 对应的张数列表
+            row_plan: 已计算的行展开计划（可选）
 
         Returns:
             (所需总行数, 检件行需求列表)
         """
-        return DataRowCalculator.calculate_total_rows(inspection_data, sheet_counts)
+        return DataRowCalculator.calculate_total_rows(inspection_data, sheet_counts, row_plan)
 
     def get_expansion_requirements(self, table, required_rows: int) -> Optional[TableExpansionRequirement]:
         """获取表格扩展需求
@@ -402,6 +449,9 @@ class DynamicRowExpander:
     def add_rows(self, count: int, insert_position: Optional[int] = None) -> List[int]:
         """添加指定数量的行
 
+        新行插在insert_position之前（签字栏等尾部行整体下移），保持格式时按批克隆参考行的XML，
+        否则插入与 table.add_row() 结构相同的空行。
+
         Args:
             count: 要添加的行数
             insert_position: 插入位置，如果为None则在末尾添加
@@ -412,34 +462,19 @@ class DynamicRowExpander:
         if count <= 0:
             return []
 
-        new_row_indices = []
-
         try:
-            # 获取参考行用于格式复制
-            reference_row = self.table.rows[self.reference_row_index] if self.reference_row_index < len(self.table.rows) else None
-
-            # 批量添加行以提高性能
-            batch_size = min(count, EXPANSION_CONFIG['max_rows_per_batch'])
-
-            for batch_start in range(0, count, batch_size):
-                batch_count = min(batch_size, count - batch_start)
+            grid = TableGrid(self.table)
+            if insert_position is None or insert_position > len(grid):
+                insert_position = len(grid)
+            batch_size = EXPANSION_CONFIG['max_rows_per_batch']
 
-                for i in range(batch_count):
-                    # 添加新行
-                    new_row = self.table.add_row()
-                    new_row_index = len(self.table.rows) - 1
-                    new_row_indices.append(new_row_index)
-
-                    # 复制格式
-                    if reference_row and EXPANSION_CONFIG['preserve_formatting']:
-                        self.format_preserver.preserve_row_format(reference_row, new_row)
-
-                # 内存管理
-                if EXPANSION_CONFIG['memory_limit_mb'] and batch_start % 100 == 0:
-                    gc.collect()
+            if EXPANSION_CONFIG['preserve_formatting'] and self.reference_row_index < len(grid):
+                new_row_indices = grid.insert_rows(insert_position - 1, count, self.reference_row_index, batch_size)
+            else:
+                new_row_indices = grid.insert_grid_rows(insert_position - 1, count, batch_size)
 
             if LOGGING_CONFIG['log_expansion_details']:
-                print(f"成功添加 {count} 行，新行索引: {new_row_indices}")
+                print(f"成功添加 {count} 行，新行索引: {new_row_indices[0]}-{new_row_indices[-1]}")
 
             return new_row_indices
 
@@ -490,6 +525,37 @@ class DynamicRowExpander:
         except Exception as e:
             print(f"设置跨页兼容性时出错: {e}")
 
+# 需要查找的列关键字
+COLUMN_KEYWORDS = {
+    '完成日期': '完成日期',
+    '委托单编号': '委托单编号',
+    '检件编号': '检件编号',
+    '焊口编号': '焊口编号',
+    '焊工号': '焊工号',
+    '规格': '规格',
+    'γ射线': 'γ射线',
+    '张数': '张数',  # 确保精确匹配"张数"列
+    '合格级别': '合格级别',
+    '检测比例': '检测比列'  # Excel中的列名是"检测比列"
+}
+
+# 未按表头找到时回退使用的列位置
+COLUMN_POSITIONS = {
+    '完成日期': 'B',
+    '委托单编号': 'C',
+    '检件编号': 'D',
+    '焊口编号': 'E',
+    '焊工号': 'F',
+    '规格': 'G',
+    'γ射线': 'P',
+    '张数': 'M',  # 明确指定张数列为M列
+    '合格级别': 'I',
+    '检测比例': 'J'
+}
+
+# 模板表头行的列关键字（顺序即判断优先级，焊口编号与焊缝编号为同一列）
+TEMPLATE_HEADER_MATCHER = KeywordMatcher(("检件编号", "焊缝编号", "焊口编号", "焊工号", "规格", "片号"))
+
 def find_column_with_keyword(df, keyword):
     """查找包含指定关键字的列"""
     # 首先尝试精确匹配
@@ -510,10 +576,7 @@ def set_font_style(paragraph, font_name="楷体", font_size=10.5):
         font_size: 字体大小，默认为10.5磅（五号字）
     """
     for run in paragraph.runs:
-        run.font.name = font_name
-        run.font.size = Pt(font_size)
-        # 设置中文字体
-        run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
+        style_run(run, font_name, font_size)
 
 def normalize_text(text):
     """标准化文本以便更好的匹配"""
@@ -608,7 +671,8 @@ def setup_logging(output_dir):
     logging.info(f"日志文件: {log_file}")
     return log_file
 
-def process_excel_to_word(excel_path, word_template_path, output_path=None, project_name=None, client_name=None, instruction_number=None):
+def process_excel_to_word(excel_path, word_template_path, output_path=None, project_name=None, client_name=None, instruction_number=None, session=None,
+                          workers=1, only_groups=None, schedule='lpt', memory_limit_mb=None, shared_memory=False):
     """将Excel数据填入Word文档
 
     Args:
@@ -618,10 +682,19 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
         project_name: 工程名称，用于替换Word文档中的"工程名称值"
         client_name: 委托单位，用于替换Word文档中的"委托单位值"
         instruction_number: 操作指导书编号，用于替换Word文档中的"操作指导书编号值"
+        session: 共享读取会话（可选，ledger_session.LedgerSession），多个生成器共用同一工作簿时只读取分组一次
+        workers: 并行进程数量，大于1时按成本模型估算各分组耗时并以最长任务优先的顺序派发
+        only_groups: 只处理指定的分组键集合（"委托单编号_射线类型"），为None时处理全部分组
+        schedule: 并行派发顺序，'lpt' 最长任务优先，'fifo' 原始顺序
+        memory_limit_mb: 每个进程的内存上限（MB，默认: EXPANSION_CONFIG['memory_limit_mb']，0表示不限制）
+        shared_memory: 并行时通过共享内存而不是数据切片向子进程传递分区数据
 
     Returns:
         bool: 处理是否成功
     """
+    if memory_limit_mb is None:
+        memory_limit_mb = EXPANSION_CONFIG['memory_limit_mb']
+
     # 创建输出目录
     if output_path is None:
         output_dir = os.path.join("生成器", "输出报告", "5_射线检测记录续")
@@ -654,7 +727,9 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
     # 读取Excel数据
     logging.info(f"正在读取Excel文件: {excel_path}")
     try:
-        df = pd.read_excel(excel_path)
+        session = session_for(session, excel_path)
+        with run_metrics.stage('read'):
+            df = session.read_excel() if session else pd.read_excel(excel_path)
         logging.info(f"成功读取Excel文件，共有{len(df)}行数据")
     except Exception as e:
         logging.error(f"无法读取Excel文件: {e}")
@@ -664,18 +739,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
     logging.info(f"Excel表格列名: {list(df.columns)}")
     
     # 定义需要查找的列关键字
-    column_keywords = {
-        '完成日期': '完成日期',
-        '委托单编号': '委托单编号',
-        '检件编号': '检件编号',
-        '焊口编号': '焊口编号',
-        '焊工号': '焊工号',
-        '规格': '规格',
-        'γ射线': 'γ射线',
-        '张数': '张数',  # 确保精确匹配"张数"列
-        '合格级别': '合格级别',
-        '检测比例': '检测比列'  # Excel中的列名是"检测比列"
-    }
+    column_keywords = COLUMN_KEYWORDS
     
     # 查找每个关键字对应的实际列名
     column_mapping = {}
@@ -692,18 +756,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
     if missing_columns:
         print(f"警告: 未找到以下列: {', '.join(missing_columns)}")
         # 尝试使用列位置
-        possible_columns = {
-            '完成日期': 'B',
-            '委托单编号': 'C',
-            '检件编号': 'D',
-            '焊口编号': 'E',
-            '焊工号': 'F',
-            '规格': 'G',
-            'γ射线': 'P',
-            '张数': 'M',  # 明确指定张数列为M列
-            '合格级别': 'I',
-            '检测比例': 'J'
-        }
+        possible_columns = COLUMN_POSITIONS
         
         for key in missing_columns:
             col_letter = possible_columns.get(key)
@@ -720,54 +773,72 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
         print("错误: 无法找到委托单编号列")
         return False
     
-    if 'γ射线' not in column_mapping:
+    # 没有γ射线列时所有记录都按X射线处理（不修改台账数据，共享会话的分组中同样没有该列）
+    gamma_column = column_mapping.get('γ射线')
+    if gamma_column is None:
         print("警告: 无法找到γ射线列，将默认所有记录为X射线")
-        # 增加一个全为空的列作为γ射线列
-        df['γ射线'] = None
-        column_mapping['γ射线'] = 'γ射线'
     
     # 根据委托单编号和射线类型分组数据
+    # 分组只记录行索引，处理到该分组时才取出数据，不同时保留所有分组的切片
     groups = []
     order_numbers = df[column_mapping['委托单编号']].dropna().unique()
+
+    # 只处理指定分组时（如工作队列的单个任务），只为这些分组的委托单整理数据
+    if only_groups is not None:
+        order_numbers = [order_number for order_number in order_numbers
+                         if any(f"{order_number}_{ray_type}" in only_groups for ray_type in ('X射线', 'γ射线'))]
+    
+    # 使用共享会话时直接取用已分组的数据
+    order_partitions = session.partitions(column_mapping['委托单编号']) if session else None
     
     for order_number in order_numbers:
         # 获取该委托单编号的所有数据
-        order_df = df[df[column_mapping['委托单编号']] == order_number]
+        if order_partitions is not None:
+            order_df = order_partitions[order_number].copy()
+        else:
+            order_df = df[df[column_mapping['委托单编号']] == order_number]
         
         # 获取该委托单编号下的所有射线类型
-        ray_types = order_df[column_mapping['γ射线']].dropna().unique()
+        ray_types = order_df[gamma_column].dropna().unique() if gamma_column is not None else []
         
         # 如果没有明确的γ射线值，则视为X射线
         if len(ray_types) == 0:
             groups.append({
                 'order_number': order_number,
                 'ray_type': 'X射线',  # X射线表示为处理逻辑，但射源种类值会设置为空
-                'data': order_df
+                'rows': order_df.index
             })
             print(f"委托单编号 {order_number} 没有明确的射线类型，处理为X射线")
         else:
             # 有γ射线值的处理为γ射线
             for ray_type in ray_types:
-                ray_df = order_df[order_df[column_mapping['γ射线']] == ray_type]
+                ray_df = order_df[order_df[gamma_column] == ray_type]
                 groups.append({
                     'order_number': order_number,
                     'ray_type': 'γ射线',
-                    'data': ray_df
+                    'rows': ray_df.index
                 })
                 print(f"委托单编号 {order_number} 的射线类型 γ射线 有 {len(ray_df)} 条记录")
             
             # 没有γ射线值的处理为X射线
-            x_ray_df = order_df[order_df[column_mapping['γ射线']].isna()]
+            x_ray_df = order_df[order_df[gamma_column].isna()]
             if len(x_ray_df) > 0:
                 groups.append({
                     'order_number': order_number,
                     'ray_type': 'X射线',  # X射线表示为处理逻辑，但射源种类值会设置为空
-                    'data': x_ray_df
+                    'rows': x_ray_df.index
                 })
                 print(f"委托单编号 {order_number} 的射线类型 X射线 有 {len(x_ray_df)} 条记录")
+
+    if only_groups is not None:
+        groups = [group for group in groups if f"{group['order_number']}_{group['ray_type']}" in only_groups]
     
     logging.info(f"共有 {len(groups)} 个组合需要生成报告")
 
+    def group_data(group):
+        """取出分组数据（与分组时的切片相同）"""
+        return df.loc[group['rows']]
+
     # 在处理之前，先统计每个分组的张数总和
     logging.info("="*80)
     logging.info("分组张数统计分析")
@@ -777,7 +848,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
     for group in groups:
         order_number = group['order_number']
         ray_type = group['ray_type']
-        group_df = group['data']
+        group_df = group_data(group)
 
         # 统计该分组中张数的总和
         if '张数' in column_mapping and column_mapping['张数'] in group_df.columns:
@@ -794,7 +865,9 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
             'order_number': order_number,
             'ray_type': ray_type,
             'total_sheets': total_sheets,
-            'data_rows': len(group_df)
+            'data_rows': len(group_df),
+            'table_rows': int(DataRowCalculator.calculate_rows_for_counts(sheet_numbers).sum())
+                          if '张数' in column_mapping and column_mapping['张数'] in group_df.columns else len(group_df)
         }
 
         logging.info(f"分组: {order_number} + {ray_type}")
@@ -803,6 +876,30 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
         logging.info(f"  预期模板: {'续表模板' if total_sheets > 21 else '标准模板'}")
         logging.info("-" * 60)
 
+    # 多进程并行：按成本模型估算各分组耗时，最长任务优先派发
+    if workers and workers > 1 and only_groups is None and len(groups) > 1:
+        alternative_template = "生成器/word/5_射线检测记录_续.docx"
+        group_costs = []
+        for group_key, stats in group_sheet_counts.items():
+            continuation = stats['total_sheets'] > 21 and os.path.exists(alternative_template)
+            template_path = alternative_template if continuation else word_template_path
+            group_costs.append(estimate_group_cost(group_key, stats['data_rows'], stats['total_sheets'],
+                                                   stats['table_rows'], template_capacity(template_path),
+                                                   continuation))
+        # 子进程只需要已识别的列；有列按位置回退识别时保留全部列，使子进程按相同位置识别
+        used_columns = list(column_mapping.values()) if not missing_columns else None
+        results = run_scheduled(
+            group_costs, process_excel_to_word,
+            args=(excel_path, word_template_path, output_dir, project_name, client_name, instruction_number),
+            kwargs={'memory_limit_mb': memory_limit_mb}, workers=workers, excel_path=excel_path,
+            memory_limit_mb=memory_limit_mb, dataframe=session.dataframe if session else df, schedule=schedule,
+            partition_column=column_mapping['委托单编号'],
+            group_partitions={key: stats['order_number'] for key, stats in group_sheet_counts.items()},
+            columns=used_columns, shared_memory=shared_memory)
+        success_count = sum(1 for success in results.values() if success)
+        print(f"\n处理完成: 共处理{len(results)}个组合，成功生成{success_count}份报告，失败{len(results) - success_count}份")
+        return success_count > 0
+
     logging.info("="*80)
     logging.info("开始处理各个分组")
     logging.info("="*80)
@@ -814,10 +911,12 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
     # 记录每个委托单编号使用的模板信息
     template_usage_summary = []
     
-    for group in groups:
+    # 按内存上限逐个处理分组，处理到该分组时才取出分组数据
+    governor = MemoryGovernor(memory_limit_mb)
+    for group in governor.admit_each(groups):
         order_number = group['order_number']
         ray_type = group['ray_type']
-        group_df = group['data']
+        group_df = group_data(group)
         
         print(f"\n{'='*50}")
         print(f"处理委托单编号: {order_number}, 射线类型: {ray_type}")
@@ -903,61 +1002,21 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                 print("警告: 未找到完成日期列")
                 year, month, day = datetime.now().year, datetime.now().month, datetime.now().day
             
-            # 获取相关数据
-            inspection_numbers = []
-            weld_numbers = []
-            welder_numbers = []
-            specifications = []
-            sheet_counts = []
-            
-            # 直接从DataFrame中获取数据
-            for i in range(len(group_df)):
-                if i < len(group_df):
-                    # 获取当前行的各列值
-                    inspection_number = group_df.iloc[i][column_mapping['检件编号']] if '检件编号' in column_mapping else ""
-                    weld_number = group_df.iloc[i][column_mapping['焊口编号']] if '焊口编号' in column_mapping else ""
-                    welder_number = group_df.iloc[i][column_mapping['焊工号']] if '焊工号' in column_mapping else ""
-                    specification = group_df.iloc[i][column_mapping['规格']] if '规格' in column_mapping else ""
-                    
-                    # 添加到对应的列表
-                    inspection_numbers.append(str(inspection_number))
-                    weld_numbers.append(str(weld_number))
-                    welder_numbers.append(str(welder_number))
-                    specifications.append(str(specification))
-                    
-                    # 处理张数
-                    if '张数' in column_mapping:
-                        sheet_count_raw = group_df.iloc[i][column_mapping['张数']]
-                        print(f"行 {i+1} 检件编号 {inspection_number} 原始张数值: '{sheet_count_raw}' (类型: {type(sheet_count_raw).__name__})")
-                        
-                        # 确保张数是数值类型
-                        try:
-                            if pd.isna(sheet_count_raw):
-                                print(f"警告: 行 {i+1} 检件编号 {inspection_number} 的张数值为NaN，默认为1")
-                                sheet_count = 1
-                            else:
-                                # 尝试从"180*80/3张"这种格式中提取数字
-                                if isinstance(sheet_count_raw, str) and '张' in sheet_count_raw:
-                                    # 使用正则表达式提取斜杠后、张字前的数字
-                                    match = re.search(r'/(\d+)张', sheet_count_raw)
-                                    if match:
-                                        sheet_count = int(match.group(1))
-                                        print(f"从字符串 '{sheet_count_raw}' 中提取到张数: {sheet_count}")
-                                    else:
-                                        # 如果没有找到匹配的模式，默认为1
-                                        print(f"无法从 '{sheet_count_raw}' 中提取张数，默认为1")
-                                        sheet_count = 1
-                                else:
-                                    # 尝试直接转换为整数
-                                    sheet_count = int(float(sheet_count_raw))
-                                    print(f"行 {i+1} 检件编号 {inspection_number} 的张数值转换为: {sheet_count}")
-                        except (ValueError, TypeError) as e:
-                            print(f"警告: 行 {i+1} 检件编号 {inspection_number} 的张数值 '{sheet_count_raw}' 转换失败: {e}，默认为1")
-                            sheet_count = 1
-                        sheet_counts.append(sheet_count)
-                    else:
-                        sheet_counts.append(1)  # 默认为1
-            
+            # 获取相关数据（按列一次性提取）
+            def extract_text(key):
+                return text_column(group_df, column_mapping[key]) if key in column_mapping else [""] * len(group_df)
+
+            inspection_numbers = extract_text('检件编号')
+            weld_numbers = extract_text('焊口编号')
+            welder_numbers = extract_text('焊工号')
+            specifications = extract_text('规格')
+
+            # 处理张数：数值直接取整，"180*80/3张"形式提取斜杠后的数字，缺失或无法解析时为1
+            if '张数' in column_mapping:
+                sheet_counts = sheet_count_column(group_df, column_mapping['张数']).tolist()
+            else:
+                sheet_counts = [1] * len(group_df)  # 默认为1
+
             if '张数' in column_mapping:
                 print(f"\n张数列名: '{column_mapping['张数']}'")
                 print(f"张数列所有值: {group_df[column_mapping['张数']].tolist()}")
@@ -1075,26 +1134,17 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                             if part:
                                                 if '年' in part:
                                                     # 添加年份数字（楷体五号）
-                                                    run_year = paragraph.add_run(str(year))
-                                                    run_year.font.name = "楷体"
-                                                    run_year.font.size = Pt(10.5)
-                                                    run_year._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
+                                                    run_year = add_styled_run(paragraph, str(year))
                                                     # 添加"年"字（保持原格式）
                                                     paragraph.add_run("年")
                                                 elif '月' in part:
                                                     # 添加月份数字（楷体五号）
-                                                    run_month = paragraph.add_run(str(month))
-                                                    run_month.font.name = "楷体"
-                                                    run_month.font.size = Pt(10.5)
-                                                    run_month._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
+                                                    run_month = add_styled_run(paragraph, str(month))
                                                     # 添加"月"字（保持原格式）
                                                     paragraph.add_run("月")
                                                 elif '日' in part:
                                                     # 添加日期数字（楷体五号）
-                                                    run_day = paragraph.add_run(str(day))
-                                                    run_day.font.name = "楷体"
-                                                    run_day.font.size = Pt(10.5)
-                                                    run_day._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
+                                                    run_day = add_styled_run(paragraph, str(day))
                                                     # 添加"日"字（保持原格式）
                                                     paragraph.add_run("日")
                                                 else:
@@ -1112,28 +1162,19 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                     p = cell.add_paragraph()
 
                                     # 添加年份数字（楷体五号）
-                                    run_year = p.add_run(str(year))
-                                    run_year.font.name = "楷体"
-                                    run_year.font.size = Pt(10.5)
-                                    run_year._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
+                                    run_year = add_styled_run(p, str(year))
 
                                     # 添加"年"字（保持原格式）
                                     p.add_run("年")
 
                                     # 添加月份数字（楷体五号）
-                                    run_month = p.add_run(str(month))
-                                    run_month.font.name = "楷体"
-                                    run_month.font.size = Pt(10.5)
-                                    run_month._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
+                                    run_month = add_styled_run(p, str(month))
 
                                     # 添加"月"字（保持原格式）
                                     p.add_run("月")
 
                                     # 添加日期数字（楷体五号）
-                                    run_day = p.add_run(str(day))
-                                    run_day.font.name = "楷体"
-                                    run_day.font.size = Pt(10.5)
-                                    run_day._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
+                                    run_day = add_styled_run(p, str(day))
 
                                     # 添加"日"字（保持原格式）
                                     p.add_run("日")
@@ -1146,35 +1187,22 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                 header_row_index = -1
                 
                 # 查找包含"检件编号"、"焊缝编号"、"焊工号"等的行
-                for i, row in enumerate(table.rows):
+                for i, cells in scan_table(table, TEMPLATE_HEADER_MATCHER):
                     header_found = False
-                    for j, cell in enumerate(row.cells):
-                        cell_text = cell.text.strip()
-                        
+                    for j, cell, cell_text, hits in cells:
                         # 打印表格单元格内容，帮助调试
-                        print(f"表格单元格[{i},{j}]内容: '{cell_text}'")
+                        print(f"表格单元格[{i},{j}]内容: '{cell_text.strip()}'")
                         
-                        if "检件编号" in cell_text:
-                            column_indices["检件编号"] = j
+                        keyword = TEMPLATE_HEADER_MATCHER.first_hit(hits)
+                        if keyword is None:
+                            continue
+                        # 焊口编号与焊缝编号为同一列
+                        column = "焊缝编号" if keyword == "焊口编号" else keyword
+                        column_indices[column] = j
+                        if column == "检件编号":
                             header_row_index = i
-                            header_found = True
-                            print(f"找到检件编号列: 行 {i+1}, 列 {j+1}")
-                        elif "焊缝编号" in cell_text or "焊口编号" in cell_text:
-                            column_indices["焊缝编号"] = j
-                            header_found = True
-                            print(f"找到焊缝编号列: 行 {i+1}, 列 {j+1}")
-                        elif "焊工号" in cell_text:
-                            column_indices["焊工号"] = j
-                            header_found = True
-                            print(f"找到焊工号列: 行 {i+1}, 列 {j+1}")
-                        elif "规格" in cell_text:
-                            column_indices["规格"] = j
-                            header_found = True
-                            print(f"找到规格列: 行 {i+1}, 列 {j+1}")
-                        elif "片号" in cell_text:
-                            column_indices["片号"] = j
-                            header_found = True
-                            print(f"找到片号列: 行 {i+1}, 列 {j+1}")
+                        header_found = True
+                        print(f"找到{column}列: 行 {i+1}, 列 {j+1}")
                     
                     if header_found and header_row_index >= 0:
                         print(f"找到表头行: 第{header_row_index+1}行")
@@ -1212,13 +1240,12 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                     available_count, data_rows = capacity_analyzer.analyze_available_rows(table)
                     print(f"表格容量分析: 可用行数={available_count}, 行索引={data_rows}")
 
-                    # 计算数据行需求
-                    inspection_numbers = group_df[column_mapping['检件编号']].tolist()
-                    sheet_counts_data = group_df[column_mapping['张数']].fillna(1).tolist() if '张数' in column_mapping else [1] * len(inspection_numbers)
+                    # 计算行展开计划：张数规则只应用一次，扩展与填写都使用该计划
+                    row_plan = DataRowCalculator.build_row_plan(sheet_counts)
 
                     # 使用数据行计算器计算总需求
                     required_rows, inspection_requirements = capacity_analyzer.calculate_required_rows(
-                        inspection_numbers, sheet_counts_data
+                        inspection_numbers, sheet_counts, row_plan
                     )
 
                     print(f"数据需求分析: 需要总行数={required_rows}")
@@ -1252,263 +1279,173 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
 
                     # 获取基础数据
                     data_count = len(group_df)
-                    print(f"需要填充{data_count}行数据")
-
-                    # 对于张数≥6的情况，我们需要确保有足够的行来填写所有片号
-                    # 检查是否需要添加额外的行来显示完整的片号序列
-                    extra_rows_needed = 0
-                    extra_rows_for_inspection = {}  # 记录每个检件编号需要的额外行数
-
-                    for i in range(data_count):
-                        if i < len(sheet_counts):
-                            # 修改逻辑：当张数为2或3时，也需要额外行
-                            if sheet_counts[i] >= 6 or sheet_counts[i] in [2, 3]:
-                                # 每个符合条件的检件编号需要张数个行
-                                extra_needed = sheet_counts[i] - 1  # 减1是因为已经计算了一行
-                                extra_rows_needed += extra_needed
-                                # 记录该检件编号需要的额外行数
-                                inspection_number = inspection_numbers[i]
-                                extra_rows_for_inspection[inspection_number] = extra_needed
-                    
+                    print(f"需要填充{data_count}行数据，按行展开计划共{row_plan.total_rows}行")
+
+                    extra_rows_needed = row_plan.total_rows - data_count
                     if extra_rows_needed > 0:
                         print(f"为了显示完整的片号序列，需要额外添加{extra_rows_needed}行")
-                    
-                    # 处理每一行数据
-                    row_index = 0  # 用于跟踪当前处理的行索引
+
+                    # 动态扩展后行数仍不足时，在最后一个数据行之后补充
+                    grid = TableGrid(table)
+                    if row_plan.total_rows > len(data_rows):
+                        rows_needed = row_plan.total_rows - len(data_rows)
+                        print(f"表格行数不足，补充 {rows_needed} 行")
+                        if data_rows:
+                            data_rows.extend(grid.insert_rows(data_rows[-1], rows_needed))
+                        else:
+                            data_rows.extend(grid.append_grid_rows(rows_needed))
+
+                    # 大表格不逐个单元格输出日志
+                    verbose = not is_large_table(row_plan.total_rows)
+
+                    # 查找表格中的"像质计灵敏度"列
+                    sensitivity_col_idx = -1
+                    sensitivity_values = {}  # 规格 -> 像质计灵敏度，同一规格只查询一次
+                    for j, cell in enumerate(grid.cells(header_row_index)):
+                        if "像质计" in cell.text and "灵敏度" in cell.text:
+                            sensitivity_col_idx = j
+                            print(f"找到像质计灵敏度列: 行 {header_row_index+1}, 列 {j+1}")
+                            break
+
+                    # 按行展开计划逐行填写：第k个表格行对应计划中的(检件序号, 片号)
                     processed_rows = 0  # 已处理的行数
-                    
-                    # 首先计算每个检件编号需要的行数
-                    inspection_rows_needed = {}
-                    for i in range(len(inspection_numbers)):
+                    for row_index, row_idx in enumerate(data_rows[:row_plan.total_rows]):
+                        i = row_plan.inspection_index[row_index]
+                        film_number = row_plan.film_numbers[row_index]
                         current_inspection = inspection_numbers[i]
-                        current_sheet_count = sheet_counts[i] if i < len(sheet_counts) else 1
-                        
-                        # 对于张数≥6的情况，需要生成多行
-                        # 修改逻辑：当张数为2或3时，也生成对应数量的行
-                        if current_sheet_count >= 6 or current_sheet_count in [2, 3]:
-                            rows_to_generate = current_sheet_count
-                        else:
-                            rows_to_generate = 1
-                        
-                        if current_inspection in inspection_rows_needed:
-                            inspection_rows_needed[current_inspection] += rows_to_generate
-                        else:
-                            inspection_rows_needed[current_inspection] = rows_to_generate
-                    
-                    print(f"每个检件编号需要的行数: {inspection_rows_needed}")
-                    
-                    # 处理每个检件编号
-                    for i in range(data_count):
-                        if i < len(inspection_numbers):
-                            current_inspection = inspection_numbers[i]
-                            current_weld = weld_numbers[i] if i < len(weld_numbers) else ""
-                            current_welder = welder_numbers[i] if i < len(welder_numbers) else ""
-                            current_spec = specifications[i] if i < len(specifications) else ""
-                            current_sheet_count = sheet_counts[i] if i < len(sheet_counts) else 1
-                            
-                            # 对于张数≥6或张数为2、3的情况，需要生成多行
-                            # 修改逻辑：当张数为2或3时，也生成对应数量的行
-                            if current_sheet_count >= 6 or current_sheet_count in [2, 3]:
-                                rows_to_generate = current_sheet_count
-                            else:
-                                rows_to_generate = 1
-                            
-                            # 检查是否需要为当前检件编号添加行
-                            if row_index + rows_to_generate > len(data_rows):
-                                # 计算需要添加的行数
-                                rows_needed = row_index + rows_to_generate - len(data_rows)
-                                print(f"为检件编号 {current_inspection} 添加 {rows_needed} 行")
-                                
-                                # 在当前位置插入新行
-                                for _ in range(rows_needed):
-                                    # 如果当前位置有效，在当前位置之后插入新行
-                                    if row_index > 0 and row_index <= len(data_rows):
-                                        # 获取当前行的索引
-                                        current_row_idx = data_rows[row_index - 1] if row_index - 1 < len(data_rows) else len(table.rows) - 1
-                                        
-                                        # 在当前行之后插入新行
-                                        new_row = table.add_row()
-                                        
-                                        # 将新行移动到当前行之后
-                                        # 注意：python-docx不直接支持在特定位置插入行，所以我们需要记录行索引
-                                        new_row_idx = len(table.rows) - 1
-                                        data_rows.insert(row_index, new_row_idx)
-                                    else:
-                                        # 如果是在末尾添加行
-                                        new_row = table.add_row()
-                                        data_rows.append(len(table.rows) - 1)
-                            
-                            # 填写当前检件编号的所有行
-                            for j in range(rows_to_generate):
-                                if row_index < len(data_rows):
-                                    row_idx = data_rows[row_index]
-                                    row = table.rows[row_idx]
-                                    
-                                    # 1. 填写检件编号
-                                    if "检件编号" in column_indices:
-                                        col_idx = column_indices["检件编号"]
-                                        if col_idx < len(row.cells):
-                                            cell = row.cells[col_idx]
-                                            if cell.paragraphs:
-                                                cell.paragraphs[0].text = str(current_inspection)
-                                                set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
-                                                print(f"已更新第{row_idx+1}行检件编号: {current_inspection}")
-
-                                    # 2. 填写焊缝编号
-                                    if "焊缝编号" in column_indices:
-                                        col_idx = column_indices["焊缝编号"]
-                                        if col_idx < len(row.cells):
-                                            cell = row.cells[col_idx]
-                                            if cell.paragraphs:
-                                                # 确保单元格内容被完全替换
-                                                if cell.paragraphs[0].text:
-                                                    cell.paragraphs[0].text = ""
-                                                cell.paragraphs[0].text = str(current_weld)
-                                                set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
-                                                print(f"已更新第{row_idx+1}行焊缝编号: {current_weld}")
-
-                                    # 3. 填写焊工号
-                                    if "焊工号" in column_indices:
-                                        col_idx = column_indices["焊工号"]
-                                        if col_idx < len(row.cells):
-                                            cell = row.cells[col_idx]
-                                            if cell.paragraphs:
-                                                cell.paragraphs[0].text = str(current_welder)
-                                                set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
-                                                print(f"已更新第{row_idx+1}行焊工号: {current_welder}")
-
-                                    # 4. 填写规格
-                                    if "规格" in column_indices:
-                                        col_idx = column_indices["规格"]
-                                        if col_idx < len(row.cells):
-                                            cell = row.cells[col_idx]
-                                            if cell.paragraphs:
-                                                cell.paragraphs[0].text = str(current_spec)
-                                                set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
-                                                print(f"已更新第{row_idx+1}行规格: {current_spec}")
-                                    
-                                    # 5. 填写片号
-                                    if "片号" in column_indices:
-                                        col_idx = column_indices["片号"]
-                                        if col_idx < len(row.cells):
-                                            cell = row.cells[col_idx]
-                                            
-                                            # 确定当前行是该检件编号的第几个实例
-                                            current_index_in_group = j
-                                            
-                                            # 根据张数规则确定片号
-                                            film_number = ""
-                                            
-                                            if current_sheet_count in [1, 4, 5]:
-                                                # 不填写片号
-                                                film_number = ""
-                                                print(f"张数为 {current_sheet_count}，片号保持为空")
-                                            elif current_sheet_count == 2:
-                                                # 依次填写1，2
-                                                if current_index_in_group < 2:
-                                                    film_number = str(current_index_in_group + 1)
-                                                    print(f"张数为 2，当前是第 {current_index_in_group + 1} 个实例，片号为: {film_number}")
-                                            elif current_sheet_count == 3:
-                                                # 依次填写1，2，3
-                                                if current_index_in_group < 3:
-                                                    film_number = str(current_index_in_group + 1)
-                                                    print(f"张数为 3，当前是第 {current_index_in_group + 1} 个实例，片号为: {film_number}")
-                                            elif current_sheet_count >= 6:
-                                                # 依次填写1-2，2-3，3-4，...，(N-1)-N，N-1
-                                                if current_index_in_group < current_sheet_count:
-                                                    if current_index_in_group < current_sheet_count - 1:
-                                                        # 对于前N-1个实例，填写 i-(i+1)
-                                                        film_number = f"{current_index_in_group + 1}-{current_index_in_group + 2}"
-                                                    else:
-                                                        # 对于第N个实例，填写 N-1
-                                                        film_number = f"{current_sheet_count}-1"
-                                                    print(f"张数为 {current_sheet_count}，当前是第 {current_index_in_group + 1} 个实例，片号为: {film_number}")
-                                            
-                                            # 打印当前单元格状态
-                                            print(f"片号单元格当前内容: '{cell.text}'")
-                                            
-                                            # 确保单元格内容被完全替换
-                                            try:
-                                                # 先清空单元格的所有内容
-                                                for p in cell.paragraphs:
-                                                    p.clear()
-                                                
-                                                # 如果没有段落，添加一个新段落
-                                                if len(cell.paragraphs) == 0:
-                                                    p = cell.add_paragraph()
-                                                
-                                                # 设置片号文本
-                                                run = cell.paragraphs[0].add_run(film_number)
-                                                # 设置楷体五号字体
-                                                run.font.name = "楷体"
-                                                run.font.size = Pt(10.5)
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-
-                                                if film_number:
-                                                    print(f"已更新第{row_idx+1}行片号: '{film_number}'")
-                                                else:
-                                                    print(f"第{row_idx+1}行片号保留为空")
-                                            except Exception as e:
-                                                print(f"设置片号时出错: {e}")
-                                                # 尝试另一种方式
-                                                try:
-                                                    if len(cell.paragraphs) > 0:
-                                                        cell.paragraphs[0].text = film_number
-                                                        set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
-                                                    else:
-                                                        cell.text = film_number
-                                                    print(f"使用备用方法设置片号: '{film_number}'")
-                                                except Exception as e2:
-                                                    print(f"备用方法也失败: {e2}")
-                                    
-                                    # 6. 填写像质计灵敏度
-                                    # 查找表格中的"像质计灵敏度"列
-                                    sensitivity_col_idx = -1
-                                    for j, cell in enumerate(table.rows[header_row_index].cells):
-                                        if "像质计" in cell.text and "灵敏度" in cell.text:
-                                            sensitivity_col_idx = j
-                                            print(f"找到像质计灵敏度列: 行 {header_row_index+1}, 列 {j+1}")
-                                            break
-                                    
-                                    if sensitivity_col_idx >= 0 and sensitivity_col_idx < len(row.cells):
-                                        # 查找对应规格的像质计灵敏度值
-                                        sensitivity_value = find_sensitivity_value(current_spec, ray_type)
-                                        
-                                        if sensitivity_value:
-                                            # 填写像质计灵敏度值
-                                            cell = row.cells[sensitivity_col_idx]
-                                            
-                                            try:
-                                                # 先清空单元格的所有内容
-                                                for p in cell.paragraphs:
-                                                    p.clear()
-                                                
-                                                # 如果没有段落，添加一个新段落
-                                                if len(cell.paragraphs) == 0:
-                                                    p = cell.add_paragraph()
-                                                
-                                                # 设置像质计灵敏度文本
-                                                run = cell.paragraphs[0].add_run(sensitivity_value)
-                                                # 设置楷体五号字体
-                                                run.font.name = "楷体"
-                                                run.font.size = Pt(10.5)
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                print(f"已更新第{row_idx+1}行像质计灵敏度: '{sensitivity_value}'")
-                                            except Exception as e:
-                                                print(f"设置像质计灵敏度时出错: {e}")
-                                                # 尝试另一种方式
-                                                try:
-                                                    if len(cell.paragraphs) > 0:
-                                                        cell.paragraphs[0].text = sensitivity_value
-                                                        set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
-                                                    else:
-                                                        cell.text = sensitivity_value
-                                                    print(f"使用备用方法设置像质计灵敏度: '{sensitivity_value}'")
-                                                except Exception as e2:
-                                                    print(f"备用方法也失败: {e2}")
-                                    
-                                    row_index += 1
-                                    processed_rows += 1
+                        current_weld = weld_numbers[i]
+                        current_welder = welder_numbers[i]
+                        current_spec = specifications[i]
+
+                        cells = grid.cells(row_idx)
+
+                        # 1. 填写检件编号
+                        if "检件编号" in column_indices:
+                            col_idx = column_indices["检件编号"]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
+                                if cell.paragraphs:
+                                    cell.paragraphs[0].text = str(current_inspection)
+                                    set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行检件编号: {current_inspection}")
+
+                        # 2. 填写焊缝编号
+                        if "焊缝编号" in column_indices:
+                            col_idx = column_indices["焊缝编号"]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
+                                if cell.paragraphs:
+                                    # 确保单元格内容被完全替换
+                                    if cell.paragraphs[0].text:
+                                        cell.paragraphs[0].text = ""
+                                    cell.paragraphs[0].text = str(current_weld)
+                                    set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行焊缝编号: {current_weld}")
+
+                        # 3. 填写焊工号
+                        if "焊工号" in column_indices:
+                            col_idx = column_indices["焊工号"]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
+                                if cell.paragraphs:
+                                    cell.paragraphs[0].text = str(current_welder)
+                                    set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行焊工号: {current_welder}")
+
+                        # 4. 填写规格
+                        if "规格" in column_indices:
+                            col_idx = column_indices["规格"]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
+                                if cell.paragraphs:
+                                    cell.paragraphs[0].text = str(current_spec)
+                                    set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行规格: {current_spec}")
+
+                        # 5. 填写片号
+                        if "片号" in column_indices:
+                            col_idx = column_indices["片号"]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
+
+                                # 打印当前单元格状态
+                                if verbose:
+                                    print(f"片号单元格当前内容: '{cell.text}'")
+
+                                # 确保单元格内容被完全替换
+                                try:
+                                    # 先清空单元格的所有内容
+                                    for p in cell.paragraphs:
+                                        p.clear()
+
+                                    # 如果没有段落，添加一个新段落
+                                    if len(cell.paragraphs) == 0:
+                                        p = cell.add_paragraph()
+
+                                    # 设置片号文本
+                                    # 设置楷体五号字体
+                                    run = add_styled_run(cell.paragraphs[0], film_number)
+
+                                    if verbose and film_number:
+                                        print(f"已更新第{row_idx+1}行片号: '{film_number}'")
+                                    elif verbose:
+                                        print(f"第{row_idx+1}行片号保留为空")
+                                except Exception as e:
+                                    print(f"设置片号时出错: {e}")
+                                    # 尝试另一种方式
+                                    try:
+                                        if len(cell.paragraphs) > 0:
+                                            cell.paragraphs[0].text = film_number
+                                            set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
+                                        else:
+                                            cell.text = film_number
+                                        print(f"使用备用方法设置片号: '{film_number}'")
+                                    except Exception as e2:
+                                        print(f"备用方法也失败: {e2}")
+
+                        # 6. 填写像质计灵敏度
+                        if sensitivity_col_idx >= 0 and sensitivity_col_idx < len(cells):
+                            # 查找对应规格的像质计灵敏度值
+                            if current_spec not in sensitivity_values:
+                                sensitivity_values[current_spec] = find_sensitivity_value(current_spec, ray_type)
+                            sensitivity_value = sensitivity_values[current_spec]
+
+                            if sensitivity_value:
+                                # 填写像质计灵敏度值
+                                cell = cells[sensitivity_col_idx]
+
+                                try:
+                                    # 先清空单元格的所有内容
+                                    for p in cell.paragraphs:
+                                        p.clear()
+
+                                    # 如果没有段落，添加一个新段落
+                                    if len(cell.paragraphs) == 0:
+                                        p = cell.add_paragraph()
+
+                                    # 设置像质计灵敏度文本
+                                    # 设置楷体五号字体
+                                    run = add_styled_run(cell.paragraphs[0], sensitivity_value)
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行像质计灵敏度: '{sensitivity_value}'")
+                                except Exception as e:
+                                    print(f"设置像质计灵敏度时出错: {e}")
+                                    # 尝试另一种方式
+                                    try:
+                                        if len(cell.paragraphs) > 0:
+                                            cell.paragraphs[0].text = sensitivity_value
+                                            set_font_style(cell.paragraphs[0])  # 设置楷体五号字体
+                                        else:
+                                            cell.text = sensitivity_value
+                                        print(f"使用备用方法设置像质计灵敏度: '{sensitivity_value}'")
+                                    except Exception as e2:
+                                        print(f"备用方法也失败: {e2}")
+
+                        processed_rows += 1
             
             print("==== 文档填充完成 ====\n")
 
@@ -1536,20 +1473,27 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
             # 保存文档
             try:
                 print(f"\n正在保存文档到: {report_output_path}")
-                doc.save(report_output_path)
+                save_docx(doc, report_output_path)
                 print(f"文档已成功保存至: {report_output_path}")
                 success_count += 1
+                run_metrics.count('rows_filled', len(group_df))
             except Exception as e:
                 print(f"错误: 无法保存文档: {e}")
                 error_count += 1
+
+            # 文档保存后立即释放，下一个分组的内存检查不再包含它
+            doc = group_df = None
                 
         except Exception as e:
             print(f"错误: 处理委托单编号 {order_number} 和射线类型 {ray_type} 时出错: {e}")
             error_count += 1
     
+    # 多进程并行时各分组在子进程中记录，由 run_scheduled 汇总
+    run_metrics.record_reports(success_count, failed=error_count)
     print(f"\n处理完成: 共处理{len(groups)}个组合，成功生成{success_count}份报告，失败{error_count}份")
     if error_count > 0:
         print(f"警告: 有{error_count}个组合处理失败，请检查日志")
+    print(governor.summary())
 
     # 输出模板使用总结
     print_template_usage_summary(template_usage_summary)
@@ -1557,6 +1501,29 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
     return success_count > 0
 
 # 新增函数：查找像质计灵敏度
+_sensitivity_tables = {}
+
+
+def load_sensitivity_table(excel_path):
+    """读取像质计灵敏度查询表，按文件路径、修改时间和大小缓存
+
+    每个表格行都要查一次像质计灵敏度，大表格时逐行重新读取Excel文件会非常慢。
+
+    Args:
+        excel_path: 查询表路径
+
+    Returns:
+        DataFrame: 查询表数据
+    """
+    stat = os.stat(excel_path)
+    key = (os.path.abspath(excel_path), stat.st_mtime_ns, stat.st_size)
+    df = _sensitivity_tables.get(key)
+    if df is None:
+        df = pd.read_excel(excel_path)
+        _sensitivity_tables[key] = df
+    return df
+
+
 def find_sensitivity_value(specification, ray_type):
     """
     根据规格和射线类型查找对应的像质计灵敏度值
@@ -1582,8 +1549,8 @@ def find_sensitivity_value(specification, ray_type):
             print(f"错误: 像质计灵敏度查询文件不存在: {excel_path}")
             return ""
         
-        # 读取Excel文件
-        df = pd.read_excel(excel_path)
+        # 读取Excel文件（同一文件只读取一次）
+        df = load_sensitivity_table(excel_path)
         
         # 打印列名，帮助调试
         print(f"文件 {excel_path} 的列名: {list(df.columns)}")
@@ -1675,10 +1642,11 @@ def find_field_options(doc, field_name, field_keywords):
 
     # 遍历所有表格
     for table_idx, table in enumerate(doc.tables):
-        for row_idx, row in enumerate(table.rows):
+        grid = TableGrid(table)
+        for row_idx in range(len(grid)):
             # 检查每一行是否包含目标字段相关内容
             row_text = ""
-            for cell in row.cells:
+            for cell in grid.cells(row_idx):
                 row_text += cell.text + " "
 
             # 如果这一行包含目标字段相关内容，搜索整行的复选框选项
@@ -1687,15 +1655,14 @@ def find_field_options(doc, field_name, field_keywords):
                 search_rows = [row_idx]
                 if row_idx > 0:
                     search_rows.append(row_idx - 1)  # 上一行
-                if row_idx < len(table.rows) - 1:
+                if row_idx < len(grid) - 1:
                     search_rows.append(row_idx + 1)  # 下一行
 
                 for search_row_idx in search_rows:
-                    if search_row_idx < 0 or search_row_idx >= len(table.rows):
+                    if search_row_idx < 0 or search_row_idx >= len(grid):
                         continue
 
-                    search_row = table.rows[search_row_idx]
-                    for check_cell_idx, check_cell in enumerate(search_row.cells):
+                    for check_cell_idx, check_cell in enumerate(grid.cells(search_row_idx)):
                         cell_key = (table_idx, search_row_idx, check_cell_idx)
                         if cell_key in processed_cells:
                             continue
@@ -1847,10 +1814,7 @@ def mark_field_checkbox(option):
                             # 没有变化，使用默认字体
                             run = paragraph.add_run(marked_line)
                             try:
-                                run.font.name = "宋体"
-                                run.font.size = Pt(9.5)
-                                if run._element.rPr is not None:
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "宋体")
+                                style_run(run, "宋体", 9.5)
                             except:
                                 pass  # 忽略字体设置错误
 
@@ -1874,11 +1838,7 @@ def add_mixed_font_text(paragraph, text):
 
             # 如果是打勾符号，使用小五号字体
             if char == '☑':
-                run = paragraph.add_run(char)
-                run.font.name = "楷体"
-                run.font.size = Pt(9)  # 小五号字体
-                if run._element.rPr is not None:
-                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "宋体")
+                add_styled_run(paragraph, char, "楷体", 9, "宋体")
                 i += 1
             else:
                 # 收集连续的非打勾符号字符
@@ -1889,20 +1849,12 @@ def add_mixed_font_text(paragraph, text):
 
                 # 添加普通文本，使用五号字体
                 if normal_text:
-                    run = paragraph.add_run(normal_text)
-                    run.font.name = "宋体"
-                    run.font.size = Pt(9.5)  # 五号字体
-                    if run._element.rPr is not None:
-                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "宋体")
+                    add_styled_run(paragraph, normal_text, "宋体", 9.5)
 
     except Exception as e:
         print(f"设置混合字体时出错: {e}")
         # 如果出错，回退到普通方式
-        run = paragraph.add_run(text)
-        run.font.name = "宋体"
-        run.font.size = Pt(9.5)
-        if run._element.rPr is not None:
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), "宋体")
+        add_styled_run(paragraph, text, "宋体", 9.5)
 
 def mark_specific_option_in_line(line, option_text, original_line):
     """在一行文本中精确标记特定选项，不影响其他选项"""
@@ -2011,6 +1963,60 @@ def process_quality_level_checkboxes(doc, quality_level):
         print(f"处理合格级别复选框时出错: {e}")
         return False
 
+def plan_excel_to_word(excel_path, word_template_path, output_path=None, session=None):
+    """生成计划（试运行）：只读取台账、分组并统计模板容量，不生成任何文档
+
+    Args:
+        excel_path: Excel表格路径
+        word_template_path: Word模板文档路径
+        output_path: 输出目录路径（如果为None，使用默认输出目录）
+        session: 共享读取会话（可选，ledger_session.LedgerSession）
+
+    Returns:
+        GeneratorPlan: 生成计划，Excel或模板不存在、缺少委托单编号列时返回None
+    """
+    start = time.perf_counter()
+    if not os.path.exists(excel_path):
+        print(f"错误: Excel文件不存在: {excel_path}")
+        return None
+    if not os.path.exists(word_template_path):
+        print(f"错误: Word模板文件不存在: {word_template_path}")
+        return None
+    output_dir = output_path or os.path.join("生成器", "输出报告", "5_射线检测记录续")
+
+    session = session_for(session, excel_path)
+    df = session.read_excel() if session else pd.read_excel(excel_path)
+    column_mapping, columns = resolve_columns(df, COLUMN_KEYWORDS, COLUMN_POSITIONS, find_column_with_keyword)
+    if '委托单编号' not in column_mapping:
+        print("错误: 无法找到委托单编号列")
+        return None
+
+    alternative_template = "生成器/word/5_射线检测记录_续.docx"
+    capacities = {}
+    sheet_column = column_mapping.get('张数')
+    plan = GeneratorPlan('Radio_test_renewal', excel_path, len(df), columns, overflow_action='将动态扩展行')
+    for order_number, ray_type, group_df in ray_type_groups(df, column_mapping['委托单编号'],
+                                                           column_mapping.get('γ射线')):
+        # 与 process_excel_to_word 相同的张数统计和模板选择规则
+        if sheet_column in group_df.columns:
+            sheet_numbers = pd.to_numeric(group_df[sheet_column], errors='coerce').fillna(0)
+            total_sheets = int(sheet_numbers.sum())
+            table_rows = int(DataRowCalculator.calculate_rows_for_counts(sheet_numbers).sum())
+        else:
+            total_sheets = table_rows = len(group_df)
+        continuation = total_sheets > 21 and os.path.exists(alternative_template)
+        template_path = alternative_template if continuation else word_template_path
+        if template_path not in capacities:
+            capacities[template_path] = template_capacity(template_path)
+
+        output_file = os.path.join(output_dir, get_output_filename(template_path, order_number, ray_type))
+        plan.entries.append(PlanEntry(order_number, ray_type, len(group_df), output_file, template_path,
+                                      template_type='续表模板' if continuation else '标准模板',
+                                      total_sheets=total_sheets, table_rows=table_rows,
+                                      capacity=capacities[template_path]))
+    plan.seconds = time.perf_counter() - start
+    return plan
+
 def main():
     # 创建命令行参数解析器
     parser = argparse.ArgumentParser(description='将Excel数据填入Word文档')
@@ -2026,16 +2032,42 @@ def main():
                         help='委托单位 (用于替换Word文档中的"委托单位值")')
     parser.add_argument('-i', '--instruction', 
                         help='操作指导书编号 (用于替换Word文档中的"操作指导书编号值")')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='并行进程数量，大于1时按预估耗时最长优先派发分组 (默认: 1)')
+    parser.add_argument('--schedule', choices=['lpt', 'fifo'], default='lpt',
+                        help='并行派发顺序: lpt 最长任务优先, fifo 原始顺序 (默认: lpt)')
+    parser.add_argument('--plan', action='store_true',
+                        help='只输出生成计划（报告数量、模板选择、容量、列查找结果），不生成文档')
+    parser.add_argument('--memory-limit', type=int, default=EXPANSION_CONFIG['memory_limit_mb'],
+                        help=f"每个进程的内存上限(MB)，超过时暂停处理新分组，0表示不限制 (默认: {EXPANSION_CONFIG['memory_limit_mb']})")
+    parser.add_argument('--metrics-dir', default=METRICS_CONFIG['output_dir'],
+                        help=f"运行指标输出目录 (默认: {METRICS_CONFIG['output_dir']})")
+    parser.add_argument('--archive',
+                        help='把报告直接写入该归档文件（.zip、.tar、.tar.gz），不写单独的文件')
+    parser.add_argument('--shared-memory', action='store_true',
+                        help='并行时通过共享内存传递分区数据（默认每个任务携带分区数据切片）')
     
     # 解析命令行参数
     args = parser.parse_args()
     
+    if args.plan:
+        plan = plan_excel_to_word(args.excel, args.word, args.output)
+        if plan is not None:
+            print_plan(plan)
+        sys.exit(0 if plan is not None else 1)
+    
     # 处理Excel到Word的转换
-    success = process_excel_to_word(args.excel, args.word, args.output, 
-                                   args.project, args.client, args.instruction)
+    with archive_output.archive(args.archive) as sink, run_metrics.collect('Radio_test_renewal', args.metrics_dir) as metrics:
+        success = process_excel_to_word(args.excel, args.word, args.output, 
+                                       args.project, args.client, args.instruction,
+                                       workers=args.workers, schedule=args.schedule,
+                                       memory_limit_mb=args.memory_limit, shared_memory=args.shared_memory)
+        metrics.success = success
+        if sink is not None:
+            sink.success = success
     
-    # 返回状态码
-    sys.exit(0 if success else 1)
+    # 返回状态码（开启归档输出而未能生成归档时同样视为失败）
+    sys.exit(0 if success and archive_output.published(sink) else 1)
 
 if __name__ == "__main__":
     main()
@@ -2,12 +2,31 @@ import pandas as pd
 import os
 import sys
 import argparse
+import contextlib
 from docx import Document
-from docx.shared import Pt
-from docx.oxml.ns import qn
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from datetime import datetime
 import re
+from ledger_session import group_value, session_for
+from report_pipeline import ReportPipeline, save_document
+from docx_merge import MergedDocument, merged_output_path, save_merged
+from table_builder import TableGrid, is_large_table
+from run_styles import add_styled_run
+from keyword_matcher import KeywordMatcher, scan_table
+from memory_profile import PROFILE_CONFIG, profiling
+import archive_output
+import run_metrics
+from run_metrics import METRICS_CONFIG
+
+# 表格尾部签字栏的关键字，这些行不作为数据行，其中的日期按委托日期填写
+FOOTER_KEYWORDS = ("委托人", "监理单位", "建设单位")
+FOOTER_MATCHER = KeywordMatcher(FOOTER_KEYWORDS)
+# 数据区结束标记："以下空白"行或签字栏
+DATA_END_MATCHER = KeywordMatcher(("以下空白",) + FOOTER_KEYWORDS)
+
+# 表头列关键字（顺序即判断优先级），其中检测批号、管道编号所在的行为表头行
+HEADER_MATCHER = KeywordMatcher(("检测批号", "管道编号", "焊口号", "焊工号", "焊口规格", "焊口材质", "备注", "单线号"))
+HEADER_ROW_KEYWORDS = ("检测批号", "管道编号")
 
 def find_column_with_keyword(df, keyword):
     """查找包含指定关键字的列"""
@@ -36,10 +55,7 @@ def replace_text_in_paragraph(paragraph, old_text, new_text):
         for i, part in enumerate(parts):
             if i > 0:
                 # 添加替换的文本（设置楷体五号字体）
-                run = paragraph.add_run(new_text)
-                run.font.name = "楷体"
-                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                run.font.size = Pt(10.5)
+                run = add_styled_run(paragraph, new_text)
 
             if part:
                 # 添加原始文本部分（保持原有格式）
@@ -60,11 +76,12 @@ def get_output_filename(word_template_path, order_number):
     # 生成输出文件名
     return f"{template_name}_{order_number}_生成结果.docx"
 
-def process_excel_to_word(excel_path, word_template_path, output_path=None, 
+def build_renderer(excel_path, word_template_path, output_path=None, 
                          project_name=None, inspection_category=None, 
                          inspection_standard=None, inspection_method=None, 
-                         groove_type=None):
-    """将Excel数据填入Word文档
+                         groove_type=None, writer_count=None, profiler=None, session=None,
+                         merge_output=None):
+    """准备生成：读取Excel、建立列映射、确定委托单编号，返回逐组生成报告的 GroupRenderer
     
     Args:
         excel_path: Excel表格路径
@@ -75,18 +92,22 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         inspection_standard: 检测标准，用于替换文档中的"检测标准值"
         inspection_method: 检测方法，用于替换文档中的"检测方法值"
         groove_type: 坡口形式，用于替换文档中的"坡口形式值"
+        writer_count: 保存文档的写入线程数量（默认使用流水线配置）
+        profiler: 内存分析器（可选，memory_profile.MemoryProfiler，由调用方开始和结束记录）
+        session: 共享读取会话（可选，ledger_session.LedgerSession），多个生成器共用同一工作簿时只读取一次
+        merge_output: 合并输出（可选）：True 时所有委托单填入同一个文档"输出目录/<模板名>_合并.docx"，也可直接指定文件路径；各委托单之间分节
     
     Returns:
-        bool: 处理是否成功
+        GroupRenderer: 逐组生成器（准备失败时返回None）；单独运行时用流水线生成全部分组
     """
     # 检查文件是否存在
     if not os.path.exists(excel_path):
         print(f"错误: Excel文件不存在: {excel_path}")
-        return False
+        return None
         
     if not os.path.exists(word_template_path):
         print(f"错误: Word模板文件不存在: {word_template_path}")
-        return False
+        return None
     
     # 获取模板文件名（不含路径和扩展名）作为子目录名
     template_name = os.path.splitext(os.path.basename(word_template_path))[0]
@@ -99,7 +120,9 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
     
     # 读取Excel数据
     print(f"正在读取Excel文件: {excel_path}")
-    df = pd.read_excel(excel_path)
+    session = session_for(session, excel_path)
+    with profiler.stage("读取Excel") if profiler else contextlib.nullcontext(), run_metrics.stage('read'):
+        df = session.read_excel() if session else pd.read_excel(excel_path)
     
     # 打印所有列名，帮助调试
     print(f"Excel表格列名: {list(df.columns)}")
@@ -169,16 +192,14 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
     for col in required_columns:
         if col not in column_mapping:
             print(f"错误: 未找到必需的列: '{col}'")
-            return False
+            return None
     
     # 按委托单编号分组处理数据
     order_numbers = df[column_mapping['委托单编号']].dropna().unique().tolist()
     print(f"找到{len(order_numbers)}个不同的委托单编号")
     
-    success_count = 0
-    
-    # 对每个委托单编号生成一份报告
-    for order_number in order_numbers:
+    # 准备阶段：提取每个委托单编号的数据
+    def prepare_order(order_number):
         print(f"\n处理委托单编号: {order_number}")
         
         # 筛选该委托单编号的数据
@@ -192,9 +213,9 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         # 1) 获取该组数据中最晚的委托日期
         date_col = column_mapping.get('委托日期')
         if date_col:
-            # 确保日期列是日期类型
-            order_df[date_col] = pd.to_datetime(order_df[date_col], errors='coerce')
-            latest_date = order_df[date_col].max()
+            # 转换为日期类型后取最晚日期（多个模板共用会话时每个委托单只计算一次）
+            latest_date = group_value(session, ('最晚委托日期', date_col), order_number,
+                                      lambda: pd.to_datetime(order_df[date_col], errors='coerce').max())
             
             if pd.isna(latest_date):
                 print(f"警告: 委托单编号 {order_number} 没有有效的委托日期")
@@ -221,7 +242,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         # 获取单个值字段（每个委托单编号只需一个值）
         unit_name = ""
         if '单元名称' in column_mapping:
-            unit_names = order_df[column_mapping['单元名称']].dropna().tolist()
+            unit_names = group_value(session, ('单元名称', column_mapping['单元名称']), order_number,
+                                     lambda: tuple(order_df[column_mapping['单元名称']].dropna()))
             if unit_names:
                 unit_name = unit_names[0]
                 print(f"找到单元名称: {unit_name}")
@@ -249,7 +271,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         
         qualification_level = ""
         if '合格级别' in column_mapping:
-            levels = order_df[column_mapping['合格级别']].dropna().tolist()
+            levels = group_value(session, ('合格级别', column_mapping['合格级别']), order_number,
+                                 lambda: tuple(order_df[column_mapping['合格级别']].dropna()))
             if levels:
                 qualification_level = levels[0]
                 print(f"找到合格级别: {qualification_level}")
@@ -278,7 +301,44 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                         # 无法转换，直接使用原始值
                         inspection_ratio = str(ratio_value)
                 print(f"找到检测比例: {inspection_ratio}")
-        
+
+        return {
+            'order_number': order_number,
+            'report_output_path': report_output_path,
+            'date': (year, month, day),
+            'pipe_codes': pipe_codes,
+            'weld_numbers': weld_numbers,
+            'welder_numbers': welder_numbers,
+            'specifications': specifications,
+            'materials': materials,
+            'notes': notes,
+            'line_numbers': line_numbers,
+            'unit_name': unit_name,
+            'welding_method': welding_method,
+            'area_number': area_number,
+            'inspection_timing': inspection_timing,
+            'qualification_level': qualification_level,
+            'inspection_ratio': inspection_ratio,
+        }
+
+    # 填充阶段：打开模板并填充该委托单编号的Word文档
+    def fill_order(prepared):
+        order_number = prepared['order_number']
+        year, month, day = prepared['date']
+        pipe_codes = prepared['pipe_codes']
+        weld_numbers = prepared['weld_numbers']
+        welder_numbers = prepared['welder_numbers']
+        specifications = prepared['specifications']
+        materials = prepared['materials']
+        notes = prepared['notes']
+        line_numbers = prepared['line_numbers']
+        unit_name = prepared['unit_name']
+        welding_method = prepared['welding_method']
+        area_number = prepared['area_number']
+        inspection_timing = prepared['inspection_timing']
+        qualification_level = prepared['qualification_level']
+        inspection_ratio = prepared['inspection_ratio']
+
         # 打开Word文档
         print(f"正在处理Word文档: {word_template_path}")
         doc = Document(word_template_path)
@@ -311,11 +371,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                     if original_text.strip() == key:
                         # 清空段落内容并重新添加
                         paragraph.clear()
-                        run = paragraph.add_run(value)
                         # 设置楷体五号字体
-                        run.font.name = "楷体"
-                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                        run.font.size = Pt(10.5)
+                        run = add_styled_run(paragraph, value)
                         print(f"已将段落中的'{key}'替换为'{value}'并设置为楷体五号字体")
                     else:
                         # 如果段落包含其他内容，需要精确替换
@@ -335,11 +392,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                 if original_text.strip() == key:
                                     # 清空段落内容并重新添加
                                     paragraph.clear()
-                                    run = paragraph.add_run(value)
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, value)
                                     print(f"已将表格单元格中的'{key}'替换为'{value}'并设置为楷体五号字体")
                                 else:
                                     # 如果段落包含其他内容，需要精确替换
@@ -350,22 +404,13 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         
         # 处理表格
         for table in doc.tables:
-            # 查找委托人、监理单位和建设单位的日期
-            for i, row in enumerate(table.rows):
-                for j, cell in enumerate(row.cells):
-                    # 处理委托人日期
-                    if "委托人" in cell.text:
-                        print(f"找到委托人单元格: 第{i+1}行, 第{j+1}列")
-                        update_date_in_cell(cell, year, month, day)
-                    
-                    # 处理监理单位日期
-                    elif "监理单位" in cell.text:
-                        print(f"找到监理单位单元格: 第{i+1}行, 第{j+1}列")
-                        update_date_in_cell(cell, year, month, day)
-                    
-                    # 处理建设单位日期
-                    elif "建设单位" in cell.text:
-                        print(f"找到建设单位单元格: 第{i+1}行, 第{j+1}列")
+            grid = TableGrid(table)
+
+            # 查找委托人、监理单位和建设单位的日期（一个单元格包含多个关键字时按该顺序取第一个）
+            for i, cells in scan_table(table, FOOTER_MATCHER, grid):
+                for j, cell, _, hits in cells:
+                    if hits:
+                        print(f"找到{FOOTER_MATCHER.first_hit(hits)}单元格: 第{i+1}行, 第{j+1}列")
                         update_date_in_cell(cell, year, month, day)
             
             # 查找表头行，确定各列的位置
@@ -373,35 +418,16 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
             header_row_index = -1
 
             # 查找包含"管道编号"、"焊口号"、"焊工号"等的行
-            for i, row in enumerate(table.rows):
+            for i, cells in scan_table(table, HEADER_MATCHER, grid):
                 header_found = False
-                for j, cell in enumerate(row.cells):
-                    if "检测批号" in cell.text:
-                        column_indices["检测批号"] = j
-                        header_row_index = i
-                        header_found = True
-                    elif "管道编号" in cell.text:
-                        column_indices["管道编号"] = j
+                for j, cell, _, hits in cells:
+                    keyword = HEADER_MATCHER.first_hit(hits)
+                    if keyword is None:
+                        continue
+                    column_indices[keyword] = j
+                    if keyword in HEADER_ROW_KEYWORDS:
                         header_row_index = i
-                        header_found = True
-                    elif "焊口号" in cell.text:
-                        column_indices["焊口号"] = j
-                        header_found = True
-                    elif "焊工号" in cell.text:
-                        column_indices["焊工号"] = j
-                        header_found = True
-                    elif "焊口规格" in cell.text:
-                        column_indices["焊口规格"] = j
-                        header_found = True
-                    elif "焊口材质" in cell.text:
-                        column_indices["焊口材质"] = j
-                        header_found = True
-                    elif "备注" in cell.text:
-                        column_indices["备注"] = j
-                        header_found = True
-                    elif "单线号" in cell.text:
-                        column_indices["单线号"] = j
-                        header_found = True
+                    header_found = True
 
                 if header_found and header_row_index >= 0:
                     break
@@ -413,14 +439,17 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                 # 如果找到表头行，处理数据填充
                 # 获取可用于填充数据的行
                 data_rows = []
-                for i in range(header_row_index + 1, len(table.rows)):
-                    if i < len(table.rows):
-                        # 检查是否是空行或包含特殊标记的行
-                        if len(table.rows[i].cells) > 0 and "以下空白" in table.rows[i].cells[0].text:
-                            print(f"找到'以下空白'行: 第{i+1}行")
-                            break
-                        # 添加可用于填充数据的行
-                        data_rows.append(i)
+                for i, cells in scan_table(table, DATA_END_MATCHER, grid, start=header_row_index + 1):
+                    # 检查是否是包含特殊标记的行（只看第一列）
+                    hits = cells[0][3] if cells else frozenset()
+                    if "以下空白" in hits:
+                        print(f"找到'以下空白'行: 第{i+1}行")
+                        break
+                    if hits:
+                        print(f"找到签字栏: 第{i+1}行")
+                        break
+                    # 添加可用于填充数据的行
+                    data_rows.append(i)
                 
                 print(f"找到{len(data_rows)}行可用于填充数据")
                 
@@ -438,149 +467,135 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                     # 找到最后一行的索引
                     last_row_idx = data_rows[-1] if data_rows else header_row_index
                     
-                    # 添加新行
-                    for _ in range(rows_needed):
-                        # 在表格末尾添加一行
-                        new_row = table.add_row()
-                        data_rows.append(len(table.rows) - 1)  # 添加新行的索引
+                    # 以最后一个数据行为原型批量克隆新行，插在数据区之后（"以下空白"等行保持在数据之后）
+                    data_rows.extend(grid.insert_rows(last_row_idx, rows_needed))
+                
+                # 大表格不逐个单元格输出日志
+                verbose = not is_large_table(data_count)
                 
                 # 处理每一行数据
                 for i in range(data_count):
                     if i < len(data_rows):
                         row_idx = data_rows[i]
-                        row = table.rows[row_idx]
+                        cells = grid.cells(row_idx)
 
                         # 1. 填写检测批号（根据管道编号个数进行排序）
                         if "检测批号" in column_indices:
                             col_idx = column_indices["检测批号"]
-                            if col_idx < len(row.cells):
-                                cell = row.cells[col_idx]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(i + 1))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
-                                    print(f"已更新第{row_idx+1}行检测批号: {i + 1}")
+                                    run = add_styled_run(paragraph, str(i + 1))
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行检测批号: {i + 1}")
 
                         # 2. 填写管道编号（检件编号）
                         if "管道编号" in column_indices and i < len(pipe_codes):
                             col_idx = column_indices["管道编号"]
-                            if col_idx < len(row.cells):
-                                cell = row.cells[col_idx]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(pipe_codes[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
-                                    print(f"已更新第{row_idx+1}行管道编号: {pipe_codes[i]}")
+                                    run = add_styled_run(paragraph, str(pipe_codes[i]))
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行管道编号: {pipe_codes[i]}")
 
                         # 3. 填写焊口号
                         if "焊口号" in column_indices and i < len(weld_numbers):
                             col_idx = column_indices["焊口号"]
-                            if col_idx < len(row.cells):
-                                cell = row.cells[col_idx]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(weld_numbers[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
-                                    print(f"已更新第{row_idx+1}行焊口号: {weld_numbers[i]}")
+                                    run = add_styled_run(paragraph, str(weld_numbers[i]))
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行焊口号: {weld_numbers[i]}")
 
                         # 4. 填写焊工号
                         if "焊工号" in column_indices and i < len(welder_numbers):
                             col_idx = column_indices["焊工号"]
-                            if col_idx < len(row.cells):
-                                cell = row.cells[col_idx]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(welder_numbers[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
-                                    print(f"已更新第{row_idx+1}行焊工号: {welder_numbers[i]}")
+                                    run = add_styled_run(paragraph, str(welder_numbers[i]))
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行焊工号: {welder_numbers[i]}")
 
                         # 5. 填写焊口规格
                         if "焊口规格" in column_indices and i < len(specifications):
                             col_idx = column_indices["焊口规格"]
-                            if col_idx < len(row.cells):
-                                cell = row.cells[col_idx]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(specifications[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
-                                    print(f"已更新第{row_idx+1}行焊口规格: {specifications[i]}")
+                                    run = add_styled_run(paragraph, str(specifications[i]))
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行焊口规格: {specifications[i]}")
 
                         # 6. 填写焊口材质
                         if "焊口材质" in column_indices and i < len(materials):
                             col_idx = column_indices["焊口材质"]
-                            if col_idx < len(row.cells):
-                                cell = row.cells[col_idx]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(materials[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
-                                    print(f"已更新第{row_idx+1}行焊口材质: {materials[i]}")
+                                    run = add_styled_run(paragraph, str(materials[i]))
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行焊口材质: {materials[i]}")
 
                         # 7. 填写备注
                         if "备注" in column_indices and i < len(notes):
                             col_idx = column_indices["备注"]
-                            if col_idx < len(row.cells):
-                                cell = row.cells[col_idx]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
                                 if cell.paragraphs:
                                     note = notes[i]
                                     if pd.notna(note):  # 检查是否为NaN
                                         paragraph = cell.paragraphs[0]
                                         paragraph.clear()
-                                        run = paragraph.add_run(str(note))
                                         # 设置楷体五号字体
-                                        run.font.name = "楷体"
-                                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                        run.font.size = Pt(10.5)
-                                        print(f"已更新第{row_idx+1}行备注")
+                                        run = add_styled_run(paragraph, str(note))
+                                        if verbose:
+                                            print(f"已更新第{row_idx+1}行备注")
 
                         # 8. 填写单线号
                         if "单线号" in column_indices and i < len(line_numbers):
                             col_idx = column_indices["单线号"]
-                            if col_idx < len(row.cells):
-                                cell = row.cells[col_idx]
+                            if col_idx < len(cells):
+                                cell = cells[col_idx]
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(line_numbers[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
-                                    print(f"已更新第{row_idx+1}行单线号: {line_numbers[i]}")
+                                    run = add_styled_run(paragraph, str(line_numbers[i]))
+                                    if verbose:
+                                        print(f"已更新第{row_idx+1}行单线号: {line_numbers[i]}")
+
+                run_metrics.count('rows_filled', min(data_count, len(data_rows)))
 
                 # 在数据填充完成后，在下一行的"管道编号"列填写"以下空白"
                 if "管道编号" in column_indices and data_count < len(data_rows):
                     # 找到数据填充后的下一行
                     next_row_idx = data_rows[data_count] if data_count < len(data_rows) else None
                     if next_row_idx is not None:
-                        row = table.rows[next_row_idx]
+                        cells = grid.cells(next_row_idx)
                         col_idx = column_indices["管道编号"]
-                        if col_idx < len(row.cells):
-                            cell = row.cells[col_idx]
+                        if col_idx < len(cells):
+                            cell = cells[col_idx]
                             if cell.paragraphs:
                                 # 设置文本为"以下空白"
                                 cell.paragraphs[0].text = "以下空白"
@@ -588,25 +603,61 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                 cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
                                 print(f"已在第{next_row_idx+1}行管道编号列填写'以下空白'并居中显示")
                 elif "管道编号" in column_indices and data_count > 0:
-                    # 如果没有多余的行，需要添加一行来填写"以下空白"
-                    new_row = table.add_row()
-                    col_idx = column_indices["管道编号"]
-                    if col_idx < len(new_row.cells):
-                        cell = new_row.cells[col_idx]
-                        if cell.paragraphs:
-                            # 设置文本为"以下空白"
-                            cell.paragraphs[0].text = "以下空白"
-                            # 设置居中对齐
-                            cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-                            print(f"已添加新行并在管道编号列填写'以下空白'并居中显示")
+                    # 如果没有多余的行，在最后一个数据行之后插入一行来填写"以下空白"
+                    # （模板中紧跟数据区的"以下空白"行已经在数据之后，不再重复添加）
+                    next_row_idx = data_rows[-1] + 1
+                    next_cells = grid.cells(next_row_idx) if next_row_idx < len(grid) else []
+                    if next_cells and "以下空白" in next_cells[0].text:
+                        print(f"第{next_row_idx+1}行已是'以下空白'行")
+                    else:
+                        cells = grid.cells(grid.insert_rows(data_rows[-1], 1)[0])
+                        col_idx = column_indices["管道编号"]
+                        if col_idx < len(cells):
+                            cell = cells[col_idx]
+                            if cell.paragraphs:
+                                # 设置文本为"以下空白"
+                                cell.paragraphs[0].text = "以下空白"
+                                # 设置居中对齐
+                                cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
+                                print(f"已在第{next_row_idx+1}行插入新行并在管道编号列填写'以下空白'并居中显示")
+
+        return doc, prepared['report_output_path']
+
+    # 对每个委托单编号生成一份报告：准备、填充与保存分阶段流水线执行；
+    # 合并输出时只用一个写入线程，按委托单顺序追加到合并文档，全部完成后只保存一次
+    merged = MergedDocument() if merge_output else None
+    pipeline = ReportPipeline(prepare_order, fill_order,
+                              write=merged.write if merged else save_document,
+                              writer_count=1 if merged else writer_count, profiler=profiler)
+    
+    def finish(success_count, group_count):
+        if merged is not None:
+            return save_merged(merged, merged_output_path(output_dir, template_name, merge_output), group_count)
+        run_metrics.record_reports(success_count, failed=group_count - success_count)
         
-        # 保存文档
-        doc.save(report_output_path)
-        print(f"文档已保存至: {report_output_path}")
-        success_count += 1
+        print(f"\n处理完成: 共处理{group_count}个委托单编号，成功生成{success_count}份报告")
+        return success_count > 0
+    
+    return pipeline.renderer('Ray_Detection', order_numbers, finish)
+
+def process_excel_to_word(excel_path, word_template_path, output_path=None, 
+                         project_name=None, inspection_category=None, 
+                         inspection_standard=None, inspection_method=None, 
+                         groove_type=None, writer_count=None, profile_memory=None, session=None,
+                         merge_output=None):
+    """将Excel数据填入Word文档（参数见 build_renderer）
+
+    Args:
+        profile_memory: 内存分析报告输出目录（可选，设置时按阶段和分组记录内存分配）
     
-    print(f"\n处理完成: 共处理{len(order_numbers)}个委托单编号，成功生成{success_count}份报告")
-    return success_count > 0
+    Returns:
+        bool: 处理是否成功
+    """
+    with profiling(profile_memory) as profiler:
+        renderer = build_renderer(excel_path, word_template_path, output_path, project_name, inspection_category,
+                                  inspection_standard, inspection_method, groove_type, writer_count, profiler,
+                                  session=session, merge_output=merge_output)
+        return renderer.run() if renderer else False
 
 def update_date_in_cell(cell, year, month, day):
     """更新单元格中的日期"""
@@ -636,10 +687,7 @@ def update_date_in_cell(cell, year, month, day):
                         paragraph.add_run(before_text)
 
                     # 添加日期部分，设置楷体五号字体
-                    date_run = paragraph.add_run(new_date)
-                    date_run.font.name = "楷体"
-                    date_run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                    date_run.font.size = Pt(10.5)
+                    date_run = add_styled_run(paragraph, new_date)
 
                     current_pos = match.end()
 
@@ -656,11 +704,8 @@ def update_date_in_cell(cell, year, month, day):
     if not date_found:
         print("未找到日期段落，尝试添加新日期...")
         p = cell.add_paragraph()
-        run = p.add_run(f"{year}年{month}月{day}日")
         # 设置楷体五号字体
-        run.font.name = "楷体"
-        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-        run.font.size = Pt(10.5)
+        run = add_styled_run(p, f"{year}年{month}月{day}日")
         print("已添加日期并设置为楷体五号字体")
 
 def main():
@@ -682,19 +727,34 @@ def main():
                        help='检测方法，用于替换文档中的"检测方法值"')
     parser.add_argument('-g', '--groove', 
                        help='坡口形式，用于替换文档中的"坡口形式值"')
+    parser.add_argument('--writers', type=int, 
+                       help='保存文档的写入线程数量 (默认: 2)')
+    parser.add_argument('--profile-memory', nargs='?', const=PROFILE_CONFIG['output_dir'], metavar='DIR',
+                       help=f"按阶段和分组记录内存分配，报告写入DIR (默认: {PROFILE_CONFIG['output_dir']})")
+    parser.add_argument('--metrics-dir', default=METRICS_CONFIG['output_dir'],
+                       help=f"运行指标输出目录 (默认: {METRICS_CONFIG['output_dir']})")
+    parser.add_argument('--archive',
+                       help='把报告直接写入该归档文件（.zip、.tar、.tar.gz），不写单独的文件')
+    parser.add_argument('--merge', nargs='?', const=True, metavar='FILE',
+                       help='所有委托单填入同一个文档（各委托单之间分节），可指定文件路径 (默认: 输出目录/<模板名>_合并.docx)')
     
     # 解析命令行参数
     args = parser.parse_args()
     
     # 处理Excel到Word的转换
-    success = process_excel_to_word(
-        args.excel, args.word, args.output,
-        args.project, args.category, args.standard, 
-        args.method, args.groove
-    )
+    with archive_output.archive(args.archive) as sink, run_metrics.collect('Ray_Detection', args.metrics_dir) as metrics:
+        success = process_excel_to_word(
+            args.excel, args.word, args.output,
+            args.project, args.category, args.standard, 
+            args.method, args.groove, args.writers,
+            profile_memory=args.profile_memory, merge_output=args.merge
+        )
+        metrics.success = success
+        if sink is not None:
+            sink.success = success
     
-    # 返回状态码
-    sys.exit(0 if success else 1)
+    # 返回状态码（开启归档输出而未能生成归档时同样视为失败）
+    sys.exit(0 if success and archive_output.published(sink) else 1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,11 +2,17 @@ import pandas as pd
 import os
 import sys
 import argparse
+import contextlib
 from docx import Document
-from docx.shared import Pt
-from docx.oxml.ns import qn
 from datetime import datetime
 import re
+from report_pipeline import ReportPipeline
+from ledger_session import group_value, session_for
+from run_styles import add_styled_run, style_run
+import archive_output
+import run_metrics
+from run_metrics import METRICS_CONFIG
+from memory_profile import PROFILE_CONFIG, profiling
 
 def find_column_with_keyword(df, keyword):
     """查找包含指定关键字的列"""
@@ -22,12 +28,8 @@ def set_font_style(paragraph, font_name="楷体", font_size=10.5):
         font_size: 字体大小，默认为10.5磅（五号字体）
     """
     for run in paragraph.runs:
-        # 设置字体名称
-        run.font.name = font_name
-        # 设置中文字体
-        run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
-        # 设置字体大小
-        run.font.size = Pt(font_size)
+        # 设置字体名称、中文字体和字体大小
+        style_run(run, font_name, font_size)
 
 def replace_text_in_paragraph(paragraph, old_text, new_text):
     """在段落中精确替换文本，只对替换的部分设置楷体五号字体
@@ -51,10 +53,7 @@ def replace_text_in_paragraph(paragraph, old_text, new_text):
         for i, part in enumerate(parts):
             if i > 0:
                 # 添加替换的文本（设置楷体五号字体）
-                run = paragraph.add_run(new_text)
-                run.font.name = "楷体"
-                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                run.font.size = Pt(10.5)
+                run = add_styled_run(paragraph, new_text)
 
             if part:
                 # 添加原始文本部分（保持原有格式）
@@ -75,12 +74,12 @@ def get_output_filename(word_template_path, order_number):
     # 生成输出文件名
     return f"{template_name}_{order_number}_生成结果.docx"
 
-def process_excel_to_word(excel_path, word_template_path, output_path=None,
+def build_renderer(excel_path, word_template_path, output_path=None,
                          project_name=None, client_name=None,
                          inspection_standard=None, acceptance_specification=None,
                          inspection_method=None, inspection_tech_level=None,
-                         appearance_check=None, groove_type=None):
-    """将Excel数据填入Word文档
+                         appearance_check=None, groove_type=None, session=None, profiler=None):
+    """准备生成：读取Excel、建立列映射、确定委托单编号，返回逐组生成报告的 GroupRenderer
 
     Args:
         excel_path: Excel表格路径
@@ -94,18 +93,20 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         inspection_tech_level: 检测技术等级，用于替换文档中的"检测技术等级值"
         appearance_check: 外观检查，用于替换文档中的"外观检查值"
         groove_type: 坡口形式，用于替换文档中的"坡口形式值"
+        session: 共享读取会话（可选，ledger_session.LedgerSession），多个生成器共用同一工作簿时只读取一次
+        profiler: 内存分析器（可选，memory_profile.MemoryProfiler，由调用方开始和结束记录）
 
     Returns:
-        bool: 处理是否成功
+        GroupRenderer: 逐组生成器（准备失败时返回None）
     """
     # 检查文件是否存在
     if not os.path.exists(excel_path):
         print(f"错误: Excel文件不存在: {excel_path}")
-        return False
+        return None
         
     if not os.path.exists(word_template_path):
         print(f"错误: Word模板文件不存在: {word_template_path}")
-        return False
+        return None
     
     # 获取模板文件名（不含路径和扩展名）作为子目录名
     template_name = os.path.splitext(os.path.basename(word_template_path))[0]
@@ -118,7 +119,9 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
     
     # 读取Excel数据
     print(f"正在读取Excel文件: {excel_path}")
-    df = pd.read_excel(excel_path)
+    session = session_for(session, excel_path)
+    with profiler.stage("读取Excel") if profiler else contextlib.nullcontext(), run_metrics.stage('read'):
+        df = session.read_excel() if session else pd.read_excel(excel_path)
     
     # 打印所有列名，帮助调试
     print(f"Excel表格列名: {list(df.columns)}")
@@ -188,16 +191,14 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
     for col in required_columns:
         if col not in column_mapping:
             print(f"错误: 未找到必需的列: '{col}'")
-            return False
+            return None
     
     # 按委托单编号分组处理数据
     order_numbers = df[column_mapping['委托单编号']].dropna().unique().tolist()
     print(f"找到{len(order_numbers)}个不同的委托单编号")
     
-    success_count = 0
-    
-    # 对每个委托单编号生成一份报告
-    for order_number in order_numbers:
+    # 准备阶段：提取每个委托单编号的数据
+    def prepare_order(order_number):
         print(f"\n处理委托单编号: {order_number}")
         
         # 筛选该委托单编号的数据
@@ -211,9 +212,9 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         # 1) 获取该组数据中最晚的委托日期
         date_col = column_mapping.get('委托日期')
         if date_col:
-            # 确保日期列是日期类型
-            order_df[date_col] = pd.to_datetime(order_df[date_col], errors='coerce')
-            latest_date = order_df[date_col].max()
+            # 转换为日期类型后取最晚日期（多个模板共用会话时每个委托单只计算一次）
+            latest_date = group_value(session, ('最晚委托日期', date_col), order_number,
+                                      lambda: pd.to_datetime(order_df[date_col], errors='coerce').max())
             
             if pd.isna(latest_date):
                 print(f"警告: 委托单编号 {order_number} 没有有效的委托日期")
@@ -240,7 +241,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         # 获取单个值字段（每个委托单编号只需一个值）
         unit_name = ""
         if '单元名称' in column_mapping:
-            unit_names = order_df[column_mapping['单元名称']].dropna().tolist()
+            unit_names = group_value(session, ('单元名称', column_mapping['单元名称']), order_number,
+                                     lambda: tuple(order_df[column_mapping['单元名称']].dropna()))
             if unit_names:
                 unit_name = unit_names[0]
                 print(f"找到单元名称: {unit_name}")
@@ -268,7 +270,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         
         qualification_level = ""
         if '合格级别' in column_mapping:
-            levels = order_df[column_mapping['合格级别']].dropna().tolist()
+            levels = group_value(session, ('合格级别', column_mapping['合格级别']), order_number,
+                                 lambda: tuple(order_df[column_mapping['合格级别']].dropna()))
             if levels:
                 qualification_level = levels[0]
                 print(f"找到合格级别: {qualification_level}")
@@ -297,7 +300,45 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                         # 无法转换，直接使用原始值
                         inspection_ratio = str(ratio_value)
                 print(f"找到检测比例: {inspection_ratio}")
-        
+
+        return {
+            'order_number': order_number,
+            'report_output_path': report_output_path,
+            'date': (year, month, day),
+            'row_count': len(order_df),
+            'pipe_codes': pipe_codes,
+            'weld_numbers': weld_numbers,
+            'welder_numbers': welder_numbers,
+            'specifications': specifications,
+            'materials': materials,
+            'notes': notes,
+            'line_numbers': line_numbers,
+            'unit_name': unit_name,
+            'welding_method': welding_method,
+            'area_number': area_number,
+            'inspection_timing': inspection_timing,
+            'qualification_level': qualification_level,
+            'inspection_ratio': inspection_ratio,
+        }
+
+    # 填充阶段：打开模板并填充该委托单编号的Word文档
+    def fill_order(prepared):
+        order_number = prepared['order_number']
+        year, month, day = prepared['date']
+        pipe_codes = prepared['pipe_codes']
+        weld_numbers = prepared['weld_numbers']
+        welder_numbers = prepared['welder_numbers']
+        specifications = prepared['specifications']
+        materials = prepared['materials']
+        notes = prepared['notes']
+        line_numbers = prepared['line_numbers']
+        unit_name = prepared['unit_name']
+        welding_method = prepared['welding_method']
+        area_number = prepared['area_number']
+        inspection_timing = prepared['inspection_timing']
+        qualification_level = prepared['qualification_level']
+        inspection_ratio = prepared['inspection_ratio']
+
         # 打开Word文档
         print(f"正在处理Word文档: {word_template_path}")
         doc = Document(word_template_path)
@@ -333,11 +374,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                     if original_text.strip() == key:
                         # 清空段落内容并重新添加
                         paragraph.clear()
-                        run = paragraph.add_run(value)
                         # 设置楷体五号字体
-                        run.font.name = "楷体"
-                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                        run.font.size = Pt(10.5)
+                        run = add_styled_run(paragraph, value)
                         print(f"已将段落中的'{key}'替换为'{value}'并设置为楷体五号字体")
                     else:
                         # 如果段落包含其他内容，需要精确替换
@@ -357,11 +395,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                 if original_text.strip() == key:
                                     # 清空段落内容并重新添加
                                     paragraph.clear()
-                                    run = paragraph.add_run(value)
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, value)
                                     print(f"已将表格单元格中的'{key}'替换为'{value}'并设置为楷体五号字体")
                                 else:
                                     # 如果段落包含其他内容，需要精确替换
@@ -462,6 +497,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                         # 在表格末尾添加一行
                         table.add_row()
                         data_rows.append(len(table.rows) - 1)  # 添加新行的索引
+                    run_metrics.count('rows_added', rows_needed)
                 
                 # 处理每一行数据
                 for i in range(data_count):
@@ -477,11 +513,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(pipe_codes[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, str(pipe_codes[i]))
                                     print(f"已更新第{row_idx+1}行管道编号: {pipe_codes[i]}")
 
                         # 2. 填写焊口号
@@ -492,11 +525,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(weld_numbers[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, str(weld_numbers[i]))
                                     print(f"已更新第{row_idx+1}行焊口号: {weld_numbers[i]}")
 
                         # 3. 填写焊工号
@@ -507,11 +537,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(welder_numbers[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, str(welder_numbers[i]))
                                     print(f"已更新第{row_idx+1}行焊工号: {welder_numbers[i]}")
 
                         # 4. 填写焊口规格
@@ -522,11 +549,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(specifications[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, str(specifications[i]))
                                     print(f"已更新第{row_idx+1}行焊口规格: {specifications[i]}")
 
                         # 5. 填写焊口材质
@@ -537,11 +561,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(materials[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, str(materials[i]))
                                     print(f"已更新第{row_idx+1}行焊口材质: {materials[i]}")
 
                         # 6. 填写备注
@@ -554,11 +575,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     if pd.notna(note):  # 检查是否为NaN
                                         paragraph = cell.paragraphs[0]
                                         paragraph.clear()
-                                        run = paragraph.add_run(str(note))
                                         # 设置楷体五号字体
-                                        run.font.name = "楷体"
-                                        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                        run.font.size = Pt(10.5)
+                                        run = add_styled_run(paragraph, str(note))
                                         print(f"已更新第{row_idx+1}行备注")
 
                         # 7. 填写单线号
@@ -569,20 +587,42 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                 if cell.paragraphs:
                                     paragraph = cell.paragraphs[0]
                                     paragraph.clear()
-                                    run = paragraph.add_run(str(line_numbers[i]))
                                     # 设置楷体五号字体
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    run = add_styled_run(paragraph, str(line_numbers[i]))
                                     print(f"已更新第{row_idx+1}行单线号: {line_numbers[i]}")
         
-        # 保存文档
-        doc.save(report_output_path)
-        print(f"文档已保存至: {report_output_path}")
-        success_count += 1
+        run_metrics.count('rows_filled', prepared['row_count'])
+        return doc, prepared['report_output_path']
+
+    # 对每个委托单编号生成一份报告：准备、填充与保存分阶段流水线执行
+    pipeline = ReportPipeline(prepare_order, fill_order, profiler=profiler)
     
-    print(f"\n处理完成: 共处理{len(order_numbers)}个委托单编号，成功生成{success_count}份报告")
-    return success_count > 0
+    def finish(success_count, group_count):
+        run_metrics.record_reports(success_count, failed=group_count - success_count)
+        print(f"\n处理完成: 共处理{group_count}个委托单编号，成功生成{success_count}份报告")
+        return success_count > 0
+    
+    return pipeline.renderer('Ray_Detection_mode1', order_numbers, finish)
+
+def process_excel_to_word(excel_path, word_template_path, output_path=None,
+                         project_name=None, client_name=None,
+                         inspection_standard=None, acceptance_specification=None,
+                         inspection_method=None, inspection_tech_level=None,
+                         appearance_check=None, groove_type=None, session=None, profile_memory=None):
+    """将Excel数据填入Word文档（参数见 build_renderer）
+
+    Args:
+        profile_memory: 内存分析报告输出目录（可选，设置时按阶段和分组记录内存分配）
+
+    Returns:
+        bool: 处理是否成功
+    """
+    with profiling(profile_memory) as profiler:
+        renderer = build_renderer(excel_path, word_template_path, output_path, project_name, client_name,
+                                  inspection_standard, acceptance_specification, inspection_method,
+                                  inspection_tech_level, appearance_check, groove_type, session=session,
+                                  profiler=profiler)
+        return renderer.run() if renderer else False
 
 def update_date_in_paragraph(paragraph, year, month, day):
     """更新段落中的日期"""
@@ -609,10 +649,7 @@ def update_date_in_paragraph(paragraph, year, month, day):
                     paragraph.add_run(before_text)
 
                 # 添加日期部分，设置楷体五号字体
-                date_run = paragraph.add_run(new_date)
-                date_run.font.name = "楷体"
-                date_run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                date_run.font.size = Pt(10.5)
+                date_run = add_styled_run(paragraph, new_date)
 
                 current_pos = match.end()
 
@@ -655,10 +692,7 @@ def update_date_in_cell(cell, year, month, day):
                         paragraph.add_run(before_text)
 
                     # 添加日期部分，设置楷体五号字体
-                    date_run = paragraph.add_run(new_date)
-                    date_run.font.name = "楷体"
-                    date_run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                    date_run.font.size = Pt(10.5)
+                    date_run = add_styled_run(paragraph, new_date)
 
                     current_pos = match.end()
 
@@ -675,11 +709,8 @@ def update_date_in_cell(cell, year, month, day):
     if not date_found:
         print("未找到日期段落，尝试添加新日期...")
         p = cell.add_paragraph()
-        run = p.add_run(f"{year}年{month}月{day}日")
         # 设置楷体五号字体
-        run.font.name = "楷体"
-        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-        run.font.size = Pt(10.5)
+        run = add_styled_run(p, f"{year}年{month}月{day}日")
         print("已添加日期并设置为楷体五号字体")
 
 def main():
@@ -707,19 +738,30 @@ def main():
                        help='外观检查，用于替换文档中的"外观检查值"')
     parser.add_argument('-g', '--groove',
                        help='坡口形式，用于替换文档中的"坡口形式值"')
+    parser.add_argument('--metrics-dir', default=METRICS_CONFIG['output_dir'],
+                       help=f"运行指标输出目录 (默认: {METRICS_CONFIG['output_dir']})")
+    parser.add_argument('--archive',
+                       help='把报告直接写入该归档文件（.zip、.tar、.tar.gz），不写单独的文件')
+    parser.add_argument('--profile-memory', nargs='?', const=PROFILE_CONFIG['output_dir'], metavar='DIR',
+                       help=f"按阶段和分组记录内存分配，报告写入DIR (默认: {PROFILE_CONFIG['output_dir']})")
 
     # 解析命令行参数
     args = parser.parse_args()
 
     # 处理Excel到Word的转换
-    success = process_excel_to_word(
-        args.excel, args.word, args.output,
-        args.project, args.client, args.standard, args.acceptance,
-        args.method, getattr(args, 'tech_level'), args.appearance, args.groove
-    )
+    with archive_output.archive(args.archive) as sink, run_metrics.collect('Ray_Detection_mode1', args.metrics_dir) as metrics:
+        success = process_excel_to_word(
+            args.excel, args.word, args.output,
+            args.project, args.client, args.standard, args.acceptance,
+            args.method, getattr(args, 'tech_level'), args.appearance, args.groove,
+            profile_memory=args.profile_memory
+        )
+        metrics.success = success
+        if sink is not None:
+            sink.success = success
     
-    # 返回状态码
-    sys.exit(0 if success else 1)
+    # 返回状态码（开启归档输出而未能生成归档时同样视为失败）
+    sys.exit(0 if success and archive_output.published(sink) else 1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,11 +2,18 @@ import pandas as pd
 import os
 import sys
 import argparse
-from docx import Document
-from docx.shared import Pt
-from docx.oxml.ns import qn
+import contextlib
 from datetime import datetime
 import re
+from ledger_session import group_value, session_for
+from template_cache import open_template
+from report_pipeline import ReportPipeline, save_document
+from docx_merge import MergedDocument, merged_output_path, save_merged
+from run_styles import add_styled_run, style_run
+import archive_output
+import run_metrics
+from run_metrics import METRICS_CONFIG
+from memory_profile import PROFILE_CONFIG, profiling
 
 def find_column_with_keyword(df, keyword):
     """查找包含指定关键字的列"""
@@ -16,9 +23,7 @@ def find_column_with_keyword(df, keyword):
 def set_kaiti_font(paragraph):
     """设置段落为楷体五号字体"""
     for run in paragraph.runs:
-        run.font.name = "楷体"
-        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-        run.font.size = Pt(10.5)
+        style_run(run)
 
 def replace_text_with_kaiti_font(paragraph, old_text, new_text):
     """替换段落中的指定文本并只对新文本设置楷体五号字体，保持其他文本的原有格式"""
@@ -51,10 +56,7 @@ def replace_text_with_kaiti_font(paragraph, old_text, new_text):
             for i, part in enumerate(parts):
                 if i > 0:
                     # 添加新文本（楷体五号）
-                    new_run = paragraph.add_run(new_text)
-                    new_run.font.name = "楷体"
-                    new_run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                    new_run.font.size = Pt(10.5)
+                    new_run = add_styled_run(paragraph, new_text)
 
                 if part:  # 如果部分不为空，添加原文本
                     if i == 0:
@@ -114,10 +116,7 @@ def replace_text_with_kaiti_font(paragraph, old_text, new_text):
         for i, part in enumerate(parts):
             if i > 0:
                 # 添加新文本（楷体五号）
-                new_run = paragraph.add_run(new_text)
-                new_run.font.name = "楷体"
-                new_run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                new_run.font.size = Pt(10.5)
+                new_run = add_styled_run(paragraph, new_text)
 
             if part:  # 如果部分不为空，添加原文本
                 text_run = paragraph.add_run(part)
@@ -213,9 +212,7 @@ def set_date_numbers_kaiti_font(paragraph, year, month, day):
                             run.text = part
                             if part.isdigit():
                                 # 数字设置为楷体五号
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                style_run(run)
                             else:
                                 # 非数字保持原有格式
                                 # 保持原有字体名称（包括None的情况）
@@ -234,9 +231,7 @@ def set_date_numbers_kaiti_font(paragraph, year, month, day):
                             new_run = paragraph.add_run(part)
                             if part.isdigit():
                                 # 数字设置为楷体五号
-                                new_run.font.name = "楷体"
-                                new_run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                new_run.font.size = Pt(10.5)
+                                style_run(new_run)
                             else:
                                 # 非数字保持原有格式
                                 # 保持原有字体名称（包括None的情况）
@@ -261,9 +256,7 @@ def set_date_numbers_kaiti_font(paragraph, year, month, day):
         for part in date_parts:
             run = paragraph.add_run(part)
             if part.isdigit():
-                run.font.name = "楷体"
-                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                run.font.size = Pt(10.5)
+                style_run(run)
 
 def get_detection_level_by_method(detection_method):
     """根据检测方法获取对应的检测级别值
@@ -325,8 +318,9 @@ def get_output_filename(word_template_path, order_number):
     # 生成输出文件名
     return f"{template_name}_{order_number}_生成结果.docx"
 
-def process_excel_to_word(excel_path, word_template_path, output_path=None, project_name=None, client_name=None, inspection_method=None):
-    """将Excel数据填入Word文档
+def build_renderer(excel_path, word_template_path, output_path=None, project_name=None, client_name=None, inspection_method=None, session=None,
+                         merge_output=None, profiler=None):
+    """准备生成：读取Excel、建立列映射、确定委托单编号，返回逐组生成报告的 GroupRenderer
     
     Args:
         excel_path: Excel表格路径
@@ -335,18 +329,21 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
         project_name: 工程名称，用于替换文档中的"工程名称参数值"
         client_name: 委托单位，用于替换文档中的"委托单位参数值"
         inspection_method: 检测方法，用于替换文档中的"检测方法参数"
+        session: 共享读取会话（可选，ledger_session.LedgerSession，数据为"荣信聚乙烯PT"工作表）
+        merge_output: 合并输出（可选）：True 时所有委托单填入同一个文档"输出目录/<模板名>_合并.docx"，也可直接指定文件路径；各委托单之间分节
+        profiler: 内存分析器（可选，memory_profile.MemoryProfiler，由调用方开始和结束记录）
     
     Returns:
-        bool: 处理是否成功
+        GroupRenderer: 逐组生成器（准备失败时返回None）
     """
     # 检查文件是否存在
     if not os.path.exists(excel_path):
         print(f"错误: Excel文件不存在: {excel_path}")
-        return False
+        return None
         
     if not os.path.exists(word_template_path):
         print(f"错误: Word模板文件不存在: {word_template_path}")
-        return False
+        return None
     
     # 创建输出目录 - 修改为指定的路径
     output_dir = os.path.join("生成器", "输出报告", "3_表面结果通知单台账","3_表面结果通知单台账_Mode2")
@@ -356,23 +353,26 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
             print(f"创建输出目录: {output_dir}")
         except Exception as e:
             print(f"错误: 无法创建输出目录: {e}")
-            return False
+            return None
     
     # 读取Excel数据 - 指定读取sheet3"荣信聚乙烯PT"
     print(f"正在读取Excel文件: {excel_path}")
+    session = session_for(session, excel_path)
     try:
         # 读取指定的工作表sheet3"荣信聚乙烯PT"
-        df = pd.read_excel(excel_path, sheet_name="荣信聚乙烯PT")
+        with profiler.stage("读取Excel") if profiler else contextlib.nullcontext(), run_metrics.stage('read'):
+            df = session.read_excel() if session else pd.read_excel(excel_path, sheet_name="荣信聚乙烯PT")
         print(f"成功读取Excel文件sheet3'荣信聚乙烯PT'，共有{len(df)}行数据")
     except Exception as e:
         print(f"错误: 无法读取Excel文件sheet3'荣信聚乙烯PT': {e}")
         # 如果指定工作表不存在，尝试读取第一个工作表
         try:
-            df = pd.read_excel(excel_path)
+            with profiler.stage("读取Excel") if profiler else contextlib.nullcontext(), run_metrics.stage('read'):
+                df = pd.read_excel(excel_path)
             print(f"警告: 未找到sheet3'荣信聚乙烯PT'，使用默认工作表，共有{len(df)}行数据")
         except Exception as e2:
             print(f"错误: 无法读取Excel文件: {e2}")
-            return False
+            return None
     
     # 打印所有列名，帮助调试
     print(f"Excel表格列名: {list(df.columns)}")
@@ -428,19 +428,18 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
     # 按委托单编号分组处理数据
     if '委托单编号' not in column_mapping:
         print("错误: 无法找到委托单编号列")
-        return False
+        return None
     
     # 获取所有唯一的委托单编号
     order_numbers = df[column_mapping['委托单编号']].dropna().unique().tolist()
     print(f"找到{len(order_numbers)}个不同的委托单编号: {order_numbers}")
     
-    success_count = 0
-    error_count = 0
+    positions = {order_number: index for index, order_number in enumerate(order_numbers)}
     
-    # 对每个委托单编号生成一份报告
-    for order_number in order_numbers:
+    # 准备阶段：提取每个委托单编号的数据
+    def prepare_order(order_number):
         print(f"\n{'='*50}")
-        print(f"处理委托单编号: {order_number} ({success_count+error_count+1}/{len(order_numbers)})")
+        print(f"处理委托单编号: {order_number} ({positions[order_number]+1}/{len(order_numbers)})")
         print(f"{'='*50}")
         
         try:
@@ -468,9 +467,9 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
             # 1) 获取该组数据中最晚的完成日期
             date_col = column_mapping.get('完成日期')
             if date_col:
-                # 确保日期列是日期类型
-                order_df[date_col] = pd.to_datetime(order_df[date_col], errors='coerce')
-                latest_date = order_df[date_col].max()
+                # 转换为日期类型后取最晚日期（多个模板共用会话时每个委托单只计算一次）
+                latest_date = group_value(session, ('最晚完成日期', date_col), order_number,
+                                          lambda: pd.to_datetime(order_df[date_col], errors='coerce').max())
                 
                 if pd.isna(latest_date):
                     print(f"警告: 委托单编号 {order_number} 没有有效的完成日期")
@@ -495,7 +494,8 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
             # 获取单元名称（第一个非空值）- O列
             unit_name = ""
             if '单元名称' in column_mapping:
-                unit_names = order_df[column_mapping['单元名称']].dropna().tolist()
+                unit_names = group_value(session, ('单元名称', column_mapping['单元名称']), order_number,
+                                         lambda: tuple(order_df[column_mapping['单元名称']].dropna()))
                 if unit_names:
                     unit_name = unit_names[0]
                     print(f"找到单元名称: {unit_name}")
@@ -513,33 +513,53 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                     detection_level = get_detection_level_by_method(detection_method)
                     if detection_level:
                         print(f"根据检测方法 '{detection_method}' 确定检测级别值: '{detection_level}'")
-            
-                    # 打开Word文档
+        except Exception as e:
+            print(f"错误: 处理委托单编号 {order_number} 时出错: {e}")
+            return None
+
+        return {
+            'order_number': order_number,
+            'report_output_path': report_output_path,
+            'date': (year, month, day),
+            'row_count': len(order_df),
+            'inspection_numbers': inspection_numbers,
+            'weld_numbers': weld_numbers,
+            'welder_numbers': welder_numbers,
+            'weld_conditions': weld_conditions,
+            'repair_counts': repair_counts,
+            'unit_name': unit_name,
+            'detection_method': detection_method,
+            'detection_level': detection_level,
+        }
+
+    # 填充阶段：打开模板并填充该委托单编号的Word文档
+    def fill_order(prepared):
+        order_number = prepared['order_number']
+        report_output_path = prepared['report_output_path']
+        year, month, day = prepared['date']
+        inspection_numbers = prepared['inspection_numbers']
+        weld_numbers = prepared['weld_numbers']
+        welder_numbers = prepared['welder_numbers']
+        weld_conditions = prepared['weld_conditions']
+        repair_counts = prepared['repair_counts']
+        unit_name = prepared['unit_name']
+        detection_method = prepared['detection_method']
+        detection_level = prepared['detection_level']
+
+        try:
+            # 打开Word文档
             print(f"正在处理Word文档: {word_template_path}")
             
-            # 检查文件扩展名，使用不同的方法处理.doc和.docx文件
             try:
-                if word_template_path.lower().endswith('.doc'):
-                    # 对于.doc文件，需要先转换为.docx
-                    temp_docx_path = word_template_path + 'x'
-                    print(f"检测到.doc文件，尝试转换为.docx: {temp_docx_path}")
-                    
-                    # 尝试直接打开.doc文件
-                    doc = Document(word_template_path)
-                    doc.save(temp_docx_path)
-                    print(f"成功转换.doc为.docx")
-                    doc = Document(temp_docx_path)
-                else:
-                    # 对于.docx文件，直接打开
-                    # 每次处理新的委托单编号时，重新从模板创建文档对象
-                    # 这确保了每个委托单编号都会生成一个独立的文档
-                    doc = Document(word_template_path)
-                    print(f"成功从模板创建新文档")
+                # .doc文件只在第一次使用时转换为.docx并缓存，之后的委托单共用转换结果
+                # 每次处理新的委托单编号时，从共享的模板缓存重新创建文档对象
+                # 这确保了每个委托单编号都会生成一个独立的文档
+                doc = open_template(word_template_path)
+                print(f"成功从模板创建新文档")
             except Exception as e:
                 print(f"无法打开Word文档: {e}")
                 # 跳过当前委托单编号的处理
-                error_count += 1
-                continue
+                return None
             
             # 替换文档中的参数值
             if project_name or client_name or inspection_method:
@@ -790,10 +810,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                             for i, part in enumerate(parts):
                                 if i > 0:
                                     # 添加单元名称（楷体五号）
-                                    unit_run = paragraph.add_run(unit_name)
-                                    unit_run.font.name = "楷体"
-                                    unit_run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    unit_run.font.size = Pt(10.5)
+                                    unit_run = add_styled_run(paragraph, unit_name)
 
                                 if part:  # 如果部分不为空，添加原文本
                                     text_run = paragraph.add_run(part)
@@ -922,7 +939,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                     print(f"找到{len(data_rows)}行可用于填充数据")
                     
                     # 确定需要填充的数据行数
-                    data_count = len(order_df)
+                    data_count = prepared['row_count']
                     print(f"需要填充{data_count}行数据")
                     
                     # 如果Word表格中的行数不足，需要添加新行
@@ -937,6 +954,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                             # 在表格末尾添加一行
                             new_row = table.add_row()
                             data_rows.append(len(table.rows) - 1)  # 添加新行的索引
+                        run_metrics.count('rows_added', rows_needed)
                     
                     # 处理每一行数据
                     for i in range(data_count):
@@ -1035,6 +1053,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                         if next_row_idx >= len(table.rows):
                             # 如果没有下一行，添加新行
                             new_row = table.add_row()
+                            run_metrics.count('rows_added')
                             next_row_idx = len(table.rows) - 1
                             print(f"添加新行用于'以下空白': 第{next_row_idx+1}行")
 
@@ -1062,23 +1081,47 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None, proj
                                     cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
                                     print(f"已在第{next_row_idx+1}行第一列添加'以下空白'并设置居中对齐和楷体五号字体")
 
-            # 保存文档
-            try:
-                print(f"\n正在保存文档到: {report_output_path}")
-                doc.save(report_output_path)
-                print(f"文档已成功保存至: {report_output_path}")
-                success_count += 1
-            except Exception as e:
-                print(f"错误: 无法保存文档: {e}")
-                error_count += 1
+            run_metrics.count('rows_filled', prepared['row_count'])
+            return doc, report_output_path
         except Exception as e:
             print(f"错误: 处理委托单编号 {order_number} 时出错: {e}")
-            error_count += 1
+            return None
+    
+    # 对每个委托单编号生成一份报告：准备、填充与保存分阶段流水线执行；
+    # 合并输出时只用一个写入线程，按委托单顺序追加到合并文档，全部完成后只保存一次
+    merged = MergedDocument() if merge_output else None
+    pipeline = ReportPipeline(prepare_order, fill_order,
+                              write=merged.write if merged else save_document,
+                              writer_count=1 if merged else None, profiler=profiler)
+    
+    def finish(success_count, group_count):
+        if merged is not None:
+            template_name = os.path.splitext(os.path.basename(word_template_path))[0]
+            return save_merged(merged, merged_output_path(output_dir, template_name, merge_output), group_count)
+
+        error_count = group_count - success_count
+        run_metrics.record_reports(success_count, failed=error_count)
+        print(f"\n处理完成: 共处理{group_count}个委托单编号，成功生成{success_count}份报告，失败{error_count}份")
+        if error_count > 0:
+            print(f"警告: 有{error_count}个委托单编号处理失败，请检查日志")
+        return success_count > 0
+    
+    return pipeline.renderer('Surface_Defect', order_numbers, finish)
+
+def process_excel_to_word(excel_path, word_template_path, output_path=None, project_name=None, client_name=None, inspection_method=None, session=None,
+                         merge_output=None, profile_memory=None):
+    """将Excel数据填入Word文档（参数见 build_renderer）
+
+    Args:
+        profile_memory: 内存分析报告输出目录（可选，设置时按阶段和分组记录内存分配）
     
-    print(f"\n处理完成: 共处理{len(order_numbers)}个委托单编号，成功生成{success_count}份报告，失败{error_count}份")
-    if error_count > 0:
-        print(f"警告: 有{error_count}个委托单编号处理失败，请检查日志")
-    return success_count > 0
+    Returns:
+        bool: 处理是否成功
+    """
+    with profiling(profile_memory) as profiler:
+        renderer = build_renderer(excel_path, word_template_path, output_path, project_name, client_name,
+                                  inspection_method, session=session, merge_output=merge_output, profiler=profiler)
+        return renderer.run() if renderer else False
 
 def main():
     # 创建命令行参数解析器
@@ -1095,15 +1138,28 @@ def main():
                         help='委托单位，用于替换文档中的"委托单位参数值"')
     parser.add_argument('-m', '--method', 
                         help='检测方法，用于替换文档中的"检测方法参数"')
+    parser.add_argument('--metrics-dir', default=METRICS_CONFIG['output_dir'],
+                        help=f"运行指标输出目录 (默认: {METRICS_CONFIG['output_dir']})")
+    parser.add_argument('--archive',
+                        help='把报告直接写入该归档文件（.zip、.tar、.tar.gz），不写单独的文件')
+    parser.add_argument('--merge', nargs='?', const=True, metavar='FILE',
+                        help='所有委托单填入同一个文档（各委托单之间分节），可指定文件路径 (默认: 输出目录/<模板名>_合并.docx)')
+    parser.add_argument('--profile-memory', nargs='?', const=PROFILE_CONFIG['output_dir'], metavar='DIR',
+                        help=f"按阶段和分组记录内存分配，报告写入DIR (默认: {PROFILE_CONFIG['output_dir']})")
     
     # 解析命令行参数
     args = parser.parse_args()
     
     # 处理Excel到Word的转换
-    success = process_excel_to_word(args.excel, args.word, args.output, args.project, args.client, args.method)
+    with archive_output.archive(args.archive) as sink, run_metrics.collect('Surface_Defect', args.metrics_dir) as metrics:
+        success = process_excel_to_word(args.excel, args.word, args.output, args.project, args.client, args.method,
+                                        merge_output=args.merge, profile_memory=args.profile_memory)
+        metrics.success = success
+        if sink is not None:
+            sink.success = success
     
-    # 返回状态码
-    sys.exit(0 if success else 1)
+    # 返回状态码（开启归档输出而未能生成归档时同样视为失败）
+    sys.exit(0 if success and archive_output.published(sink) else 1)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -12,18 +12,25 @@ import os
 import sys
 import pandas as pd
 from docx import Document
-from docx.shared import Pt
-from docx.oxml.ns import qn
 import argparse
 import re
 from datetime import datetime
+from columnar_extract import text_column
+from ledger_session import group_value, session_for
+from report_pipeline import ReportPipeline
+from run_styles import style_run
+from keyword_matcher import KeywordMatcher, scan_table
+import archive_output
+import run_metrics
+from run_metrics import METRICS_CONFIG
+
+# 需要填入日期的单元格关键字（施工单位、监理单位、项目部/装置、检测单位）
+DATE_CELL_MATCHER = KeywordMatcher(["施工单位：", "监理单位：", "项目部/装置：", "检测单位："])
 
 def set_kaiti_font(paragraph):
     """设置段落为楷体五号字体"""
     for run in paragraph.runs:
-        run.font.name = "楷体"
-        run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-        run.font.size = Pt(10.5)
+        style_run(run)
 
 def update_date_in_cell(cell, year, month, day):
     """更新单元格中的日期"""
@@ -63,10 +70,10 @@ def update_date_in_cell(cell, year, month, day):
             set_kaiti_font(cell.paragraphs[0])
             print(f"已添加日期: {year}年{month}月{day}日并设置为楷体五号字体")
 
-def process_excel_to_word(excel_path, word_template_path, output_path=None,
+def build_renderer(excel_path, word_template_path, output_path=None,
                          project_name=None, client_name=None, inspection_unit=None,
-                         inspection_standard=None):
-    """将Excel数据填入Word文档 - Mode1模式
+                         inspection_standard=None, session=None):
+    """准备生成 - Mode1模式：读取Excel、建立列映射、按委托单编号分组，返回逐组生成报告的 GroupRenderer
     
     Args:
         excel_path: Excel表格路径
@@ -77,18 +84,19 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         inspection_unit: 检测单位，用于替换文档中的"检测单位值"
         inspection_standard: 检测标准，用于替换文档中的"检测标准值"
         inspection_method: 检测方法，用于替换文档中的"检测方法值"
+        session: 共享读取会话（可选，ledger_session.LedgerSession，数据为"荣信聚乙烯PT"工作表）
     
     Returns:
-        bool: 处理是否成功
+        GroupRenderer: 逐组生成器（准备失败时返回None）
     """
     # 检查文件是否存在
     if not os.path.exists(excel_path):
         print(f"错误: Excel文件不存在: {excel_path}")
-        return False
+        return None
         
     if not os.path.exists(word_template_path):
         print(f"错误: Word模板文件不存在: {word_template_path}")
-        return False
+        return None
     
     # 创建输出目录
     if output_path:
@@ -107,19 +115,22 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
     try:
         # 读取Excel文件 - 指定读取sheet3"荣信聚乙烯PT"
         print(f"正在读取Excel文件: {excel_path}")
+        session = session_for(session, excel_path)
         try:
             # 读取指定的工作表sheet3"荣信聚乙烯PT"
-            df = pd.read_excel(excel_path, sheet_name="荣信聚乙烯PT")
+            with run_metrics.stage('read'):
+                df = session.read_excel() if session else pd.read_excel(excel_path, sheet_name="荣信聚乙烯PT")
             print(f"Excel文件sheet3'荣信聚乙烯PT'读取成功，共{len(df)}行数据")
         except Exception as e:
             print(f"错误: 无法读取Excel文件sheet3'荣信聚乙烯PT': {e}")
             # 如果指定工作表不存在，尝试读取第一个工作表
             try:
-                df = pd.read_excel(excel_path)
+                with run_metrics.stage('read'):
+                    df = pd.read_excel(excel_path)
                 print(f"警告: 未找到sheet3'荣信聚乙烯PT'，使用默认工作表，共{len(df)}行数据")
             except Exception as e2:
                 print(f"错误: 无法读取Excel文件: {e2}")
-                return False
+                return None
         
         # 显示列名以便调试
         print("Excel文件列名:")
@@ -193,56 +204,129 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
         for col in required_columns:
             if col not in column_mapping:
                 print(f"错误: 未找到必需的列: '{col}'")
-                return False
+                return None
         
         # 按委托单编号分组
         order_column = column_mapping['委托单编号']
-        grouped = df.groupby(order_column)
+        if session:
+            # 使用共享会话中已分组的数据
+            grouped = session.partitions(order_column, sort=True).items()
+        else:
+            grouped = df.groupby(order_column)
         
         print(f"\n按委托单编号分组，共{len(grouped)}组:")
         for order_number, group in grouped:
             print(f"  委托单编号: {order_number}, 数据行数: {len(group)}")
         
         # 处理每个委托单编号的数据
-        success_count = 0
-        error_count = 0
+        groups = {order_number: group_data for order_number, group_data in grouped}
         
-        for order_number, group_data in grouped:
-            try:
-                print(f"\n==== 处理委托单编号: {order_number} ====")
-                print(f"该组数据行数: {len(group_data)}")
-                
-                # 加载Word模板
-                doc = Document(word_template_path)
-                print("Word模板加载成功")
-                
-                # 获取完成日期的最晚日期
-                completion_date_column = column_mapping.get('完成日期')
-                if completion_date_column:
-                    completion_dates = group_data[completion_date_column].dropna()
-                    if not completion_dates.empty:
-                        # 转换为日期类型并找到最晚日期
-                        try:
-                            completion_dates_converted = pd.to_datetime(completion_dates, errors='coerce')
-                            latest_completion_date = completion_dates_converted.max()
-                            
-                            if pd.notna(latest_completion_date):
-                                year = latest_completion_date.year
-                                month = latest_completion_date.month
-                                day = latest_completion_date.day
-                                print(f"最晚完成日期: {year}年{month}月{day}日")
-                            else:
-                                print("警告: 无法解析完成日期")
-                                year, month, day = 2024, 1, 1
-                        except Exception as e:
-                            print(f"日期转换错误: {e}")
+        # 准备阶段：提取该委托单编号的日期、单值和表格数据
+        def prepare_order(order_number):
+            group_data = groups[order_number]
+            print(f"\n==== 处理委托单编号: {order_number} ====")
+            print(f"该组数据行数: {len(group_data)}")
+            
+            # 获取完成日期的最晚日期
+            completion_date_column = column_mapping.get('完成日期')
+            if completion_date_column:
+                completion_dates = group_data[completion_date_column].dropna()
+                if not completion_dates.empty:
+                    # 转换为日期类型并找到最晚日期
+                    try:
+                        # 多个模板共用会话时每个委托单只计算一次
+                        latest_completion_date = group_value(
+                            session, ('最晚完成日期', completion_date_column), order_number,
+                            lambda: pd.to_datetime(group_data[completion_date_column], errors='coerce').max())
+                        
+                        if pd.notna(latest_completion_date):
+                            year = latest_completion_date.year
+                            month = latest_completion_date.month
+                            day = latest_completion_date.day
+                            print(f"最晚完成日期: {year}年{month}月{day}日")
+                        else:
+                            print("警告: 无法解析完成日期")
                             year, month, day = 2024, 1, 1
-                    else:
-                        print("警告: 完成日期列为空")
+                    except Exception as e:
+                        print(f"日期转换错误: {e}")
                         year, month, day = 2024, 1, 1
                 else:
-                    print("警告: 未找到完成日期列")
+                    print("警告: 完成日期列为空")
                     year, month, day = 2024, 1, 1
+            else:
+                print("警告: 未找到完成日期列")
+                year, month, day = 2024, 1, 1
+            
+            # 获取合格级别值
+            qualification_level = ""
+            if '合格级别' in column_mapping:
+                qual_values = group_value(session, ('合格级别', column_mapping['合格级别']), order_number,
+                                          lambda: tuple(group_data[column_mapping['合格级别']].dropna()))
+                if qual_values:
+                    qualification_level = str(qual_values[0])
+                    print(f"合格级别值: {qualification_level}")
+            
+            # 获取单元名称值
+            unit_name = ""
+            if '单元名称' in column_mapping:
+                unit_values = group_value(session, ('单元名称', column_mapping['单元名称']), order_number,
+                                          lambda: tuple(group_data[column_mapping['单元名称']].dropna()))
+                if unit_values:
+                    unit_name = str(unit_values[0])
+                    print(f"单元名称值: {unit_name}")
+
+            # 获取检测方法值
+            detection_method = ""
+            if '检测方法' in column_mapping:
+                method_values = group_data[column_mapping['检测方法']].dropna()
+                if not method_values.empty:
+                    detection_method = str(method_values.iloc[0])
+                    print(f"检测方法值: {detection_method}")
+
+            # 准备数据 - 根据新需求更新（按列一次性提取）
+            def extract_text(key):
+                return text_column(group_data, column_mapping[key]) if key in column_mapping else []
+
+            pipe_numbers = extract_text('检件编号')            # 检件编号 (D列)
+            weld_numbers = extract_text('焊口编号')            # 焊口编号 (E列)
+            materials = extract_text('材质')                   # 材质 (H列)
+            specifications = extract_text('规格')              # 规格 (G列)
+            detection_quantities = extract_text('检测数量')    # 检测数量 (S列)
+            weld_conditions = extract_text('焊口情况')         # 焊口情况/合格 (K列)
+
+
+            return {
+                'order_number': order_number,
+                'date': (year, month, day),
+                'row_count': len(group_data),
+                'qualification_level': qualification_level,
+                'unit_name': unit_name,
+                'detection_method': detection_method,
+                'pipe_numbers': pipe_numbers,
+                'weld_numbers': weld_numbers,
+                'materials': materials,
+                'specifications': specifications,
+                'detection_quantities': detection_quantities,
+                'weld_conditions': weld_conditions,
+            }
+        
+        # 填充阶段：加载Word模板并填充该委托单编号的文档
+        def fill_order(prepared):
+            order_number = prepared['order_number']
+            year, month, day = prepared['date']
+            qualification_level = prepared['qualification_level']
+            unit_name = prepared['unit_name']
+            detection_method = prepared['detection_method']
+            pipe_numbers = prepared['pipe_numbers']
+            weld_numbers = prepared['weld_numbers']
+            materials = prepared['materials']
+            specifications = prepared['specifications']
+            detection_quantities = prepared['detection_quantities']
+            weld_conditions = prepared['weld_conditions']
+            try:
+                # 加载Word模板
+                doc = Document(word_template_path)
+                print("Word模板加载成功")
                 
                 # 替换文档中的参数值
                 if any([project_name, client_name, inspection_unit, inspection_standard]):
@@ -260,36 +344,28 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                             for run in paragraph.runs:
                                 if "工程名称值" in run.text:
                                     run.text = run.text.replace("工程名称值", project_name)
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    style_run(run)
                             print(f"已将段落中的'工程名称值'替换为'{project_name}'并设置为楷体五号字体")
 
                         if client_name and "委托单位值" in paragraph.text:
                             for run in paragraph.runs:
                                 if "委托单位值" in run.text:
                                     run.text = run.text.replace("委托单位值", client_name)
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    style_run(run)
                             print(f"已将段落中的'委托单位值'替换为'{client_name}'并设置为楷体五号字体")
 
                         if inspection_unit and "检测单位值" in paragraph.text:
                             for run in paragraph.runs:
                                 if "检测单位值" in run.text:
                                     run.text = run.text.replace("检测单位值", inspection_unit)
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    style_run(run)
                             print(f"已将段落中的'检测单位值'替换为'{inspection_unit}'并设置为楷体五号字体")
 
                         if inspection_standard and "检测标准值" in paragraph.text:
                             for run in paragraph.runs:
                                 if "检测标准值" in run.text:
                                     run.text = run.text.replace("检测标准值", inspection_standard)
-                                    run.font.name = "楷体"
-                                    run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                    run.font.size = Pt(10.5)
+                                    style_run(run)
                             print(f"已将段落中的'检测标准值'替换为'{inspection_standard}'并设置为楷体五号字体")
 
                     # 2. 遍历表格中的单元格，替换参数值 - 保持原有格式
@@ -301,9 +377,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                         for run in paragraph.runs:
                                             if "工程名称值" in run.text:
                                                 run.text = run.text.replace("工程名称值", project_name)
-                                                run.font.name = "楷体"
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                run.font.size = Pt(10.5)
+                                                style_run(run)
                                     print(f"已将表格中的'工程名称值'替换为'{project_name}'并设置为楷体五号字体")
 
                                 if client_name and "委托单位值" in cell.text:
@@ -311,9 +385,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                         for run in paragraph.runs:
                                             if "委托单位值" in run.text:
                                                 run.text = run.text.replace("委托单位值", client_name)
-                                                run.font.name = "楷体"
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                run.font.size = Pt(10.5)
+                                                style_run(run)
                                     print(f"已将表格中的'委托单位值'替换为'{client_name}'并设置为楷体五号字体")
 
                                 if inspection_unit and "检测单位值" in cell.text:
@@ -321,9 +393,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                         for run in paragraph.runs:
                                             if "检测单位值" in run.text:
                                                 run.text = run.text.replace("检测单位值", inspection_unit)
-                                                run.font.name = "楷体"
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                run.font.size = Pt(10.5)
+                                                style_run(run)
                                     print(f"已将表格中的'检测单位值'替换为'{inspection_unit}'并设置为楷体五号字体")
 
                                 if inspection_standard and "检测标准值" in cell.text:
@@ -331,38 +401,12 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                         for run in paragraph.runs:
                                             if "检测标准值" in run.text:
                                                 run.text = run.text.replace("检测标准值", inspection_standard)
-                                                run.font.name = "楷体"
-                                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                                run.font.size = Pt(10.5)
+                                                style_run(run)
                                     print(f"已将表格中的'检测标准值'替换为'{inspection_standard}'并设置为楷体五号字体")
                 
                 # 处理单值替换（合格级别、单元名称、完成日期）
                 print("\n==== 开始处理单值替换 ====")
                 
-                # 获取合格级别值
-                qualification_level = ""
-                if '合格级别' in column_mapping:
-                    qual_values = group_data[column_mapping['合格级别']].dropna()
-                    if not qual_values.empty:
-                        qualification_level = str(qual_values.iloc[0])
-                        print(f"合格级别值: {qualification_level}")
-                
-                # 获取单元名称值
-                unit_name = ""
-                if '单元名称' in column_mapping:
-                    unit_values = group_data[column_mapping['单元名称']].dropna()
-                    if not unit_values.empty:
-                        unit_name = str(unit_values.iloc[0])
-                        print(f"单元名称值: {unit_name}")
-
-                # 获取检测方法值
-                detection_method = ""
-                if '检测方法' in column_mapping:
-                    method_values = group_data[column_mapping['检测方法']].dropna()
-                    if not method_values.empty:
-                        detection_method = str(method_values.iloc[0])
-                        print(f"检测方法值: {detection_method}")
-
                 # 获取委托单编号值（同一个委托单编号只需选一个）
                 order_number_value = order_number  # 直接使用当前处理的委托单编号
                 print(f"委托单编号值: {order_number_value}")
@@ -374,36 +418,28 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                         for run in paragraph.runs:
                             if "合格级别值" in run.text:
                                 run.text = run.text.replace("合格级别值", qualification_level)
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                style_run(run)
                         print(f"已将'合格级别值'替换为'{qualification_level}'并设置为楷体五号字体")
 
                     if "单元名称值" in paragraph.text and unit_name:
                         for run in paragraph.runs:
                             if "单元名称值" in run.text:
                                 run.text = run.text.replace("单元名称值", unit_name)
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                style_run(run)
                         print(f"已将'单元名称值'替换为'{unit_name}'并设置为楷体五号字体")
 
                     if "检测方法值" in paragraph.text and detection_method:
                         for run in paragraph.runs:
                             if "检测方法值" in run.text:
                                 run.text = run.text.replace("检测方法值", detection_method)
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                style_run(run)
                         print(f"已将'检测方法值'替换为'{detection_method}'并设置为楷体五号字体")
 
                     if "委托单编号值" in paragraph.text and order_number_value:
                         for run in paragraph.runs:
                             if "委托单编号值" in run.text:
                                 run.text = run.text.replace("委托单编号值", order_number_value)
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                style_run(run)
                         print(f"已将'委托单编号值'替换为'{order_number_value}'并设置为楷体五号字体")
 
                     if "完成日期值" in paragraph.text:
@@ -411,9 +447,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                         for run in paragraph.runs:
                             if "完成日期值" in run.text:
                                 run.text = run.text.replace("完成日期值", completion_date_str)
-                                run.font.name = "楷体"
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                run.font.size = Pt(10.5)
+                                style_run(run)
                         print(f"已将'完成日期值'替换为'{completion_date_str}'并设置为楷体五号字体")
 
                 # 处理表格中的单值替换 - 保持原有格式
@@ -426,9 +460,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     for run in paragraph.runs:
                                         if "合格级别值" in run.text:
                                             run.text = run.text.replace("合格级别值", qualification_level)
-                                            run.font.name = "楷体"
-                                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                            run.font.size = Pt(10.5)
+                                            style_run(run)
                                 print(f"已将表格中的'合格级别值'替换为'{qualification_level}'并设置为楷体五号字体")
 
                             if "单元名称值" in cell.text and unit_name:
@@ -436,9 +468,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     for run in paragraph.runs:
                                         if "单元名称值" in run.text:
                                             run.text = run.text.replace("单元名称值", unit_name)
-                                            run.font.name = "楷体"
-                                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                            run.font.size = Pt(10.5)
+                                            style_run(run)
                                 print(f"已将表格中的'单元名称值'替换为'{unit_name}'并设置为楷体五号字体")
 
                             if "检测方法值" in cell.text and detection_method:
@@ -446,9 +476,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     for run in paragraph.runs:
                                         if "检测方法值" in run.text:
                                             run.text = run.text.replace("检测方法值", detection_method)
-                                            run.font.name = "楷体"
-                                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                            run.font.size = Pt(10.5)
+                                            style_run(run)
                                 print(f"已将表格中的'检测方法值'替换为'{detection_method}'并设置为楷体五号字体")
 
                             if "委托单号编号值" in cell.text and order_number_value:
@@ -456,9 +484,7 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     for run in paragraph.runs:
                                         if "委托单号编号值" in run.text:
                                             run.text = run.text.replace("委托单号编号值", order_number_value)
-                                            run.font.name = "楷体"
-                                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                            run.font.size = Pt(10.5)
+                                            style_run(run)
                                 print(f"已将表格中的'委托单号编号值'替换为'{order_number_value}'并设置为楷体五号字体")
 
                             if "完成日期值" in cell.text:
@@ -467,21 +493,17 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                                     for run in paragraph.runs:
                                         if "完成日期值" in run.text:
                                             run.text = run.text.replace("完成日期值", completion_date_str)
-                                            run.font.name = "楷体"
-                                            run._element.rPr.rFonts.set(qn('w:eastAsia'), "楷体")
-                                            run.font.size = Pt(10.5)
+                                            style_run(run)
                                 print(f"已将表格中的'完成日期值'替换为'{completion_date_str}'并设置为楷体五号字体")
 
                 # 处理日期填入（施工单位、监理单位、项目部/装置、检测单位）
                 print("\n==== 开始处理日期填入 ====")
-                date_keywords = ["施工单位：", "监理单位：", "项目部/装置：", "检测单位："]
 
                 for table in doc.tables:
-                    for row in table.rows:
-                        for cell in row.cells:
-                            cell_text = cell.text.strip()
-                            for keyword in date_keywords:
-                                if keyword in cell_text:
+                    for _, cells in scan_table(table, DATE_CELL_MATCHER):
+                        for _, cell, _, hits in cells:
+                            for keyword in DATE_CELL_MATCHER.keywords:
+                                if keyword in hits:
                                     print(f"找到{keyword}单元格")
                                     # 更新单元格中的日期
                                     update_date_in_cell(cell, year, month, day)
@@ -489,45 +511,6 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                 # 处理表格数据填入
                 print("\n==== 开始处理表格数据填入 ====")
 
-                # 准备数据 - 根据新需求更新
-                pipe_numbers = []  # 检件编号 (D列)
-                weld_numbers = []  # 焊口编号 (E列)
-                materials = []     # 材质 (H列)
-                specifications = [] # 规格 (G列)
-                detection_quantities = [] # 检测数量 (S列)
-                weld_conditions = [] # 焊口情况/合格 (K列)
-
-                for _, row in group_data.iterrows():
-                    # 检件编号 (D列)
-                    if '检件编号' in column_mapping:
-                        pipe_num = row[column_mapping['检件编号']]
-                        pipe_numbers.append(str(pipe_num) if pd.notna(pipe_num) else "")
-
-                    # 焊口编号 (E列)
-                    if '焊口编号' in column_mapping:
-                        weld_num = row[column_mapping['焊口编号']]
-                        weld_numbers.append(str(weld_num) if pd.notna(weld_num) else "")
-
-                    # 材质 (H列)
-                    if '材质' in column_mapping:
-                        material = row[column_mapping['材质']]
-                        materials.append(str(material) if pd.notna(material) else "")
-
-                    # 规格 (G列)
-                    if '规格' in column_mapping:
-                        spec = row[column_mapping['规格']]
-                        specifications.append(str(spec) if pd.notna(spec) else "")
-
-                    # 检测数量 (S列)
-                    if '检测数量' in column_mapping:
-                        detection_qty = row[column_mapping['检测数量']]
-                        detection_quantities.append(str(detection_qty) if pd.notna(detection_qty) else "")
-
-                    # 焊口情况/合格 (K列)
-                    if '焊口情况' in column_mapping:
-                        weld_condition = row[column_mapping['焊口情况']]
-                        weld_conditions.append(str(weld_condition) if pd.notna(weld_condition) else "")
-
                 print(f"准备填入表格的数据行数: {len(pipe_numbers)}")
 
                 # 查找并填入表格数据
@@ -787,28 +770,43 @@ def process_excel_to_word(excel_path, word_template_path, output_path=None,
                 # 保存文档
                 report_output_path = os.path.join(output_dir, f"3_表面结果通知单台账_Mode1_{order_number}.docx")
                 
-                try:
-                    print(f"\n正在保存文档到: {report_output_path}")
-                    doc.save(report_output_path)
-                    print(f"文档已成功保存至: {report_output_path}")
-                    success_count += 1
-                except Exception as e:
-                    print(f"错误: 无法保存文档: {e}")
-                    error_count += 1
+                print(f"\n正在保存文档到: {report_output_path}")
+                run_metrics.count('rows_filled', prepared['row_count'])
+                return doc, report_output_path
                     
             except Exception as e:
                 print(f"错误: 处理委托单编号 {order_number} 时出错: {e}")
-                error_count += 1
+                return None
+        
+        # 准备、填充与保存分阶段流水线执行
+        pipeline = ReportPipeline(prepare_order, fill_order)
         
-        print(f"\n==== 处理完成 ====")
-        print(f"成功处理: {success_count} 个文档")
-        print(f"处理失败: {error_count} 个文档")
+        def finish(success_count, group_count):
+            error_count = group_count - success_count
+            run_metrics.record_reports(success_count, failed=error_count)
+            print(f"\n==== 处理完成 ====")
+            print(f"成功处理: {success_count} 个文档")
+            print(f"处理失败: {error_count} 个文档")
+            
+            return error_count == 0
         
-        return error_count == 0
+        return pipeline.renderer('Surface_Defect_mode1', list(groups), finish)
         
     except Exception as e:
         print(f"错误: 处理过程中出现异常: {e}")
-        return False
+        return None
+
+def process_excel_to_word(excel_path, word_template_path, output_path=None,
+                         project_name=None, client_name=None, inspection_unit=None,
+                         inspection_standard=None, session=None):
+    """将Excel数据填入Word文档 - Mode1模式（参数见 build_renderer）
+    
+    Returns:
+        bool: 处理是否成功
+    """
+    renderer = build_renderer(excel_path, word_template_path, output_path, project_name, client_name,
+                              inspection_unit, inspection_standard, session=session)
+    return renderer.run() if renderer else False
 
 def main():
     # 创建命令行参数解析器
@@ -827,19 +825,27 @@ def main():
                         help='检测单位，用于替换文档中的"检测单位值"')
     parser.add_argument('-s', '--standard',
                         help='检测标准，用于替换文档中的"检测标准值"')
+    parser.add_argument('--metrics-dir', default=METRICS_CONFIG['output_dir'],
+                        help=f"运行指标输出目录 (默认: {METRICS_CONFIG['output_dir']})")
+    parser.add_argument('--archive',
+                        help='把报告直接写入该归档文件（.zip、.tar、.tar.gz），不写单独的文件')
     
     # 解析命令行参数
     args = parser.parse_args()
     
     # 处理Excel到Word的转换
-    success = process_excel_to_word(
-        args.excel, args.word, args.output,
-        args.project, args.client, args.unit,
-        args.standard
-    )
+    with archive_output.archive(args.archive) as sink, run_metrics.collect('Surface_Defect_mode1', args.metrics_dir) as metrics:
+        success = process_excel_to_word(
+            args.excel, args.word, args.output,
+            args.project, args.client, args.unit,
+            args.standard
+        )
+        metrics.success = success
+        if sink is not None:
+            sink.success = success
     
-    # 返回状态码
-    sys.exit(0 if success else 1)
+    # 返回状态码（开启归档输出而未能生成归档时同样视为失败）
+    sys.exit(0 if success and archive_output.published(sink) else 1)
 
 if __name__ == "__main__":
     main()
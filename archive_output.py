@@ -0,0 +1,276 @@
+"""
+报告直接写入归档文件
+
+下游系统每次运行需要一个归档文件，原来在生成完成后再把 生成器/输出报告 打包：
+每份docx先写一次文件，打包时再读一次、写一次。
+
+本模块：
+1. archive(路径) 开启归档输出：运行期间 docx_writer.save_docx 不再写单独的文件，
+   而是把文档内容直接写入一个 .zip 或 .tar（.tar.gz/.tgz）归档
+2. 归档只由一个写入线程写入，生成器的多个写入线程、流水线线程可以同时提交文档；
+   提交队列有长度上限，写入跟不上时提交方等待，内存不会无限增长
+3. 每份报告在归档的 manifest.json 中记录一条：归档内路径、原输出路径、字节数、SHA-256、内容哈希和生成模块
+4. 归档先写临时文件，运行成功结束后再改名；运行失败时不留下不完整的归档。
+   生成器把运行结果记入 sink.success（与运行指标的 metrics.success 相同），
+   归档未能生成时 published(sink) 为False，命令行以非零状态码退出
+
+子进程中的文档由 capture() 暂存，随结果返回父进程后用 merge() 写入父进程的归档（与运行指标的汇总方式相同）。
+"""
+
+import calendar
+import contextvars
+import hashlib
+import io
+import json
+import os
+import queue
+import tarfile
+import threading
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import run_metrics
+
+# 归档输出配置
+ARCHIVE_CONFIG = {
+    'base_dir': os.path.join("生成器", "输出报告"),   # 归档内路径相对于该目录（其他目录的文件保留上级目录名）
+    'queue_size': 16,                                # 等待写入的文档数量上限
+    'manifest_name': 'manifest.json',                # 清单文件名
+    'date_time': (1980, 1, 1, 0, 0, 0),              # 归档条目的固定时间戳，与docx内部条目一致
+}
+
+_current = contextvars.ContextVar('archive_output', default=None)
+_STOP = object()
+
+
+def archive_format(path: str) -> str:
+    """按扩展名判断归档格式：'zip'、'tar' 或 'tar.gz'"""
+    lower = path.lower()
+    if lower.endswith('.zip'):
+        return 'zip'
+    if lower.endswith(('.tar.gz', '.tgz')):
+        return 'tar.gz'
+    if lower.endswith('.tar'):
+        return 'tar'
+    raise ValueError(f"不支持的归档格式（应为 .zip、.tar、.tar.gz 或 .tgz）: {path}")
+
+
+def entry_name(output_path: str, base_dir: Optional[str] = None) -> str:
+    """报告在归档内的路径：相对于输出根目录；不在输出根目录下时保留上级目录名和文件名"""
+    base_dir = os.path.abspath(base_dir or ARCHIVE_CONFIG['base_dir'])
+    path = os.path.abspath(output_path)
+    relative = os.path.relpath(path, base_dir) if os.path.splitdrive(path)[0] == os.path.splitdrive(base_dir)[0] else '..'
+    if relative.startswith('..'):
+        relative = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return relative.replace(os.sep, '/')
+
+
+class ArchiveSink:
+    """单写入线程的归档输出
+
+    Args:
+        archive_path: 归档文件路径（.zip、.tar、.tar.gz 或 .tgz）
+        base_dir: 归档内路径的根目录（默认: ARCHIVE_CONFIG['base_dir']）
+        queue_size: 等待写入的文档数量上限（默认: ARCHIVE_CONFIG['queue_size']）
+    """
+
+    def __init__(self, archive_path: str, base_dir: Optional[str] = None, queue_size: Optional[int] = None):
+        self.archive_path = archive_path
+        self.format = archive_format(archive_path)
+        self.base_dir = base_dir or ARCHIVE_CONFIG['base_dir']
+        self.manifest: List[Dict[str, Any]] = []
+        self._queue = queue.Queue(maxsize=queue_size or ARCHIVE_CONFIG['queue_size'])
+        self._temp_path = f"{archive_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        self._names = set()
+        self._error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = None
+        self._archive = None
+        self.success: Optional[bool] = None     # 运行结果，由调用方设置；为False时不生成归档
+        self.published = False                  # 是否已生成归档
+
+    def open(self):
+        """创建临时归档并启动写入线程"""
+        directory = os.path.dirname(self.archive_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.format == 'zip':
+            self._archive = zipfile.ZipFile(self._temp_path, 'w')
+        else:
+            self._archive = tarfile.open(self._temp_path, 'w:gz' if self.format == 'tar.gz' else 'w',
+                                         format=tarfile.PAX_FORMAT)
+        self._thread = threading.Thread(target=self._writer, name='archive-writer', daemon=True)
+        self._thread.start()
+        print(f"归档输出已开启，报告将写入: {self.archive_path}")
+
+    def add(self, output_path: str, data: bytes, content_hash: Optional[str] = None, module: Optional[str] = None):
+        """提交一份报告（可在任意线程调用，队列已满时等待）
+
+        Args:
+            output_path: 生成器原本的输出路径
+            data: docx文件内容
+            content_hash: 文档内容的规范哈希（docx_writer.parts_hash）
+            module: 生成模块（默认取当前运行指标的模块名）
+        """
+        if self._error is not None:
+            raise RuntimeError(f"归档写入失败: {self._error}")
+        if module is None:
+            metrics = run_metrics.current()
+            module = metrics.module if metrics is not None else None
+        self._queue.put((output_path, data, content_hash, module))
+
+    def merge(self, entries: Optional[List[tuple]]):
+        """写入子进程暂存的报告"""
+        for output_path, data, content_hash, module in entries or ():
+            self.add(output_path, data, content_hash, module)
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._write_entry(*item)
+            except BaseException as e:
+                self._error = e
+
+    def _write_entry(self, output_path, data, content_hash, module):
+        name = entry_name(output_path, self.base_dir)
+        if name in self._names:
+            raise ValueError(f"归档中已有同名报告: {name}")
+        self._names.add(name)
+        self._write_member(name, data)
+        self.manifest.append({
+            'name': name,
+            'output_path': output_path,
+            'size': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'content_hash': content_hash,
+            'module': module,
+        })
+
+    def _write_member(self, name: str, data: bytes):
+        if self.format == 'zip':
+            # docx本身已经是压缩的zip，直接存储，不再重复压缩
+            info = zipfile.ZipInfo(name, date_time=ARCHIVE_CONFIG['date_time'])
+            info.compress_type = zipfile.ZIP_STORED
+            info.create_system = 0
+            info.external_attr = 0o600 << 16
+            self._archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = calendar.timegm(ARCHIVE_CONFIG['date_time'])
+            info.mode = 0o600
+            self._archive.addfile(info, io.BytesIO(data))
+
+    def close(self, success: bool = True) -> bool:
+        """等待写入线程写完，写入清单并生成归档；运行失败或写入出错时删除临时归档
+
+        Returns:
+            bool: 是否生成了归档
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+        try:
+            if success and self._error is None:
+                manifest = {
+                    'created_at': datetime.now().isoformat(timespec='seconds'),
+                    'report_count': len(self.manifest),
+                    'reports': self.manifest,
+                }
+                self._write_member(ARCHIVE_CONFIG['manifest_name'],
+                                   json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+            self._archive.close()
+            if success and self._error is None:
+                os.replace(self._temp_path, self.archive_path)
+                print(f"归档已生成: {self.archive_path}（{len(self.manifest)}份报告）")
+                return True
+            if self._error is not None:
+                print(f"错误: 归档写入失败，未生成归档: {self._error}")
+            else:
+                print(f"运行失败，未生成归档: {self.archive_path}")
+            return False
+        finally:
+            if os.path.exists(self._temp_path):
+                os.remove(self._temp_path)
+
+
+class BufferSink:
+    """子进程中暂存报告，随结果返回父进程"""
+
+    def __init__(self):
+        self.entries: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def add(self, output_path: str, data: bytes, content_hash: Optional[str] = None, module: Optional[str] = None):
+        if module is None:
+            metrics = run_metrics.current()
+            module = metrics.module if metrics is not None else None
+        with self._lock:
+            self.entries.append((output_path, data, content_hash, module))
+
+
+def current():
+    """返回当前上下文中的归档输出（没有时返回None，报告正常写入文件）"""
+    return _current.get()
+
+
+def merge(entries: Optional[List[tuple]]):
+    """把子进程暂存的报告写入当前归档"""
+    sink = _current.get()
+    if sink is not None and entries:
+        sink.merge(entries)
+
+
+@contextmanager
+def archive(archive_path: Optional[str], base_dir: Optional[str] = None):
+    """在归档输出中运行（archive_path 为空时报告正常写入文件）
+
+    Args:
+        archive_path: 归档文件路径
+        base_dir: 归档内路径的根目录
+
+    Yields:
+        ArchiveSink: 归档输出（未开启时为None）。运行失败时调用方应设置 sink.success = False
+    """
+    if not archive_path:
+        yield None
+        return
+    sink = ArchiveSink(archive_path, base_dir)
+    sink.open()
+    token = _current.set(sink)
+    success = False
+    try:
+        yield sink
+        success = True
+    finally:
+        _current.reset(token)
+        sink.published = sink.close(success and sink.success is not False)
+
+
+def published(sink: Optional[ArchiveSink]) -> bool:
+    """归档输出是否已生成（未开启归档输出时为True）"""
+    return sink is None or sink.published
+
+
+@contextmanager
+def capture(enabled: bool = True):
+    """子进程中暂存报告（父进程开启了归档输出时使用）
+
+    Yields:
+        BufferSink: 暂存的报告（enabled 为False时为None）
+    """
+    if not enabled:
+        yield None
+        return
+    buffer = BufferSink()
+    token = _current.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _current.reset(token)
@@ -0,0 +1,90 @@
+"""
+按列提取分组数据
+
+生成器填表前需要把分组数据整理成若干列表（检件编号、焊口编号、张数等）。
+逐行 iterrows()/iloc[i] 会为每一行构造一个 Series，行数多时非常慢。
+这里的函数每列只取一次底层数组，统一完成 NaN→"" 转换、数值转换和张数解析。
+"""
+
+import numpy as np
+import pandas as pd
+
+# "180*80/3张" 形式的底片规格/张数
+SHEET_COUNT_PATTERN = r'/(\d+)张'
+
+
+def text_column(df, column, default=""):
+    """取出文本列：缺失值替换为default，其余值转换为字符串
+
+    Args:
+        df: 分组数据
+        column: 列名
+        default: 缺失值的替换文本
+
+    Returns:
+        list: 字符串列表，与 str(value) if pd.notna(value) else default 的逐行结果一致
+    """
+    series = df[column]
+    values = series.to_numpy(dtype=object)
+    missing = series.isna().to_numpy()
+    return [default if is_missing else str(value) for value, is_missing in zip(values, missing)]
+
+
+def int_column(df, column, default=0):
+    """取出整数列：等价于逐行 int(float(value))，缺失或无法转换时为default
+
+    Args:
+        df: 分组数据
+        column: 列名
+        default: 缺失或无法转换时的值
+
+    Returns:
+        numpy.ndarray: 整数数组
+    """
+    numbers = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+    numbers = np.where(np.isfinite(numbers), np.trunc(numbers), default)
+    return numbers.astype(np.int64)
+
+
+def unqualified_column(df, total_column=None, qualified_column=None):
+    """计算不合格张数：max(0, 张数 - 合格张数)，列不存在时按0计
+
+    Args:
+        df: 分组数据
+        total_column: 张数列名
+        qualified_column: 合格张数列名
+
+    Returns:
+        numpy.ndarray: 不合格张数数组
+    """
+    totals = int_column(df, total_column) if total_column else np.zeros(len(df), dtype=np.int64)
+    qualified = int_column(df, qualified_column) if qualified_column else np.zeros(len(df), dtype=np.int64)
+    return np.clip(totals - qualified, 0, None)
+
+
+def sheet_count_column(df, column, default=1):
+    """解析张数列，支持数值和 "180*80/3张" 形式的文本
+
+    规则与逐行解析一致：
+    - 缺失值为default
+    - 含"张"的文本提取斜杠后、张字前的数字，提取不到时为default
+    - 其他值按 int(float(value)) 转换，失败时为default
+
+    Args:
+        df: 分组数据
+        column: 张数列名
+        default: 缺失或无法解析时的张数
+
+    Returns:
+        numpy.ndarray: 张数数组
+    """
+    series = df[column]
+    values = series.to_numpy(dtype=object)
+    is_sheet_text = np.fromiter((isinstance(value, str) and '张' in value for value in values),
+                                dtype=bool, count=len(values))
+
+    counts = int_column(df, column, default)
+    if is_sheet_text.any():
+        extracted = series[is_sheet_text].astype(str).str.extract(SHEET_COUNT_PATTERN)[0]
+        counts[is_sheet_text] = pd.to_numeric(extracted, errors='coerce').fillna(default).to_numpy(dtype=np.int64)
+    return counts
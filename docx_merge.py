@@ -0,0 +1,242 @@
+"""
+合并输出：所有分组填入同一个Word文档
+
+部分委托方希望收到一个包含全部委托单的结果通知单，而不是每个委托单一个文件；
+逐个打开、保存N个文档包也比生成一个文档慢。
+
+本模块：
+1. MergedDocument.append(doc) 依次接收每个分组填好的文档：第一个文档作为合并文档，
+   其样式、编号、页眉页脚、设置等部件只保留这一份；之后的文档只把正文元素移入合并文档
+2. 分组之间插入分节符（下一页），每节使用与模板相同的页面设置和页眉页脚，页码从1开始，
+   每个分组在合并文档中的版面与单独生成的文件相同
+3. 移入的正文中引用的图片等关联部件重新关联到合并文档（相同图片只保存一份），
+   书签、绘图对象的编号重新分配，避免与已有内容重复
+4. save(路径) 最后只保存一次（通过 docx_writer.save_docx，内容未变化时不改写、支持归档输出）
+5. 报告流水线以 write 作为写入函数；save_merged 保存合并文档并记录运行指标：
+   合并输出只生成1份报告，追加的分组数单独记录（groups_merged）
+
+所有分组来自同一个模板，因此共用第一个文档的样式和编号定义不会改变格式。
+"""
+
+import copy
+import io
+import os
+import re
+import threading
+from typing import Optional
+
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+import run_metrics
+from docx_writer import save_docx
+
+_R_NAMESPACE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_W14_NAMESPACE = 'http://schemas.microsoft.com/office/word/2010/wordml'
+_WP_DOCPR = '{http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing}docPr'
+
+# w:sectPr 中 w:pgNumType 之后的元素（用于按顺序插入）
+_PGNUMTYPE_SUCCESSORS = (
+    'w:cols', 'w:formProt', 'w:vAlign', 'w:noEndnote', 'w:titlePg', 'w:textDirection',
+    'w:bidi', 'w:rtlGutter', 'w:docGrid', 'w:printerSettings', 'w:sectPrChange',
+)
+
+
+def restart_page_numbers(sectPr):
+    """设置该节页码从1开始（与单独的文件一致）"""
+    pgNumType = sectPr.find(qn('w:pgNumType'))
+    if pgNumType is None:
+        pgNumType = OxmlElement('w:pgNumType')
+        sectPr.insert_element_before(pgNumType, *_PGNUMTYPE_SUCCESSORS)
+    pgNumType.set(qn('w:start'), '1')
+
+
+class MergedDocument:
+    """把多个分组的文档依次合并为一个文档，分组之间分节
+
+    文档按 append 的调用顺序合并；移入正文后原文档不再可用。
+    """
+
+    def __init__(self):
+        self.document = None
+        self.count = 0
+        self._section = None          # 合并文档末尾的节属性（模板的页面设置）
+        self._bookmark_id = 0
+        self._docpr_id = 0
+        self._bookmark_names = set()
+        self._lock = threading.Lock()
+
+    def append(self, doc):
+        """追加一个分组的文档
+
+        Args:
+            doc: 填好的Word文档对象（与合并文档来自同一个模板）
+        """
+        with self._lock:
+            if self.document is None:
+                self.document = doc
+                self._section = doc.element.body.find(qn('w:sectPr'))
+                if self._section is not None:
+                    restart_page_numbers(self._section)
+                self._scan(doc.element.body)
+            else:
+                self._break_section()
+                body = self.document.element.body
+                elements = [element for element in doc.element.body if element.tag != qn('w:sectPr')]
+                self._renumber(elements)
+                for element in elements:
+                    self._relink(element, doc.part)
+                    if self._section is not None:
+                        self._section.addprevious(element)
+                    else:
+                        body.append(element)
+            self.count += 1
+
+    def write(self, doc, output_path: Optional[str] = None) -> bool:
+        """报告流水线的写入函数：追加分组文档（output_path 为单独输出时的路径，不写入该文件）"""
+        self.append(doc)
+        print(f"已追加到合并文档（第{self.count}个分组）")
+        return True
+
+    def _scan(self, element):
+        """记录第一个文档中已用的书签、绘图编号"""
+        for bookmark in element.iter(qn('w:bookmarkStart')):
+            self._bookmark_id = max(self._bookmark_id, int(bookmark.get(qn('w:id'), 0)) + 1)
+            self._bookmark_names.add(bookmark.get(qn('w:name')))
+        for docPr in element.iter(_WP_DOCPR):
+            self._docpr_id = max(self._docpr_id, int(docPr.get('id', 0)))
+
+    def _break_section(self):
+        """在合并文档当前末尾插入分节符（下一页），节属性与模板相同"""
+        body = self.document.element.body
+        last = self._section.getprevious() if self._section is not None else body[-1]
+        if last is None or last.tag != qn('w:p') or last.find(f"{qn('w:pPr')}/{qn('w:framePr')}") is not None:
+            # 末尾是表格，或是模板中用于避免多出空白页的图文框段落（分节符不能放在图文框中）：
+            # 另加一个行高极小的段落承载分节符
+            last = self._break_paragraph()
+            if self._section is not None:
+                self._section.addprevious(last)
+            else:
+                body.append(last)
+        pPr = last.get_or_add_pPr()
+        if pPr.sectPr is None and self._section is not None:
+            pPr._insert_sectPr(copy.deepcopy(self._section))
+
+    @staticmethod
+    def _break_paragraph():
+        """行高1磅、字号0.5磅的空段落"""
+        paragraph = OxmlElement('w:p')
+        pPr = paragraph.get_or_add_pPr()
+        spacing = pPr.get_or_add_spacing()
+        spacing.set(qn('w:before'), '0')
+        spacing.set(qn('w:after'), '0')
+        spacing.set(qn('w:line'), '20')
+        spacing.set(qn('w:lineRule'), 'exact')
+        rPr = OxmlElement('w:rPr')
+        size = OxmlElement('w:sz')
+        size.set(qn('w:val'), '1')
+        rPr.append(size)
+        pPr.append(rPr)
+        return paragraph
+
+    def _relink(self, element, source_part):
+        """把正文中引用的关联部件（图片、超链接等）重新关联到合并文档"""
+        target_part = self.document.part
+        for node in element.iter():
+            for name, rId in node.attrib.items():
+                if not name.startswith(f'{{{_R_NAMESPACE}}}'):
+                    continue
+                rel = source_part.rels.get(rId)
+                if rel is None:
+                    continue
+                if rel.is_external:
+                    new_rId = target_part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+                elif rel.reltype == RT.IMAGE:
+                    # 按内容去重：相同图片只保存一份
+                    new_rId, _ = target_part.get_or_add_image(io.BytesIO(rel.target_part.blob))
+                else:
+                    part = rel.target_part
+                    package = target_part.package
+                    if any(existing.partname == part.partname for existing in package.iter_parts()):
+                        template = re.sub(r'\d*(\.\w+)$', r'%d\1', str(part.partname))
+                        part.partname = package.next_partname(template)
+                    new_rId = target_part.relate_to(part, rel.reltype)
+                node.set(name, new_rId)
+
+    def _renumber(self, elements):
+        """重新分配书签和绘图对象的编号，去掉重复的段落标识（书签可能跨越多个正文元素）"""
+        id_map = {}
+        for bookmark in [node for element in elements for node in element.iter(qn('w:bookmarkStart'))]:
+            name = bookmark.get(qn('w:name'))
+            old_id = bookmark.get(qn('w:id'))
+            if name == '_GoBack' or name in self._bookmark_names:
+                # Word 的"上次编辑位置"书签或重名书签：去掉书签，保留内容
+                id_map[old_id] = None
+                bookmark.getparent().remove(bookmark)
+                continue
+            self._bookmark_names.add(name)
+            id_map[old_id] = str(self._bookmark_id)
+            bookmark.set(qn('w:id'), id_map[old_id])
+            self._bookmark_id += 1
+        for bookmark_end in [node for element in elements for node in element.iter(qn('w:bookmarkEnd'))]:
+            old_id = bookmark_end.get(qn('w:id'))
+            if old_id in id_map and id_map[old_id] is None:
+                bookmark_end.getparent().remove(bookmark_end)
+            elif old_id in id_map:
+                bookmark_end.set(qn('w:id'), id_map[old_id])
+        for docPr in [node for element in elements for node in element.iter(_WP_DOCPR)]:
+            self._docpr_id += 1
+            docPr.set('id', str(self._docpr_id))
+        for node in [node for element in elements for node in element.iter()]:
+            for name in (f'{{{_W14_NAMESPACE}}}paraId', f'{{{_W14_NAMESPACE}}}textId'):
+                if name in node.attrib:
+                    del node.attrib[name]
+
+    def save(self, output_path: str) -> bool:
+        """保存合并文档（只保存一次）
+
+        Returns:
+            bool: 是否写入了文件（没有任何分组或内容未变化时返回False）
+        """
+        if self.document is None:
+            print("没有可合并的分组，未生成合并文档")
+            return False
+        print(f"\n正在保存合并文档（{self.count}个分组）到: {output_path}")
+        written = save_docx(self.document, output_path)
+        if written:
+            print(f"合并文档已保存至: {output_path}")
+        return written
+
+
+def save_merged(merged: MergedDocument, output_path: str, group_count: int) -> bool:
+    """保存合并文档并记录生成结果：生成1份报告，追加的分组数记入 groups_merged
+
+    Args:
+        merged: 合并文档
+        output_path: 合并文档路径
+        group_count: 分组总数（未追加的分组记为失败）
+
+    Returns:
+        bool: 是否生成了合并文档
+    """
+    merged_count = merged.count
+    try:
+        merged.save(output_path)
+    except Exception as e:
+        print(f"错误: 无法保存合并文档: {e}")
+        merged_count = 0
+    report_count = 1 if merged_count else 0
+    run_metrics.count('groups_merged', merged_count)
+    run_metrics.record_reports(report_count, failed=group_count - merged_count)
+    print(f"\n处理完成: 共处理{group_count}个委托单编号，{merged_count}个追加到合并文档，生成{report_count}份报告")
+    return report_count > 0
+
+
+def merged_output_path(output_dir: str, template_name: str, merge_output=True) -> Optional[str]:
+    """合并输出文件路径：merge_output 为路径时直接使用，为True时为 输出目录/<模板名>_合并.docx"""
+    if not merge_output:
+        return None
+    if merge_output is True:
+        return os.path.join(output_dir, f"{template_name}_合并.docx")
+    return merge_output
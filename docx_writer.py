@@ -0,0 +1,141 @@
+"""
+Word文档确定性保存
+
+python-docx 保存文档时每个zip条目都带当前时间戳，同样的输入每次生成的文件字节都不同；
+重新运行一个台账会改写全部输出文件，即使内容完全一样，同步盘/网络共享也会重新上传。
+
+本模块：
+1. 按文档各部件（XML和图片等）计算规范哈希，与已有输出文件的部件哈希比较，
+   内容未变化时不改写文件（修改时间和字节都保持不变）
+2. zip条目使用固定的时间戳和属性写入，相同输入生成字节相同的文件
+3. 先写临时文件再改名，网络共享上不会留下写了一半的文件
+4. 开启归档输出（archive_output.archive）时，文档内容直接写入归档，不写单独的文件
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+import zipfile
+from typing import List, Optional, Tuple
+
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from docx.opc.pkgwriter import _ContentTypesItem
+
+import archive_output
+import run_metrics
+
+# 输出保存配置
+OUTPUT_CONFIG = {
+    'skip_unchanged': True,                    # 内容未变化时不改写已有文件
+    'zip_date_time': (1980, 1, 1, 0, 0, 0),    # zip条目的固定时间戳（zip格式支持的最早时间）
+}
+
+
+def document_parts(doc) -> List[Tuple[str, bytes]]:
+    """按 python-docx 的写入顺序序列化文档各部件
+
+    Args:
+        doc: Word文档对象
+
+    Returns:
+        list: (zip条目名, 内容) 列表
+    """
+    package = doc.part.package
+    parts = list(package.iter_parts())
+    for part in parts:
+        part.before_marshal()
+
+    items = [(CONTENT_TYPES_URI.membername, _ContentTypesItem.from_parts(parts).blob),
+             (PACKAGE_URI.rels_uri.membername, package.rels.xml)]
+    for part in parts:
+        items.append((part.partname.membername, part.blob))
+        if len(part._rels):
+            items.append((part.partname.rels_uri.membername, part._rels.xml))
+    return items
+
+
+def parts_hash(items) -> str:
+    """计算部件列表的规范哈希（只与条目名和内容有关，与时间戳、压缩方式无关）"""
+    digest = hashlib.sha256()
+    for name, blob in items:
+        encoded = name.encode('utf-8')
+        digest.update(len(encoded).to_bytes(4, 'big'))
+        digest.update(encoded)
+        digest.update(len(blob).to_bytes(8, 'big'))
+        digest.update(blob)
+    return digest.hexdigest()
+
+
+def file_parts_hash(path: str) -> Optional[str]:
+    """计算已有docx文件的规范哈希，文件不存在或不是有效的zip时返回None"""
+    if not os.path.isfile(path):
+        return None
+    try:
+        with zipfile.ZipFile(path) as zf:
+            return parts_hash((info.filename, zf.read(info)) for info in zf.infolist())
+    except (zipfile.BadZipFile, OSError, KeyError):
+        return None
+
+
+def _write_zip(items, target):
+    """以固定的时间戳和属性把部件写入zip（target 为文件路径或文件对象）"""
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, blob in items:
+            info = zipfile.ZipInfo(name, date_time=OUTPUT_CONFIG['zip_date_time'])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.create_system = 0
+            info.external_attr = 0o600 << 16
+            zf.writestr(info, blob)
+
+
+def docx_bytes(items) -> bytes:
+    """把部件写成docx文件内容（与 write_parts 写出的文件字节相同）"""
+    buffer = io.BytesIO()
+    _write_zip(items, buffer)
+    return buffer.getvalue()
+
+
+def write_parts(items, output_path: str):
+    """以固定的时间戳和属性写入zip，先写临时文件再改名"""
+    # 临时文件按进程和线程区分；不用 mkstemp，新文件的权限与直接保存时相同（遵循umask）
+    temp_path = f"{output_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        _write_zip(items, temp_path)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def save_docx(doc, output_path: str, skip_unchanged: Optional[bool] = None) -> bool:
+    """保存Word文档，内容与已有文件相同时不改写；开启归档输出时写入归档
+
+    Args:
+        doc: Word文档对象
+        output_path: 输出文件路径
+        skip_unchanged: 内容未变化时是否跳过写入（默认: OUTPUT_CONFIG['skip_unchanged']）
+
+    Returns:
+        bool: 是否写入了文件或归档（内容未变化而跳过时返回False）
+    """
+    start = time.perf_counter()
+    try:
+        items = document_parts(doc)
+        sink = archive_output.current()
+        if sink is not None:
+            data = docx_bytes(items)
+            sink.add(output_path, data, parts_hash(items))
+            run_metrics.count('bytes_written', len(data))
+            return True
+        if OUTPUT_CONFIG['skip_unchanged'] if skip_unchanged is None else skip_unchanged:
+            if file_parts_hash(output_path) == parts_hash(items):
+                print(f"内容未变化，保留原文件: {output_path}")
+                run_metrics.count('reports_unchanged')
+                return False
+        write_parts(items, output_path)
+        run_metrics.count('bytes_written', os.path.getsize(output_path))
+        return True
+    finally:
+        run_metrics.add_stage('write', time.perf_counter() - start)
@@ -0,0 +1,256 @@
+"""
+多模板扇出：一次读取台账，逐组生成所有模板的报告
+
+同一台账常常要同时生成 Mode1 和 Mode2 两种报告（NDT_result 与 NDT_result_mode1、
+Ray_Detection 与 Ray_Detection_mode1、Surface_Defect 与 Surface_Defect_mode1）。
+分别运行时每个生成器各自读取、分组台账，各自计算每个委托单的最晚完成日期、单元名称、合格级别等数据。
+
+本模块：
+1. 各生成器的 build_renderer 完成准备工作（读取、列映射、分组）后返回 GroupRenderer，
+   process_excel_to_word 单独运行时用报告流水线（report_pipeline）生成全部分组，行为不变
+2. run_fan_out 让多个模板共用一个 ledger_session.LedgerSession：台账只读取、分组一次，
+   每个委托单的派生数据通过 session.group_value 只计算一次
+3. 逐组生成：同一个委托单的所有模板在同一个进程中依次生成，再处理下一个委托单；
+   分组为各模板分组的并集（按模板顺序、首次出现的顺序），每个分组只生成包含该分组的模板。
+   多进程时按委托单分配到各进程，每个进程生成所分配委托单的全部模板，
+   各进程只返回每个模板成功的分组数，由父进程汇总后每个模板输出一次处理结果
+4. 各模板的输出文件名和输出目录与单独运行时相同
+"""
+
+import argparse
+import importlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+import archive_output
+import run_metrics
+from ledger_session import GeneratorJob, LedgerSession
+
+
+@dataclass
+class GroupRenderer:
+    """一个模板的逐组生成器（准备工作已完成）
+
+    Attributes:
+        name: 生成器名称
+        groups: 分组键（按生成顺序）
+        render: 生成一个分组的报告，返回是否成功
+        finish: 全部分组生成后调用（输出汇总、保存合并文档等），参数为 (成功的分组数, 处理的分组数)，返回整体是否成功
+        run_all: 单独运行时批量生成全部分组的方式（可选，如流水线），返回成功的分组数；默认逐组调用 render
+    """
+    name: str
+    groups: Sequence[Any]
+    render: Callable[[Any], bool]
+    finish: Callable[[int, int], bool]
+    run_all: Optional[Callable[[], int]] = None
+
+    def run(self) -> bool:
+        """单独运行：生成全部分组"""
+        if self.run_all is not None:
+            success_count = self.run_all()
+        else:
+            success_count = sum(bool(self.render(key)) for key in self.groups)
+        return self.finish(success_count, len(self.groups))
+
+
+# 常用的模板组合：同一台账的 Mode2 与 Mode1 报告
+FAN_OUT_PRESETS = {
+    'ndt': {
+        'excel': "生成器/Excel/2_生成器结果.xlsx",
+        'jobs': [
+            ('RT结果通知单台账_Mode2', 'NDT_result', "生成器/word/2_RT结果通知台账_Mode2.docx"),
+            ('RT结果通知单台账_Mode1', 'NDT_result_mode1', "生成器/word/2_RT结果通知台账_Mode1.docx"),
+        ],
+    },
+    'ray': {
+        'excel': "生成器/Excel/1_生成器委托.xlsx",
+        'jobs': [
+            ('射线检测委托台账_Mode2', 'Ray_Detection', "生成器/word/1_射线检测委托台账_Mode2.docx"),
+            ('射线检测委托台账_Mode1', 'Ray_Detection_mode1', "生成器/word/1_射线检测委托台账_Mode1.docx"),
+        ],
+    },
+    'surface': {
+        'excel': "生成器/Excel/3_生成器表面结果.xlsx",
+        'sheet_name': "荣信聚乙烯PT",
+        'jobs': [
+            ('表面结果通知单台账_Mode2', 'Surface_Defect', "生成器/word/3_表面结果通知单台账_Mode2.docx"),
+            ('表面结果通知单台账_Mode1', 'Surface_Defect_mode1', "生成器/word/3_表面结果通知单台账_Mode1.docx"),
+        ],
+    },
+}
+
+
+def _build_renderers(session: LedgerSession, jobs: List[GeneratorJob]):
+    """为每个模板准备生成器
+
+    Returns:
+        tuple: ([(任务, GroupRenderer, 分组键集合)], {准备失败的任务名称: False})
+    """
+    renderers = []
+    failed = {}
+    for job in jobs:
+        module = importlib.import_module(job.module)
+        renderer = module.build_renderer(session.excel_path, job.word_template_path, session=session, **job.options)
+        if renderer is None:
+            print(f"错误: {job.name} 准备失败")
+            failed[job.name] = False
+        else:
+            renderers.append((job, renderer, set(renderer.groups)))
+    return renderers, failed
+
+
+def _group_keys(renderers) -> List[Any]:
+    """各模板分组键的并集：按模板顺序，保留首次出现的顺序"""
+    keys = []
+    seen = set()
+    for _, renderer, _ in renderers:
+        for key in renderer.groups:
+            if key not in seen:
+                seen.add(key)
+                keys.append(key)
+    return keys
+
+
+def _render_keys(renderers, keys: List[Any]) -> Dict[str, int]:
+    """逐组生成全部模板的报告
+
+    Returns:
+        dict: 任务名称 -> 成功的分组数
+    """
+    counts = {job.name: 0 for job, _, _ in renderers}
+    for key in keys:
+        for job, renderer, groups in renderers:
+            if key in groups:
+                try:
+                    counts[job.name] += bool(renderer.render(key))
+                except Exception as e:
+                    # 一个模板出错不影响同一分组的其他模板
+                    print(f"错误: {job.name} 生成分组 {key} 时出错: {e}")
+    return counts
+
+
+def _finish_renderers(renderers, counts: Dict[str, int], results: Dict[str, bool]):
+    """每个模板按成功的分组数输出处理结果（全部分组均已分配处理，处理数为该模板的分组数）"""
+    for job, renderer, groups in renderers:
+        print(f"\n==== {job.name} ====")
+        results[job.name] = bool(renderer.finish(counts.get(job.name, 0), len(groups)))
+    return results
+
+
+def _render_groups(session: LedgerSession, jobs: List[GeneratorJob]):
+    """为每个模板准备生成器，逐组生成全部模板的报告
+
+    Returns:
+        dict: 任务名称 -> 是否成功
+    """
+    renderers, results = _build_renderers(session, jobs)
+    counts = _render_keys(renderers, _group_keys(renderers))
+    return _finish_renderers(renderers, counts, results)
+
+
+def _render_chunk(jobs: List[GeneratorJob], excel_path: str, dataframe: pd.DataFrame,
+                  keys: List[Any], capture: bool):
+    """子进程：生成分配到本进程的委托单的全部模板，返回各模板成功的分组数（处理结果由父进程汇总输出）"""
+    with run_metrics.collect(None, write=False) as metrics, archive_output.capture(capture) as buffer:
+        renderers, _ = _build_renderers(LedgerSession(excel_path, dataframe), jobs)
+        counts = _render_keys(renderers, keys)
+    return counts, metrics.snapshot(), buffer.entries if buffer else None
+
+
+def run_fan_out(session: LedgerSession, jobs: List[GeneratorJob], workers: int = 1) -> Dict[str, bool]:
+    """多个模板共用一次读取和分组，逐组生成全部模板的报告
+
+    Args:
+        session: 共享读取会话
+        jobs: 各模板的生成任务（GeneratorJob，options 为各生成器的关键字参数）
+        workers: 进程数量（大于1时按委托单分配到多个进程；合并输出时只能用1个进程）
+
+    Returns:
+        dict: 任务名称 -> 是否成功
+    """
+    start = time.perf_counter()
+    if workers > 1 and any(job.options.get('merge_output') for job in jobs):
+        print("警告: 合并输出需要在同一进程中按顺序追加，改为单进程生成")
+        workers = 1
+
+    if workers <= 1:
+        results = _render_groups(session, jobs)
+    else:
+        with run_metrics.stage('read'):
+            dataframe = session.dataframe
+        # 在本进程准备各模板以取得分组（与单进程相同的并集和顺序），处理结果也在本进程汇总输出
+        renderers, results = _build_renderers(session, jobs)
+        keys = _group_keys(renderers)
+        chunks = [keys[index::workers] for index in range(workers) if keys[index::workers]]
+        capture = archive_output.current() is not None
+
+        counts = {job.name: 0 for job, _, _ in renderers}
+        with ProcessPoolExecutor(max_workers=max(1, len(chunks))) as executor:
+            futures = [executor.submit(_render_chunk, jobs, session.excel_path, dataframe, chunk, capture)
+                       for chunk in chunks]
+            for future in futures:
+                chunk_counts, metrics, reports = future.result()
+                for name, success_count in chunk_counts.items():
+                    counts[name] = counts.get(name, 0) + success_count
+                run_metrics.merge(metrics)
+                archive_output.merge(reports)
+        _finish_renderers(renderers, counts, results)
+
+    for name, success in results.items():
+        print(f"{name}: {'成功' if success else '失败'}")
+    print(f"全部模板生成完成，总耗时 {time.perf_counter() - start:.2f} 秒")
+    return results
+
+
+def main():
+    # 创建命令行参数解析器
+    parser = argparse.ArgumentParser(description='一次读取台账，逐组生成 Mode2 和 Mode1 两种报告')
+    parser.add_argument('ledger', choices=sorted(FAN_OUT_PRESETS),
+                        help='台账类型: ndt (RT结果通知单)、ray (射线检测委托台账) 或 surface (表面结果通知单)')
+    parser.add_argument('-e', '--excel',
+                        help='Excel表格路径 (默认使用台账类型对应的生成器Excel)')
+    parser.add_argument('-p', '--project',
+                        help='工程名称，用于替换文档中的工程名称占位符')
+    parser.add_argument('-c', '--client',
+                        help='委托单位，用于替换文档中的委托单位占位符（射线检测委托台账Mode2没有该参数）')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='进程数量，按委托单分配 (默认: 1)')
+    parser.add_argument('--metrics-dir', default=run_metrics.METRICS_CONFIG['output_dir'],
+                        help=f"运行指标输出目录 (默认: {run_metrics.METRICS_CONFIG['output_dir']})")
+    parser.add_argument('--archive',
+                        help='把报告直接写入该归档文件（.zip、.tar、.tar.gz），不写单独的文件')
+
+    # 解析命令行参数
+    args = parser.parse_args()
+
+    preset = FAN_OUT_PRESETS[args.ledger]
+    excel_path = args.excel or preset['excel']
+    if not os.path.exists(excel_path):
+        print(f"错误: Excel文件不存在: {excel_path}")
+        sys.exit(1)
+
+    jobs = []
+    for name, module, word_template_path in preset['jobs']:
+        options = {'project_name': args.project}
+        if module != 'Ray_Detection':
+            options['client_name'] = args.client
+        jobs.append(GeneratorJob(name, module, word_template_path, options))
+
+    session = LedgerSession(excel_path, sheet_name=preset.get('sheet_name'))
+    with archive_output.archive(args.archive) as sink, run_metrics.collect(f"fan_out_{args.ledger}", args.metrics_dir) as metrics:
+        results = run_fan_out(session, jobs, workers=args.jobs)
+        metrics.success = all(results.values())
+        if sink is not None:
+            sink.success = all(results.values())
+
+    # 返回状态码（开启归档输出而未能生成归档时同样视为失败）
+    sys.exit(0 if all(results.values()) and archive_output.published(sink) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+分组调度器
+
+不同分组的处理耗时差异很大：有的委托单只有2行数据，有的有300行且张数总和大于21，
+需要使用续表模板并大量扩展表格行。并行生成时如果按原始顺序派发，
+最后往往只剩一个大分组在运行，其余进程空等。
+
+本模块在派发前用成本模型估算每个分组的耗时（数据行数、张数决定的表格行数、
+模板容量与需要动态扩展的行数），并按"最长处理时间优先"(LPT)的顺序派发。
+
+基准测试（用示例台账的数据行组成合成台账，实际运行 Radio_test_renewal，
+分别按原始顺序和最长任务优先派发，比较实际总耗时）:
+    python group_scheduler.py --benchmark
+"""
+
+import argparse
+import heapq
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import archive_output
+import run_metrics
+from keyword_matcher import KeywordMatcher, scan_table
+from memory_governor import DispatchThrottle
+from table_builder import TableGrid
+
+# 成本模型参数（单位：秒，按实际运行记录的数量级设定）
+SCHEDULER_CONFIG = {
+    'base_cost': 5.0,           # 打开模板、替换参数、处理复选框、保存文档的固定成本
+    'data_row_cost': 0.05,      # 每条Excel数据行的读取与整理成本
+    'table_row_cost': 0.3,      # 每个需要填充的表格行
+    'expansion_row_cost': 0.6,  # 超出模板容量、需要动态扩展的每一行
+    'continuation_cost': 1.0,   # 使用续表模板（张数总和大于21）的额外成本
+}
+
+# 基准测试使用的示例台账和模板
+BENCHMARK_CONFIG = {
+    'excel': "生成器/Excel/5_生成器评片记录续表模版.xlsx",
+    'word': "生成器/word/5_射线检测记录_续.docx",
+    'order_column': '委托单编号',
+    'large_ratio': 0.1,          # 大分组（行数多、使用续表模板）所占比例
+    'large_rows': (40, 120),     # 大分组的行数范围
+    'small_rows': (2, 10),       # 普通分组的行数范围
+}
+
+# 模板中不可用于填充数据的行标记
+_RESERVED_ROW_MARKERS = ['以下空白', '合计', '总计', '备注', '评片人', '审核人']
+RESERVED_ROW_MATCHER = KeywordMatcher(_RESERVED_ROW_MARKERS)
+
+
+@dataclass
+class GroupCost:
+    """分组成本估算结果"""
+    key: str
+    data_rows: int
+    total_sheets: int
+    table_rows: int
+    capacity: int
+    continuation: bool
+    cost: float
+
+    @property
+    def expansion_rows(self) -> int:
+        return max(0, self.table_rows - self.capacity)
+
+
+@lru_cache(maxsize=None)
+def template_capacity(template_path: str, header_keyword: str = '检件编号') -> int:
+    """统计模板数据表格中可直接填充的行数（表头行之后、不含以下空白/合计等标记行）
+
+    Args:
+        template_path: Word模板路径
+        header_keyword: 用于定位表头行的关键字
+
+    Returns:
+        int: 可用行数，模板不存在或找不到表头时返回0
+    """
+    if not template_path or not os.path.exists(template_path):
+        return 0
+
+    from docx import Document
+    doc = Document(template_path)
+    header_matcher = KeywordMatcher([header_keyword])
+    for table in doc.tables:
+        grid = TableGrid(table)
+        header_row_index = -1
+        for i, cells in scan_table(table, header_matcher, grid):
+            if any(hits for _, _, _, hits in cells):
+                header_row_index = i
+                break
+        if header_row_index < 0:
+            continue
+
+        capacity = 0
+        for _, cells in scan_table(table, RESERVED_ROW_MATCHER, grid, start=header_row_index + 1):
+            if any(hits for _, _, _, hits in cells):
+                continue
+            capacity += 1
+        return capacity
+    return 0
+
+
+def estimate_group_cost(key: str, data_rows: int, total_sheets: int, table_rows: int,
+                        capacity: int, continuation: bool = False) -> GroupCost:
+    """按成本模型估算单个分组的处理耗时
+
+    Args:
+        key: 分组键（委托单编号_射线类型）
+        data_rows: Excel数据行数
+        total_sheets: 张数总和
+        table_rows: 按张数规则需要填充的表格行数
+        capacity: 所选模板的可用行数
+        continuation: 是否使用续表模板
+
+    Returns:
+        GroupCost: 成本估算结果
+    """
+    config = SCHEDULER_CONFIG
+    cost = (config['base_cost']
+            + config['data_row_cost'] * data_rows
+            + config['table_row_cost'] * table_rows
+            + config['expansion_row_cost'] * max(0, table_rows - capacity))
+    if continuation:
+        cost += config['continuation_cost']
+    return GroupCost(key, data_rows, total_sheets, table_rows, capacity, continuation, cost)
+
+
+def lpt_order(costs: Sequence[GroupCost]) -> List[GroupCost]:
+    """最长处理时间优先排序（成本相同时保持原顺序）"""
+    return sorted(costs, key=lambda item: -item.cost)
+
+
+def simulate_makespan(costs: Sequence[float], workers: int) -> float:
+    """模拟按给定顺序派发到workers个进程时的总耗时（每个任务交给最先空闲的进程）"""
+    finish_times = [0.0] * max(1, workers)
+    heapq.heapify(finish_times)
+    for cost in costs:
+        start = heapq.heappop(finish_times)
+        heapq.heappush(finish_times, start + cost)
+    return max(finish_times)
+
+
+def print_schedule(ordered: Sequence[GroupCost], workers: int, original: Optional[Sequence[GroupCost]] = None):
+    """输出调度计划及预估总耗时"""
+    print(f"\n==== 分组调度计划 ({workers}个进程) ====")
+    print(f"{'顺序':<6}{'分组':<45}{'数据行':>8}{'张数':>8}{'表格行':>8}{'扩展行':>8}{'预估(秒)':>10}")
+    for i, item in enumerate(ordered, 1):
+        print(f"{i:<6}{item.key:<45}{item.data_rows:>8}{item.total_sheets:>8}"
+              f"{item.table_rows:>8}{item.expansion_rows:>8}{item.cost:>10.1f}")
+    lpt_makespan = simulate_makespan([item.cost for item in ordered], workers)
+    print(f"预估总耗时(派发顺序): {lpt_makespan:.1f} 秒")
+    if original is not None:
+        fifo_makespan = simulate_makespan([item.cost for item in original], workers)
+        print(f"预估总耗时(原始顺序): {fifo_makespan:.1f} 秒")
+    print("=" * 40)
+
+
+# 子进程中共享的读取会话（传入完整数据时）或共享内存台账（按共享内存分区派发时）
+_worker_session = None
+_worker_ledger = None
+_worker_excel_path = None
+
+
+def _init_worker(excel_path, dataframe, layout=None):
+    global _worker_session, _worker_ledger, _worker_excel_path
+    from ledger_session import LedgerSession
+    _worker_excel_path = excel_path
+    if layout is not None:
+        from shared_ledger import SharedLedger
+        _worker_ledger = SharedLedger.attach(layout)
+    elif dataframe is not None:
+        _worker_session = LedgerSession(excel_path, dataframe)
+
+
+def _run_group(func, args, kwargs, key, rows=None, capture=False, partition=None):
+    from memory_governor import process_rss_mb
+    with run_metrics.collect(None, write=False) as metrics, archive_output.capture(capture) as buffer:
+        try:
+            session = _worker_session
+            if partition is not None or rows is not None:
+                # 任务携带的分区数据，或只解码共享内存中该分区的行
+                from ledger_session import LedgerSession
+                frame = partition if partition is not None else _worker_ledger.frame(*rows)
+                session = LedgerSession(_worker_excel_path, frame)
+            success = bool(func(*args, session=session, only_groups={key}, **kwargs))
+        except Exception as e:
+            print(f"错误: 分组 {key} 处理失败: {e}")
+            run_metrics.record_reports(0, failed=1)
+            success = False
+    # 同时上报本进程内存，供派发时控制总内存；运行指标和暂存的报告汇总到父进程
+    return key, success, os.getpid(), process_rss_mb(), metrics.snapshot(), buffer.entries if buffer else None
+
+
+def run_scheduled(costs: Sequence[GroupCost], func: Callable[..., Any], args: tuple = (),
+                  kwargs: Optional[Dict[str, Any]] = None, workers: int = 2,
+                  excel_path: Optional[str] = None, dataframe=None, schedule: str = 'lpt',
+                  partition_column=None, group_partitions: Optional[Dict[str, Any]] = None,
+                  memory_limit_mb: Optional[float] = None, columns: Optional[Sequence] = None,
+                  shared_memory: bool = False) -> Dict[str, bool]:
+    """按调度顺序把分组派发到多个进程
+
+    每个分组调用 func(*args, session=..., only_groups={分组键}, **kwargs)，不再重复读取Excel。
+    提供分区列和各分组所属的分区时，每个任务携带该分区的数据切片，子进程的会话只包含该分区；
+    指定 shared_memory 时改为把台账一次性放入共享内存（shared_ledger），任务只携带行号范围。
+    按 shared_ledger 基准测试，切片派发在各进程数下都更快，共享内存只在实测更优时使用。
+    未提供分区时子进程启动时用完整数据建立共享会话。
+    指定 columns 时只传递这些列（生成器实际使用的列），减少序列化的数据量。
+    设置内存上限时，同时派发的分组不超过进程数，总内存超过 上限×进程数 时暂停派发，等已派发的分组完成。
+    开启归档输出时，子进程生成的报告随结果返回，由父进程写入归档。
+
+    Args:
+        costs: 各分组的成本估算
+        func: 模块级的处理函数（如 Radio_test_renewal.process_excel_to_word）
+        args: 位置参数
+        kwargs: 关键字参数
+        workers: 进程数量
+        excel_path: Excel路径（用于子进程的共享会话）
+        dataframe: 已读取的数据（用于子进程的共享会话）
+        schedule: 'lpt' 最长任务优先，'fifo' 保持原始顺序
+        partition_column: 分区列名（如委托单编号列，可选）
+        group_partitions: 分组键 -> 分区列的值（与 partition_column 一起提供）
+        memory_limit_mb: 每个进程的内存上限（MB，可选）
+        columns: 只传递给子进程的列（可选，默认全部列）
+        shared_memory: 按分区派发时使用共享内存代替数据切片
+
+    Returns:
+        dict: 分组键 -> 是否成功
+    """
+    ordered = lpt_order(costs) if schedule == 'lpt' else list(costs)
+    print_schedule(ordered, workers, original=costs if schedule == 'lpt' else None)
+
+    start = time.perf_counter()
+    results = {}
+    ledger = None
+    partitions = None
+    if dataframe is not None and columns is not None:
+        dataframe = dataframe[list(dict.fromkeys(columns))]
+    initargs = (excel_path, dataframe)
+    if dataframe is not None and partition_column is not None and group_partitions:
+        if shared_memory:
+            from shared_ledger import SharedLedger
+            ledger = SharedLedger.create(dataframe, partition_column)
+            initargs = (excel_path, None, ledger.layout)
+            print(f"台账已放入共享内存: {ledger.layout.rows}行，{len(ledger.layout.partitions)}个分区，"
+                  f"{ledger.layout.size / 1024 / 1024:.1f} MB")
+        else:
+            from ledger_session import LedgerSession
+            partitions = LedgerSession(excel_path, dataframe).partitions(partition_column)
+            initargs = (excel_path, None)
+            print(f"按分区派发数据切片: {len(partitions)}个分区，{len(dataframe.columns)}列")
+
+    throttle = DispatchThrottle(memory_limit_mb, workers)
+    capture = archive_output.current() is not None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=initargs) as executor:
+            # ProcessPoolExecutor按提交顺序取任务，提交顺序即派发顺序
+            pending = set()
+
+            def collect(return_when):
+                nonlocal pending
+                done, pending = wait(pending, return_when=return_when)
+                for future in done:
+                    key, success, pid, rss_mb, metrics, reports = future.result()
+                    results[key] = success
+                    throttle.report(pid, rss_mb)
+                    run_metrics.merge(metrics)
+                    archive_output.merge(reports)
+
+            for item in ordered:
+                if memory_limit_mb:
+                    # 有内存上限时逐个派发，总内存超过上限时等已派发的分组完成
+                    while pending and (len(pending) >= workers or throttle.over_budget()):
+                        if len(pending) < workers:
+                            throttle.throttled += 1
+                        collect(FIRST_COMPLETED)
+                rows = ledger.layout.partitions[group_partitions[item.key]] if ledger else None
+                partition = partitions[group_partitions[item.key]] if partitions is not None else None
+                pending.add(executor.submit(_run_group, func, args, kwargs or {}, item.key, rows, capture,
+                                            partition))
+            collect(ALL_COMPLETED)
+    finally:
+        if ledger is not None:
+            ledger.close()
+    if memory_limit_mb:
+        print(f"内存上限 {throttle.limit_mb} MB（每个进程 {memory_limit_mb} MB），预估总内存 {throttle.total_mb():.0f} MB，"
+              f"因内存暂停派发 {throttle.throttled} 次")
+    print(f"\n并行处理完成: {len(results)}个分组，{workers}个进程，实际总耗时 {time.perf_counter() - start:.1f} 秒")
+    return results
+
+
+def build_benchmark_ledger(source, order_column: str, group_count: int, seed: int = 0):
+    """用示例台账的数据行组成合成台账：大多数委托单只有几行，少数委托单行数多（使用续表模板）
+
+    Args:
+        source: 示例台账数据（DataFrame）
+        order_column: 委托单编号列名
+        group_count: 委托单数量
+        seed: 随机种子
+
+    Returns:
+        DataFrame: 合成台账，委托单编号为 BENCH-0000 起
+    """
+    import pandas as pd
+
+    config = BENCHMARK_CONFIG
+    rng = random.Random(seed)
+    rows = source.dropna(subset=[order_column]).reset_index(drop=True)
+    large = set(rng.sample(range(group_count), max(1, round(group_count * config['large_ratio']))))
+    frames = []
+    for i in range(group_count):
+        size = rng.randint(*(config['large_rows'] if i in large else config['small_rows']))
+        frame = rows.iloc[[rng.randrange(len(rows)) for _ in range(size)]].copy()
+        frame[order_column] = f"BENCH-{i:04d}"
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def benchmark(group_count: int = 24, worker_counts: Sequence[int] = (2, 4), seed: int = 0,
+              excel_path: Optional[str] = None, word_template_path: Optional[str] = None) -> Dict[tuple, float]:
+    """在合成台账上实际运行 Radio_test_renewal，比较原始顺序与最长任务优先的实际总耗时
+
+    每次运行在单独的进程中执行完整的生成命令（-j 进程数 --schedule 顺序），计时包含读取、派发和保存。
+
+    Args:
+        group_count: 合成台账的委托单数量
+        worker_counts: 进程数量列表
+        seed: 随机种子
+        excel_path: 示例台账路径（默认: BENCHMARK_CONFIG['excel']）
+        word_template_path: Word模板路径（默认: BENCHMARK_CONFIG['word']）
+
+    Returns:
+        dict: (进程数, 派发顺序) -> 实际总耗时（秒）
+    """
+    import pandas as pd
+
+    excel_path = excel_path or BENCHMARK_CONFIG['excel']
+    word_template_path = word_template_path or BENCHMARK_CONFIG['word']
+    ledger = build_benchmark_ledger(pd.read_excel(excel_path), BENCHMARK_CONFIG['order_column'], group_count, seed)
+    sizes = ledger[BENCHMARK_CONFIG['order_column']].value_counts()
+    print(f"基准测试: 合成台账{len(ledger)}行，{group_count}个委托单（最大{sizes.max()}行，"
+          f"中位数{int(sizes.median())}行），CPU核心数 {os.cpu_count()}")
+    if max(worker_counts) > (os.cpu_count() or 1):
+        print("注意: 进程数超过CPU核心数时各进程分时运行，派发顺序对实际总耗时的影响会被掩盖")
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Radio_test_renewal.py')
+    timings = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ledger_path = os.path.join(temp_dir, "合成台账.xlsx")
+        ledger.to_excel(ledger_path, index=False)
+        for workers in worker_counts:
+            for schedule in ('fifo', 'lpt'):
+                output_dir = os.path.join(temp_dir, f"{schedule}_{workers}")
+                command = [sys.executable, script, '-e', ledger_path, '-w', word_template_path, '-o', output_dir,
+                           '-j', str(workers), '--schedule', schedule, '--metrics-dir', os.path.join(temp_dir, '指标')]
+                start = time.perf_counter()
+                completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                timings[(workers, schedule)] = time.perf_counter() - start
+                if completed.returncode != 0:
+                    print(f"警告: {schedule} / {workers}个进程 运行失败（退出码 {completed.returncode}）")
+
+    print(f"{'进程数':<8}{'原始顺序(秒)':>14}{'最长优先(秒)':>14}{'缩短':>8}")
+    for workers in worker_counts:
+        fifo, lpt = timings[(workers, 'fifo')], timings[(workers, 'lpt')]
+        print(f"{workers:<8}{fifo:>14.1f}{lpt:>14.1f}{(fifo - lpt) / fifo * 100:>7.1f}%")
+    return timings
+
+
+def main():
+    # 创建命令行参数解析器
+    parser = argparse.ArgumentParser(description='分组调度基准测试（原始顺序 vs 最长任务优先，实际运行生成器）')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='在合成台账上实际运行 Radio_test_renewal 并比较总耗时')
+    parser.add_argument('-n', '--groups', type=int, default=24,
+                        help='合成台账的委托单数量 (默认: 24)')
+    parser.add_argument('-j', '--workers', type=int, nargs='+', default=[2, 4],
+                        help='进程数量列表 (默认: 2 4)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='随机种子 (默认: 0)')
+    parser.add_argument('-e', '--excel', default=BENCHMARK_CONFIG['excel'],
+                        help=f"提供数据行的示例台账 (默认: {BENCHMARK_CONFIG['excel']})")
+    parser.add_argument('-w', '--word', default=BENCHMARK_CONFIG['word'],
+                        help=f"Word模板路径 (默认: {BENCHMARK_CONFIG['word']})")
+
+    # 解析命令行参数
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.groups, args.workers, args.seed, args.excel, args.word)
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -2,38 +2,132 @@ import sys
 import os
 import tkinter as tk
 from tkinter import filedialog, ttk, scrolledtext, font
-import threading
 import io
-from contextlib import redirect_stdout
+import collections
+import shutil
+import threading
 from datetime import datetime
 
 # 导入NDT_result模块
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import NDT_result
 import NDT_result_mode1
+from job_manager import JobManager, STATUS_RUNNING, STATUS_SUCCESS, STATUS_FAILED
+
+# 日志区配置
+LOG_VIEW_CONFIG = {
+    'frame_interval_ms': 50,    # 日志区刷新间隔（每秒20帧）
+    'max_lines': 5000,          # 日志区最多保留的行数，更早的行只保存在完整日志文件中
+    'log_dir': os.path.join("生成器", "输出报告", "log"),  # 完整日志文件目录
+}
 
 class RedirectText:
-    """用于重定向stdout到Text控件"""
-    def __init__(self, text_widget):
+    """用于重定向stdout到Text控件
+
+    任意线程都可以写入；写入的内容先进入有界的待显示队列，主线程按固定帧率
+    一次性插入控件并滚动一次。控件只保留最近 max_lines 行，完整日志写入磁盘。
+    没有换行的内容（如进度提示）等待一帧后也会显示。
+    """
+    def __init__(self, text_widget, name="gui"):
         self.text_widget = text_widget
-        self.buffer = ""
+        self.max_lines = LOG_VIEW_CONFIG['max_lines']
+        self.log_path = os.path.join(
+            LOG_VIEW_CONFIG['log_dir'], f"gui_{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+        self._pending = collections.deque(maxlen=self.max_lines)  # 待显示的完整行
+        self._partial = ""
+        self._partial_waited = False  # 未换行的内容已经等待过一帧
+        self._dropped = 0         # 待显示队列溢出而未显示的行数
+        self._widget_lines = 0    # 控件中当前的行数
+        self._log_file = None
+        self._lock = threading.Lock()
+        self.text_widget.after(LOG_VIEW_CONFIG['frame_interval_ms'], self.update_text_widget)
 
     def write(self, string):
-        self.buffer += string
-        # 在主线程中更新UI
-        self.text_widget.after(10, self.update_text_widget)
-    
+        with self._lock:
+            self._write_log_file(string)
+            lines = (self._partial + string).split("\n")
+            self._partial = lines.pop()
+            if lines:
+                self._partial_waited = False
+            self._dropped += max(0, len(self._pending) + len(lines) - self.max_lines)
+            self._pending.extend(lines)
+        return len(string)
+
+    def write_line(self, message):
+        """写入一行消息"""
+        self.write(message + "\n")
+
+    def _write_log_file(self, string):
+        if self._log_file is None:
+            try:
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                self._log_file = open(self.log_path, 'a', encoding='utf-8')
+            except OSError:
+                return
+        self._log_file.write(string)
+
     def update_text_widget(self):
-        if self.buffer:
+        """在主线程中批量显示待显示的行（每帧调用一次）"""
+        with self._lock:
+            lines = list(self._pending)
+            dropped = self._dropped
+            self._pending.clear()
+            self._dropped = 0
+            if self._partial and self._partial_waited:
+                lines.append(self._partial)
+                self._partial = ""
+            self._partial_waited = bool(self._partial)
+            if self._log_file is not None:
+                self._log_file.flush()
+
+        if lines:
+            if dropped:
+                lines.insert(0, f"...（省略{dropped}行，完整日志见 {self.log_path}）")
             self.text_widget.configure(state='normal')
-            self.text_widget.insert(tk.END, self.buffer)
+            self.text_widget.insert(tk.END, "\n".join(lines) + "\n")
+            self._widget_lines += len(lines)
+            excess = self._widget_lines - self.max_lines
+            if excess > 0:
+                # 删除最早的行，控件中只保留最近max_lines行
+                self.text_widget.delete("1.0", f"{excess + 1}.0")
+                self._widget_lines -= excess
             self.text_widget.see(tk.END)  # 自动滚动到最新内容
             self.text_widget.configure(state='disabled')
-            self.buffer = ""
-    
+
+        self.text_widget.after(LOG_VIEW_CONFIG['frame_interval_ms'], self.update_text_widget)
+
+    def clear(self):
+        """清空日志区（完整日志文件保留）"""
+        with self._lock:
+            self._pending.clear()
+            self._partial = ""
+            self._partial_waited = False
+            self._dropped = 0
+        self.text_widget.configure(state='normal')
+        self.text_widget.delete(1.0, tk.END)
+        self.text_widget.configure(state='disabled')
+        self._widget_lines = 0
+
+    def export(self, filename):
+        """导出完整日志（包括日志区中已不再显示的行）"""
+        with self._lock:
+            if self._log_file is not None:
+                self._log_file.flush()
+                shutil.copyfile(self.log_path, filename)
+                return
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(self.text_widget.get(1.0, tk.END))
+
     def flush(self):
         pass
 
+    def close(self):
+        """关闭完整日志文件（之后再写入时会重新以追加方式打开）"""
+        with self._lock:
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+
 class NDTResultGUI:
     def __init__(self, root):
         self.root = root
@@ -45,6 +139,9 @@ class NDTResultGUI:
         
         # 设置整体样式
         self.configure_styles()
+
+        # 任务管理器：各模块的任务可以并发运行，输出只写入各自的日志区
+        self.job_manager = JobManager()
         
         # 创建主框架
         self.main_frame = ttk.Frame(root)
@@ -59,6 +156,16 @@ class NDTResultGUI:
         
         # 默认选中第二个功能模块
         self.select_module(1)  # RT结果通知单台账
+
+        # 关闭窗口时关闭各日志区的完整日志文件
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        """关闭窗口"""
+        for redirect in (self.ray_redirect, self.redirect, self.surface_redirect,
+                         self.radio_redirect, self.radio_renewal_redirect):
+            redirect.close()
+        self.root.destroy()
     
     def get_chinese_font(self):
         """获取系统中可用的中文字体"""
@@ -151,7 +258,8 @@ class NDTResultGUI:
             "2. RT结果通知单台账",
             "3. 表面结果通知单台账",
             "4. 射线检测记录",
-            "5. 射线检测记录续"
+            "5. 射线检测记录续",
+            "6. 任务队列"
         ]
         
         modules_frame = ttk.Frame(self.sidebar, style="Sidebar.TFrame")
@@ -212,7 +320,7 @@ class NDTResultGUI:
         
         # 创建各个模块的内容框架
         self.module_frames = []
-        for i in range(5):
+        for i in range(6):
             frame = ttk.Frame(self.content_frame)
             if i != 1:  # 默认只显示第二个模块（RT结果通知单台账）
                 frame.pack_forget()
@@ -232,6 +340,9 @@ class NDTResultGUI:
         
         # 创建射线检测记录续模块的内容
         self.create_radio_renewal_frame(self.module_frames[4])
+
+        # 创建任务队列的内容
+        self.create_job_queue_frame(self.module_frames[5])
     
     def create_ray_detection_frame(self, parent_frame):
         """创建射线检测委托台账模块的内容"""
@@ -311,7 +422,12 @@ class NDTResultGUI:
         groove_label = ttk.Label(ray_row3_frame, text="坡口形式")
         groove_label.pack(side=tk.LEFT, padx=(0, 5))
         self.ray_groove_entry = ttk.Entry(ray_row3_frame, width=20)
-        self.ray_groove_entry.pack(side=tk.LEFT)
+        self.ray_groove_entry.pack(side=tk.LEFT, padx=(0, 30))
+
+        # 内存分析（仅模板2）：按阶段记录内存分配，报告写入 生成器/内存分析
+        self.ray_profile_memory_var = tk.BooleanVar(value=False)
+        profile_check = ttk.Checkbutton(ray_row3_frame, text="内存分析", variable=self.ray_profile_memory_var)
+        profile_check.pack(side=tk.LEFT)
 
         # 第五行参数 - 模板1专用参数（初始隐藏）
         self.ray_row4_frame = ttk.Frame(params_grid)
@@ -408,7 +524,7 @@ class NDTResultGUI:
         clear_button.pack(side=tk.RIGHT, padx=5)
         
         # 设置日志重定向
-        self.ray_redirect = RedirectText(self.ray_log_text)
+        self.ray_redirect = RedirectText(self.ray_log_text, "ray_detection")
 
     def on_ray_template_change(self, event=None):
         """射线检测委托台账模板选择变化时的回调函数"""
@@ -589,7 +705,7 @@ class NDTResultGUI:
         clear_button.pack(side=tk.RIGHT, padx=5)
         
         # 设置日志重定向
-        self.redirect = RedirectText(self.log_text)
+        self.redirect = RedirectText(self.log_text, "rt_result")
 
     def on_template_change(self, event=None):
         """RT结果通知单台账模板选择变化时的回调函数"""
@@ -760,7 +876,7 @@ class NDTResultGUI:
         clear_button.pack(side=tk.RIGHT, padx=5)
         
         # 设置日志重定向
-        self.surface_redirect = RedirectText(self.surface_log_text)
+        self.surface_redirect = RedirectText(self.surface_log_text, "surface")
     
     def create_radio_test_frame(self, parent_frame):
         """创建射线检测记录模块的内容"""
@@ -868,6 +984,9 @@ class NDTResultGUI:
         self.radio_submit_button = ttk.Button(submit_frame, text="提交", 
                                         style="Submit.TButton", command=self.process_radio_data)
         self.radio_submit_button.pack(side=tk.RIGHT, padx=10)
+        self.radio_retry_button = ttk.Button(submit_frame, text="仅重试失败组", 
+                                        style="Action.TButton", command=self.retry_radio_failed)
+        self.radio_retry_button.pack(side=tk.RIGHT, padx=10)
         
         # 日志区域
         log_frame = ttk.LabelFrame(parent_frame, text="执行日志")
@@ -894,7 +1013,7 @@ class NDTResultGUI:
         clear_button.pack(side=tk.RIGHT, padx=5)
         
         # 设置日志重定向
-        self.radio_redirect = RedirectText(self.radio_log_text)
+        self.radio_redirect = RedirectText(self.radio_log_text, "radio")
     
     def create_radio_renewal_frame(self, parent_frame):
         """创建射线检测记录续模块的内容"""
@@ -939,7 +1058,15 @@ class NDTResultGUI:
         guide_label = ttk.Label(row2_frame, text="操作指导书编号")
         guide_label.pack(side=tk.LEFT, padx=(0, 5))
         self.radio_renewal_guide_entry = ttk.Entry(row2_frame, width=20)
-        self.radio_renewal_guide_entry.pack(side=tk.LEFT)
+        self.radio_renewal_guide_entry.pack(side=tk.LEFT, padx=(0, 20))
+        
+        # 内存上限
+        memory_label = ttk.Label(row2_frame, text="内存上限(MB)")
+        memory_label.pack(side=tk.LEFT, padx=(0, 5))
+        self.radio_renewal_memory_entry = ttk.Entry(row2_frame, width=8)
+        from Radio_test_renewal import EXPANSION_CONFIG
+        self.radio_renewal_memory_entry.insert(0, str(EXPANSION_CONFIG['memory_limit_mb']))
+        self.radio_renewal_memory_entry.pack(side=tk.LEFT)
         
         # 文件选择区域
         files_frame = ttk.LabelFrame(parent_frame, text="文件选择")
@@ -1012,8 +1139,66 @@ class NDTResultGUI:
         clear_button.pack(side=tk.RIGHT, padx=5)
         
         # 设置日志重定向
-        self.radio_renewal_redirect = RedirectText(self.radio_renewal_log_text)
-    
+        self.radio_renewal_redirect = RedirectText(self.radio_renewal_log_text, "radio_renewal")
+
+    def create_job_queue_frame(self, parent_frame):
+        """创建任务队列的内容"""
+        parent_frame.pack(fill=tk.BOTH, expand=True)
+
+        # 模块标题
+        header_frame = ttk.Frame(parent_frame)
+        header_frame.pack(fill=tk.X, pady=(0, 15))
+        header_label = ttk.Label(header_frame, text="任务队列",
+                                style="ContentHeader.TLabel")
+        header_label.pack(side=tk.LEFT, padx=5)
+
+        # 任务列表
+        jobs_frame = ttk.LabelFrame(parent_frame, text="任务列表（各模块提交的任务并发运行，日志显示在各模块的执行日志中）")
+        jobs_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10), padx=5)
+
+        columns = ("编号", "任务", "状态", "已生成报告", "日志行数", "耗时")
+        self.job_tree = ttk.Treeview(jobs_frame, columns=columns, show="headings", height=15)
+        for column, width in zip(columns, (60, 280, 80, 100, 100, 100)):
+            self.job_tree.heading(column, text=column)
+            self.job_tree.column(column, width=width, anchor=tk.W if column == "任务" else tk.CENTER)
+        self.job_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        # 操作按钮
+        buttons_frame = ttk.Frame(jobs_frame)
+        buttons_frame.pack(fill=tk.X, padx=5, pady=(0, 5))
+        clear_button = ttk.Button(buttons_frame, text="清除已结束",
+                                style="Action.TButton", command=self.clear_finished_jobs)
+        clear_button.pack(side=tk.RIGHT, padx=5)
+
+        # 定时刷新任务状态
+        self.root.after(500, self.refresh_job_queue)
+
+    def refresh_job_queue(self):
+        """刷新任务列表中的状态、进度和耗时"""
+        jobs = self.job_manager.jobs()
+        existing = set(self.job_tree.get_children())
+        for job in jobs:
+            item_id = str(job.job_id)
+            values = (job.job_id, job.name, job.status, f"{job.reports_done} 份",
+                      job.log_lines, f"{job.elapsed:.1f} 秒")
+            if item_id in existing:
+                self.job_tree.item(item_id, values=values)
+                existing.discard(item_id)
+            else:
+                self.job_tree.insert("", tk.END, iid=item_id, values=values)
+        for item_id in existing:
+            self.job_tree.delete(item_id)
+
+        if jobs:
+            running = sum(1 for job in jobs if job.status == STATUS_RUNNING)
+            finished = sum(1 for job in jobs if job.status in (STATUS_SUCCESS, STATUS_FAILED))
+            self.process_var.set(f"{finished}/{len(jobs)} 任务已完成，{running}个运行中")
+        self.root.after(500, self.refresh_job_queue)
+
+    def clear_finished_jobs(self):
+        """清除已结束的任务（任务列表在下一次刷新时更新）"""
+        self.job_manager.clear_finished()
+
     def create_status_bar(self):
         """创建状态栏"""
         status_frame = ttk.Frame(self.root)
@@ -1075,10 +1260,8 @@ class NDTResultGUI:
     
     def clear_log(self):
         """清空日志"""
-        self.log_text.configure(state='normal')
-        self.log_text.delete(1.0, tk.END)
-        self.log_text.configure(state='disabled')
-    
+        self.redirect.clear()
+
     def export_log(self):
         """导出日志"""
         filename = filedialog.asksaveasfilename(
@@ -1087,8 +1270,7 @@ class NDTResultGUI:
             filetypes=[("文本文件", "*.txt")]
         )
         if filename:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.log_text.get(1.0, tk.END))
+            self.redirect.export(filename)
             self.show_log(f"日志已导出到: {filename}")
             
     def process_data(self):
@@ -1152,52 +1334,52 @@ class NDTResultGUI:
             self.show_log(f"检测标准: {inspection_standard}")
         self.show_log("="*50)
 
-        # 在后台线程中处理数据
+        # 提交到任务队列，在后台线程中处理数据
         if selected_template == "模板1":
-            threading.Thread(target=self.run_process_mode1, args=(
+            self.job_manager.submit("RT结果通知单台账(模板1)", self.run_process_mode1, (
                 excel_path, word_path, output_path, project_name, client_name,
                 inspection_unit, inspection_standard, inspection_method
-            )).start()
+            ), sink=self.redirect, metrics_name='NDT_result_mode1')
         else:
-            threading.Thread(target=self.run_process, args=(
+            self.job_manager.submit("RT结果通知单台账(模板2)", self.run_process, (
                 excel_path, word_path, output_path, project_name, client_name, inspection_method
-            )).start()
+            ), sink=self.redirect, metrics_name='NDT_result')
         
     def run_process(self, excel_path, word_path, output_path, project_name, client_name, inspection_method):
         """在后台线程中运行数据处理 - 模板2"""
         try:
-            # 重定向标准输出到日志区
-            with redirect_stdout(self.redirect):
-                # 调用NDT_result模块的处理函数
-                success = NDT_result.process_excel_to_word(
-                    excel_path, word_path, output_path, project_name, client_name, inspection_method
-                )
+            # 调用NDT_result模块的处理函数
+            success = NDT_result.process_excel_to_word(
+                excel_path, word_path, output_path, project_name, client_name, inspection_method
+            )
 
             # 在主线程中更新UI
             self.root.after(0, self.process_completed, success)
+            return success
 
         except Exception as e:
             # 在主线程中显示错误
             self.root.after(0, self.show_error, str(e))
+            return False
 
     def run_process_mode1(self, excel_path, word_path, output_path, project_name, client_name,
                          inspection_unit, inspection_standard, inspection_method):
         """在后台线程中运行数据处理 - 模板1"""
         try:
-            # 重定向标准输出到日志区
-            with redirect_stdout(self.redirect):
-                # 调用NDT_result_mode1模块的处理函数
-                success = NDT_result_mode1.process_excel_to_word(
-                    excel_path, word_path, output_path, project_name, client_name,
-                    inspection_unit, inspection_standard, inspection_method
-                )
+            # 调用NDT_result_mode1模块的处理函数
+            success = NDT_result_mode1.process_excel_to_word(
+                excel_path, word_path, output_path, project_name, client_name,
+                inspection_unit, inspection_standard, inspection_method
+            )
 
             # 在主线程中更新UI
             self.root.after(0, self.process_completed, success)
+            return success
 
         except Exception as e:
             # 在主线程中显示错误
             self.root.after(0, self.show_error, str(e))
+            return False
             
     def process_completed(self, success):
         """处理完成后的回调"""
@@ -1219,10 +1401,7 @@ class NDTResultGUI:
         
     def show_log(self, message):
         """在日志区显示消息"""
-        self.log_text.configure(state='normal')
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)  # 自动滚动到最新内容
-        self.log_text.configure(state='disabled')
+        self.redirect.write_line(message)
 
     def browse_ray_excel(self):
         """浏览选择射线检测委托台账Excel文件"""
@@ -1250,9 +1429,7 @@ class NDTResultGUI:
 
     def clear_ray_log(self):
         """清空射线检测委托台账日志"""
-        self.ray_log_text.configure(state='normal')
-        self.ray_log_text.delete(1.0, tk.END)
-        self.ray_log_text.configure(state='disabled')
+        self.ray_redirect.clear()
 
     def export_ray_log(self):
         """导出射线检测委托台账日志"""
@@ -1262,16 +1439,12 @@ class NDTResultGUI:
             filetypes=[("文本文件", "*.txt")]
         )
         if filename:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.ray_log_text.get(1.0, tk.END))
+            self.ray_redirect.export(filename)
             self.show_ray_log(f"日志已导出到: {filename}")
 
     def show_ray_log(self, message):
         """在射线检测委托台账日志区显示消息"""
-        self.ray_log_text.configure(state='normal')
-        self.ray_log_text.insert(tk.END, message + "\n")
-        self.ray_log_text.see(tk.END)  # 自动滚动到最新内容
-        self.ray_log_text.configure(state='disabled')
+        self.ray_redirect.write_line(message)
 
     def process_ray_data(self):
         """处理射线检测委托台账数据"""
@@ -1340,23 +1513,28 @@ class NDTResultGUI:
             self.show_ray_log(f"外观检查: {appearance_check}")
             self.show_ray_log("="*50)
 
-            # 在后台线程中处理数据
-            threading.Thread(target=self.run_ray_mode1_process, args=(
+            # 提交到任务队列，在后台线程中处理数据
+            self.job_manager.submit("射线检测委托台账(模板1)", self.run_ray_mode1_process, (
                 excel_path, word_path, output_path, project_name, client_name,
                 standard, acceptance_spec, method, tech_level, appearance_check, groove
-            )).start()
+            ), sink=self.ray_redirect, metrics_name='Ray_Detection_mode1')
         else:
             # 模板2的5个参数
             category = self.ray_category_entry.get()
 
             self.show_ray_log(f"检测类别号: {category}")
+            profile_memory = None
+            if self.ray_profile_memory_var.get():
+                from memory_profile import PROFILE_CONFIG
+                profile_memory = PROFILE_CONFIG['output_dir']
+                self.show_ray_log(f"内存分析: 开启（报告目录: {profile_memory}）")
             self.show_ray_log("="*50)
 
-            # 在后台线程中处理数据
-            threading.Thread(target=self.run_ray_mode2_process, args=(
+            # 提交到任务队列，在后台线程中处理数据
+            self.job_manager.submit("射线检测委托台账(模板2)", self.run_ray_mode2_process, (
                 excel_path, word_path, output_path, project_name, category,
-                standard, method, groove
-            )).start()
+                standard, method, groove, profile_memory
+            ), sink=self.ray_redirect, metrics_name='Ray_Detection')
 
     def run_ray_mode1_process(self, excel_path, word_path, output_path, project_name, client_name,
                             standard, acceptance_spec, method, tech_level, appearance_check, groove):
@@ -1366,43 +1544,43 @@ class NDTResultGUI:
             sys.path.append(os.path.dirname(os.path.abspath(__file__)))
             import Ray_Detection_mode1
 
-            # 重定向标准输出到日志区
-            with redirect_stdout(self.ray_redirect):
-                # 调用Ray_Detection_mode1模块的处理函数
-                success = Ray_Detection_mode1.process_excel_to_word(
-                    excel_path, word_path, output_path, project_name, client_name,
-                    standard, acceptance_spec, method, tech_level, appearance_check, groove
-                )
+            # 调用Ray_Detection_mode1模块的处理函数
+            success = Ray_Detection_mode1.process_excel_to_word(
+                excel_path, word_path, output_path, project_name, client_name,
+                standard, acceptance_spec, method, tech_level, appearance_check, groove
+            )
 
             # 在主线程中更新UI
             self.root.after(0, self.process_ray_completed, success)
+            return success
 
         except Exception as e:
             # 在主线程中显示错误
             self.root.after(0, self.show_ray_error, str(e))
+            return False
 
     def run_ray_mode2_process(self, excel_path, word_path, output_path, project_name, category,
-                            standard, method, groove):
+                            standard, method, groove, profile_memory=None):
         """在后台线程中运行射线检测委托台账模板2处理"""
         try:
             # 导入Ray_Detection模块
             sys.path.append(os.path.dirname(os.path.abspath(__file__)))
             import Ray_Detection
 
-            # 重定向标准输出到日志区
-            with redirect_stdout(self.ray_redirect):
-                # 调用Ray_Detection模块的处理函数
-                success = Ray_Detection.process_excel_to_word(
-                    excel_path, word_path, output_path, project_name, category,
-                    standard, method, groove
-                )
+            # 调用Ray_Detection模块的处理函数
+            success = Ray_Detection.process_excel_to_word(
+                excel_path, word_path, output_path, project_name, category,
+                standard, method, groove, profile_memory=profile_memory
+            )
 
             # 在主线程中更新UI
             self.root.after(0, self.process_ray_completed, success)
+            return success
 
         except Exception as e:
             # 在主线程中显示错误
             self.root.after(0, self.show_ray_error, str(e))
+            return False
 
     def process_ray_completed(self, success):
         """射线检测委托台账处理完成后的回调"""
@@ -1505,11 +1683,12 @@ class NDTResultGUI:
             self.show_surface_log(f"检测标准: {inspection_standard}")
         self.show_surface_log("="*50)
 
-        # 在后台线程中处理数据
-        threading.Thread(target=self.run_surface_process, args=(
+        # 提交到任务队列，在后台线程中处理数据
+        self.job_manager.submit(f"表面结果通知单台账({selected_template})", self.run_surface_process, (
             excel_path, word_path, output_path, project_name, client_name,
             selected_template, inspection_unit, inspection_standard
-        )).start()
+        ), sink=self.surface_redirect,
+            metrics_name='Surface_Defect_mode1' if selected_template == "模板1" else 'Surface_Defect')
 
     def run_surface_process(self, excel_path, word_path, output_path, project_name, client_name,
                            selected_template, inspection_unit, inspection_standard):
@@ -1518,30 +1697,30 @@ class NDTResultGUI:
             # 根据选择的模板导入不同的模块
             sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-            # 重定向标准输出到日志区
-            with redirect_stdout(self.surface_redirect):
-                if selected_template == "模板1":
-                    # 导入Surface_Defect_mode1模块
-                    import Surface_Defect_mode1
-                    # 调用Surface_Defect_mode1模块的处理函数
-                    success = Surface_Defect_mode1.process_excel_to_word(
-                        excel_path, word_path, output_path, project_name, client_name,
-                        inspection_unit, inspection_standard
-                    )
-                else:
-                    # 导入Surface_Defect模块
-                    import Surface_Defect
-                    # 调用Surface_Defect模块的处理函数
-                    success = Surface_Defect.process_excel_to_word(
-                        excel_path, word_path, output_path, project_name, client_name
-                    )
+            if selected_template == "模板1":
+                # 导入Surface_Defect_mode1模块
+                import Surface_Defect_mode1
+                # 调用Surface_Defect_mode1模块的处理函数
+                success = Surface_Defect_mode1.process_excel_to_word(
+                    excel_path, word_path, output_path, project_name, client_name,
+                    inspection_unit, inspection_standard
+                )
+            else:
+                # 导入Surface_Defect模块
+                import Surface_Defect
+                # 调用Surface_Defect模块的处理函数
+                success = Surface_Defect.process_excel_to_word(
+                    excel_path, word_path, output_path, project_name, client_name
+                )
 
             # 在主线程中更新UI
             self.root.after(0, self.process_surface_completed, success)
+            return success
 
         except Exception as e:
             # 在主线程中显示错误
             self.root.after(0, self.show_surface_error, str(e))
+            return False
 
     def process_surface_completed(self, success):
         """表面结果通知单台账处理完成后的回调"""
@@ -1563,10 +1742,8 @@ class NDTResultGUI:
         
     def clear_surface_log(self):
         """清空表面结果通知单台账日志"""
-        self.surface_log_text.configure(state='normal')
-        self.surface_log_text.delete(1.0, tk.END)
-        self.surface_log_text.configure(state='disabled')
-    
+        self.surface_redirect.clear()
+
     def export_surface_log(self):
         """导出表面结果通知单台账日志"""
         filename = filedialog.asksaveasfilename(
@@ -1575,16 +1752,12 @@ class NDTResultGUI:
             filetypes=[("文本文件", "*.txt")]
         )
         if filename:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.surface_log_text.get(1.0, tk.END))
+            self.surface_redirect.export(filename)
             self.show_surface_log(f"日志已导出到: {filename}")
     
     def show_surface_log(self, message):
         """在表面结果通知单台账日志区显示消息"""
-        self.surface_log_text.configure(state='normal')
-        self.surface_log_text.insert(tk.END, message + "\n")
-        self.surface_log_text.see(tk.END)  # 自动滚动到最新内容
-        self.surface_log_text.configure(state='disabled')
+        self.surface_redirect.write_line(message)
 
     def browse_radio_excel(self):
         """浏览选择射线检测记录Excel文件"""
@@ -1610,7 +1783,11 @@ class NDTResultGUI:
         if directory:
             self.radio_output_path.set(directory)
 
-    def process_radio_data(self):
+    def retry_radio_failed(self):
+        """只重新生成上一次运行中失败的射线检测记录组合"""
+        self.process_radio_data(retry_failed=True)
+
+    def process_radio_data(self, retry_failed=False):
         """处理射线检测记录数据"""
         # 获取输入值
         excel_path = self.radio_excel_path.get()
@@ -1648,10 +1825,13 @@ class NDTResultGUI:
         
         # 禁用提交按钮，避免重复提交
         self.radio_submit_button.configure(state='disabled')
+        self.radio_retry_button.configure(state='disabled')
         self.status_var.set("状态: 处理中...")
         
         # 显示开始信息
         self.show_radio_log(f"开始处理数据: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        if retry_failed:
+            self.show_radio_log("处理模式: 仅重试上次运行失败的组合")
         self.show_radio_log(f"Excel文件: {excel_path}")
         self.show_radio_log(f"Word模板: {word_path}")
         self.show_radio_log(f"输出路径: {output_path}")
@@ -1662,34 +1842,34 @@ class NDTResultGUI:
         self.show_radio_log(f"设备型号: {equipment_model}")
         self.show_radio_log("="*50)
         
-        # 在后台线程中处理数据
-        threading.Thread(target=self.run_radio_process, args=(
+        # 提交到任务队列，在后台线程中处理数据
+        self.job_manager.submit("射线检测记录(仅重试失败组)" if retry_failed else "射线检测记录", self.run_radio_process, (
             excel_path, word_path, output_path, project_name, client_name, guide_number, 
-            contract_name, equipment_model
-        )).start()
+            contract_name, equipment_model, retry_failed
+        ), sink=self.radio_redirect, metrics_name='Radio_test')
 
     def run_radio_process(self, excel_path, word_path, output_path, project_name, client_name, guide_number, 
-                          contract_name, equipment_model):
+                          contract_name, equipment_model, retry_failed=False):
         """在后台线程中运行射线检测记录处理"""
         try:
             # 导入Radio_test模块
             sys.path.append(os.path.dirname(os.path.abspath(__file__)))
             import Radio_test
             
-            # 重定向标准输出到日志区
-            with redirect_stdout(self.radio_redirect):
-                # 调用Radio_test模块的处理函数
-                success = Radio_test.process_excel_to_word(
-                    excel_path, word_path, output_path, project_name, client_name, guide_number, 
-                    contract_name, equipment_model
-                )
+            # 调用Radio_test模块的处理函数
+            success = Radio_test.process_excel_to_word(
+                excel_path, word_path, output_path, project_name, client_name, guide_number, 
+                contract_name, equipment_model, retry_failed=retry_failed
+            )
             
             # 在主线程中更新UI
             self.root.after(0, self.process_radio_completed, success)
+            return success
             
         except Exception as e:
             # 在主线程中显示错误
             self.root.after(0, self.show_radio_error, str(e))
+            return False
 
     def process_radio_completed(self, success):
         """射线检测记录处理完成后的回调"""
@@ -1702,19 +1882,19 @@ class NDTResultGUI:
             
         # 重新启用提交按钮
         self.radio_submit_button.configure(state='normal')
+        self.radio_retry_button.configure(state='normal')
         
     def show_radio_error(self, error_msg):
         """显示射线检测记录错误信息"""
         self.show_radio_log(f"\n错误: {error_msg}")
         self.status_var.set("状态: 处理出错")
         self.radio_submit_button.configure(state='normal')
+        self.radio_retry_button.configure(state='normal')
 
     def clear_radio_log(self):
         """清空射线检测记录日志"""
-        self.radio_log_text.configure(state='normal')
-        self.radio_log_text.delete(1.0, tk.END)
-        self.radio_log_text.configure(state='disabled')
-    
+        self.radio_redirect.clear()
+
     def export_radio_log(self):
         """导出射线检测记录日志"""
         filename = filedialog.asksaveasfilename(
@@ -1723,16 +1903,12 @@ class NDTResultGUI:
             filetypes=[("文本文件", "*.txt")]
         )
         if filename:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.radio_log_text.get(1.0, tk.END))
+            self.radio_redirect.export(filename)
             self.show_radio_log(f"日志已导出到: {filename}")
     
     def show_radio_log(self, message):
         """在射线检测记录日志区显示消息"""
-        self.radio_log_text.configure(state='normal')
-        self.radio_log_text.insert(tk.END, message + "\n")
-        self.radio_log_text.see(tk.END)  # 自动滚动到最新内容
-        self.radio_log_text.configure(state='disabled')
+        self.radio_redirect.write_line(message)
 
     def browse_radio_renewal_excel(self):
         """浏览选择射线检测记录续Excel文件"""
@@ -1767,12 +1943,18 @@ class NDTResultGUI:
         project_name = self.radio_renewal_project_entry.get()
         client_name = self.radio_renewal_client_entry.get()
         guide_number = self.radio_renewal_guide_entry.get()
+        memory_limit = self.radio_renewal_memory_entry.get().strip()
         
         # 验证输入
         if not excel_path or not os.path.exists(excel_path):
             self.show_radio_renewal_log("错误: 请选择有效的Excel文件")
             return
         
+        if memory_limit and not memory_limit.isdigit():
+            self.show_radio_renewal_log("错误: 内存上限请输入整数(MB)，0表示不限制")
+            return
+        memory_limit_mb = int(memory_limit) if memory_limit else None
+        
         if not word_path or not os.path.exists(word_path):
             self.show_radio_renewal_log("错误: 请选择有效的Word模板文件")
             return
@@ -1804,33 +1986,37 @@ class NDTResultGUI:
         self.show_radio_renewal_log(f"工程名称: {project_name}")
         self.show_radio_renewal_log(f"委托单位: {client_name}")
         self.show_radio_renewal_log(f"操作指导书编号: {guide_number}")
+        if memory_limit_mb is not None:
+            self.show_radio_renewal_log(f"内存上限: {memory_limit_mb} MB")
         self.show_radio_renewal_log("="*50)
         
-        # 在后台线程中处理数据
-        threading.Thread(target=self.run_radio_renewal_process, args=(
-            excel_path, word_path, output_path, project_name, client_name, guide_number
-        )).start()
+        # 提交到任务队列，在后台线程中处理数据
+        self.job_manager.submit("射线检测记录续", self.run_radio_renewal_process, (
+            excel_path, word_path, output_path, project_name, client_name, guide_number, memory_limit_mb
+        ), sink=self.radio_renewal_redirect, metrics_name='Radio_test_renewal')
 
-    def run_radio_renewal_process(self, excel_path, word_path, output_path, project_name, client_name, guide_number):
+    def run_radio_renewal_process(self, excel_path, word_path, output_path, project_name, client_name, guide_number,
+                                  memory_limit_mb=None):
         """在后台线程中运行射线检测记录续处理"""
         try:
             # 导入Radio_test_renewal模块
             sys.path.append(os.path.dirname(os.path.abspath(__file__)))
             import Radio_test_renewal
             
-            # 重定向标准输出到日志区
-            with redirect_stdout(self.radio_renewal_redirect):
-                # 调用Radio_test_renewal模块的处理函数
-                success = Radio_test_renewal.process_excel_to_word(
-                    excel_path, word_path, output_path, project_name, client_name, guide_number
-                )
+            # 调用Radio_test_renewal模块的处理函数
+            success = Radio_test_renewal.process_excel_to_word(
+                excel_path, word_path, output_path, project_name, client_name, guide_number,
+                memory_limit_mb=memory_limit_mb
+            )
             
             # 在主线程中更新UI
             self.root.after(0, self.process_radio_renewal_completed, success)
+            return success
             
         except Exception as e:
             # 在主线程中显示错误
             self.root.after(0, self.show_radio_renewal_error, str(e))
+            return False
 
     def process_radio_renewal_completed(self, success):
         """射线检测记录续处理完成后的回调"""
@@ -1852,10 +2038,8 @@ class NDTResultGUI:
 
     def clear_radio_renewal_log(self):
         """清空射线检测记录续日志"""
-        self.radio_renewal_log_text.configure(state='normal')
-        self.radio_renewal_log_text.delete(1.0, tk.END)
-        self.radio_renewal_log_text.configure(state='disabled')
-    
+        self.radio_renewal_redirect.clear()
+
     def export_radio_renewal_log(self):
         """导出射线检测记录续日志"""
         filename = filedialog.asksaveasfilename(
@@ -1864,16 +2048,12 @@ class NDTResultGUI:
             filetypes=[("文本文件", "*.txt")]
         )
         if filename:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.radio_renewal_log_text.get(1.0, tk.END))
+            self.radio_renewal_redirect.export(filename)
             self.show_radio_renewal_log(f"日志已导出到: {filename}")
     
     def show_radio_renewal_log(self, message):
         """在射线检测记录续日志区显示消息"""
-        self.radio_renewal_log_text.configure(state='normal')
-        self.radio_renewal_log_text.insert(tk.END, message + "\n")
-        self.radio_renewal_log_text.see(tk.END)  # 自动滚动到最新内容
-        self.radio_renewal_log_text.configure(state='disabled')
+        self.radio_renewal_redirect.write_line(message)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,246 @@
+"""
+GUI任务管理
+
+原来每个功能模块在后台线程中用 contextlib.redirect_stdout 把输出重定向到自己的日志区。
+redirect_stdout 替换的是进程全局的 sys.stdout，两个模块同时运行时日志会互相串行或错发，
+所以只能一次运行一个模块。
+
+本模块：
+1. JobStdoutRouter 只安装一次，按当前任务（contextvars）把输出分发到该任务自己的日志
+2. JobManager 用线程池并发运行多个任务，记录每个任务的状态、已生成报告数和耗时；
+   提交时指定模块名的任务，结束后写出运行指标（run_metrics）
+3. buffered_output 暂存一段输出，结束时整块写出，同一任务内多个线程的日志不会交错
+"""
+
+import contextvars
+import io
+import itertools
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import run_metrics
+
+# 任务管理配置
+JOB_CONFIG = {
+    'max_workers': 3,   # 同时运行的任务数
+}
+
+STATUS_QUEUED = '等待中'
+STATUS_RUNNING = '运行中'
+STATUS_SUCCESS = '完成'
+STATUS_FAILED = '失败'
+
+# 生成器保存一份报告（或报告内容未变化而保留原文件）时输出的日志，用于统计任务进度
+PROGRESS_PATTERN = re.compile(r'文档已(成功)?保存至|内容未变化，保留原文件')
+
+# 当前任务的日志（在任务线程及其复制了上下文的子线程中有效）
+_current_log = contextvars.ContextVar('job_log', default=None)
+
+
+class JobStdoutRouter:
+    """按任务分发的标准输出：当前上下文属于某个任务时写入该任务的日志，否则写入原输出"""
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def write(self, text):
+        log = _current_log.get()
+        if log is not None:
+            return log.write(text)
+        return self.fallback.write(text) if self.fallback is not None else len(text)
+
+    def flush(self):
+        log = _current_log.get()
+        if log is not None:
+            log.flush()
+        elif self.fallback is not None:
+            self.fallback.flush()
+
+    @contextmanager
+    def route(self, log):
+        """在with块内（以及复制了当前上下文的线程中）把输出写入log"""
+        token = _current_log.set(log)
+        try:
+            yield log
+        finally:
+            _current_log.reset(token)
+
+
+_router_lock = threading.Lock()
+
+
+def install_stdout_router() -> JobStdoutRouter:
+    """把 sys.stdout 替换为按任务分发的输出（重复调用返回同一个实例）"""
+    with _router_lock:
+        if not isinstance(sys.stdout, JobStdoutRouter):
+            sys.stdout = JobStdoutRouter(sys.stdout)
+        return sys.stdout
+
+
+def current_output():
+    """返回当前上下文的输出目标：当前任务的日志，不属于任务时为原输出（可能为None）"""
+    router = install_stdout_router()
+    log = _current_log.get()
+    return log if log is not None else router.fallback
+
+
+@contextmanager
+def buffered_output():
+    """在with块内（以及复制了当前上下文的线程中）暂存输出，结束时一次写出到原来的目标
+
+    原来的目标为当前任务的日志，不属于任务时为原输出。多个线程同时输出时（如报告流水线的
+    准备和填充阶段），每个线程的一段日志整块写出，不会逐行交错。
+    """
+    router = install_stdout_router()
+    target = current_output()
+    buffer = io.StringIO()
+    try:
+        with router.route(buffer):
+            yield buffer
+    finally:
+        text = buffer.getvalue()
+        if text and target is not None:
+            target.write(text)
+
+
+@dataclass
+class Job:
+    """一个生成任务"""
+    job_id: int
+    name: str
+    status: str = STATUS_QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    reports_done: int = 0
+    log_lines: int = 0
+    error: Optional[str] = None
+    result: Any = None
+
+    @property
+    def elapsed(self) -> float:
+        """运行耗时（秒），未开始时为0"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobLog:
+    """任务日志：把输出转交给任务的日志目标，并按行统计进度
+
+    Args:
+        job: 所属任务
+        sink: 日志目标（具有write方法的对象，如GUI的日志控件包装）
+    """
+
+    def __init__(self, job: Job, sink=None):
+        self.job = job
+        self.sink = sink
+        self._partial = ""
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            lines = (self._partial + text).split('\n')
+            self._partial = lines.pop()
+            for line in lines:
+                self.job.log_lines += 1
+                if PROGRESS_PATTERN.search(line):
+                    self.job.reports_done += 1
+        if self.sink is not None:
+            self.sink.write(text)
+        return len(text)
+
+    def flush(self):
+        if self.sink is not None and hasattr(self.sink, 'flush'):
+            self.sink.flush()
+
+
+class JobManager:
+    """并发运行生成任务
+
+    每个任务在线程池中运行，输出只写入提交任务时指定的日志目标。
+    回调在任务线程中调用，GUI需要自行切换到主线程更新界面。
+
+    Args:
+        max_workers: 同时运行的任务数（默认: JOB_CONFIG['max_workers']）
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.router = install_stdout_router()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or JOB_CONFIG['max_workers'],
+                                            thread_name_prefix='job')
+        self._jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, func: Callable[..., Any], args: tuple = (),
+               kwargs: Optional[Dict[str, Any]] = None, sink=None,
+               on_done: Optional[Callable[[Job], None]] = None,
+               metrics_name: Optional[str] = None) -> Job:
+        """提交任务
+
+        Args:
+            name: 任务名称（显示在任务队列中）
+            func: 任务函数，返回值为真表示成功
+            args: 位置参数
+            kwargs: 关键字参数
+            sink: 任务日志目标
+            on_done: 任务结束后的回调
+            metrics_name: 运行指标的模块名（可选，设置时任务结束后写出运行指标）
+
+        Returns:
+            Job: 任务对象
+        """
+        job = Job(next(self._ids), name)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, func, args, kwargs or {}, sink, on_done, metrics_name)
+        return job
+
+    def _run(self, job, func, args, kwargs, sink, on_done, metrics_name=None):
+        job.status = STATUS_RUNNING
+        job.started_at = time.time()
+        log = JobLog(job, sink)
+        try:
+            with self.router.route(log):
+                if metrics_name:
+                    with run_metrics.collect(metrics_name) as metrics:
+                        job.result = func(*args, **kwargs)
+                        metrics.success = bool(job.result)
+                else:
+                    job.result = func(*args, **kwargs)
+            job.status = STATUS_SUCCESS if job.result else STATUS_FAILED
+        except Exception as e:
+            job.error = str(e)
+            job.status = STATUS_FAILED
+            log.write(f"\n错误: {e}\n")
+        finally:
+            job.finished_at = time.time()
+        if on_done is not None:
+            on_done(job)
+
+    def jobs(self) -> List[Job]:
+        """按提交顺序返回全部任务"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def active_count(self) -> int:
+        """等待中和运行中的任务数"""
+        return sum(1 for job in self.jobs() if job.status in (STATUS_QUEUED, STATUS_RUNNING))
+
+    def clear_finished(self):
+        """从任务列表中移除已结束的任务"""
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.status in (STATUS_SUCCESS, STATUS_FAILED)]:
+                del self._jobs[job_id]
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
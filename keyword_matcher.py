@@ -0,0 +1,146 @@
+"""
+多关键字匹配
+
+模板扫描（表头列定位、日期单元格、"以下空白"等标记行）原来对每个单元格逐个关键字
+执行 `"检测批号" in cell.text`：每次都重新拼接单元格文字（遍历所有段落和文字），
+而 table.rows / row.cells 每次又重新计算整个表格的单元格网格。
+
+本模块：
+1. KeywordMatcher 把一组关键字构建为 Aho–Corasick 自动机，一次扫描文字即得到全部命中的关键字
+   （包括互相包含的关键字，如"合格"和"不合格"），相同文字的匹配结果会被缓存
+2. scan_table 按 TableGrid 的网格逐行返回单元格，每个不同的单元格只取一次文字、匹配一次
+
+原来的 if/elif 判断链改为在命中集合上判断，判断顺序和结果保持不变。
+"""
+
+from collections import deque
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+import run_metrics
+from table_builder import TableGrid
+
+# 匹配结果缓存的最大条目数（模板中的单元格文字大量重复，如空单元格、表头）
+_CACHE_LIMIT = 4096
+
+_EMPTY = frozenset()
+
+
+class KeywordMatcher:
+    """Aho–Corasick 多关键字匹配器
+
+    Args:
+        keywords: 关键字（顺序即优先级，first_hit 按该顺序返回第一个命中的关键字）
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: Tuple[str, ...] = tuple(dict.fromkeys(k for k in keywords if k))
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [0]   # 每个状态命中的关键字（按关键字序号的位掩码）
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(0)
+                state = next_state
+            self._output[state] |= 1 << index
+        self._alphabet = frozenset(self._goto[0])
+        self._build_failure_links()
+        self._sets = {0: _EMPTY}
+        self._cache = {}
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def find(self, text: Optional[str]) -> FrozenSet[str]:
+        """返回文字中出现的全部关键字
+
+        Args:
+            text: 待匹配的文字
+
+        Returns:
+            frozenset: 命中的关键字集合（没有命中时为空集合）
+        """
+        if not text:
+            return _EMPTY
+        hits = self._cache.get(text)
+        if hits is not None:
+            run_metrics.count('lookup_cache_hits')
+            return hits
+        run_metrics.count('lookup_cache_misses')
+
+        goto, fail, output, alphabet = self._goto, self._fail, self._output, self._alphabet
+        state = 0
+        mask = 0
+        for char in text:
+            if state == 0 and char not in alphabet:
+                continue
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            mask |= output[state]
+
+        hits = self._sets.get(mask)
+        if hits is None:
+            hits = self._sets[mask] = frozenset(
+                keyword for index, keyword in enumerate(self.keywords) if mask >> index & 1)
+        if len(self._cache) >= _CACHE_LIMIT:
+            self._cache.clear()
+        self._cache[text] = hits
+        return hits
+
+    def first_hit(self, hits: FrozenSet[str]) -> Optional[str]:
+        """按关键字顺序返回命中集合中的第一个关键字（对应原来的 if/elif 判断链）"""
+        if not hits:
+            return None
+        for keyword in self.keywords:
+            if keyword in hits:
+                return keyword
+        return None
+
+
+def scan_table(table, matcher: KeywordMatcher, grid: Optional[TableGrid] = None,
+               start: int = 0, stop: Optional[int] = None
+               ) -> Iterator[Tuple[int, List[Tuple[int, object, str, FrozenSet[str]]]]]:
+    """逐行扫描表格单元格的关键字
+
+    单元格顺序与 row.cells 一致（合并单元格在每个网格位置重复出现），
+    同一个单元格的文字只读取一次；遍历过程中修改单元格文字不会影响后续行已缓存的结果。
+
+    Args:
+        table: Word表格对象
+        matcher: 关键字匹配器
+        grid: 已创建的表格网格（可选）
+        start: 起始行索引
+        stop: 结束行索引（不包含，默认到表格末尾）
+
+    Yields:
+        (行索引, [(列索引, 单元格, 文字, 命中的关键字), ...])
+    """
+    grid = grid or TableGrid(table)
+    stop = len(grid) if stop is None else min(stop, len(grid))
+    scanned = {}
+    for row_idx in range(start, stop):
+        entries = []
+        for col_idx, cell in enumerate(grid.cells(row_idx)):
+            entry = scanned.get(cell._tc)
+            if entry is None:
+                text = cell.text
+                entry = scanned[cell._tc] = (text, matcher.find(text))
+            entries.append((col_idx, cell, entry[0], entry[1]))
+        yield row_idx, entries
@@ -0,0 +1,280 @@
+"""
+台账共享读取会话
+
+同一份台账工作簿常常需要生成多种报告，例如：
+- 4_生成器台账-射线检测记录.xlsx 同时用于 Radio_test（射线检测记录）和 Radio_test_renewal（续表）
+- 2_生成器结果.xlsx 同时用于 NDT_result（Mode2）和 NDT_result_mode1（Mode1）
+
+LedgerSession 只读取并分组一次工作簿，然后把同一份只读分组交给多个生成器使用。
+run_generators 可以让多个生成器并行运行，总耗时接近最慢的单个生成器。
+
+共享范围：依次运行（--serial）和多模板逐组生成（fan_out）时，各生成器在同一进程中共用
+读取结果、分组和分组派生数据。并行运行时工作簿仍只读取一次，但每个进程收到一份序列化的数据，
+在进程内各自分组，分组和派生数据不在进程之间共享。
+"""
+
+import argparse
+import importlib
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+import archive_output
+import run_metrics
+
+
+class LedgerSession:
+    """台账工作簿的共享读取会话
+
+    工作簿只读取一次；每个生成器通过 read_excel 获得自己的浅副本（可增加、替换列，不可原地修改数据），
+    通过 partitions 获得按列分组的只读分组（修改前需要先 copy()），
+    通过 group_value 共用每个分组的派生数据（如最晚完成日期）。
+
+    Args:
+        excel_path: Excel台账路径
+        dataframe: 已读取的数据（可选，传入时不再读取文件）
+        sheet_name: 读取的工作表（默认第一个工作表；表面检测台账为"荣信聚乙烯PT"）
+    """
+
+    def __init__(self, excel_path: str, dataframe: Optional[pd.DataFrame] = None,
+                 sheet_name: Optional[str] = None):
+        self.excel_path = excel_path
+        self.sheet_name = sheet_name
+        self._dataframe = dataframe
+        self._partitions: Dict[Any, MappingProxyType] = {}
+        self._group_values: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def dataframe(self) -> pd.DataFrame:
+        """会话共享的原始数据（只读）"""
+        with self._lock:
+            if self._dataframe is None:
+                print(f"正在读取Excel文件(共享会话): {self.excel_path}")
+                self._dataframe = pd.read_excel(self.excel_path, sheet_name=self.sheet_name or 0)
+                print(f"共享会话读取完成，共{len(self._dataframe)}行数据")
+            return self._dataframe
+
+    def covers(self, excel_path: str) -> bool:
+        """判断会话是否对应指定的Excel文件"""
+        return os.path.abspath(excel_path) == os.path.abspath(self.excel_path)
+
+    def read_excel(self, excel_path: Optional[str] = None) -> pd.DataFrame:
+        """返回工作簿数据的浅副本（不复制数据），生成器可以在副本上增加或替换列
+
+        副本与会话共用各列的数据，不能原地修改数据（如 df.loc[...] = 值、inplace=True），
+        需要原地修改时先 copy()。分组（partitions）来自会话的原始数据，不包含在副本上增加的列。
+
+        Args:
+            excel_path: 生成器请求的Excel路径，与会话文件不一致时直接读取该文件
+
+        Returns:
+            DataFrame: 数据浅副本
+        """
+        if excel_path is not None and not self.covers(excel_path):
+            print(f"警告: 共享会话文件为 {self.excel_path}，改为直接读取 {excel_path}")
+            return pd.read_excel(excel_path, sheet_name=self.sheet_name or 0)
+        return self.dataframe.copy(deep=False)
+
+    def partitions(self, column: str, sort: bool = False) -> MappingProxyType:
+        """按列分组，返回 {分组键: 分组数据} 的只读映射
+
+        分组只计算一次并在生成器之间共享。sort=False 时分组顺序与
+        df[column].dropna().unique() 一致，sort=True 时与 df.groupby(column) 一致。
+
+        Args:
+            column: 分组列名
+            sort: 是否按分组键排序
+
+        Returns:
+            MappingProxyType: 只读分组映射，分组数据修改前需要先 copy()
+        """
+        cache_key = (column, sort)
+        with self._lock:
+            cached = self._partitions.get(cache_key)
+        if cached is not None:
+            run_metrics.count('lookup_cache_hits')
+            return cached
+        run_metrics.count('lookup_cache_misses')
+
+        df = self.dataframe
+        if column not in df.columns:
+            raise KeyError(f"共享会话数据中没有列: {column}")
+        grouped = df.groupby(column, sort=sort)
+        partitions = MappingProxyType({key: group for key, group in grouped})
+
+        with self._lock:
+            self._partitions.setdefault(cache_key, partitions)
+            return self._partitions[cache_key]
+
+    def group_value(self, name: Any, key: Any, compute: Callable[[], Any]) -> Any:
+        """分组的派生数据（如最晚完成日期、单元名称），同一会话中每个分组只计算一次
+
+        多个模板共用同一会话时（fan_out），后生成的模板直接取用已计算的结果。
+
+        Args:
+            name: 数据名称，应包含计算所用的列名（如 ('最晚完成日期', 列名)）
+            key: 分组键
+            compute: 计算函数（只在第一次请求时调用）
+
+        Returns:
+            派生数据（只读，调用方不应修改）
+        """
+        cache_key = (name, key)
+        with self._lock:
+            if cache_key in self._group_values:
+                run_metrics.count('lookup_cache_hits')
+                return self._group_values[cache_key]
+        run_metrics.count('lookup_cache_misses')
+        value = compute()
+        with self._lock:
+            return self._group_values.setdefault(cache_key, value)
+
+
+def session_for(session: Optional[LedgerSession], excel_path: str) -> Optional[LedgerSession]:
+    """生成器内部使用：只有会话对应同一Excel文件时才使用会话"""
+    if session is not None and session.covers(excel_path):
+        return session
+    return None
+
+
+def group_value(session: Optional[LedgerSession], name: Any, key: Any, compute: Callable[[], Any]) -> Any:
+    """生成器内部使用：有会话时按分组共用派生数据，否则直接计算"""
+    if session is None:
+        return compute()
+    return session.group_value(name, key, compute)
+
+
+@dataclass
+class GeneratorJob:
+    """一次生成任务：调用 module.process_excel_to_word(excel_path, word_template_path, **options)"""
+    name: str
+    module: str
+    word_template_path: str
+    options: Dict[str, Any] = field(default_factory=dict)
+
+
+def _run_job(job: GeneratorJob, excel_path: str, dataframe: Optional[pd.DataFrame], capture: bool = False):
+    """执行单个生成任务（可在子进程中运行；capture 时暂存报告，由父进程写入归档）"""
+    session = LedgerSession(excel_path, dataframe)
+    start = time.perf_counter()
+    module = importlib.import_module(job.module)
+    with run_metrics.collect(job.module, write=False) as metrics, archive_output.capture(capture) as buffer:
+        try:
+            success = module.process_excel_to_word(excel_path, job.word_template_path,
+                                                   session=session, **job.options)
+        except Exception as e:
+            print(f"错误: {job.name} 生成失败: {e}")
+            success = False
+    return (job.name, bool(success), time.perf_counter() - start, metrics.snapshot(),
+            buffer.entries if buffer else None)
+
+
+def run_generators(session: LedgerSession, jobs: List[GeneratorJob], parallel: bool = True) -> Dict[str, bool]:
+    """使用同一个会话运行多个生成器
+
+    Args:
+        session: 共享读取会话
+        jobs: 生成任务列表
+        parallel: 是否在多个进程中并行运行（数据只读取一次后分发给各进程；
+                  每个进程各自分组，分组和派生数据只在依次运行时共享）
+
+    Returns:
+        dict: 任务名称 -> 是否成功
+    """
+    start = time.perf_counter()
+    with run_metrics.stage('read'):
+        dataframe = session.dataframe
+    results = {}
+
+    if parallel and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+            capture = archive_output.current() is not None
+            futures = [executor.submit(_run_job, job, session.excel_path, dataframe, capture) for job in jobs]
+            outcomes = [future.result() for future in futures]
+    else:
+        outcomes = [_run_job(job, session.excel_path, dataframe) for job in jobs]
+
+    for name, success, seconds, metrics, reports in outcomes:
+        results[name] = success
+        run_metrics.merge(metrics)
+        archive_output.merge(reports)
+        print(f"{name}: {'成功' if success else '失败'}，耗时 {seconds:.2f} 秒")
+    print(f"全部生成完成，总耗时 {time.perf_counter() - start:.2f} 秒")
+    return results
+
+
+# 常用的台账组合：同一工作簿生成的多种报告
+LEDGER_PRESETS = {
+    'ndt': {
+        'excel': "生成器/Excel/2_生成器结果.xlsx",
+        'jobs': [
+            ('RT结果通知单台账_Mode2', 'NDT_result', "生成器/word/2_RT结果通知台账_Mode2.docx"),
+            ('RT结果通知单台账_Mode1', 'NDT_result_mode1', "生成器/word/2_RT结果通知台账_Mode1.docx"),
+        ],
+    },
+    'radio': {
+        'excel': "生成器/Excel/4_生成器台账-射线检测记录.xlsx",
+        'jobs': [
+            ('射线检测记录', 'Radio_test', "生成器/word/4_射线检测记录.docx"),
+            ('射线检测记录续', 'Radio_test_renewal', "生成器/word/5_射线检测记录_续.docx"),
+        ],
+    },
+}
+
+
+def main():
+    # 创建命令行参数解析器
+    parser = argparse.ArgumentParser(description='一次读取台账，生成该台账对应的全部报告')
+    parser.add_argument('ledger', choices=sorted(LEDGER_PRESETS),
+                        help='台账类型: ndt (RT结果通知单Mode1+Mode2) 或 radio (射线检测记录+续表)')
+    parser.add_argument('-e', '--excel',
+                        help='Excel表格路径 (默认使用台账类型对应的生成器Excel)')
+    parser.add_argument('-p', '--project',
+                        help='工程名称，用于替换文档中的"工程名称值"')
+    parser.add_argument('-c', '--client',
+                        help='委托单位，用于替换文档中的"委托单位值"')
+    parser.add_argument('--serial', action='store_true',
+                        help='依次运行各生成器（默认并行运行）')
+    parser.add_argument('--metrics-dir', default=run_metrics.METRICS_CONFIG['output_dir'],
+                        help=f"运行指标输出目录 (默认: {run_metrics.METRICS_CONFIG['output_dir']})")
+    parser.add_argument('--archive',
+                        help='把报告直接写入该归档文件（.zip、.tar、.tar.gz），不写单独的文件')
+
+    # 解析命令行参数
+    args = parser.parse_args()
+
+    preset = LEDGER_PRESETS[args.ledger]
+    excel_path = args.excel or preset['excel']
+    if not os.path.exists(excel_path):
+        print(f"错误: Excel文件不存在: {excel_path}")
+        sys.exit(1)
+
+    options = {'project_name': args.project}
+    jobs = []
+    for name, module, word_template_path in preset['jobs']:
+        job_options = dict(options)
+        if module == 'Radio_test':
+            job_options['entrusting_unit'] = args.client
+        else:
+            job_options['client_name'] = args.client
+        jobs.append(GeneratorJob(name, module, word_template_path, job_options))
+
+    with archive_output.archive(args.archive) as sink, run_metrics.collect(f"ledger_session_{args.ledger}", args.metrics_dir) as metrics:
+        results = run_generators(LedgerSession(excel_path), jobs, parallel=not args.serial)
+        metrics.success = all(results.values())
+        if sink is not None:
+            sink.success = all(results.values())
+
+    # 返回状态码（开启归档输出而未能生成归档时同样视为失败）
+    sys.exit(0 if all(results.values()) and archive_output.published(sink) else 1)
+
+if __name__ == "__main__":
+    main()
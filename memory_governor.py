@@ -0,0 +1,202 @@
+"""
+内存预算控制
+
+Radio_test_renewal.EXPANSION_CONFIG['memory_limit_mb'] 原来只是一个声明，从未生效：
+大批量生成时，已保存的文档、每个分组的 DataFrame 切片都一直留在内存中，
+使用大型γ/X射线模板时进程内存持续上涨。
+
+本模块：
+1. process_rss_mb 读取当前进程的常驻内存（Linux 读 /proc，Windows 调用 GetProcessMemoryInfo，
+   安装了 psutil 时优先使用 psutil），process_peak_rss_mb 读取进程启动以来的常驻内存峰值
+2. MemoryGovernor 统计同一进程内正在处理的文档数量（GUI 可同时运行多个任务），
+   打开新文档前检查内存：超过上限时先回收内存，仍超过则等待其他文档保存释放后再继续
+3. DispatchThrottle 用于多进程派发：按各子进程上报的内存估算总占用，
+   超过 上限×进程数 时暂停派发新分组，等已派发的分组完成
+
+内存上限都按每个进程计算（默认 EXPANSION_CONFIG['memory_limit_mb']）。
+"""
+
+import gc
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 内存控制配置
+GOVERNOR_CONFIG = {
+    'poll_seconds': 0.5,      # 超过上限时的等待检查间隔
+}
+
+# 同一进程内所有 MemoryGovernor 共享的在途文档计数
+_condition = threading.Condition()
+_in_flight = 0
+
+
+def _windows_memory_counters():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    get_process = ctypes.windll.kernel32.GetCurrentProcess
+    get_process.restype = wintypes.HANDLE
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(get_process(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+
+def process_rss_mb() -> Optional[float]:
+    """返回当前进程的常驻内存（MB），系统不支持时返回None"""
+    try:
+        if psutil is not None:
+            return psutil.Process().memory_info().rss / 1024 / 1024
+        if sys.platform.startswith('linux'):
+            with open('/proc/self/statm') as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+        if sys.platform == 'win32':
+            counters = _windows_memory_counters()
+            return counters.WorkingSetSize / 1024 / 1024 if counters is not None else None
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def process_peak_rss_mb() -> Optional[float]:
+    """返回当前进程启动以来的常驻内存峰值（MB），系统不支持时返回None"""
+    try:
+        if sys.platform.startswith('linux'):
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) / 1024
+        elif sys.platform == 'win32':
+            counters = _windows_memory_counters()
+            return counters.PeakWorkingSetSize / 1024 / 1024 if counters is not None else None
+        else:
+            import resource
+            # macOS 的 ru_maxrss 单位为字节
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 / 1024
+    except (OSError, ValueError, AttributeError, ImportError):
+        pass
+    return None
+
+
+def in_flight_documents() -> int:
+    """返回本进程正在处理的文档数量"""
+    with _condition:
+        return _in_flight
+
+
+class MemoryGovernor:
+    """按内存上限控制同时处理的文档
+
+    Args:
+        limit_mb: 内存上限（MB），为0或None时不限制
+    """
+
+    def __init__(self, limit_mb: Optional[float]):
+        self.limit_mb = limit_mb or 0
+        self.peak_mb = 0.0
+        self.throttled = 0
+        self._warned = False
+
+    def over_budget(self) -> bool:
+        """判断当前进程内存是否超过上限"""
+        rss = process_rss_mb()
+        if rss is None:
+            return False
+        self.peak_mb = max(self.peak_mb, rss)
+        return bool(self.limit_mb) and rss > self.limit_mb
+
+    def acquire(self):
+        """开始处理一份文档：超过内存上限时先回收内存，仍超过则等待其他文档完成"""
+        global _in_flight
+        with _condition:
+            if self.limit_mb and self.over_budget():
+                gc.collect()
+                waited = False
+                while self.over_budget() and _in_flight > 0:
+                    if not waited:
+                        self.throttled += 1
+                        print(f"内存占用 {process_rss_mb():.0f} MB 超过上限 {self.limit_mb} MB，"
+                              f"等待正在处理的 {_in_flight} 份文档完成")
+                        waited = True
+                    _condition.wait(GOVERNOR_CONFIG['poll_seconds'])
+                    gc.collect()
+                if self.over_budget() and not self._warned:
+                    self._warned = True
+                    print(f"警告: 内存占用 {process_rss_mb():.0f} MB 仍超过上限 {self.limit_mb} MB，继续处理")
+            _in_flight += 1
+
+    def release(self):
+        """一份文档处理完成（已保存并释放）"""
+        global _in_flight
+        with _condition:
+            _in_flight -= 1
+            _condition.notify_all()
+
+    @contextmanager
+    def document(self):
+        """处理一份文档：进入时按内存上限等待，退出时（文档已保存）释放名额"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+            self.over_budget()   # 记录峰值
+
+    def admit_each(self, items: Iterable):
+        """逐个返回待处理项，每一项都按 document() 的方式进出（用于 for 循环）"""
+        for item in items:
+            with self.document():
+                yield item
+
+    def summary(self) -> str:
+        """返回本次运行的内存统计"""
+        text = f"内存峰值 {self.peak_mb:.0f} MB"
+        if self.limit_mb:
+            text += f"（上限 {self.limit_mb} MB，因内存等待 {self.throttled} 次）"
+        return text
+
+
+class DispatchThrottle:
+    """多进程派发时的内存控制
+
+    各子进程在分组完成后上报自己的内存，总占用 = 本进程 + 各子进程最近一次上报的内存，
+    总上限 = 每个进程的上限 × (子进程数 + 1)。
+
+    Args:
+        limit_mb: 每个进程的内存上限（MB），为0或None时不限制
+        workers: 子进程数量
+    """
+
+    def __init__(self, limit_mb: Optional[float], workers: int = 1):
+        self.limit_mb = (limit_mb or 0) * (workers + 1)
+        self.worker_rss: Dict[int, float] = {}
+        self.throttled = 0
+
+    def report(self, pid: int, rss_mb: Optional[float]):
+        """记录子进程上报的内存"""
+        if rss_mb is not None:
+            self.worker_rss[pid] = rss_mb
+
+    def total_mb(self) -> float:
+        return (process_rss_mb() or 0) + sum(self.worker_rss.values())
+
+    def over_budget(self) -> bool:
+        """判断总内存是否超过上限"""
+        return bool(self.limit_mb) and self.total_mb() > self.limit_mb
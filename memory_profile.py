@@ -0,0 +1,215 @@
+"""
+按阶段的内存分析（tracemalloc）
+
+内存占用到底花在哪里并不直观：pd.to_datetime 赋值产生的 DataFrame 副本、
+python-docx 每次访问产生的代理对象、每份文档的 lxml 树，还是日志字符串？
+
+本模块：
+1. MemoryProfiler.stage(阶段, 分组) 在阶段前后各取一次 tracemalloc 快照，
+   记录该阶段新增的内存（按代码行汇总）、当前内存和阶段内的内存峰值
+2. 运行结束后写出：
+   - 内存分析_各阶段.txt：每个阶段新增内存最多的前N个代码行
+   - 内存分析_时间线.csv / 内存分析_时间线.json：每个阶段、每个分组的内存与峰值时间线
+3. summary() 返回简要汇总，打印到日志（GUI 中显示在任务日志里）
+4. profiling(目录) 供生成器的 process_excel_to_word 使用：生成出错时同样停止记录并写出报告
+
+分析模式下各阶段依次执行（流水线的阶段不再并行），保证每次分配归属到正确的阶段；
+每个阶段结束时取一次快照并按代码行汇总（上一阶段结束的快照即下一阶段开始的快照），
+取快照本身较慢，只用于排查问题，不用于正常生成。
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# 内存分析配置
+PROFILE_CONFIG = {
+    'output_dir': os.path.join("生成器", "内存分析"),   # 默认输出目录
+    'top_n': 15,                                      # 每个阶段报告的代码行数量
+    'frames': 1,                                      # 每次分配记录的调用栈深度
+}
+
+_MB = 1024 * 1024
+
+# 不计入报告的分配位置（tracemalloc 和本模块自身；"<frozen ...>"、"<unknown>" 另行跳过）
+_IGNORED_FILES = {tracemalloc.__file__, __file__}
+
+
+class MemoryProfiler:
+    """按阶段、按分组记录 tracemalloc 内存分配
+
+    Args:
+        output_dir: 报告输出目录（默认: PROFILE_CONFIG['output_dir']）
+        top_n: 每个阶段报告的代码行数量
+    """
+
+    def __init__(self, output_dir: Optional[str] = None, top_n: Optional[int] = None):
+        self.output_dir = output_dir or PROFILE_CONFIG['output_dir']
+        self.top_n = top_n or PROFILE_CONFIG['top_n']
+        self.timeline: List[Dict[str, Any]] = []
+        self._sites: Dict[str, Dict[str, List[int]]] = {}    # 阶段 -> 代码行 -> [新增字节, 新增块数]
+        self._lock = threading.RLock()
+        self._started_tracing = False
+        self._start_time = None
+        self._last_lines = None    # 上一次快照按代码行的汇总
+
+    def start(self):
+        """开始记录内存分配"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_CONFIG['frames'])
+            self._started_tracing = True
+        self._start_time = time.perf_counter()
+        self._last_lines = self._line_totals()
+        print(f"内存分析已开启，报告将写入: {self.output_dir}")
+
+    @staticmethod
+    def _line_totals() -> Dict[str, tuple]:
+        """取快照并按代码行汇总 {文件:行号: (字节, 块数)}"""
+        totals = {}
+        for stat in tracemalloc.take_snapshot().statistics('lineno'):
+            frame = stat.traceback[0]
+            if frame.filename in _IGNORED_FILES or frame.filename.startswith('<'):
+                continue
+            totals[f"{frame.filename}:{frame.lineno}"] = (stat.size, stat.count)
+        return totals
+
+    @contextmanager
+    def stage(self, name: str, group: Any = None):
+        """记录一个阶段（可指定分组）的内存变化
+
+        Args:
+            name: 阶段名称（如"读取Excel"、"准备"、"填充"、"写入"）
+            group: 分组键（如委托单编号）
+        """
+        if not tracemalloc.is_tracing():
+            yield
+            return
+        with self._lock:
+            # 阶段依次执行，上一阶段结束时的快照即为本阶段开始时的快照（对快照汇总是最耗时的部分）
+            before = self._last_lines if self._last_lines is not None else self._line_totals()
+            before_current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                seconds = time.perf_counter() - started
+                current, peak = tracemalloc.get_traced_memory()
+                after = self._line_totals()
+                self._last_lines = after
+                sites = self._sites.setdefault(name, {})
+                for line in after.keys() | before.keys():
+                    size, count = after.get(line, (0, 0))
+                    old_size, old_count = before.get(line, (0, 0))
+                    if size != old_size or count != old_count:
+                        site = sites.setdefault(line, [0, 0])
+                        site[0] += size - old_size
+                        site[1] += count - old_count
+                self.timeline.append({
+                    'seq': len(self.timeline) + 1,
+                    'elapsed_s': round(time.perf_counter() - (self._start_time or started), 3),
+                    'stage': name,
+                    'group': "" if group is None else str(group),
+                    'seconds': round(seconds, 3),
+                    'current_mb': round(current / _MB, 3),
+                    'peak_mb': round(peak / _MB, 3),
+                    'delta_mb': round((current - before_current) / _MB, 3),
+                })
+
+    def stage_totals(self) -> Dict[str, Dict[str, float]]:
+        """按阶段汇总：次数、总耗时、净增内存、最大峰值"""
+        totals: Dict[str, Dict[str, float]] = {}
+        for entry in self.timeline:
+            total = totals.setdefault(entry['stage'], {'count': 0, 'seconds': 0.0, 'delta_mb': 0.0, 'peak_mb': 0.0})
+            total['count'] += 1
+            total['seconds'] += entry['seconds']
+            total['delta_mb'] += entry['delta_mb']
+            total['peak_mb'] = max(total['peak_mb'], entry['peak_mb'])
+        for total in totals.values():
+            total['seconds'] = round(total['seconds'], 3)
+            total['delta_mb'] = round(total['delta_mb'], 3)
+        return totals
+
+    def top_sites(self, stage: str, limit: Optional[int] = None):
+        """返回阶段中新增内存最多的代码行 [(代码行, 新增字节, 新增块数), ...]"""
+        sites = self._sites.get(stage, {})
+        ranked = sorted(sites.items(), key=lambda item: item[1][0], reverse=True)
+        return [(site, size, count) for site, (size, count) in ranked[:limit or self.top_n]]
+
+    def write_reports(self) -> Dict[str, str]:
+        """写出各阶段报告和时间线，返回 {报告类型: 文件路径}"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = {
+            'stages': os.path.join(self.output_dir, "内存分析_各阶段.txt"),
+            'csv': os.path.join(self.output_dir, "内存分析_时间线.csv"),
+            'json': os.path.join(self.output_dir, "内存分析_时间线.json"),
+        }
+
+        with open(paths['stages'], 'w', encoding='utf-8') as f:
+            for stage, total in self.stage_totals().items():
+                f.write(f"==== {stage}：{total['count']:.0f}次，耗时 {total['seconds']:.2f} 秒，"
+                        f"净增 {total['delta_mb']:.2f} MB，峰值 {total['peak_mb']:.2f} MB ====\n")
+                for site, size, count in self.top_sites(stage):
+                    f.write(f"{size / 1024:>12.1f} KiB {count:>9} 块  {site}\n")
+                f.write("\n")
+
+        fields = ['seq', 'elapsed_s', 'stage', 'group', 'seconds', 'current_mb', 'peak_mb', 'delta_mb']
+        with open(paths['csv'], 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.timeline)
+
+        with open(paths['json'], 'w', encoding='utf-8') as f:
+            json.dump({'stages': self.stage_totals(), 'timeline': self.timeline}, f, ensure_ascii=False, indent=2)
+        return paths
+
+    def summary(self, sites_per_stage: int = 3) -> str:
+        """返回简要汇总（各阶段的净增内存、峰值和主要分配位置）"""
+        lines = ["==== 内存分析汇总 ===="]
+        for stage, total in self.stage_totals().items():
+            lines.append(f"{stage}阶段: {total['count']:.0f}次, 耗时{total['seconds']:.2f}秒, "
+                         f"净增{total['delta_mb']:.2f} MB, 峰值{total['peak_mb']:.2f} MB")
+            for site, size, _ in self.top_sites(stage, sites_per_stage):
+                lines.append(f"    {size / 1024:.1f} KiB  {os.path.basename(site)}")
+        return "\n".join(lines)
+
+    def finish(self) -> Dict[str, str]:
+        """停止记录，写出报告并打印汇总
+
+        Returns:
+            dict: {报告类型: 文件路径}
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        paths = self.write_reports()
+        print(self.summary())
+        print(f"内存分析报告已写入: {paths['stages']}")
+        print(f"内存时间线已写入: {paths['csv']}, {paths['json']}")
+        return paths
+
+
+@contextmanager
+def profiling(output_dir: Optional[str]):
+    """在 with 块内按阶段记录内存分配，退出时（包括出错时）停止记录并写出报告
+
+    Args:
+        output_dir: 报告输出目录，为空时不记录
+
+    Yields:
+        MemoryProfiler: 内存分析器，不记录时为 None
+    """
+    if not output_dir:
+        yield None
+        return
+    profiler = MemoryProfiler(output_dir)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.finish()
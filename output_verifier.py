@@ -0,0 +1,382 @@
+"""
+生成结果校验：并行检查输出报告
+
+verify_implementation.py 只检查 gui.py 中的标识符；生成了成千上万份报告后，
+没有快速的办法确认报告中没有残留占位符、数据行数正确、必选的复选框组都已勾选。
+
+本模块：
+1. 每份报告只流式读取 word/document.xml（lxml.etree.iterparse，不使用python-docx），逐个段落、表格行检查：
+   - 残留占位符：模板中的"…值"、"…参数值"（如"工程名称值"、"委托单位参数值"）
+   - 数据行数：表头（焊口号/焊口编号/焊缝编号）之后填写的数据行数与台账中该分组的行数一致
+   - 复选框组（含□/☑的单元格）至少勾选一项（VERIFY_CONFIG['optional_checkbox_groups'] 中的组除外）
+2. 台账只在主进程读取、分组一次（ledger_session.LedgerSession），按文件名中的委托单编号（及X/γ射线类型）
+   得到每份报告的期望行数；射线检测记录续表按张数展开的行数计算，规则与生成器相同
+3. 报告按批分配到进程池，子进程只返回异常列表；1万份报告在一分钟内完成
+4. 输出异常汇总，可写入JSON报告；有异常时返回码为1
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from lxml import etree
+
+from Radio_test_renewal import DataRowCalculator
+from ledger_session import LedgerSession
+from run_plan import ray_type_groups
+
+# 校验配置
+VERIFY_CONFIG = {
+    'placeholder_pattern': r'[\u4e00-\u9fff]{2,12}(?:参数值|值)|检测方法参数',  # 模板占位符
+    'row_key_headers': ('焊口号', '焊口编号', '焊缝编号'),   # 数据表头中用于计数的列
+    'blank_marker': '以下空白',                             # 数据行之后的结束标记
+    'checked_marks': '☑✓■☒',                              # 已勾选的复选框
+    'unchecked_marks': '□☐',                               # 未勾选的复选框
+    'optional_checkbox_groups': ('热处理状态', '像质计型号'),  # 生成器不勾选的复选框组（按左侧标签）
+    'order_column': '委托单编号',                           # 台账委托单编号列关键字
+    'gamma_column': 'γ射线',                               # 台账射线类型列关键字
+    'sheet_count_column': '张数',                          # 台账张数列关键字
+    'continuation_marker': '续表',                         # 按张数展开行的报告（文件名中的标记）
+    'batch_size': 64,                                     # 每个子进程任务的报告数量
+    'max_listed': 50,                                     # 控制台最多列出的异常数量
+}
+
+KIND_PLACEHOLDER = '残留占位符'
+KIND_ROWS = '数据行数'
+KIND_CHECKBOX = '复选框未勾选'
+KIND_ERROR = '无法读取'
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_BODY, _P, _T, _TR, _TC = (f'{_W}body', f'{_W}p', f'{_W}t', f'{_W}tr', f'{_W}tc')
+_GRID_SPAN = f'{_W}tcPr/{_W}gridSpan'
+_PLACEHOLDER = re.compile(VERIFY_CONFIG['placeholder_pattern'])
+
+
+@dataclass
+class Anomaly:
+    """一份报告中的一个异常"""
+    path: str
+    kind: str
+    detail: str
+
+
+@dataclass
+class DocumentScan:
+    """一份报告的扫描结果"""
+    placeholders: List[str] = field(default_factory=list)
+    data_rows: Optional[int] = None          # 未找到数据表头时为None
+    unchecked_groups: List[str] = field(default_factory=list)
+
+
+@dataclass
+class VerifyReport:
+    """一次校验的汇总"""
+    files: int
+    anomalies: List[Anomaly]
+    seconds: float
+    rows_checked: int = 0
+
+    def counts(self) -> Dict[str, int]:
+        """各类异常的数量"""
+        counts = {}
+        for anomaly in self.anomalies:
+            counts[anomaly.kind] = counts.get(anomaly.kind, 0) + 1
+        return counts
+
+
+class _RowCounter:
+    """按表格行的顺序统计数据行：找到数据表头后，计数列有内容的行，到结束标记或表尾（合并单元格的行）为止"""
+
+    def __init__(self):
+        self.rows: Optional[int] = None
+        self._key_column = None
+        self._header_cells = 0
+
+    def feed(self, cells: List[Tuple[int, str]]):
+        starts = []
+        column = 0
+        for span, _ in cells:
+            starts.append(column)
+            column += span
+        for start, (_, text) in zip(starts, cells):
+            if text in VERIFY_CONFIG['row_key_headers']:
+                # 数据表头（合并文档中每节各有一个，行数累加）
+                self._key_column = start
+                self._header_cells = len(cells)
+                self.rows = self.rows or 0
+                return
+        if self._key_column is None:
+            return
+        if len(cells) < self._header_cells:
+            self._key_column = None
+            return
+        for start, (_, text) in zip(starts, cells):
+            if start == self._key_column:
+                if text == VERIFY_CONFIG['blank_marker']:
+                    self._key_column = None
+                elif text:
+                    self.rows += 1
+                return
+
+
+def _text(element) -> str:
+    return ''.join(element.itertext(_T))
+
+
+def _checkbox_unchecked(text: str) -> bool:
+    return (any(mark in text for mark in VERIFY_CONFIG['unchecked_marks'])
+            and not any(mark in text for mark in VERIFY_CONFIG['checked_marks']))
+
+
+def scan_document(source) -> DocumentScan:
+    """流式读取报告的 word/document.xml 并扫描占位符、数据行和复选框
+
+    Args:
+        source: docx文件路径或文件对象
+
+    Returns:
+        DocumentScan: 扫描结果
+    """
+    scan = DocumentScan()
+    counter = _RowCounter()
+    placeholders = []
+    with zipfile.ZipFile(source) as zf, zf.open('word/document.xml') as stream:
+        for _, element in etree.iterparse(stream, events=('end',), tag=(_P, _TR)):
+            parent = element.getparent()
+            if element.tag == _P:
+                # 表格中的段落随所在的行一起检查
+                if parent is not None and parent.tag == _BODY:
+                    text = _text(element)
+                    placeholders.extend(_PLACEHOLDER.findall(text))
+                    if _checkbox_unchecked(text):
+                        # 表格之外的复选框段落
+                        scan.unchecked_groups.append(text.strip())
+                    element.clear()
+                continue
+
+            cells = []
+            for tc in element.iterchildren(_TC):
+                span = tc.find(_GRID_SPAN)
+                text = _text(tc)
+                if text:
+                    placeholders.extend(_PLACEHOLDER.findall(text))
+                cells.append((int(span.get(f'{_W}val', 1)) if span is not None else 1, text.strip()))
+            counter.feed(cells)
+            for index, (_, text) in enumerate(cells):
+                if _checkbox_unchecked(text):
+                    label = cells[index - 1][1] if index > 0 else ''
+                    if label not in VERIFY_CONFIG['optional_checkbox_groups']:
+                        scan.unchecked_groups.append(f"{label}: {text}" if label else text)
+            if parent is not None and parent.getparent() is not None and parent.getparent().tag == _BODY:
+                # 顶层表格的行处理完即释放
+                element.clear()
+    scan.placeholders = sorted(set(placeholders))
+    scan.data_rows = counter.rows
+    return scan
+
+
+def check_document(path: str, expected_rows: Optional[int] = None) -> List[Anomaly]:
+    """校验一份报告
+
+    Args:
+        path: docx文件路径
+        expected_rows: 台账中该分组的数据行数（None时不检查行数）
+
+    Returns:
+        list: 异常列表
+    """
+    try:
+        scan = scan_document(path)
+    except (zipfile.BadZipFile, KeyError, OSError, etree.XMLSyntaxError) as e:
+        return [Anomaly(path, KIND_ERROR, str(e))]
+
+    anomalies = []
+    if scan.placeholders:
+        anomalies.append(Anomaly(path, KIND_PLACEHOLDER, '、'.join(scan.placeholders)))
+    if expected_rows is not None:
+        if scan.data_rows is None:
+            anomalies.append(Anomaly(path, KIND_ROWS, f"未找到数据表头，台账 {expected_rows} 行"))
+        elif scan.data_rows != expected_rows:
+            anomalies.append(Anomaly(path, KIND_ROWS, f"报告 {scan.data_rows} 行，台账 {expected_rows} 行"))
+    for group in scan.unchecked_groups:
+        anomalies.append(Anomaly(path, KIND_CHECKBOX, group))
+    return anomalies
+
+
+def _check_batch(tasks: List[Tuple[str, Optional[int]]]) -> List[Anomaly]:
+    """子进程：校验一批报告"""
+    anomalies = []
+    for path, expected_rows in tasks:
+        anomalies.extend(check_document(path, expected_rows))
+    return anomalies
+
+
+class LedgerIndex:
+    """台账分组行数索引：按报告文件名查找期望的数据行数
+
+    Args:
+        excel_path: 台账Excel路径
+        sheet_name: 工作表名称（默认第一个工作表）
+        session: 共享读取会话（可选，已读取台账时直接使用）
+    """
+
+    def __init__(self, excel_path: str, sheet_name: Optional[str] = None, session: Optional[LedgerSession] = None):
+        session = session or LedgerSession(excel_path, sheet_name=sheet_name)
+        df = session.dataframe
+        order_column = self._find_column(df, VERIFY_CONFIG['order_column'])
+        if order_column is None:
+            raise ValueError(f"台账中没有{VERIFY_CONFIG['order_column']}列: {excel_path}")
+        gamma_column = self._find_column(df, VERIFY_CONFIG['gamma_column'])
+        sheet_column = self._find_column(df, VERIFY_CONFIG['sheet_count_column'])
+
+        self.rows: Dict[str, int] = {str(key): len(group) for key, group in session.partitions(order_column).items()}
+        self.ray_rows: Dict[Tuple[str, str], int] = {}
+        self.film_rows: Dict[Tuple[str, str], int] = {}
+        for order_number, ray_type, group_df in ray_type_groups(df, order_column, gamma_column):
+            key = (str(order_number), 'γ' if ray_type == 'γ射线' else 'X')
+            self.ray_rows[key] = self.ray_rows.get(key, 0) + len(group_df)
+            if sheet_column is not None:
+                # 与射线检测记录续表相同：张数为2、3或≥6时每张一行，其他一行
+                sheet_numbers = pd.to_numeric(group_df[sheet_column], errors='coerce').fillna(0)
+                film_rows = int(DataRowCalculator.calculate_rows_for_counts(sheet_numbers).sum())
+            else:
+                film_rows = len(group_df)
+            self.film_rows[key] = self.film_rows.get(key, 0) + film_rows
+
+    @staticmethod
+    def _find_column(df: pd.DataFrame, keyword: str) -> Optional[str]:
+        """与关键字完全相同的列优先（如"张数"与"底片规格/张数"），否则取第一个包含关键字的列"""
+        if keyword in df.columns:
+            return keyword
+        matching = [column for column in df.columns if keyword in str(column)]
+        return matching[0] if matching else None
+
+    def expected_rows(self, path: str) -> Optional[int]:
+        """报告对应分组的数据行数（文件名中没有台账中的委托单编号时返回None，如合并输出）"""
+        tokens = os.path.splitext(os.path.basename(path))[0].split('_')
+        orders = [token for token in tokens if token in self.rows]
+        if not orders:
+            return None
+        order_number = max(orders, key=len)
+        ray_mark = next((token for token in tokens if token in ('X', 'γ')), None)
+        if ray_mark is None:
+            return self.rows[order_number]
+        if VERIFY_CONFIG['continuation_marker'] in tokens:
+            return self.film_rows.get((order_number, ray_mark), 0)
+        return self.ray_rows.get((order_number, ray_mark), 0)
+
+
+def collect_reports(paths: Iterable[str]) -> List[str]:
+    """收集要校验的报告：目录递归查找 .docx（跳过Word临时文件），文件直接使用"""
+    reports = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                reports.extend(os.path.join(root, name) for name in sorted(files)
+                               if name.lower().endswith('.docx') and not name.startswith('~$'))
+        else:
+            reports.append(path)
+    return reports
+
+
+def verify_outputs(paths: Iterable[str], ledger: Optional[LedgerIndex] = None, workers: Optional[int] = None,
+                   batch_size: Optional[int] = None) -> VerifyReport:
+    """并行校验输出报告
+
+    Args:
+        paths: 报告文件或目录
+        ledger: 台账分组行数索引（None时不检查数据行数）
+        workers: 进程数量（默认CPU核数；1时在本进程中校验）
+        batch_size: 每个子进程任务的报告数量
+
+    Returns:
+        VerifyReport: 校验汇总
+    """
+    start = time.perf_counter()
+    reports = collect_reports(paths)
+    tasks = [(path, ledger.expected_rows(path) if ledger else None) for path in reports]
+    batch_size = max(1, batch_size or VERIFY_CONFIG['batch_size'])
+    batches = [tasks[index:index + batch_size] for index in range(0, len(tasks), batch_size)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(batches) or 1))
+
+    anomalies = []
+    if workers == 1:
+        for batch in batches:
+            anomalies.extend(_check_batch(batch))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for batch_anomalies in executor.map(_check_batch, batches):
+                anomalies.extend(batch_anomalies)
+
+    rows_checked = sum(1 for _, expected in tasks if expected is not None)
+    return VerifyReport(len(reports), anomalies, time.perf_counter() - start, rows_checked)
+
+
+def print_verify_report(report: VerifyReport, max_listed: Optional[int] = None):
+    """输出校验汇总和异常列表"""
+    max_listed = VERIFY_CONFIG['max_listed'] if max_listed is None else max_listed
+    print(f"\n==== 生成结果校验 (共{report.files}份报告，耗时 {report.seconds:.2f} 秒) ====")
+    print(f"核对台账行数: {report.rows_checked}份")
+    if not report.anomalies:
+        print("未发现异常")
+        return
+    for kind, count in report.counts().items():
+        print(f"{kind}: {count}处")
+    print()
+    for anomaly in report.anomalies[:max_listed]:
+        print(f"[{anomaly.kind}] {anomaly.path}: {anomaly.detail}")
+    if len(report.anomalies) > max_listed:
+        print(f"……另有{len(report.anomalies) - max_listed}处异常未列出")
+
+
+def main():
+    # 创建命令行参数解析器
+    parser = argparse.ArgumentParser(description='校验生成的报告：残留占位符、数据行数、复选框勾选')
+    parser.add_argument('paths', nargs='*', default=[os.path.join("生成器", "输出报告")],
+                        help='报告文件或目录 (默认: 生成器/输出报告)')
+    parser.add_argument('-l', '--ledger',
+                        help='台账Excel路径，按台账分组核对数据行数 (可选)')
+    parser.add_argument('-s', '--sheet',
+                        help='台账工作表名称 (如表面结果台账的"荣信聚乙烯PT"，默认第一个工作表)')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='进程数量 (默认: CPU核数)')
+    parser.add_argument('--report',
+                        help='把全部异常写入该JSON文件')
+
+    # 解析命令行参数
+    args = parser.parse_args()
+
+    ledger = None
+    if args.ledger:
+        if not os.path.exists(args.ledger):
+            print(f"错误: 台账文件不存在: {args.ledger}")
+            sys.exit(1)
+        ledger = LedgerIndex(args.ledger, args.sheet)
+
+    report = verify_outputs(args.paths, ledger, workers=args.jobs)
+    print_verify_report(report)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({
+                'files': report.files,
+                'seconds': round(report.seconds, 3),
+                'counts': report.counts(),
+                'anomalies': [asdict(anomaly) for anomaly in report.anomalies],
+            }, f, ensure_ascii=False, indent=2)
+        print(f"异常报告已写入: {args.report}")
+
+    # 返回状态码
+    sys.exit(0 if report.files and not report.anomalies else 1)
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ import logging
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import re
+from table_builder import TableGrid
+from docx_writer import save_docx
 
 # 配置日志
 logging.basicConfig(
@@ -15,6 +17,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 表头字段定义：(字段名, 候选表头文本, 未找到时使用的列位置)
+HEADER_FIELDS = [
+    ('管道编号', ('管道编号', '检件编号'), 1),
+    ('焊口号', ('焊口号', '焊口编号'), 2),
+    ('焊工号', ('焊工号', '焊工'), 3),
+    ('焊口规格', ('焊口规格', '规格'), 4),
+    ('焊口材质', ('焊口材质', '材质'), 5),
+]
+
 class ReportGenerator:
     def __init__(self):
         self.excel_file = None
@@ -174,29 +185,91 @@ class ReportGenerator:
                     return (i, j)
         return None
     
+    def _clean_header_text(self, text):
+        """移除表头文本中的特殊字符，仅保留中英文和数字"""
+        return re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9]', '', text)
+
+    def _get_header_cells(self, table):
+        """读取表头行(第一行)的单元格文本，返回[(原始文本, 清洗后文本)]列表"""
+        if not table.rows or len(table.rows) == 0:
+            return []
+        return [(cell.text, self._clean_header_text(cell.text)) for cell in table.rows[0].cells]
+
+    def _match_header(self, header_cells, header_text):
+        """在已缓存的表头单元格中查找列索引，先精确匹配再模糊匹配"""
+        for j, (cell_text, _) in enumerate(header_cells):
+            if header_text in cell_text:
+                return j
+
+        header_key = self._clean_header_text(header_text)
+        for j, (cell_text, clean_text) in enumerate(header_cells):
+            if header_key in clean_text or clean_text in header_key:
+                logger.info(f"通过模糊匹配找到列: '{header_text}' -> '{cell_text}' (列索引 {j})")
+                return j
+
+        return None
+
     def find_column_index_by_header(self, table, header_text):
         """根据表头文本查找列索引，支持模糊匹配"""
-        if not table.rows or len(table.rows) == 0:
-            return None
-            
-        # 先尝试精确匹配
-        for i, row in enumerate(table.rows):
-            if i == 0:  # 只在第一行(表头行)查找
-                for j, cell in enumerate(row.cells):
-                    if header_text in cell.text:
-                        return j
-        
-        # 如果精确匹配失败，尝试部分匹配
-        header_key = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9]', '', header_text)  # 移除特殊字符
+        return self._match_header(self._get_header_cells(table), header_text)
+
+    def build_header_map(self, table):
+        """一次性解析表格表头，返回各字段的列索引
+
+        Args:
+            table: Word表格对象
+
+        Returns:
+            dict: 字段名 -> 列索引（未找到时为None）
+        """
+        header_cells = self._get_header_cells(table)
+        header_map = {}
+        for field, candidates, fallback_col in HEADER_FIELDS:
+            col = None
+            for candidate in candidates:
+                col = self._match_header(header_cells, candidate)
+                if col:
+                    break
+
+            # 如果没有找到列，尝试通过位置猜测
+            if col is None and len(header_cells) > fallback_col:
+                col = fallback_col
+                logger.info(f"未找到{field}列，使用第{fallback_col+1}列")
+            header_map[field] = col
+
+        return header_map
+
+    def find_header_row(self, table):
+        """查找数据表头所在行，找不到时返回0"""
         for i, row in enumerate(table.rows):
-            if i == 0:  # 只在第一行(表头行)查找
-                for j, cell in enumerate(row.cells):
-                    cell_text = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9]', '', cell.text)  # 移除特殊字符
-                    if header_key in cell_text or cell_text in header_key:
-                        logger.info(f"通过模糊匹配找到列: '{header_text}' -> '{cell.text}' (列索引 {j})")
-                        return j
-        
-        return None
+            for cell in row.cells:
+                if "管道编号" in cell.text or "检件编号" in cell.text or "焊口号" in cell.text or "焊口编号" in cell.text:
+                    return i
+
+        logger.warning("未找到表头行，假设第一行是表头")
+        return 0
+
+    def ensure_row_count(self, table, row_count, grid=None):
+        """一次性补足表格行数，确保表格至少有row_count行
+
+        按表格网格列构造一个空行后批量克隆追加，不再逐行 add_row
+
+        Args:
+            table: Word表格对象
+            row_count: 需要的总行数
+            grid: 表格的TableGrid（可选，传入时追加后同步刷新）
+
+        Returns:
+            int: 追加的行数
+        """
+        grid = grid or TableGrid(table)
+        rows_needed = row_count - len(grid)
+        if rows_needed <= 0:
+            return 0
+
+        grid.append_grid_rows(rows_needed)
+        logger.info(f"已向表格追加{rows_needed}行")
+        return rows_needed
     
     def generate_reports(self):
         """生成所有报告"""
@@ -287,9 +360,38 @@ class ReportGenerator:
             
             # 处理每一行数据
             successful_count = 0
+            filled_rows = 0
+            filled_cells = 0
             total_count = len(self.df)
             
-            for index, row in self.df.iterrows():
+            # 只处理第一个表格：表头映射和数据行游标按模板计算一次
+            table = doc.tables[0] if doc.tables else None
+            if table is not None:
+                header_map = self.build_header_map(table)
+                logger.info(f"表格列索引: 管道编号={header_map['管道编号']}, 焊口号={header_map['焊口号']}, 焊工号={header_map['焊工号']}, 焊口规格={header_map['焊口规格']}, 焊口材质={header_map['焊口材质']}")
+                
+                # 数据行从表头行之后开始，行数不够时一次性追加
+                header_row = self.find_header_row(table)
+                first_data_row = header_row + 1
+                grid = TableGrid(table)
+                self.ensure_row_count(table, first_data_row + total_count, grid)
+                
+                # 需要填充的字段：(列索引, 数据键, 日志名称)
+                fill_columns = [
+                    (header_map['管道编号'], '检件编号', '管道编号'),
+                    (header_map['焊口号'], '焊口编号', '焊口号'),
+                    (header_map['焊工号'], '焊工号', '焊工号'),
+                    (header_map['焊口规格'], '规格', '规格'),
+                    (header_map['焊口材质'], '材质', '材质'),
+                ]
+                fill_columns = [column for column in fill_columns if column[0] is not None]
+            else:
+                logger.warning("Word模板中没有表格")
+            
+            for position, (index, row) in enumerate(self.df.iterrows()):
+                if table is None:
+                    break
+                
                 row_data = row.to_dict()
                 # 使用最晚日期替换行数据中的日期
                 if latest_date:
@@ -300,160 +402,45 @@ class ReportGenerator:
                 # 提取数据
                 try:
                     委托日期 = row_data.get('委托日期', None)
-                    检件编号 = row_data.get('检件编号', '')
-                    焊口编号 = row_data.get('焊口编号', '')
-                    焊工号 = row_data.get('焊工号', '')
-                    规格 = row_data.get('规格', '')
-                    材质 = row_data.get('材质', '')
+                    values = {key: row_data.get(key, '') for key in ('检件编号', '焊口编号', '焊工号', '规格', '材质')}
                     
-                    logger.info(f"行 {index+1} 数据: 委托日期={委托日期}, 检件编号={检件编号}, 焊口编号={焊口编号}, 焊工号={焊工号}, 规格={规格}, 材质={材质}")
+                    logger.info(f"行 {index+1} 数据: 委托日期={委托日期}, 检件编号={values['检件编号']}, 焊口编号={values['焊口编号']}, 焊工号={values['焊工号']}, 规格={values['规格']}, 材质={values['材质']}")
                 except Exception as e:
                     logger.error(f"数据提取失败: {str(e)}")
                     continue
                 
-                # 查找并替换表格中的值
-                for table in doc.tables:
-                    # 查找各字段所在列索引（增加模糊匹配）
-                    管道编号_col = self.find_column_index_by_header(table, "管道编号") or self.find_column_index_by_header(table, "检件编号")
-                    焊口号_col = self.find_column_index_by_header(table, "焊口号") or self.find_column_index_by_header(table, "焊口编号")
-                    焊工号_col = self.find_column_index_by_header(table, "焊工号") or self.find_column_index_by_header(table, "焊工")
-                    焊口规格_col = self.find_column_index_by_header(table, "焊口规格") or self.find_column_index_by_header(table, "规格")
-                    焊口材质_col = self.find_column_index_by_header(table, "焊口材质") or self.find_column_index_by_header(table, "材质")
-                    
-                    # 如果没有找到列，尝试通过位置猜测
-                    if 管道编号_col is None and len(table.rows) > 0 and len(table.rows[0].cells) > 1:
-                        管道编号_col = 1  # 假设第2列是管道编号
-                        logger.info(f"未找到管道编号列，使用第2列")
-                    if 焊口号_col is None and len(table.rows) > 0 and len(table.rows[0].cells) > 2:
-                        焊口号_col = 2  # 假设第3列是焊口号
-                        logger.info(f"未找到焊口号列，使用第3列")
-                    if 焊工号_col is None and len(table.rows) > 0 and len(table.rows[0].cells) > 3:
-                        焊工号_col = 3  # 假设第4列是焊工号
-                        logger.info(f"未找到焊工号列，使用第4列")
-                    if 焊口规格_col is None and len(table.rows) > 0 and len(table.rows[0].cells) > 4:
-                        焊口规格_col = 4  # 假设第5列是焊口规格
-                        logger.info(f"未找到焊口规格列，使用第5列")
-                    if 焊口材质_col is None and len(table.rows) > 0 and len(table.rows[0].cells) > 5:
-                        焊口材质_col = 5  # 假设第6列是焊口材质
-                        logger.info(f"未找到焊口材质列，使用第6列")
-                        
-                    logger.info(f"表格列索引: 管道编号={管道编号_col}, 焊口号={焊口号_col}, 焊工号={焊工号_col}, 焊口规格={焊口规格_col}, 焊口材质={焊口材质_col}")
-                    
-                    # 查找表格中的数据行
-                    # 首先检查表格是否有足够的行
-                    header_row = -1
-                    
-                    # 尝试找到表头行
-                    for i, row in enumerate(table.rows):
-                        for cell in row.cells:
-                            if "管道编号" in cell.text or "检件编号" in cell.text or "焊口号" in cell.text or "焊口编号" in cell.text:
-                                header_row = i
-                                break
-                        if header_row >= 0:
-                            break
-                    
-                    if header_row < 0:
-                        header_row = 0  # 如果找不到表头行，假设第一行是表头
-                        logger.warning("未找到表头行，假设第一行是表头")
-                    
-                    # 数据行从表头行之后开始
-                    data_row = header_row + index + 1
-                    
-                    # 如果行数不够，添加新行
-                    while data_row >= len(table.rows):
-                        new_row = table.add_row()
-                        # 确保新行有足够的单元格
-                        if len(table.rows[0].cells) > len(new_row.cells):
-                            for _ in range(len(table.rows[0].cells) - len(new_row.cells)):
-                                new_row.add_cell()
-                    
-                    logger.info(f"数据将填入第{data_row+1}行")
-                    
-                    # 填充相应字段到找到的行
-                    values_replaced = False
-                    
-                    # 清空行中的所有单元格，确保没有残留数据
-                    if data_row < len(table.rows):
-                        for j in range(len(table.rows[data_row].cells)):
-                            # 保留第一列的序号（如果有）
-                            if j > 0 or not table.rows[data_row].cells[j].text.strip().isdigit():
-                                table.rows[data_row].cells[j].text = ""
-                    
-                    # 填充检件编号/管道编号
-                    if 管道编号_col is not None and data_row < len(table.rows):
-                        j = 管道编号_col
-                        if j < len(table.rows[data_row].cells):
-                            # 使用段落而不是直接设置文本，以保持格式
-                            cell = table.rows[data_row].cells[j]
-                            if not cell.paragraphs:
-                                cell.add_paragraph()
-                            cell.paragraphs[0].text = str(检件编号)
-                            values_replaced = True
-                            logger.info(f"已填充管道编号: {检件编号} 到 行{data_row+1}列{j+1}")
-                    
-                    # 填充焊口编号/焊口号
-                    if 焊口号_col is not None and data_row < len(table.rows):
-                        j = 焊口号_col
-                        if j < len(table.rows[data_row].cells):
-                            cell = table.rows[data_row].cells[j]
-                            if not cell.paragraphs:
-                                cell.add_paragraph()
-                            cell.paragraphs[0].text = str(焊口编号)
-                            values_replaced = True
-                            logger.info(f"已填充焊口号: {焊口编号} 到 行{data_row+1}列{j+1}")
-                    
-                    # 填充焊工号
-                    if 焊工号_col is not None and data_row < len(table.rows):
-                        j = 焊工号_col
-                        if j < len(table.rows[data_row].cells):
-                            cell = table.rows[data_row].cells[j]
-                            if not cell.paragraphs:
-                                cell.add_paragraph()
-                            cell.paragraphs[0].text = str(焊工号)
-                            values_replaced = True
-                            logger.info(f"已填充焊工号: {焊工号} 到 行{data_row+1}列{j+1}")
-                    
-                    # 填充焊口规格
-                    if 焊口规格_col is not None and data_row < len(table.rows):
-                        j = 焊口规格_col
-                        if j < len(table.rows[data_row].cells):
-                            cell = table.rows[data_row].cells[j]
-                            if not cell.paragraphs:
-                                cell.add_paragraph()
-                            cell.paragraphs[0].text = str(规格)
-                            values_replaced = True
-                            logger.info(f"已填充规格: {规格} 到 行{data_row+1}列{j+1}")
-                    
-                    # 填充焊口材质
-                    if 焊口材质_col is not None and data_row < len(table.rows):
-                        j = 焊口材质_col
-                        if j < len(table.rows[data_row].cells):
-                            cell = table.rows[data_row].cells[j]
-                            if not cell.paragraphs:
-                                cell.add_paragraph()
-                            cell.paragraphs[0].text = str(材质)
-                            values_replaced = True
-                            logger.info(f"已填充材质: {材质} 到 行{data_row+1}列{j+1}")
-                    
-                    # 无论是否找到匹配的列，都认为这条记录已处理
-                    successful_count += 1
-                    break  # 只处理第一个找到的表格
+                data_row = first_data_row + position
+                logger.info(f"数据将填入第{data_row+1}行")
+                
+                cells = grid.cells(data_row)
+                
+                # 清空行中的所有单元格，确保没有残留数据（保留第一列的序号）
+                for j, cell in enumerate(cells):
+                    if j > 0 or not cell.text.strip().isdigit():
+                        cell.text = ""
+                
+                # 填充相应字段到找到的行
+                values_replaced = False
+                for j, key, label in fill_columns:
+                    if j < len(cells):
+                        # 使用段落而不是直接设置文本，以保持格式
+                        cell = cells[j]
+                        if not cell.paragraphs:
+                            cell.add_paragraph()
+                        cell.paragraphs[0].text = str(values[key])
+                        values_replaced = True
+                        filled_cells += 1
+                        logger.info(f"已填充{label}: {values[key]} 到 行{data_row+1}列{j+1}")
+                
+                if values_replaced:
+                    filled_rows += 1
+                
+                # 无论是否找到匹配的列，都认为这条记录已处理
+                successful_count += 1
             
-            # 检查表格内容是否已填充
-            table_content_filled = False
-            for table in doc.tables:
-                if len(table.rows) > 1:  # 至少有表头和一行数据
-                    for i in range(1, len(table.rows)):
-                        row_has_data = False
-                        for cell in table.rows[i].cells:
-                            if cell.text.strip():
-                                row_has_data = True
-                                break
-                        if row_has_data:
-                            table_content_filled = True
-                            break
-                if table_content_filled:
-                    break
+            # 根据填充计数判断表格内容是否已填充
+            table_content_filled = filled_cells > 0
+            logger.info(f"共填充{filled_rows}行、{filled_cells}个单元格")
             
             if not table_content_filled:
                 logger.warning("警告：表格似乎没有填充任何数据！")
@@ -471,7 +458,7 @@ class ReportGenerator:
             output_path = os.path.join(self.output_dir, output_filename)
             
             # 保存文档
-            doc.save(output_path)
+            save_docx(doc, output_path)
             logger.info(f"成功生成文档: {output_filename}")
             
             # 判断是否真正成功
@@ -0,0 +1,311 @@
+"""
+报告生成流水线
+
+将按组生成报告的过程拆分为三个阶段，阶段之间通过有界队列连接：
+1. 准备阶段：从DataFrame中提取该组的数据
+2. 填充阶段：打开模板并填充Word文档
+3. 写入阶段：由写入线程池序列化并保存文档
+
+有界队列提供背压，填充阶段不会因为磁盘写入（或网络共享写入）而停顿，
+写入线程也不会在填充过慢时空转。每个阶段的利用率在运行结束后输出。
+各阶段在不同线程中同时运行，每个分组每个阶段的日志暂存后整块输出，不同委托单的日志不会交错。
+传入 memory_profile.MemoryProfiler 时按阶段、按分组记录内存分配。
+多模板逐组生成（fan_out）时用 run_one 在当前线程中依次执行三个阶段，只生成一个分组；
+renderer 把流水线包装为生成器的 fan_out.GroupRenderer。
+"""
+
+import contextlib
+import contextvars
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import run_metrics
+from docx_writer import save_docx
+from fan_out import GroupRenderer
+from job_manager import buffered_output
+
+# 队列结束标记
+_STOP = object()
+
+PIPELINE_CONFIG = {
+    'queue_size': 4,      # 阶段之间队列的最大长度
+    'writer_count': 2,    # 写入线程数量
+}
+
+
+@dataclass
+class StageStats:
+    """单个阶段的运行统计"""
+    name: str
+    workers: int = 1
+    busy_seconds: float = 0.0
+    items: int = 0
+    errors: int = 0
+
+    def utilization(self, wall_seconds: float) -> float:
+        """阶段利用率：忙碌时间 / (墙钟时间 × 线程数)"""
+        if wall_seconds <= 0 or self.workers <= 0:
+            return 0.0
+        return min(1.0, self.busy_seconds / (wall_seconds * self.workers))
+
+
+@dataclass
+class PipelineResult:
+    """单个分组的处理结果"""
+    key: Any
+    output_path: Optional[str] = None
+    success: bool = False
+    error: Optional[str] = None
+    stage: Optional[str] = None
+
+
+@dataclass
+class PipelineReport:
+    """流水线运行汇总"""
+    results: List[PipelineResult] = field(default_factory=list)
+    stages: List[StageStats] = field(default_factory=list)
+    wall_seconds: float = 0.0
+
+    @property
+    def success_count(self) -> int:
+        return sum(1 for result in self.results if result.success)
+
+    @property
+    def failed_results(self) -> List[PipelineResult]:
+        return [result for result in self.results if not result.success]
+
+
+def save_document(doc, output_path) -> bool:
+    """默认写入函数：保存Word文档并输出保存路径（内容未变化时不改写已有文件，返回False）"""
+    written = save_docx(doc, output_path)
+    if written:
+        print(f"文档已保存至: {output_path}")
+    return written
+
+
+class ReportPipeline:
+    """准备 → 填充 → 写入 三阶段报告生成流水线
+
+    Args:
+        prepare: 准备函数，参数为分组键，返回该组的数据（返回None表示跳过该组）
+        fill: 填充函数，参数为准备阶段的结果，返回 (doc, output_path)
+        write: 写入函数，参数为 (doc, output_path)，默认为 save_document；由写入函数输出写入结果
+        writer_count: 写入线程数量
+        queue_size: 阶段之间队列的最大长度
+        profiler: 内存分析器（可选，memory_profile.MemoryProfiler）
+    """
+
+    def __init__(self, prepare: Callable[[Any], Any], fill: Callable[[Any], Any],
+                 write: Callable[[Any, str], Optional[bool]] = save_document,
+                 writer_count: Optional[int] = None, queue_size: Optional[int] = None,
+                 profiler=None):
+        self.prepare = prepare
+        self.fill = fill
+        self.write = write
+        self.profiler = profiler
+        self.writer_count = max(1, writer_count or PIPELINE_CONFIG['writer_count'])
+        self.queue_size = max(1, queue_size or PIPELINE_CONFIG['queue_size'])
+
+        self._lock = threading.Lock()
+        self._results: Dict[int, PipelineResult] = {}
+        self._stats = {
+            'prepare': StageStats('准备'),
+            'fill': StageStats('填充'),
+            'write': StageStats('写入', workers=self.writer_count),
+        }
+
+    def _record(self, stage: str, seconds: float, failed: bool = False):
+        with self._lock:
+            stats = self._stats[stage]
+            stats.busy_seconds += seconds
+            stats.items += 1
+            if failed:
+                stats.errors += 1
+        if stage != 'write':
+            # 写入阶段的耗时由 docx_writer.save_docx 记录
+            run_metrics.add_stage(stage, seconds)
+
+    def _profiled(self, stage: str, key: Any):
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.stage(self._stats[stage].name, key)
+
+    def _run_stage(self, stage: str, key: Any, function: Callable[[Any], Any], item: Any):
+        """在阶段线程中处理一项：该项的日志暂存后整块输出"""
+        with buffered_output(), self._profiled(stage, key):
+            return function(item)
+
+    def _fail(self, index: int, stage: str, error: Exception):
+        result = self._results[index]
+        result.success = False
+        result.stage = stage
+        result.error = str(error)
+        print(f"错误: 分组 {result.key} 在{self._stats[stage].name}阶段失败: {error}")
+
+    def _prepare_worker(self, keys: List[Any], fill_queue: queue.Queue):
+        for index, key in enumerate(keys):
+            start = time.perf_counter()
+            try:
+                prepared = self._run_stage('prepare', key, self.prepare, key)
+                self._record('prepare', time.perf_counter() - start)
+            except Exception as e:
+                self._record('prepare', time.perf_counter() - start, failed=True)
+                self._fail(index, 'prepare', e)
+                continue
+            if prepared is None:
+                self._results[index].error = "无可用数据，已跳过"
+                continue
+            fill_queue.put((index, prepared))
+        fill_queue.put(_STOP)
+
+    def _fill_worker(self, fill_queue: queue.Queue, write_queue: queue.Queue):
+        while True:
+            item = fill_queue.get()
+            if item is _STOP:
+                break
+            index, prepared = item
+            start = time.perf_counter()
+            try:
+                filled = self._run_stage('fill', self._results[index].key, self.fill, prepared)
+                self._record('fill', time.perf_counter() - start)
+            except Exception as e:
+                self._record('fill', time.perf_counter() - start, failed=True)
+                self._fail(index, 'fill', e)
+                continue
+            if filled is None:
+                self._results[index].error = "未生成文档，已跳过"
+                continue
+            write_queue.put((index, filled))
+        for _ in range(self.writer_count):
+            write_queue.put(_STOP)
+
+    def _write_worker(self, write_queue: queue.Queue):
+        while True:
+            item = write_queue.get()
+            if item is _STOP:
+                break
+            index, (doc, output_path) = item
+            start = time.perf_counter()
+            try:
+                self._run_stage('write', self._results[index].key, lambda filled: self.write(*filled),
+                                (doc, output_path))
+                self._record('write', time.perf_counter() - start)
+            except Exception as e:
+                self._record('write', time.perf_counter() - start, failed=True)
+                self._fail(index, 'write', e)
+                continue
+            result = self._results[index]
+            result.output_path = output_path
+            result.success = True
+
+    def run(self, keys: Iterable[Any]) -> PipelineReport:
+        """运行流水线，按分组键依次生成报告
+
+        Args:
+            keys: 分组键列表（如委托单编号）
+
+        Returns:
+            PipelineReport: 各分组结果及各阶段统计
+        """
+        keys = list(keys)
+        self._results = {index: PipelineResult(key=key) for index, key in enumerate(keys)}
+        fill_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+
+        # 各阶段线程继承调用方的上下文（如GUI任务的日志路由）
+        def stage_thread(target, *args):
+            return threading.Thread(target=contextvars.copy_context().run, args=(target,) + args, daemon=True)
+
+        threads = [
+            stage_thread(self._prepare_worker, keys, fill_queue),
+            stage_thread(self._fill_worker, fill_queue, write_queue),
+        ]
+        threads += [stage_thread(self._write_worker, write_queue) for _ in range(self.writer_count)]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return PipelineReport(
+            results=[self._results[index] for index in range(len(keys))],
+            stages=list(self._stats.values()),
+            wall_seconds=time.perf_counter() - start,
+        )
+
+    def run_one(self, key: Any) -> PipelineResult:
+        """在当前线程中依次执行三个阶段，生成一个分组的报告（阶段统计与 run 相同）
+
+        Args:
+            key: 分组键
+
+        Returns:
+            PipelineResult: 该分组的结果
+        """
+        result = PipelineResult(key=key)
+        item = key
+        for stage, function in (('prepare', self.prepare), ('fill', self.fill)):
+            start = time.perf_counter()
+            try:
+                with self._profiled(stage, key):
+                    item = function(item)
+                self._record(stage, time.perf_counter() - start)
+            except Exception as e:
+                self._record(stage, time.perf_counter() - start, failed=True)
+                result.stage = stage
+                result.error = str(e)
+                print(f"错误: 分组 {key} 在{self._stats[stage].name}阶段失败: {e}")
+                return result
+            if item is None:
+                result.error = "无可用数据，已跳过" if stage == 'prepare' else "未生成文档，已跳过"
+                return result
+
+        doc, output_path = item
+        start = time.perf_counter()
+        try:
+            with self._profiled('write', key):
+                self.write(doc, output_path)
+            self._record('write', time.perf_counter() - start)
+        except Exception as e:
+            self._record('write', time.perf_counter() - start, failed=True)
+            result.stage = 'write'
+            result.error = str(e)
+            print(f"错误: 分组 {key} 在{self._stats['write'].name}阶段失败: {e}")
+            return result
+        result.output_path = output_path
+        result.success = True
+        return result
+
+    def renderer(self, name: str, keys: List[Any], finish: Callable[[int, int], bool]) -> GroupRenderer:
+        """把流水线包装为生成器的逐组生成器
+
+        单独运行时用 run 分阶段并行生成全部分组，多模板逐组生成时用 run_one 生成一个分组。
+
+        Args:
+            name: 生成器名称
+            keys: 分组键列表
+            finish: 全部分组生成后调用，参数为 (成功写入的分组数, 处理的分组数)，返回整体是否成功
+
+        Returns:
+            GroupRenderer: 逐组生成器
+        """
+        def run_all():
+            report = self.run(keys)
+            print_pipeline_report(report)
+            return report.success_count
+
+        return GroupRenderer(name, keys, lambda key: self.run_one(key).success, finish, run_all)
+
+
+def print_pipeline_report(report: PipelineReport):
+    """输出流水线各阶段利用率"""
+    print(f"\n==== 流水线统计 (总耗时 {report.wall_seconds:.2f} 秒) ====")
+    for stats in report.stages:
+        print(f"{stats.name}阶段: 处理{stats.items}项, 失败{stats.errors}项, "
+              f"忙碌{stats.busy_seconds:.2f}秒, 线程{stats.workers}个, "
+              f"利用率{stats.utilization(report.wall_seconds) * 100:.1f}%")
+    print("=" * 40)
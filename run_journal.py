@@ -0,0 +1,255 @@
+"""
+生成任务运行记录
+
+使用本地SQLite数据库记录每次运行以及每个分组（如委托单编号+射线类型）的处理结果：
+分组键、输入数据哈希、输出路径、状态、耗时和错误信息。
+
+用途：
+1. 断点续跑（--resume）：跳过已成功生成且输入未变化的分组
+2. 仅重试失败分组：只处理上一次运行中失败的分组
+3. 查询历史运行的吞吐量
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Set
+
+import pandas as pd
+
+# 默认运行记录数据库路径
+DEFAULT_JOURNAL_PATH = os.path.join("生成器", "运行记录", "run_journal.db")
+
+STATUS_SUCCESS = 'success'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    generator TEXT NOT NULL,
+    excel_path TEXT,
+    word_template_path TEXT,
+    output_dir TEXT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    duration REAL,
+    total_groups INTEGER DEFAULT 0,
+    success_count INTEGER DEFAULT 0,
+    error_count INTEGER DEFAULT 0,
+    skipped_count INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS group_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    generator TEXT NOT NULL,
+    group_key TEXT NOT NULL,
+    input_hash TEXT,
+    output_path TEXT,
+    status TEXT NOT NULL,
+    duration REAL,
+    error TEXT,
+    finished_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_group_results_key
+    ON group_results (generator, group_key, status);
+"""
+
+
+def file_hash(path: str) -> str:
+    """计算文件内容的SHA256哈希"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# 文件哈希缓存：(路径, 修改时间, 大小) -> 哈希，同一次运行中每个分组共用模板和参数表的哈希
+_file_hashes: Dict[tuple, str] = {}
+
+
+def _cached_file_hash(path: str) -> str:
+    """文件内容哈希（文件不存在时为固定标记，之后创建该文件时哈希会变化）"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 'missing'
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        _file_hashes[key] = file_hash(path)
+    return _file_hashes[key]
+
+
+def hash_group_input(group_df: pd.DataFrame, word_template_path: Optional[str] = None,
+                     input_files: Sequence[str] = (), **params) -> str:
+    """计算分组输入的哈希：分组数据 + 模板内容 + 其他输入文件内容 + 替换参数
+
+    Args:
+        group_df: 分组数据
+        word_template_path: Word模板路径（模板变化时哈希也会变化）
+        input_files: 其他影响输出内容的文件（如曝光参数表），内容变化、新建或删除时哈希也会变化
+        **params: 影响输出内容的参数（工程名称等）
+
+    Returns:
+        str: 十六进制哈希值
+    """
+    digest = hashlib.sha256()
+    digest.update(repr([str(col) for col in group_df.columns]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(group_df.astype(str), index=False).values.tobytes())
+    if word_template_path and os.path.exists(word_template_path):
+        digest.update(_cached_file_hash(word_template_path).encode('utf-8'))
+    for path in input_files:
+        digest.update(f"{os.path.basename(path)}:{_cached_file_hash(path)}".encode('utf-8'))
+    digest.update(repr(sorted((key, str(value)) for key, value in params.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class RunJournal:
+    """SQLite运行记录
+
+    Args:
+        db_path: 数据库文件路径（默认: 生成器/运行记录/run_journal.db）
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or DEFAULT_JOURNAL_PATH
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+        self._run_started = {}
+
+    def close(self):
+        self.conn.close()
+
+    def start_run(self, generator: str, excel_path: str, word_template_path: str, output_dir: str) -> int:
+        """登记一次新的运行，返回运行ID"""
+        cursor = self.conn.execute(
+            "INSERT INTO runs (generator, excel_path, word_template_path, output_dir, started_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (generator, os.path.abspath(excel_path), os.path.abspath(word_template_path),
+             os.path.abspath(output_dir), _now()))
+        self.conn.commit()
+        self._run_started[cursor.lastrowid] = time.perf_counter()
+        return cursor.lastrowid
+
+    def record_group(self, run_id: int, generator: str, group_key: str, input_hash: str,
+                     output_path: str, status: str, duration: float = 0.0, error: Optional[str] = None):
+        """记录一个分组的处理结果"""
+        self.conn.execute(
+            "INSERT INTO group_results (run_id, generator, group_key, input_hash, output_path, "
+            "status, duration, error, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, generator, str(group_key), input_hash,
+             os.path.abspath(output_path) if output_path else None,
+             status, duration, error, _now()))
+        self.conn.commit()
+
+    def finish_run(self, run_id: int):
+        """结束运行，汇总各状态的分组数量"""
+        counts = {row['status']: row['count'] for row in self.conn.execute(
+            "SELECT status, COUNT(*) AS count FROM group_results WHERE run_id = ? GROUP BY status",
+            (run_id,))}
+        started = self._run_started.pop(run_id, None)
+        duration = time.perf_counter() - started if started is not None else None
+        self.conn.execute(
+            "UPDATE runs SET finished_at = ?, duration = ?, total_groups = ?, success_count = ?, "
+            "error_count = ?, skipped_count = ? WHERE id = ?",
+            (_now(), duration, sum(counts.values()), counts.get(STATUS_SUCCESS, 0),
+             counts.get(STATUS_FAILED, 0), counts.get(STATUS_SKIPPED, 0), run_id))
+        self.conn.commit()
+
+    def is_completed(self, generator: str, group_key: str, input_hash: str, output_path: str) -> bool:
+        """判断分组是否已成功生成：最近一次成功记录的输入哈希一致且输出文件仍然存在"""
+        row = self.conn.execute(
+            "SELECT input_hash, output_path FROM group_results "
+            "WHERE generator = ? AND group_key = ? AND status = ? ORDER BY id DESC LIMIT 1",
+            (generator, str(group_key), STATUS_SUCCESS)).fetchone()
+        if row is None or row['input_hash'] != input_hash:
+            return False
+        return row['output_path'] == os.path.abspath(output_path) and os.path.isfile(output_path)
+
+    def last_run_id(self, generator: str, excel_path: Optional[str] = None,
+                    output_dir: Optional[str] = None) -> Optional[int]:
+        """查询某生成器最近一次运行的ID（可按Excel文件和输出目录过滤）"""
+        query = "SELECT id FROM runs WHERE generator = ?"
+        params: List = [generator]
+        if excel_path:
+            query += " AND excel_path = ?"
+            params.append(os.path.abspath(excel_path))
+        if output_dir:
+            query += " AND output_dir = ?"
+            params.append(os.path.abspath(output_dir))
+        row = self.conn.execute(query + " ORDER BY id DESC LIMIT 1", params).fetchone()
+        return row['id'] if row else None
+
+    def failed_groups(self, run_id: Optional[int]) -> Set[str]:
+        """查询某次运行中失败的分组键"""
+        if run_id is None:
+            return set()
+        return {row['group_key'] for row in self.conn.execute(
+            "SELECT DISTINCT group_key FROM group_results WHERE run_id = ? AND status = ?",
+            (run_id, STATUS_FAILED))}
+
+    def throughput_history(self, generator: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """查询历史运行的吞吐量（每分钟生成的报告数）"""
+        query = "SELECT * FROM runs WHERE finished_at IS NOT NULL"
+        params: List = []
+        if generator:
+            query += " AND generator = ?"
+            params.append(generator)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        history = []
+        for row in self.conn.execute(query, params):
+            record = dict(row)
+            duration = record.get('duration') or 0
+            record['reports_per_minute'] = record['success_count'] * 60 / duration if duration > 0 else 0.0
+            history.append(record)
+        return history
+
+
+def print_throughput_history(history: List[Dict]):
+    """输出历史运行吞吐量"""
+    if not history:
+        print("没有运行记录")
+        return
+    print(f"{'运行ID':<8}{'生成器':<22}{'开始时间':<22}{'成功':>6}{'失败':>6}{'跳过':>6}{'耗时(秒)':>10}{'报告/分钟':>10}")
+    for record in history:
+        print(f"{record['id']:<8}{record['generator']:<22}{record['started_at']:<22}"
+              f"{record['success_count']:>6}{record['error_count']:>6}{record['skipped_count']:>6}"
+              f"{(record['duration'] or 0):>10.1f}{record['reports_per_minute']:>10.1f}")
+
+
+def main():
+    # 创建命令行参数解析器
+    parser = argparse.ArgumentParser(description='查询报告生成运行记录')
+    parser.add_argument('-d', '--db', default=DEFAULT_JOURNAL_PATH,
+                        help=f'运行记录数据库路径 (默认: {DEFAULT_JOURNAL_PATH})')
+    parser.add_argument('-g', '--generator',
+                        help='只显示指定生成器的运行记录 (如 Radio_test)')
+    parser.add_argument('-n', '--limit', type=int, default=20,
+                        help='显示最近的运行次数 (默认: 20)')
+
+    # 解析命令行参数
+    args = parser.parse_args()
+
+    journal = RunJournal(args.db)
+    try:
+        print_throughput_history(journal.throughput_history(args.generator, args.limit))
+    finally:
+        journal.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+运行指标导出
+
+生成器由计划任务定时运行，只有日志可看，无法按周统计吞吐量的变化趋势。
+
+本模块：
+1. collect(模块名) 记录一次运行的指标：生成/失败/未变化的报告数、填充的数据行数、扩展新增的表格行数、
+   模板缓存命中/未命中、查找缓存命中/未命中、写入字节数、各阶段耗时和运行期间的进程内存峰值
+2. 运行结束后写出两种格式（默认目录 生成器/运行指标）：
+   - <模块名>.prom：Prometheus 文本格式，可由 node-exporter 的 textfile 采集器直接抓取，不需要常驻服务
+   - run_metrics.jsonl：每次运行追加一行JSON，便于长期保存和离线分析
+3. count()/add_stage() 供各模块在计数点调用，没有正在记录的运行时不做任何事
+
+当前运行通过 contextvars 传递（与 job_manager 的任务日志相同），GUI 同时运行的多个任务各自记录；
+子进程中的指标由调用方通过 snapshot()/merge() 汇总到父进程的运行中。
+
+内存峰值只统计本次运行期间：GUI 进程会依次运行多个任务，进程的历史峰值（VmHWM）可能来自更早的任务。
+运行期间后台线程定期采样常驻内存；如果进程历史峰值在运行期间刷新，则该峰值就是本次运行的峰值。
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from memory_governor import process_peak_rss_mb, process_rss_mb
+
+# 运行指标配置
+METRICS_CONFIG = {
+    'output_dir': os.path.join("生成器", "运行指标"),   # 指标输出目录（可设为 node-exporter 的 textfile 目录）
+    'prefix': 'report_generator',                     # Prometheus 指标名前缀
+    'jsonl_name': 'run_metrics.jsonl',                # JSON行文件名
+    'rss_sample_seconds': 0.2,                        # 运行期间常驻内存的采样间隔（秒）
+}
+
+# 计数指标及说明（顺序即输出顺序）
+COUNTERS = {
+    'reports_generated': '成功生成的报告数',
+    'reports_failed': '生成失败的报告数',
+    'reports_skipped': '断点续跑跳过的报告数',
+    'reports_unchanged': '内容未变化而保留原文件的报告数',
+    'groups_merged': '追加到合并文档的分组数（合并输出）',
+    'rows_filled': '填入报告的台账数据行数',
+    'rows_added': '表格扩展新增的行数',
+    'template_cache_hits': '模板缓存命中次数',
+    'template_cache_misses': '模板缓存未命中次数（读取模板文件）',
+    'lookup_cache_hits': '查找缓存命中次数（关键字匹配、共享会话分组）',
+    'lookup_cache_misses': '查找缓存未命中次数',
+    'bytes_written': '写入的报告文件字节数',
+}
+
+# 各阶段：读取Excel、准备、填充、写入（没有单独计时填充阶段的模块，填充时间为总耗时减去其他阶段）；
+# 流水线线程或多个子进程同时工作时，阶段耗时为各线程/进程耗时之和，可能超过总耗时
+STAGES = ('read', 'prepare', 'fill', 'write')
+
+_current = contextvars.ContextVar('run_metrics', default=None)
+
+
+class RunMetrics:
+    """一次运行的指标
+
+    Args:
+        module: 模块名（Prometheus 的 module 标签和 .prom 文件名）
+    """
+
+    def __init__(self, module: Optional[str]):
+        self.module = module
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.stage_seconds: Dict[str, float] = {}
+        self.peak_rss_mb: Optional[float] = None
+        self.success: Optional[bool] = None
+        self.started_at = time.time()
+        self.duration_seconds = 0.0
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._start_peak_mb = process_peak_rss_mb()
+        self._sampled_peak_mb = process_rss_mb()
+        self._stop_sampling = threading.Event()
+        self._sampler = None
+
+    def start_sampling(self):
+        """启动后台线程，运行期间定期采样进程常驻内存"""
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_loop, name="run-metrics-rss", daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self):
+        while not self._stop_sampling.wait(METRICS_CONFIG['rss_sample_seconds']):
+            self._sample_rss()
+
+    def _sample_rss(self):
+        rss = process_rss_mb()
+        if rss is not None:
+            with self._lock:
+                self._sampled_peak_mb = max(self._sampled_peak_mb or 0.0, rss)
+
+    def run_peak_rss_mb(self) -> Optional[float]:
+        """本次运行期间的进程常驻内存峰值（MB），系统不支持时返回None"""
+        self._sample_rss()
+        peak = process_peak_rss_mb()
+        if peak is not None and self._start_peak_mb is not None and peak > self._start_peak_mb:
+            # 进程历史峰值在本次运行期间刷新，即为本次运行的准确峰值
+            return peak
+        with self._lock:
+            return self._sampled_peak_mb
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回可跨进程传递的指标（用于子进程汇总到父进程）"""
+        peak = self.run_peak_rss_mb()
+        with self._lock:
+            return {'counters': dict(self.counters), 'stage_seconds': dict(self.stage_seconds),
+                    'peak_rss_mb': peak}
+
+    def merge(self, snapshot: Optional[Dict[str, Any]]):
+        """汇总子进程（或嵌套运行）的指标，内存峰值取各进程中的最大值"""
+        if not snapshot:
+            return
+        for name, value in snapshot['counters'].items():
+            self.count(name, value)
+        for stage, seconds in snapshot['stage_seconds'].items():
+            self.add_stage(stage, seconds)
+        if snapshot.get('peak_rss_mb') is not None:
+            with self._lock:
+                self.peak_rss_mb = max(self.peak_rss_mb or 0.0, snapshot['peak_rss_mb'])
+
+    def finish(self):
+        """结束记录：计算总耗时、未单独计时的填充阶段和运行期间的内存峰值"""
+        self._stop_sampling.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.duration_seconds = time.perf_counter() - self._start
+        if 'fill' not in self.stage_seconds:
+            other = sum(self.stage_seconds.values())
+            self.stage_seconds['fill'] = max(0.0, self.duration_seconds - other)
+        peak = self.run_peak_rss_mb()
+        if peak is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, peak)
+
+    def to_record(self) -> Dict[str, Any]:
+        """JSON行的内容"""
+        return {
+            'module': self.module,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+            'duration_seconds': round(self.duration_seconds, 3),
+            'success': self.success,
+            **self.counters,
+            'stage_seconds': {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()},
+            'peak_rss_mb': round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式（各指标为最近一次运行的值）"""
+        prefix = METRICS_CONFIG['prefix']
+        label = f'module="{self.module}"'
+        lines = []
+
+        def gauge(name, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            for labels, value in samples:
+                lines.append(f"{prefix}_{name}{{{labels}}} {value}")
+
+        gauge('last_run_timestamp_seconds', '最近一次运行的开始时间', [(label, round(self.started_at, 3))])
+        gauge('run_duration_seconds', '最近一次运行的总耗时（秒）', [(label, round(self.duration_seconds, 3))])
+        gauge('run_success', '最近一次运行是否成功（1成功，0失败）', [(label, int(bool(self.success)))])
+        for name, help_text in COUNTERS.items():
+            gauge(name, f"最近一次运行{help_text}", [(label, self.counters.get(name, 0))])
+        gauge('stage_seconds', '最近一次运行各阶段耗时（秒）',
+              [(f'{label},stage="{stage}"', round(self.stage_seconds.get(stage, 0.0), 3)) for stage in STAGES])
+        if self.peak_rss_mb is not None:
+            gauge('peak_rss_bytes', '最近一次运行期间的进程常驻内存峰值（字节，不含更早的运行）',
+                  [(label, int(self.peak_rss_mb * 1024 * 1024))])
+        return "\n".join(lines) + "\n"
+
+    def write(self, output_dir: Optional[str] = None) -> Dict[str, str]:
+        """写出 .prom 文件（先写临时文件再改名，采集器不会读到写了一半的文件）并追加JSON行
+
+        Returns:
+            dict: {'prom': 路径, 'jsonl': 路径}
+        """
+        output_dir = output_dir or METRICS_CONFIG['output_dir']
+        os.makedirs(output_dir, exist_ok=True)
+        paths = {'prom': os.path.join(output_dir, f"{self.module}.prom"),
+                 'jsonl': os.path.join(output_dir, METRICS_CONFIG['jsonl_name'])}
+
+        temp_path = f"{paths['prom']}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8', newline='\n') as f:
+                f.write(self.to_prometheus())
+            os.replace(temp_path, paths['prom'])
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        with open(paths['jsonl'], 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.to_record(), ensure_ascii=False) + "\n")
+        return paths
+
+
+def current() -> Optional[RunMetrics]:
+    """返回当前上下文中正在记录的运行（没有时返回None）"""
+    return _current.get()
+
+
+def count(name: str, value: int = 1):
+    """当前运行的计数指标加 value"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.count(name, value)
+
+
+def add_stage(stage: str, seconds: float):
+    """当前运行的阶段耗时加 seconds"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_stage(stage, seconds)
+
+
+def record_reports(generated: int, failed: int = 0, skipped: int = 0):
+    """记录生成结果（各生成器在处理完成时调用）"""
+    count('reports_generated', generated)
+    count('reports_failed', failed)
+    count('reports_skipped', skipped)
+
+
+def merge(snapshot: Optional[Dict[str, Any]]):
+    """把子进程的指标汇总到当前运行"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.merge(snapshot)
+
+
+@contextmanager
+def stage(name: str):
+    """为当前运行的一个阶段计时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def collect(module: Optional[str], output_dir: Optional[str] = None, write: bool = True):
+    """记录一次运行的指标，结束时写出指标文件
+
+    调用方在运行结束前设置 metrics.success；运行抛出异常时记为失败。
+
+    Args:
+        module: 模块名
+        output_dir: 指标输出目录（默认: METRICS_CONFIG['output_dir']）
+        write: 是否写出指标文件（子进程中只收集，由父进程汇总）
+
+    Yields:
+        RunMetrics: 本次运行的指标
+    """
+    metrics = RunMetrics(module)
+    metrics.start_sampling()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    except BaseException:
+        metrics.success = False
+        raise
+    finally:
+        _current.reset(token)
+        metrics.finish()
+        if write:
+            try:
+                paths = metrics.write(output_dir)
+                print(f"运行指标已写入: {paths['prom']}")
+            except OSError as e:
+                print(f"警告: 无法写入运行指标: {e}")
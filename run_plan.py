@@ -0,0 +1,169 @@
+"""
+生成计划（试运行）
+
+正式生成前只读取台账、分组并查看模板结构，不创建任何Word文档，几秒内给出：
+- 将生成多少份报告、每份报告的输出文件名
+- 每个分组选用的模板（如射线检测记录续的续表模板）
+- 超出模板容量的分组（双列表格会丢弃溢出行，续表会动态扩展行）
+- 哪些列是按表头找到的，哪些回退到了固定的列字母位置
+
+各生成器提供 plan_excel_to_word，命令行使用 --plan 调用。
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+SOURCE_HEADER = '表头'
+SOURCE_POSITION = '列位置'
+SOURCE_MISSING = '缺失'
+
+
+@dataclass
+class ColumnSource:
+    """列的查找结果"""
+    key: str
+    column: Optional[str]
+    source: str
+    letter: Optional[str] = None
+
+
+@dataclass
+class PlanEntry:
+    """一个分组的生成计划"""
+    order_number: str
+    ray_type: str
+    data_rows: int
+    output_file: str
+    template: str
+    template_type: str = ''
+    total_sheets: Optional[int] = None
+    table_rows: Optional[int] = None
+    capacity: Optional[int] = None
+
+    @property
+    def overflow_rows(self) -> int:
+        """超出模板容量的行数（容量未知时为0）"""
+        if not self.capacity:
+            return 0
+        return max(0, (self.table_rows if self.table_rows is not None else self.data_rows) - self.capacity)
+
+
+@dataclass
+class GeneratorPlan:
+    """一个生成器的生成计划"""
+    generator: str
+    excel_path: str
+    total_rows: int
+    columns: List[ColumnSource]
+    entries: List[PlanEntry] = field(default_factory=list)
+    overflow_action: str = '超出容量'
+    seconds: float = 0.0
+
+    @property
+    def fallback_columns(self) -> List[ColumnSource]:
+        return [item for item in self.columns if item.source != SOURCE_HEADER]
+
+    @property
+    def overflow_entries(self) -> List[PlanEntry]:
+        return [entry for entry in self.entries if entry.overflow_rows > 0]
+
+
+def resolve_columns(df: pd.DataFrame, column_keywords: Dict[str, str], column_positions: Dict[str, str],
+                    find_column: Callable[[pd.DataFrame, str], Optional[str]]) -> Tuple[Dict[str, str], List[ColumnSource]]:
+    """按生成器的规则查找列：先按表头关键字，找不到时回退到固定的列字母位置
+
+    Args:
+        df: 台账数据
+        column_keywords: 键 -> 表头关键字
+        column_positions: 键 -> 回退使用的列字母
+        find_column: 生成器的表头查找函数（如 find_column_with_keyword）
+
+    Returns:
+        (列映射, 各列的查找结果)
+    """
+    column_mapping = {}
+    sources = []
+    for key, keyword in column_keywords.items():
+        column = find_column(df, keyword)
+        if column:
+            column_mapping[key] = column
+            sources.append(ColumnSource(key, column, SOURCE_HEADER))
+            continue
+        letter = column_positions.get(key)
+        col_idx = ord(letter) - ord('A') if letter else len(df.columns)
+        if col_idx < len(df.columns):
+            column_mapping[key] = df.columns[col_idx]
+            sources.append(ColumnSource(key, df.columns[col_idx], SOURCE_POSITION, letter))
+        else:
+            sources.append(ColumnSource(key, None, SOURCE_MISSING, letter))
+    return column_mapping, sources
+
+
+def ray_type_groups(df: pd.DataFrame, order_column: str, gamma_column: Optional[str]):
+    """按委托单编号和射线类型分组，顺序与生成器逐个委托单分组时一致
+
+    γ射线列有值的行按每个不同的值各成一组（射线类型为γ射线），
+    没有值的行合为一组X射线。
+
+    Yields:
+        (委托单编号, 射线类型, 分组数据)
+    """
+    for order_number, order_df in df.dropna(subset=[order_column]).groupby(order_column, sort=False):
+        if gamma_column is None or gamma_column not in order_df.columns:
+            yield order_number, 'X射线', order_df
+            continue
+        gamma = order_df[gamma_column]
+        gamma_values = gamma.dropna().unique()
+        if len(gamma_values) == 0:
+            yield order_number, 'X射线', order_df
+            continue
+        for value in gamma_values:
+            yield order_number, 'γ射线', order_df[gamma == value]
+        x_ray_df = order_df[gamma.isna()]
+        if len(x_ray_df) > 0:
+            yield order_number, 'X射线', x_ray_df
+
+
+def print_plan(plan: GeneratorPlan):
+    """输出生成计划"""
+    print(f"\n==== 生成计划: {plan.generator} ====")
+    print(f"Excel文件: {plan.excel_path}（{plan.total_rows}行）")
+    print(f"将生成 {len(plan.entries)} 份报告")
+
+    print("\n列查找:")
+    for item in plan.columns:
+        if item.source == SOURCE_HEADER:
+            print(f"  {item.key:<8} -> '{item.column}'")
+        elif item.source == SOURCE_POSITION:
+            print(f"  {item.key:<8} -> '{item.column}'  [回退到列位置 {item.letter}]")
+        else:
+            print(f"  {item.key:<8} -> 未找到")
+
+    template_counts = {}
+    for entry in plan.entries:
+        template_counts[entry.template] = template_counts.get(entry.template, 0) + 1
+    print("\n模板选择:")
+    for template, count in template_counts.items():
+        print(f"  {template}: {count}份")
+
+    print(f"\n{'委托单编号':<36}{'射线类型':<8}{'数据行':>8}{'张数':>8}{'表格行':>8}{'容量':>8}{'超出':>8}  模板")
+    for entry in plan.entries:
+        total_sheets = '' if entry.total_sheets is None else entry.total_sheets
+        table_rows = '' if entry.table_rows is None else entry.table_rows
+        capacity = entry.capacity if entry.capacity else ''
+        overflow = entry.overflow_rows or ''
+        print(f"{str(entry.order_number):<36}{entry.ray_type:<8}{entry.data_rows:>8}{total_sheets:>8}"
+              f"{table_rows:>8}{capacity:>8}{overflow:>8}  {entry.template_type or entry.template}")
+
+    if plan.overflow_entries:
+        print(f"\n警告: {len(plan.overflow_entries)}个分组超出模板容量（{plan.overflow_action}）:")
+        for entry in plan.overflow_entries:
+            print(f"  {entry.order_number} {entry.ray_type}: 超出{entry.overflow_rows}行")
+    if plan.fallback_columns:
+        print(f"\n警告: {len(plan.fallback_columns)}列未按表头找到: "
+              f"{', '.join(item.key for item in plan.fallback_columns)}")
+    print(f"\n计划完成，用时 {plan.seconds:.2f} 秒（未生成任何文档）")
+    print("=" * 40)
+
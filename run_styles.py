@@ -0,0 +1,100 @@
+"""
+文字格式原型
+
+各生成器给每个填入的文字单独设置字体：run.font.name、run.font.size 以及
+rPr.rFonts.set(qn('w:eastAsia'), ...) 每一步都要在XML中查找、创建元素，
+一份报告有成百上千个单元格时，这部分耗时相当可观。
+
+本模块为项目使用的几种格式（楷体五号10.5磅、宋体9.5磅、打勾符号楷体9磅/宋体）
+各构建一次 <w:rPr> 原型，新文字直接复制原型，一次完成全部格式设置。
+原型由 python-docx 的同一组设置语句生成，输出的XML与逐项设置完全相同。
+"""
+
+import copy
+import threading
+
+from docx.oxml import OxmlElement
+from docx.shared import Pt
+from docx.oxml.ns import qn
+from docx.text.run import Run
+
+# 项目使用的文字格式：(字体, 字号, 中文字体)
+PRESET_STYLES = (
+    ("楷体", 10.5, "楷体"),   # 填充值：楷体五号
+    ("宋体", 9.5, "宋体"),    # 混合字体中的普通文字
+    ("楷体", 9, "宋体"),      # 打勾符号：小五号
+)
+
+_lock = threading.Lock()
+_prototypes = {}   # (字体, 字号, 中文字体) -> <w:rPr> 原型
+
+
+def _set_fonts(run, font_name, font_size, east_asia):
+    run.font.name = font_name
+    run.font.size = Pt(font_size)
+    run._element.rPr.rFonts.set(qn('w:eastAsia'), east_asia)
+
+
+def style_prototype(font_name="楷体", font_size=10.5, east_asia=None):
+    """返回指定格式的 <w:rPr> 原型（首次使用时构建，之后共享，调用方不能修改）
+
+    Args:
+        font_name: 字体名称
+        font_size: 字号（磅）
+        east_asia: 中文字体（默认与字体名称相同）
+
+    Returns:
+        CT_RPr: rPr原型元素
+    """
+    key = (font_name, font_size, east_asia or font_name)
+    prototype = _prototypes.get(key)
+    if prototype is None:
+        run = Run(OxmlElement('w:r'), None)
+        _set_fonts(run, *key)
+        prototype = run._element.rPr
+        with _lock:
+            prototype = _prototypes.setdefault(key, prototype)
+    return prototype
+
+
+def style_run(run, font_name="楷体", font_size=10.5, east_asia=None):
+    """设置文字的字体和字号
+
+    文字还没有格式（rPr）时直接复制原型；已有格式（如模板中的加粗、颜色）时
+    逐项设置，保留原有格式。
+
+    Args:
+        run: Word文字对象
+        font_name: 字体名称，默认为"楷体"
+        font_size: 字号（磅），默认为10.5磅（五号）
+        east_asia: 中文字体（默认与字体名称相同）
+
+    Returns:
+        Run: 传入的文字对象
+    """
+    r = run._element
+    if r.rPr is None:
+        r._insert_rPr(copy.deepcopy(style_prototype(font_name, font_size, east_asia)))
+    else:
+        _set_fonts(run, font_name, font_size, east_asia or font_name)
+    return run
+
+
+def add_styled_run(paragraph, text, font_name="楷体", font_size=10.5, east_asia=None):
+    """在段落末尾添加设置好字体和字号的文字
+
+    Args:
+        paragraph: Word段落对象
+        text: 文字内容
+        font_name: 字体名称，默认为"楷体"
+        font_size: 字号（磅），默认为10.5磅（五号）
+        east_asia: 中文字体（默认与字体名称相同）
+
+    Returns:
+        Run: 新添加的文字对象
+    """
+    return style_run(paragraph.add_run(text), font_name, font_size, east_asia)
+
+
+for _preset in PRESET_STYLES:
+    style_prototype(*_preset)
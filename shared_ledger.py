@@ -0,0 +1,404 @@
+"""
+共享内存台账分区
+
+多进程生成时，run_scheduled 原来把整份台账 DataFrame 作为进程初始化参数传给每个子进程：
+Windows 下子进程以 spawn 方式启动，每个进程都要反序列化一份完整副本，
+台账有30多个文字列、上万行时，派发耗时和内存占用都随进程数线性增长。
+
+本模块：
+1. SharedLedger.create 把台账按分区列（委托单编号）稳定排序，使每个分区的行连续，
+   然后编码后一次性写入一块共享内存：
+   - 数值、布尔、日期列直接存放 NumPy 缓冲区
+   - 文字（object）列按 Arrow 的方式存放：类型标记 + 偏移量 + UTF-8 字节，
+     按行连续存放，一个行号范围的全部文字只需一次读取
+2. 子进程用 SharedLedger.attach 以只读方式映射同一块共享内存，不复制数据；
+   任务只携带分区的行号范围，frame(start, stop) 只解码该范围内的行
+3. 解码得到的分组数据与原 DataFrame 对应行的列、类型、行索引完全相同
+
+基准测试中每个任务直接携带分组数据切片（slice）的派发耗时和内存都不高于共享内存，
+因此 group_scheduler.run_scheduled 默认按切片派发，只有指定 shared_memory 时才使用本模块。
+
+基准测试（每个任务的派发耗时和进程内存，1/4/16个进程）:
+    python shared_ledger.py --benchmark
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 文字值的类型标记
+_TAG_NAN = 0      # 浮点 NaN（Excel空单元格）
+_TAG_NONE = 1     # None
+_TAG_STR = 2      # 字符串（UTF-8）
+_TAG_PICKLE = 3   # 其他对象（整数、日期等混在文字列中的值）
+
+# 缓冲区在共享内存中的对齐字节数
+_ALIGNMENT = 8
+
+
+@dataclass
+class ColumnLayout:
+    """单列的编码信息
+
+    数值列（encoding='numpy'）的数据在 offset 处连续存放；
+    文字列（encoding='text'）的数据在文字块中，offset 为该列在文字块每行中的位置。
+    """
+    name: Any
+    dtype: str
+    encoding: str                                  # 'numpy' 或 'text'
+    offset: int = 0
+
+
+@dataclass
+class LedgerLayout:
+    """共享台账的描述信息（可序列化，传给子进程）"""
+    shm_name: str
+    size: int
+    rows: int
+    columns: List[ColumnLayout]
+    index: ColumnLayout
+    text_width: int                                # 文字块每行的值个数
+    text_buffers: Dict[str, Tuple[int, int]] = field(default_factory=dict)   # tags/offsets/data -> (偏移, 字节数)
+    partitions: Dict[Any, Tuple[int, int]] = field(default_factory=dict)     # 分区值 -> (起始行, 结束行)
+
+
+def _encode_text(values) -> Dict[str, np.ndarray]:
+    """把对象值编码为 类型标记 + 偏移量 + 字节 三个缓冲区"""
+    tags = np.empty(len(values), dtype=np.uint8)
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    chunks = []
+    position = 0
+    for i, value in enumerate(values):
+        if isinstance(value, str):
+            tags[i] = _TAG_STR
+            encoded = value.encode('utf-8')
+        elif value is None:
+            tags[i] = _TAG_NONE
+            encoded = b''
+        elif isinstance(value, float) and value != value:
+            tags[i] = _TAG_NAN
+            encoded = b''
+        else:
+            tags[i] = _TAG_PICKLE
+            encoded = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        chunks.append(encoded)
+        position += len(encoded)
+        offsets[i + 1] = position
+    return {'tags': tags, 'offsets': offsets, 'data': np.frombuffer(b''.join(chunks), dtype=np.uint8)}
+
+
+def _is_numpy_column(values) -> bool:
+    dtype = values.dtype
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM'
+
+
+class SharedLedger:
+    """放在共享内存中、按分区列排序的只读台账
+
+    由父进程用 create 创建并负责 unlink；子进程用 attach 映射。
+    """
+
+    def __init__(self, layout: LedgerLayout, shm: SharedMemory, owner: bool):
+        self.layout = layout
+        self._shm = shm
+        self._owner = owner
+        self._views: Dict[Tuple[int, str], np.ndarray] = {}
+
+    @classmethod
+    def create(cls, dataframe: pd.DataFrame, partition_column) -> "SharedLedger":
+        """把台账按分区列排序后写入共享内存
+
+        分区列为空的行不会被任何分组使用，不写入共享内存；分区内的行保持原始顺序。
+
+        Args:
+            dataframe: 台账数据
+            partition_column: 分区列名（如委托单编号列）
+
+        Returns:
+            SharedLedger: 共享台账（调用方负责 close 和 unlink）
+        """
+        codes, uniques = pd.factorize(dataframe[partition_column], sort=False)
+        kept = np.flatnonzero(codes >= 0)
+        order = kept[np.argsort(codes[kept], kind='stable')]
+        counts = np.bincount(codes[kept], minlength=len(uniques))
+        stops = np.cumsum(counts)
+        partitions = {value: (int(stop - count), int(stop))
+                      for value, count, stop in zip(uniques, counts, stops)}
+
+        projected = dataframe.take(order)
+        sources = [(name, projected.iloc[:, i]) for i, name in enumerate(projected.columns)]
+        sources.append((projected.index.name, projected.index))
+
+        # 数值列各自存放，其余列（object 和扩展类型）按行合并为文字块
+        layouts, arrays, text_values = [], [], []
+        for name, values in sources:
+            if _is_numpy_column(values):
+                layouts.append(ColumnLayout(name, values.dtype.str, 'numpy'))
+                arrays.append(np.ascontiguousarray(values.to_numpy()))
+            else:
+                layouts.append(ColumnLayout(name, str(values.dtype), 'text', len(text_values)))
+                arrays.append(None)
+                text_values.append(values.to_numpy(dtype=object))
+        text_width = len(text_values)
+        text_block = np.column_stack(text_values).ravel() if text_values else np.empty(0, dtype=object)
+
+        # 计算各缓冲区的位置后一次写入
+        placements, size = [], 0
+
+        def place(array):
+            nonlocal size
+            raw = array.view(np.uint8).reshape(-1) if array.nbytes else np.empty(0, dtype=np.uint8)
+            placements.append((size, raw))
+            position = size
+            size += -(-raw.nbytes // _ALIGNMENT) * _ALIGNMENT
+            return position, raw.nbytes
+
+        for column, array in zip(layouts, arrays):
+            if array is not None:
+                column.offset = place(array)[0]
+        text_buffers = {name: place(array) for name, array in _encode_text(text_block).items()}
+
+        shm = SharedMemory(create=True, size=max(size, 1))
+        for offset, raw in placements:
+            shm.buf[offset:offset + raw.nbytes] = raw
+        layout = LedgerLayout(shm.name, size, len(order), layouts[:-1], layouts[-1],
+                              text_width, text_buffers, partitions)
+        return cls(layout, shm, owner=True)
+
+    @classmethod
+    def attach(cls, layout: LedgerLayout) -> "SharedLedger":
+        """在子进程中映射共享台账（只读，不复制数据）"""
+        return cls(layout, SharedMemory(name=layout.shm_name), owner=False)
+
+    def _view(self, offset: int, count: int, dtype) -> np.ndarray:
+        key = (offset, np.dtype(dtype).str)
+        view = self._views.get(key)
+        if view is None:
+            view = np.ndarray((count,), dtype=dtype, buffer=self._shm.buf, offset=offset)
+            view.flags.writeable = False
+            self._views[key] = view
+        return view
+
+    def _numeric(self, column: ColumnLayout, start: int, stop: int) -> np.ndarray:
+        return self._view(column.offset, self.layout.rows, column.dtype)[start:stop]
+
+    def _text_block(self, start: int, stop: int) -> np.ndarray:
+        """解码行范围内的文字块，返回 (行数, 文字列数) 的 object 数组"""
+        width = self.layout.text_width
+        buffers = self.layout.text_buffers
+        first, last = start * width, stop * width
+        tags = self._view(buffers['tags'][0], buffers['tags'][1], np.uint8)[first:last].tolist()
+        offsets = self._view(buffers['offsets'][0], buffers['offsets'][1] // 8, np.int64)[first:last + 1]
+        base = int(offsets[0])
+        blob = self._view(buffers['data'][0], buffers['data'][1], np.uint8)[base:int(offsets[-1])].tobytes()
+        bounds = (offsets - base).tolist()
+
+        values = [None] * len(tags)
+        for i, tag in enumerate(tags):
+            if tag == _TAG_STR:
+                values[i] = blob[bounds[i]:bounds[i + 1]].decode('utf-8')
+            elif tag == _TAG_NAN:
+                values[i] = np.nan
+            elif tag == _TAG_PICKLE:
+                values[i] = pickle.loads(blob[bounds[i]:bounds[i + 1]])
+        block = np.empty(len(values), dtype=object)
+        block[:] = values
+        return block.reshape(stop - start, width)
+
+    def frame(self, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        """解码指定行范围的数据（只解码范围内的行，返回可修改的新 DataFrame）
+
+        Args:
+            start: 起始行
+            stop: 结束行（不包含，默认到末尾）
+
+        Returns:
+            DataFrame: 与原台账对应行的列、类型和行索引相同
+        """
+        stop = self.layout.rows if stop is None else stop
+        columns, index_layout = self.layout.columns, self.layout.index
+        block = self._text_block(start, stop)
+
+        if index_layout.encoding == 'numpy':
+            index_values = np.array(self._numeric(index_layout, start, stop))
+        else:
+            index_values = block[:, index_layout.offset]
+        index = pd.Index(index_values, name=index_layout.name)
+
+        # 文字列用一个二维 object 数组一次构建，其余列按原位置插入（逐列构建 DataFrame 开销较大）
+        text_columns = [column for column in columns if column.encoding == 'text']
+        frame = pd.DataFrame(block[:, [column.offset for column in text_columns]], index=index,
+                             columns=pd.Index([column.name for column in text_columns], dtype=object))
+        for position, column in enumerate(columns):
+            if column.encoding == 'numpy':
+                frame.insert(position, column.name, np.array(self._numeric(column, start, stop)))
+            elif column.dtype != 'object':
+                frame[column.name] = pd.array(frame[column.name].to_numpy(), dtype=column.dtype)
+        if not frame.columns.equals(pd.Index([column.name for column in columns])):
+            frame.columns = pd.Index([column.name for column in columns])
+        return frame
+
+    def partition_frame(self, value) -> pd.DataFrame:
+        """返回一个分区的数据"""
+        return self.frame(*self.layout.partitions[value])
+
+    def close(self):
+        """释放本进程的映射（创建者同时删除共享内存）"""
+        self._views.clear()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+            self._owner = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------------------------------------------------
+# 基准测试
+# ---------------------------------------------------------------------------
+
+_bench_state = {}
+
+
+def _synthetic_ledger(rows: int, columns: int, group_rows: int, seed: int = 0) -> pd.DataFrame:
+    """生成与实际台账相近的宽表：委托单编号 + 多个文字列 + 张数、日期列"""
+    rng = np.random.default_rng(seed)
+    data = {'委托单编号': [f"RT-{i // group_rows:05d}" for i in range(rows)]}
+    for c in range(columns):
+        data[f"文字列{c + 1}"] = [f"B{c}-{value:06d}-焊口" for value in rng.integers(0, 10 ** 6, rows)]
+    data['张数'] = rng.integers(1, 8, rows)
+    data['完成日期'] = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')
+    return pd.DataFrame(data)
+
+
+def _bench_init(mode, payload):
+    if mode == 'shared':
+        _bench_state['ledger'] = SharedLedger.attach(payload)
+    elif mode == 'initargs':
+        _bench_state['partitions'] = {key: group for key, group in payload.groupby('委托单编号', sort=False)}
+
+
+def _bench_task(mode, payload):
+    if mode == 'shared':
+        frame = _bench_state['ledger'].frame(*payload)
+    elif mode == 'initargs':
+        frame = _bench_state['partitions'][payload].copy()
+    else:
+        frame = payload.copy()
+    return len(frame)
+
+
+def _process_memory_mb(pid: int) -> Tuple[Optional[float], Optional[float]]:
+    """读取进程的 RSS 和 PSS（MB，共享页按进程数分摊）；系统不支持时返回 None"""
+    rss = pss = None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) / 1024
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    pss = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return rss, pss
+
+
+def _run_benchmark_mode(mode, df, workers, start_method):
+    keys = list(pd.unique(df['委托单编号']))
+    ledger = None
+    if mode == 'shared':
+        ledger = SharedLedger.create(df, '委托单编号')
+        initargs = (mode, ledger.layout)
+        tasks = [ledger.layout.partitions[key] for key in keys]
+    elif mode == 'initargs':
+        initargs = (mode, df)
+        tasks = keys
+    else:
+        initargs = (mode, None)
+        tasks = [group for _, group in df.groupby('委托单编号', sort=False)]
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context(start_method),
+                                 initializer=_bench_init, initargs=initargs) as executor:
+            # 先让所有进程完成初始化，只统计任务派发的耗时
+            list(executor.map(time.sleep, [0.2] * workers))
+            start = time.perf_counter()
+            rows = sum(executor.map(_bench_task, [mode] * len(tasks), tasks, chunksize=1))
+            elapsed = time.perf_counter() - start
+
+            pids = [os.getpid()] + list(executor._processes)
+            memory = [_process_memory_mb(pid) for pid in pids]
+    finally:
+        if ledger is not None:
+            ledger.close()
+
+    assert rows == len(df)
+    task_bytes = sum(len(pickle.dumps(task, protocol=pickle.HIGHEST_PROTOCOL)) for task in tasks) / len(tasks)
+    rss = sum(m[0] for m in memory) if all(m[0] is not None for m in memory) else None
+    pss = sum(m[1] for m in memory) if all(m[1] is not None for m in memory) else None
+    return elapsed / len(tasks) * 1e6, task_bytes, rss, pss
+
+
+def benchmark(rows: int = 20000, columns: int = 32, group_rows: int = 10,
+              worker_counts=(1, 4, 16), start_method: str = 'spawn'):
+    """比较三种数据交接方式的每任务派发耗时和全部进程的内存占用
+
+    - initargs: 原方式，每个子进程初始化时收到完整台账
+    - slice: 每个任务携带该分组的 DataFrame
+    - shared: 台账放在共享内存，任务只携带行号范围
+    """
+    df = _synthetic_ledger(rows, columns, group_rows)
+    print(f"基准测试: {rows}行 x {len(df.columns)}列，{df['委托单编号'].nunique()}个分组，"
+          f"进程启动方式 {start_method}")
+    print(f"{'进程数':<8}{'方式':<10}{'每任务(微秒)':>14}{'任务参数(字节)':>16}{'总RSS(MB)':>12}{'总PSS(MB)':>12}")
+    for workers in worker_counts:
+        for mode in ('initargs', 'slice', 'shared'):
+            per_task, task_bytes, rss, pss = _run_benchmark_mode(mode, df, workers, start_method)
+            rss_text = f"{rss:.0f}" if rss is not None else "不可用"
+            pss_text = f"{pss:.0f}" if pss is not None else "不可用"
+            print(f"{workers:<8}{mode:<10}{per_task:>14.0f}{task_bytes:>16.0f}{rss_text:>12}{pss_text:>12}")
+
+
+def main():
+    # 创建命令行参数解析器
+    parser = argparse.ArgumentParser(description='共享内存台账分区基准测试（每任务派发耗时与内存占用）')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='使用模拟台账运行基准测试')
+    parser.add_argument('-n', '--rows', type=int, default=20000,
+                        help='模拟台账行数 (默认: 20000)')
+    parser.add_argument('--columns', type=int, default=32,
+                        help='模拟的文字列数量 (默认: 32)')
+    parser.add_argument('--group-rows', type=int, default=10,
+                        help='每个分组的行数 (默认: 10)')
+    parser.add_argument('-j', '--workers', type=int, nargs='+', default=[1, 4, 16],
+                        help='进程数量列表 (默认: 1 4 16)')
+    parser.add_argument('--start-method', choices=['spawn', 'fork', 'forkserver'], default='spawn',
+                        help='子进程启动方式 (默认: spawn，与Windows相同)')
+
+    # 解析命令行参数
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.rows, args.columns, args.group_rows, args.workers, args.start_method)
+    else:
+        parser.print_help()
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
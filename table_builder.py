@@ -0,0 +1,151 @@
+"""
+大表格构建
+
+python-docx 的 row.cells 每次都会遍历整个表格重新计算单元格网格，table.rows[i] 和
+len(table.rows) 每次也会重新查找全部行；table.add_row() 添加的行只有宽度、不带模板格式，
+并且总是加在表格末尾（"以下空白"、合计等尾部行之后）。一个委托单有几千行时，
+逐行 add_row 再逐个单元格写入会退化为平方级。
+
+本模块：
+1. TableGrid 只计算一次单元格网格，按行取单元格（与 row.cells 的结果一致）
+2. insert_rows 以数据行为原型，按批克隆行的XML插入到指定行之后，尾部行位置保持不变；
+   insert_grid_rows/append_grid_rows 按表格网格列批量插入与 table.add_row() 结构相同的空行
+"""
+
+import copy
+
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.table import _Row
+
+import run_metrics
+
+# 大表格模式配置
+LARGE_TABLE_CONFIG = {
+    'row_threshold': 200,   # 数据行数超过该值时使用大表格模式（不逐格输出日志）
+    'batch_size': 500,      # 每批插入的行数
+}
+
+
+def is_large_table(row_count):
+    """判断是否使用大表格模式"""
+    return row_count > LARGE_TABLE_CONFIG['row_threshold']
+
+
+class TableGrid:
+    """缓存表格的行和单元格网格
+
+    网格在创建时计算一次，通过 insert_rows 插入行后会自动刷新；
+    表格结构被其他方式修改（如 table.add_row）后需要调用 refresh。
+
+    Args:
+        table: Word表格对象
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.refresh()
+
+    def refresh(self):
+        """重新计算行和单元格网格"""
+        self._trs = list(self.table._tbl.tr_lst)
+        self._column_count = self.table._column_count
+        self._cells = self.table._cells
+
+    def __len__(self):
+        return len(self._trs)
+
+    def row(self, row_idx):
+        """返回第row_idx行"""
+        return _Row(self._trs[row_idx], self.table)
+
+    def cells(self, row_idx):
+        """返回第row_idx行的单元格（合并单元格重复出现，与 row.cells 一致）"""
+        start = row_idx * self._column_count
+        return self._cells[start:start + self._column_count]
+
+    def insert_rows(self, after_idx, count, prototype_idx=None, batch_size=None):
+        """在第after_idx行之后插入count行
+
+        新行克隆原型行的XML（行高、边框、段落格式等全部保留），并清空文字；
+        after_idx之后原有的行（"以下空白"、合计、签字等）整体下移，相对位置不变。
+
+        Args:
+            after_idx: 插入位置，新行位于该行之后
+            count: 插入的行数
+            prototype_idx: 原型行索引（默认: after_idx）
+            batch_size: 每批插入的行数（默认: LARGE_TABLE_CONFIG['batch_size']）
+
+        Returns:
+            list: 新行的索引
+        """
+        if count <= 0:
+            return []
+
+        prototype = blank_row_copy(self._trs[after_idx if prototype_idx is None else prototype_idx])
+        return self._insert_copies(after_idx, prototype, count, batch_size)
+
+    def append_grid_rows(self, count, batch_size=None):
+        """在表格末尾添加count个与 table.add_row() 结构相同的空行（每个网格列一个单元格）
+
+        Returns:
+            list: 新行的索引
+        """
+        if count <= 0:
+            return []
+        if not self._trs:
+            for _ in range(count):
+                self.table.add_row()
+            self.refresh()
+            run_metrics.count('rows_added', count)
+            return list(range(count))
+        return self.insert_grid_rows(len(self._trs) - 1, count, batch_size)
+
+    def insert_grid_rows(self, after_idx, count, batch_size=None):
+        """在第after_idx行之后插入count个与 table.add_row() 结构相同的空行
+
+        Returns:
+            list: 新行的索引
+        """
+        if count <= 0:
+            return []
+        return self._insert_copies(after_idx, grid_row(self.table), count, batch_size)
+
+    def _insert_copies(self, after_idx, prototype, count, batch_size=None):
+        batch_size = batch_size or LARGE_TABLE_CONFIG['batch_size']
+        anchor = self._trs[after_idx]
+        parent = anchor.getparent()
+        position = parent.index(anchor) + 1
+        for batch_start in range(0, count, batch_size):
+            batch = [copy.deepcopy(prototype) for _ in range(min(batch_size, count - batch_start))]
+            parent[position:position] = batch
+            position += len(batch)
+
+        self.refresh()
+        run_metrics.count('rows_added', count)
+        return list(range(after_idx + 1, after_idx + 1 + count))
+
+
+def grid_row(table):
+    """按表格网格列创建一个空行（与 table.add_row() 添加的行结构相同，但不加入表格）"""
+    tr = OxmlElement('w:tr')
+    for grid_col in table._tbl.tblGrid.gridCol_lst:
+        tc = tr.add_tc()
+        tc.width = grid_col.w
+    return tr
+
+
+def blank_row_copy(tr):
+    """复制行的XML并清空文字，保留行、单元格和段落属性"""
+    new_tr = copy.deepcopy(tr)
+    for tc in new_tr.tc_lst:
+        paragraphs = tc.p_lst
+        # 每个单元格只保留第一个段落，且只保留段落属性
+        for p in paragraphs[1:]:
+            tc.remove(p)
+        if paragraphs:
+            for child in list(paragraphs[0]):
+                if child.tag != qn('w:pPr'):
+                    paragraphs[0].remove(child)
+    return new_tr
+
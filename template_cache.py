@@ -0,0 +1,131 @@
+"""
+Word模板缓存
+
+生成器为每个委托单重新打开一次模板。对 .doc 模板，原来的做法是在每个委托单的循环里
+打开、另存为模板旁边的 .docx、再重新打开，每个委托单都要多做两次完整的解析和保存，
+并且会在模板目录里写文件。
+
+本模块：
+1. .doc 模板按内容哈希只转换一次，转换结果保存在缓存目录（不写模板所在目录）
+2. 模板内容读入内存后在同一进程内共享，每个委托单从内存中的模板包创建文档
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+from docx import Document
+
+import run_metrics
+
+# 转换后模板的缓存目录
+TEMPLATE_CACHE_DIR = os.path.join(tempfile.gettempdir(), "ReportAutoGenerator", "templates")
+
+# 需要先转换为 .docx 的旧格式模板扩展名
+LEGACY_TEMPLATE_EXTENSIONS = ('.doc',)
+
+_lock = threading.Lock()
+_converted = {}   # (绝对路径, 修改时间, 大小) -> 转换后的 .docx 路径
+_packages = {}    # (绝对路径, 修改时间, 大小) -> 模板内容
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+def _content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_legacy_template(path):
+    """判断是否为需要转换的旧格式模板"""
+    return path.lower().endswith(LEGACY_TEMPLATE_EXTENSIONS)
+
+
+def converted_template_path(word_template_path, cache_dir=None):
+    """返回模板对应的 .docx 路径，旧格式模板按内容哈希转换一次并缓存
+
+    Args:
+        word_template_path: 模板路径
+        cache_dir: 缓存目录（默认: TEMPLATE_CACHE_DIR）
+
+    Returns:
+        str: .docx 模板路径（.docx 模板原样返回）
+
+    Raises:
+        Exception: 模板无法打开或转换时抛出
+    """
+    if not is_legacy_template(word_template_path):
+        return word_template_path
+
+    key = _file_key(word_template_path)
+    with _lock:
+        cached = _converted.get(key)
+    if cached and os.path.isfile(cached):
+        return cached
+
+    cache_dir = cache_dir or TEMPLATE_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(word_template_path))[0]
+    target = os.path.join(cache_dir, f"{stem}_{_content_hash(word_template_path)[:16]}.docx")
+
+    if os.path.isfile(target):
+        print(f"使用已转换的模板缓存: {target}")
+    else:
+        print(f"检测到.doc文件，转换为.docx并缓存: {target}")
+        doc = Document(word_template_path)
+        # 先写临时文件再改名，避免多个进程同时转换时读到不完整的文件
+        fd, temp_path = tempfile.mkstemp(suffix='.docx', dir=cache_dir)
+        os.close(fd)
+        try:
+            doc.save(temp_path)
+            os.replace(temp_path, target)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        print("成功转换.doc为.docx")
+
+    with _lock:
+        _converted[key] = target
+    return target
+
+
+def open_template(word_template_path):
+    """从共享的模板缓存创建新文档
+
+    模板文件（旧格式模板为转换后的 .docx）只读取一次，之后每次调用都从内存中的
+    模板包创建独立的文档对象；模板文件被修改后会重新读取。
+
+    Args:
+        word_template_path: 模板路径
+
+    Returns:
+        Document: 新的文档对象
+    """
+    docx_path = converted_template_path(word_template_path)
+    key = _file_key(docx_path)
+    with _lock:
+        package = _packages.get(key)
+    if package is None:
+        run_metrics.count('template_cache_misses')
+        with open(docx_path, 'rb') as f:
+            package = f.read()
+        with _lock:
+            _packages[key] = package
+    else:
+        run_metrics.count('template_cache_hits')
+    return Document(io.BytesIO(package))
+
+
+def clear_template_cache():
+    """清空进程内的模板缓存（不删除缓存目录中的文件）"""
+    with _lock:
+        _converted.clear()
+        _packages.clear()
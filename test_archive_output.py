@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试archive_output.py的归档输出
+"""
+
+import contextvars
+import json
+import os
+import tarfile
+import tempfile
+import threading
+import zipfile
+
+from docx import Document
+
+import archive_output
+from docx_writer import document_parts, save_docx, write_parts
+
+
+def _document(text):
+    doc = Document()
+    doc.add_paragraph(text)
+    return doc
+
+
+def test_concurrent_writers_share_one_zip():
+    """测试多个线程同时保存的报告写入同一个zip，不写单独的文件，内容与直接保存相同"""
+    print("=== 测试归档输出 ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_dir = os.path.join(temp_dir, "输出报告", "结果通知单")
+        archive_path = os.path.join(temp_dir, "run.zip")
+        with archive_output.archive(archive_path, base_dir=os.path.join(temp_dir, "输出报告")) as sink:
+            # 与 report_pipeline 的写入线程相同，线程在当前上下文中运行
+            threads = [threading.Thread(target=contextvars.copy_context().run,
+                                        args=(save_docx, _document(f"RT-{i}"), os.path.join(output_dir, f"RT-{i}.docx")))
+                       for i in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert archive_output.current() is sink
+        assert archive_output.current() is None
+        assert not os.path.exists(output_dir)
+
+        with zipfile.ZipFile(archive_path) as zf:
+            names = zf.namelist()
+            manifest = json.loads(zf.read("manifest.json"))
+            assert sorted(names) == sorted([f"结果通知单/RT-{i}.docx" for i in range(20)] + ["manifest.json"])
+            assert manifest['report_count'] == 20
+            entry = next(item for item in manifest['reports'] if item['name'] == "结果通知单/RT-3.docx")
+            archived = zf.read(entry['name'])
+        assert entry['size'] == len(archived)
+
+        # 与直接保存的文件字节相同
+        direct_path = os.path.join(temp_dir, "RT-3.docx")
+        write_parts(document_parts(_document("RT-3")), direct_path)
+        with open(direct_path, 'rb') as f:
+            assert f.read() == archived
+        assert Document(os.path.join(temp_dir, "RT-3.docx")).paragraphs[-1].text == "RT-3"
+    print("归档输出测试通过")
+
+
+def test_child_capture_and_failed_run():
+    """测试子进程暂存的报告写入tar归档；运行出错时不留下归档"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with archive_output.capture() as buffer:
+            save_docx(_document("子进程"), os.path.join(temp_dir, "其他目录", "RT-9.docx"))
+        assert len(buffer.entries) == 1
+
+        archive_path = os.path.join(temp_dir, "run.tar.gz")
+        with archive_output.archive(archive_path):
+            archive_output.merge(buffer.entries)
+        with tarfile.open(archive_path) as tf:
+            assert sorted(tf.getnames()) == ["manifest.json", "其他目录/RT-9.docx"]
+
+        failed_path = os.path.join(temp_dir, "failed.zip")
+        try:
+            with archive_output.archive(failed_path):
+                save_docx(_document("RT-1"), os.path.join(temp_dir, "RT-1.docx"))
+                raise RuntimeError("生成中断")
+        except RuntimeError:
+            pass
+        assert os.listdir(temp_dir) == ["run.tar.gz"]
+    print("子进程暂存与失败处理测试通过")
+
+
+def test_unsuccessful_run_not_published():
+    """测试运行结果为失败时不生成归档；写入线程出错时 published 为False"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        failed_path = os.path.join(temp_dir, "failed.zip")
+        with archive_output.archive(failed_path) as sink:
+            save_docx(_document("RT-1"), os.path.join(temp_dir, "RT-1.docx"))
+            sink.success = False
+        assert not archive_output.published(sink)
+        assert os.listdir(temp_dir) == []
+
+        broken_path = os.path.join(temp_dir, "broken.zip")
+        with archive_output.archive(broken_path) as sink:
+            sink.success = True
+            sink.add(os.path.join(temp_dir, "RT-1.docx"), b"1")
+            sink.add(os.path.join(temp_dir, "RT-1.docx"), b"2")     # 同名报告，写入线程出错
+        assert not archive_output.published(sink)
+        assert os.listdir(temp_dir) == []
+
+        with archive_output.archive(os.path.join(temp_dir, "run.zip")) as sink:
+            sink.success = True
+        assert archive_output.published(sink) and archive_output.published(None)
+    print("失败运行不生成归档测试通过")
+
+
+if __name__ == "__main__":
+    test_concurrent_writers_share_one_zip()
+    test_child_capture_and_failed_run()
+    test_unsuccessful_run_not_published()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试columnar_extract.py的按列提取与逐行转换结果一致
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from columnar_extract import int_column, sheet_count_column, text_column, unqualified_column
+
+# 台账中实际出现过的各种取值：缺失、浮点文本、空白、不合格标记、底片规格文本
+VALUES = [np.nan, None, 3, 3.0, 2.7, "3.0", "3", " ", "", "不合格", "合格", "180*80/3张", "/张", "2张", "inf"]
+
+
+def _row_int(value, default=0):
+    """原逐行写法：int(float(value))，缺失或无法转换时为default"""
+    if pd.isna(value):
+        return default
+    try:
+        return int(float(value))
+    except (ValueError, TypeError, OverflowError):
+        return default
+
+
+def _row_sheet_count(value, default=1):
+    """原逐行写法：含"张"的文本提取斜杠后的数字，其他值按 int(float(value))"""
+    if pd.isna(value):
+        return default
+    if isinstance(value, str) and '张' in value:
+        match = re.search(r'/(\d+)张', value)
+        return int(match.group(1)) if match else default
+    return _row_int(value, default)
+
+
+def test_text_and_int_columns():
+    """逐个取值对比 text_column / int_column 与逐行结果"""
+    print("=== 测试按列提取 ===")
+
+    df = pd.DataFrame({'列': pd.Series(VALUES, dtype=object)})
+    expected_text = [str(value) if pd.notna(value) else "" for value in VALUES]
+    assert text_column(df, '列') == expected_text
+    assert text_column(df, '列', default="-")[:2] == ["-", "-"]
+
+    cases = [(value, _row_int(value)) for value in VALUES]
+    result = int_column(df, '列')
+    for (value, expected), actual in zip(cases, result):
+        assert actual == expected, f"int_column({value!r}) = {actual}，逐行结果为 {expected}"
+    assert list(int_column(df, '列', default=-1)[:2]) == [-1, -1]
+    assert int_column(pd.DataFrame({'列': [1.0, np.nan, 2.0]}), '列').tolist() == [1, 0, 2]
+    print("文本列与整数列测试通过")
+
+
+def test_unqualified_column():
+    """测试不合格张数：张数 - 合格张数，不小于0，合格张数为不合格标记或空白时按0计"""
+    cases = [
+        # (张数, 合格张数, 不合格张数)
+        (3, 3, 0),
+        ("3.0", 1, 2),
+        (2, "不合格", 2),
+        (np.nan, 2, 0),
+        (4, " ", 4),
+        (1, 5, 0),
+        ("", np.nan, 0),
+    ]
+    df = pd.DataFrame({'张数': pd.Series([c[0] for c in cases], dtype=object),
+                       '合格张数': pd.Series([c[1] for c in cases], dtype=object)})
+    assert unqualified_column(df, '张数', '合格张数').tolist() == [c[2] for c in cases]
+    assert unqualified_column(df, '张数').tolist() == [max(0, _row_int(c[0])) for c in cases]
+    assert unqualified_column(df).tolist() == [0] * len(cases)
+    print("不合格张数测试通过")
+
+
+def test_sheet_count_column():
+    """逐个取值对比 sheet_count_column 与逐行解析结果"""
+    df = pd.DataFrame({'张数': pd.Series(VALUES, dtype=object)})
+    for default in (1, 0):
+        result = sheet_count_column(df, '张数', default=default)
+        for value, actual in zip(VALUES, result):
+            expected = _row_sheet_count(value, default)
+            assert actual == expected, f"sheet_count_column({value!r}) = {actual}，逐行结果为 {expected}"
+    assert sheet_count_column(pd.DataFrame({'张数': [2, 5]}), '张数').tolist() == [2, 5]
+    print("张数解析测试通过")
+
+
+if __name__ == "__main__":
+    test_text_and_int_columns()
+    test_unqualified_column()
+    test_sheet_count_column()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试docx_merge.py的合并输出
+"""
+
+import io
+import os
+import struct
+import tempfile
+import zipfile
+import zlib
+
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+import run_metrics
+from docx_merge import MergedDocument, save_merged
+from job_manager import PROGRESS_PATTERN, install_stdout_router
+from report_pipeline import ReportPipeline
+
+
+def _png():
+    """1×1像素的PNG图片"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(b'\x00\xff\x00\x00')) + chunk(b'IEND', b''))
+
+
+def _group_document(order_number, end_with_table=False):
+    """模拟一个分组填好的文档：表格、图片、书签，末尾为空段落或表格"""
+    doc = Document()
+    paragraph = doc.add_paragraph(f"委托单编号: {order_number}")
+    bookmark = OxmlElement('w:bookmarkStart')
+    bookmark.set(qn('w:id'), '0')
+    bookmark.set(qn('w:name'), '_GoBack')
+    end = OxmlElement('w:bookmarkEnd')
+    end.set(qn('w:id'), '0')
+    paragraph._p.append(bookmark)
+    paragraph._p.append(end)
+    doc.add_picture(io.BytesIO(_png()))
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = order_number
+    if not end_with_table:
+        doc.add_paragraph()
+    return doc
+
+
+def test_groups_become_sections_with_shared_parts():
+    """测试每个分组成为一节，样式和图片只保存一份，书签编号不重复"""
+    print("=== 测试合并输出 ===")
+
+    merged = MergedDocument()
+    for order_number in ["RT-1", "RT-2", "RT-3"]:
+        merged.append(_group_document(order_number))
+
+    doc = merged.document
+    assert merged.count == 3 and len(doc.sections) == 3
+    assert [table.cell(0, 0).text for table in doc.tables] == ["RT-1", "RT-2", "RT-3"]
+    for section in doc.element.body.iter(qn('w:sectPr')):
+        assert section.find(qn('w:pgNumType')).get(qn('w:start')) == '1'
+    bookmarks = list(doc.element.body.iter(qn('w:bookmarkStart')))
+    assert len(bookmarks) == 1 and len(list(doc.element.body.iter(qn('w:bookmarkEnd')))) == 1
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, "合并.docx")
+        assert merged.save(output_path)
+        with zipfile.ZipFile(output_path) as zf:
+            names = zf.namelist()
+        assert len([name for name in names if name.startswith('word/media/')]) == 1
+        assert names.count('word/styles.xml') == 1
+
+        reopened = Document(output_path)
+        assert len(reopened.sections) == 3 and len(reopened.inline_shapes) == 3
+        embeds = {blip.get(qn('r:embed')) for blip in reopened.element.body.iter(qn('a:blip'))}
+        assert len(embeds) == 1 and reopened.part.related_parts[embeds.pop()].blob == _png()
+    print("合并输出测试通过")
+
+
+def test_table_ending_gets_break_paragraph():
+    """测试分组以表格结尾时另加段落承载分节符，原有内容不变"""
+    merged = MergedDocument()
+    merged.append(_group_document("RT-1", end_with_table=True))
+    merged.append(_group_document("RT-2", end_with_table=True))
+
+    body = list(merged.document.element.body)
+    first_break = next(element for element in body if element.find(f"{qn('w:pPr')}/{qn('w:sectPr')}") is not None)
+    assert first_break.getprevious().tag == qn('w:tbl')
+    assert first_break.find(f"{qn('w:pPr')}/{qn('w:spacing')}").get(qn('w:lineRule')) == 'exact'
+    assert len(merged.document.sections) == 2 and len(merged.document.tables) == 2
+    print("表格结尾分节测试通过")
+
+
+def test_pipeline_merge_counts_one_report():
+    """测试流水线合并输出：分组只追加不保存，记为1份报告和追加的分组数，进度只计合并文档"""
+    orders = ["RT-1", "RT-2", "RT-3"]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        merged = MergedDocument()
+        log = io.StringIO()
+        with install_stdout_router().route(log), run_metrics.collect(None, write=False) as metrics:
+            pipeline = ReportPipeline(lambda key: key,
+                                      lambda key: (_group_document(key), os.path.join(temp_dir, f"{key}.docx")),
+                                      write=merged.write, writer_count=1)
+            renderer = pipeline.renderer('合并', orders, lambda success_count, group_count: save_merged(
+                merged, os.path.join(temp_dir, "合并.docx"), group_count))
+            assert renderer.run()
+        assert os.listdir(temp_dir) == ["合并.docx"]
+
+    output = log.getvalue()
+    assert output.count("已追加到合并文档") == 3
+    assert len([line for line in output.splitlines() if PROGRESS_PATTERN.search(line)]) == 1
+    assert metrics.counters['reports_generated'] == 1 and metrics.counters['reports_failed'] == 0
+    assert metrics.counters['groups_merged'] == 3
+    print("流水线合并输出计数测试通过")
+
+
+if __name__ == "__main__":
+    test_groups_become_sections_with_shared_parts()
+    test_table_ending_gets_break_paragraph()
+    test_pipeline_merge_counts_one_report()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试docx_writer.py的确定性保存与未变化输出跳过
+"""
+
+import os
+import tempfile
+import time
+
+from docx import Document
+
+from docx_writer import file_parts_hash, save_docx
+
+
+def _build_document(text):
+    doc = Document()
+    doc.add_paragraph(text)
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "委托单编号"
+    table.cell(1, 0).text = text
+    return doc
+
+
+def test_unchanged_output_is_not_rewritten():
+    """测试相同内容保存两次时第二次不改写文件，内容变化后重新写入"""
+    print("=== 测试未变化输出跳过 ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, "报告_生成结果.docx")
+        assert save_docx(_build_document("A-001"), output_path)
+        first_mtime = os.stat(output_path).st_mtime_ns
+
+        time.sleep(0.01)
+        assert not save_docx(_build_document("A-001"), output_path)
+        assert os.stat(output_path).st_mtime_ns == first_mtime
+
+        assert save_docx(_build_document("A-002"), output_path)
+        assert Document(output_path).paragraphs[0].text == "A-002"
+        assert [name for name in os.listdir(temp_dir)] == ["报告_生成结果.docx"]
+    print("未变化输出跳过测试通过")
+
+
+def test_identical_input_gives_identical_bytes():
+    """测试相同输入在不同时间保存的文件字节完全相同"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        first = os.path.join(temp_dir, "first.docx")
+        second = os.path.join(temp_dir, "second.docx")
+        save_docx(_build_document("B-001"), first)
+        time.sleep(2.1)  # zip时间戳精度为2秒
+        save_docx(_build_document("B-001"), second)
+
+        with open(first, 'rb') as f1, open(second, 'rb') as f2:
+            assert f1.read() == f2.read()
+        assert file_parts_hash(first) == file_parts_hash(second)
+        assert file_parts_hash(os.path.join(temp_dir, "missing.docx")) is None
+    print("确定性保存测试通过")
+
+
+if __name__ == "__main__":
+    test_unchanged_output_is_not_rewritten()
+    test_identical_input_gives_identical_bytes()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试fan_out.py的多模板逐组生成
+"""
+
+import os
+import sys
+import tempfile
+import types
+
+import pandas as pd
+
+from fan_out import GroupRenderer, run_fan_out
+from ledger_session import GeneratorJob, LedgerSession, group_value
+
+NDT_EXCEL = "生成器/Excel/2_生成器结果.xlsx"
+
+
+def _fake_module(name, calls, computed, finished=None, column='委托单编号', failing=()):
+    """模拟一个生成器模块：build_renderer 返回记录调用顺序的 GroupRenderer
+
+    按 column 列分组；render 的调用记入 calls（多进程时在子进程中，另在 output_dir 下写一个文件），
+    failing 中的分组生成失败，finish 的参数记入 finished
+    """
+    module = types.ModuleType(name)
+
+    def build_renderer(excel_path, word_template_path, session=None, output_dir=None):
+        df = session.read_excel()
+
+        def render(key):
+            latest = group_value(session, ('最晚完成日期', '完成日期'), key,
+                                 lambda: computed.append(key) or df[df[column] == key]['完成日期'].max())
+            calls.append((key, name, latest))
+            if output_dir:
+                open(os.path.join(output_dir, f"{name}_{key}"), 'w').close()
+            return key not in failing
+
+        def finish(success_count, group_count):
+            if finished is not None:
+                finished.append((name, success_count, group_count))
+            return success_count == group_count
+
+        return GroupRenderer(name, df[column].dropna().unique().tolist(), render, finish)
+
+    module.build_renderer = build_renderer
+    return module
+
+
+def test_groups_render_all_templates_in_order():
+    """测试每个分组依次生成全部模板后再处理下一个分组，分组派生数据只计算一次"""
+    print("=== 测试逐组生成 ===")
+
+    calls, computed = [], []
+    sys.modules['fake_mode2'] = _fake_module('fake_mode2', calls, computed)
+    sys.modules['fake_mode1'] = _fake_module('fake_mode1', calls, computed)
+    try:
+        df = pd.DataFrame({'委托单编号': ['A', 'B', 'A', 'C'], '完成日期': [1, 2, 3, 4]})
+        session = LedgerSession("台账.xlsx", df)
+        jobs = [GeneratorJob('Mode2', 'fake_mode2', "模板2.docx"), GeneratorJob('Mode1', 'fake_mode1', "模板1.docx")]
+        results = run_fan_out(session, jobs)
+    finally:
+        del sys.modules['fake_mode2'], sys.modules['fake_mode1']
+
+    assert results == {'Mode2': True, 'Mode1': True}
+    assert calls == [('A', 'fake_mode2', 3), ('A', 'fake_mode1', 3),
+                     ('B', 'fake_mode2', 2), ('B', 'fake_mode1', 2),
+                     ('C', 'fake_mode2', 4), ('C', 'fake_mode1', 4)]
+    assert computed == ['A', 'B', 'C']
+
+    # 单独运行时逐组调用 render，最后调用 finish
+    order = []
+    renderer = GroupRenderer('单独', ['A', 'B'], lambda key: order.append(key) or True,
+                             lambda success_count, group_count: order.append((success_count, group_count)) or True)
+    assert renderer.run() and order == ['A', 'B', (2, 2)]
+    print("逐组生成测试通过")
+
+
+def test_multiprocess_counts_and_group_union():
+    """测试多进程逐组生成：分组为各模板分组的并集，处理结果按全部分组在父进程中每个模板汇总一次"""
+    calls, computed, finished = [], [], []
+    sys.modules['fake_mode2'] = _fake_module('fake_mode2', calls, computed, finished, failing=('B',))
+    # Mode1 按另一列分组，多出只有该模板才有的分组D
+    sys.modules['fake_mode1'] = _fake_module('fake_mode1', calls, computed, finished, column='Mode1分组',
+                                              failing=('B',))
+    df = pd.DataFrame({'委托单编号': ['A', 'B', 'A', 'C', None],
+                       'Mode1分组': ['A', 'B', 'A', 'C', 'D'],
+                       '完成日期': [1, 2, 3, 4, 5]})
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for workers in (1, 2):
+                output_dir = os.path.join(temp_dir, str(workers))
+                os.makedirs(output_dir)
+                jobs = [GeneratorJob('Mode2', 'fake_mode2', "模板2.docx", {'output_dir': output_dir}),
+                        GeneratorJob('Mode1', 'fake_mode1', "模板1.docx", {'output_dir': output_dir})]
+                del finished[:]
+                results = run_fan_out(LedgerSession("台账.xlsx", df), jobs, workers=workers)
+
+                assert sorted(os.listdir(output_dir)) == [
+                    'fake_mode1_A', 'fake_mode1_B', 'fake_mode1_C', 'fake_mode1_D',
+                    'fake_mode2_A', 'fake_mode2_B', 'fake_mode2_C']
+                # 每个模板只汇总一次，失败数按该模板的全部分组计算
+                assert finished == [('fake_mode2', 2, 3), ('fake_mode1', 3, 4)]
+                assert results == {'Mode2': False, 'Mode1': False}     # 分组B生成失败
+    finally:
+        del sys.modules['fake_mode2'], sys.modules['fake_mode1']
+    print("多进程逐组生成测试通过")
+
+
+def test_fan_out_matches_separate_runs():
+    """测试共用会话逐组生成的报告与各生成器单独运行的报告字节相同"""
+    if not os.path.exists(NDT_EXCEL):
+        print("跳过: 缺少示例台账")
+        return
+
+    df = pd.read_excel(NDT_EXCEL)
+    orders = df['委托单编号'].dropna().unique()[:2]
+    subset = df[df['委托单编号'].isin(orders)].reset_index(drop=True)
+    templates = [('NDT_result', "生成器/word/2_RT结果通知台账_Mode2.docx"),
+                 ('NDT_result_mode1', "生成器/word/2_RT结果通知台账_Mode1.docx")]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        jobs = [GeneratorJob(module, module, template,
+                             {'output_path': os.path.join(temp_dir, 'fan_out', module), 'project_name': "测试工程"})
+                for module, template in templates]
+        results = run_fan_out(LedgerSession(NDT_EXCEL, subset), jobs)
+        assert all(results.values())
+
+        for module, template in templates:
+            separate_dir = os.path.join(temp_dir, 'separate', module)
+            assert __import__(module).process_excel_to_word(NDT_EXCEL, template, separate_dir, project_name="测试工程",
+                                                            session=LedgerSession(NDT_EXCEL, subset))
+            names = sorted(os.listdir(separate_dir))
+            assert len(names) == 2 and names == sorted(os.listdir(os.path.join(temp_dir, 'fan_out', module)))
+            for name in names:
+                with open(os.path.join(separate_dir, name), 'rb') as f1, \
+                        open(os.path.join(temp_dir, 'fan_out', module, name), 'rb') as f2:
+                    assert f1.read() == f2.read()
+    print("逐组生成与单独运行一致测试通过")
+
+
+if __name__ == "__main__":
+    test_groups_render_all_templates_in_order()
+    test_multiprocess_counts_and_group_union()
+    test_fan_out_matches_separate_runs()
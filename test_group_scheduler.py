@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试group_scheduler.py的成本模型与派发顺序
+"""
+
+import pandas as pd
+
+from group_scheduler import (BENCHMARK_CONFIG, SCHEDULER_CONFIG, build_benchmark_ledger, estimate_group_cost,
+                             lpt_order, simulate_makespan, template_capacity)
+
+
+def test_estimate_group_cost():
+    """测试成本模型：固定成本、数据行、表格行、超出模板容量的扩展行与续表"""
+    print("=== 测试成本估算 ===")
+
+    config = SCHEDULER_CONFIG
+    fits = estimate_group_cost("RT-1_X射线", data_rows=4, total_sheets=6, table_rows=6, capacity=10)
+    assert fits.expansion_rows == 0
+    assert fits.cost == config['base_cost'] + 4 * config['data_row_cost'] + 6 * config['table_row_cost']
+
+    expands = estimate_group_cost("RT-2_X射线", data_rows=20, total_sheets=30, table_rows=30, capacity=18,
+                                  continuation=True)
+    assert expands.expansion_rows == 12
+    assert expands.cost == (config['base_cost'] + 20 * config['data_row_cost'] + 30 * config['table_row_cost']
+                            + 12 * config['expansion_row_cost'] + config['continuation_cost'])
+    assert expands.cost > fits.cost
+    print("成本估算测试通过")
+
+
+def test_lpt_order_and_makespan():
+    """测试最长任务优先排序（成本相同保持原顺序）与模拟总耗时"""
+    costs = [estimate_group_cost(key, 0, 0, rows, 100) for key, rows in
+             [('A', 0), ('B', 10), ('C', 0), ('D', 40), ('E', 10)]]
+    assert [item.key for item in lpt_order(costs)] == ['D', 'B', 'E', 'A', 'C']
+    assert [item.key for item in costs] == ['A', 'B', 'C', 'D', 'E']     # 不修改原列表
+
+    # 原始顺序把大任务留到最后：1,1,1,1 先分到两个进程，4 接在其中一个之后
+    assert simulate_makespan([1, 1, 1, 1, 4], 2) == 6
+    assert simulate_makespan([4, 1, 1, 1, 1], 2) == 4
+    assert simulate_makespan([3, 2, 2], 1) == 7
+    assert simulate_makespan([3, 2, 2], 8) == 3
+    assert simulate_makespan([], 4) == 0
+    print("派发顺序与总耗时测试通过")
+
+
+def test_template_capacity_and_benchmark_ledger():
+    """测试模板容量统计与基准测试合成台账的分组规模"""
+    assert template_capacity("不存在的模板.docx") == 0
+    assert template_capacity(BENCHMARK_CONFIG['word']) > 0
+
+    source = pd.DataFrame({'委托单编号': ['A', None, 'B'], '张数': [1, 2, 3]})
+    ledger = build_benchmark_ledger(source, '委托单编号', 20, seed=1)
+    sizes = ledger['委托单编号'].value_counts()
+    assert len(sizes) == 20 and ledger['张数'].isin([1, 3]).all()
+    assert (sizes >= BENCHMARK_CONFIG['large_rows'][0]).sum() == 2
+    assert sizes.min() >= BENCHMARK_CONFIG['small_rows'][0]
+    assert ledger.equals(build_benchmark_ledger(source, '委托单编号', 20, seed=1))
+    print("模板容量与合成台账测试通过")
+
+
+if __name__ == "__main__":
+    test_estimate_group_cost()
+    test_lpt_order_and_makespan()
+    test_template_capacity_and_benchmark_ledger()
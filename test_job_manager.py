@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试job_manager.py的并发任务与日志隔离
+"""
+
+import io
+import threading
+
+from job_manager import JobManager, STATUS_FAILED, STATUS_SUCCESS
+from report_pipeline import ReportPipeline
+
+
+def test_concurrent_jobs_keep_their_own_logs():
+    """测试两个任务同时运行时输出只写入各自的日志"""
+    print("=== 测试任务日志隔离 ===")
+
+    manager = JobManager(max_workers=2)
+    both_running = threading.Barrier(2)
+    logs = {'A': io.StringIO(), 'B': io.StringIO()}
+    done = threading.Event()
+    finished = []
+
+    def generate(name, count):
+        both_running.wait(timeout=5)
+        for i in range(count):
+            print(f"{name} 第{i + 1}份")
+            print(f"文档已成功保存至: {name}_{i + 1}.docx")
+        return True
+
+    def on_done(job):
+        finished.append(job)
+        if len(finished) == 3:
+            done.set()
+
+    job_a = manager.submit("A", generate, ("A", 3), sink=logs['A'], on_done=on_done)
+    job_b = manager.submit("B", generate, ("B", 5), sink=logs['B'], on_done=on_done)
+    job_c = manager.submit("C", lambda: 1 / 0, sink=io.StringIO(), on_done=on_done)
+    assert done.wait(timeout=10)
+    manager.shutdown(wait=True)
+
+    assert "B" not in logs['A'].getvalue() and "A" not in logs['B'].getvalue()
+    assert job_a.status == STATUS_SUCCESS and job_a.reports_done == 3 and job_a.log_lines == 6
+    assert job_b.status == STATUS_SUCCESS and job_b.reports_done == 5
+    assert job_c.status == STATUS_FAILED and "division" in job_c.error
+    assert job_a.elapsed >= 0
+    print("任务日志隔离测试通过")
+
+
+def test_pipeline_threads_inherit_job_log():
+    """测试流水线阶段线程的输出仍然写入所属任务的日志"""
+    manager = JobManager(max_workers=1)
+    log = io.StringIO()
+    done = threading.Event()
+
+    def generate():
+        pipeline = ReportPipeline(lambda key: key, lambda key: (key, f"{key}.docx"),
+                                  write=lambda doc, path: print(f"写入 {path}"))
+        return pipeline.run(["1", "2"]).success_count == 2
+
+    job = manager.submit("流水线", generate, sink=log, on_done=lambda job: done.set())
+    assert done.wait(timeout=10)
+    manager.shutdown(wait=True)
+
+    assert job.status == STATUS_SUCCESS
+    assert "写入 1.docx" in log.getvalue() and "写入 2.docx" in log.getvalue()
+    print("流水线日志继承测试通过")
+
+
+if __name__ == "__main__":
+    test_concurrent_jobs_keep_their_own_logs()
+    test_pipeline_threads_inherit_job_log()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试keyword_matcher.py的多关键字匹配与表格扫描
+"""
+
+import random
+
+from docx import Document
+
+from keyword_matcher import KeywordMatcher, scan_table
+
+
+def test_matcher_agrees_with_substring_checks():
+    """测试自动机命中的关键字与逐个 in 判断完全一致（包括互相包含的关键字）"""
+    print("=== 测试多关键字匹配 ===")
+
+    keywords = ["合格", "不合格", "以下空白", "施工单位：", "检测单位：", "焊口", "焊口编号", "口编"]
+    matcher = KeywordMatcher(keywords)
+    alphabet = "合格不以下空白施工单位：检测焊口编号A1 "
+    rng = random.Random(7)
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        expected = {keyword for keyword in keywords if keyword in text}
+        assert matcher.find(text) == expected, text
+
+    hits = matcher.find("不合格")
+    assert hits == {"合格", "不合格"}
+    assert matcher.first_hit(hits) == "合格"
+    assert matcher.first_hit(matcher.find("无关文字")) is None
+    print("多关键字匹配测试通过")
+
+
+def test_scan_table_follows_row_cells():
+    """测试扫描结果与 row.cells 一致，合并单元格在每个网格位置都出现"""
+    doc = Document()
+    table = doc.add_table(rows=3, cols=3)
+    table.cell(0, 0).text = "焊口编号"
+    table.cell(0, 1).merge(table.cell(0, 2)).text = "检测单位：2024年"
+    table.cell(2, 0).text = "以下空白"
+
+    matcher = KeywordMatcher(["检测单位：", "焊口编号", "以下空白"])
+    rows = list(scan_table(table, matcher))
+    assert [row_idx for row_idx, _ in rows] == [0, 1, 2]
+    for (row_idx, cells), row in zip(rows, table.rows):
+        assert [cell._tc for _, cell, _, _ in cells] == [cell._tc for cell in row.cells]
+        assert [text for _, _, text, _ in cells] == [cell.text for cell in row.cells]
+
+    first_row = rows[0][1]
+    assert [hits for _, _, _, hits in first_row] == [{"焊口编号"}, {"检测单位："}, {"检测单位："}]
+    assert [row_idx for row_idx, _ in scan_table(table, matcher, start=1, stop=2)] == [1]
+    print("表格扫描测试通过")
+
+
+if __name__ == "__main__":
+    test_matcher_agrees_with_substring_checks()
+    test_scan_table_follows_row_cells()
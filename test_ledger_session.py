@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试ledger_session.py的共享读取会话
+"""
+
+import os
+
+import pandas as pd
+
+from ledger_session import LedgerSession, group_value, session_for
+
+
+def _session():
+    df = pd.DataFrame({'委托单编号': ['B', 'A', 'B', None, 'C', 'A'], '张数': [1, 2, 3, 4, 5, 6]})
+    return LedgerSession("台账.xlsx", df)
+
+
+def test_partitions_order_and_read_only():
+    """测试分组顺序、只读与缓存，以及 read_excel 副本不影响会话数据"""
+    print("=== 测试共享分组 ===")
+
+    session = _session()
+    partitions = session.partitions('委托单编号')
+    assert list(partitions) == ['B', 'A', 'C']          # 与 df[列].dropna().unique() 一致
+    assert list(session.partitions('委托单编号', sort=True)) == ['A', 'B', 'C']   # 与 groupby 一致
+    assert partitions['B']['张数'].tolist() == [1, 3]
+    assert session.partitions('委托单编号') is partitions
+
+    try:
+        partitions['D'] = pd.DataFrame()
+        assert False, "分组映射应为只读"
+    except TypeError:
+        pass
+    try:
+        session.partitions('不存在的列')
+        assert False, "缺少的列应抛出 KeyError"
+    except KeyError:
+        pass
+
+    df = session.read_excel()
+    df['γ射线'] = None
+    df['张数'] = df['张数'] * 10
+    assert list(session.dataframe.columns) == ['委托单编号', '张数']
+    assert session.dataframe['张数'].tolist() == [1, 2, 3, 4, 5, 6]
+    print("共享分组测试通过")
+
+
+def test_group_value_cache_and_session_for():
+    """测试分组派生数据只计算一次，以及只有同一Excel文件时才使用会话"""
+    session = _session()
+    computed = []
+
+    def compute(key):
+        return lambda: computed.append(key) or f"值{key}"
+
+    assert group_value(session, ('最晚完成日期', '完成日期'), 'A', compute('A')) == "值A"
+    assert group_value(session, ('最晚完成日期', '完成日期'), 'A', compute('A')) == "值A"
+    assert group_value(session, ('单元名称', '单元名称'), 'A', compute('A单元')) == "值A单元"
+    assert computed == ['A', 'A单元']
+
+    # 没有会话时每次直接计算
+    assert group_value(None, ('最晚完成日期', '完成日期'), 'A', compute('A')) == "值A"
+    assert computed == ['A', 'A单元', 'A']
+
+    assert session_for(session, "台账.xlsx") is session
+    assert session_for(session, os.path.abspath("台账.xlsx")) is session
+    assert session_for(session, "其他台账.xlsx") is None
+    assert session_for(None, "台账.xlsx") is None
+    print("分组派生数据与会话匹配测试通过")
+
+
+if __name__ == "__main__":
+    test_partitions_order_and_read_only()
+    test_group_value_cache_and_session_for()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试memory_governor.py的内存上限控制
+"""
+
+import threading
+import time
+
+import memory_governor
+from memory_governor import DispatchThrottle, MemoryGovernor, in_flight_documents, process_rss_mb
+
+
+def test_over_budget_waits_for_in_flight_document():
+    """测试超过内存上限时，新文档等待正在处理的文档完成后才开始"""
+    print("=== 测试内存上限控制 ===")
+
+    rss = process_rss_mb()
+    assert rss is not None and rss > 0
+
+    poll_seconds = memory_governor.GOVERNOR_CONFIG['poll_seconds']
+    memory_governor.GOVERNOR_CONFIG['poll_seconds'] = 0.05
+    governor = MemoryGovernor(1)   # 1 MB：始终超过上限
+    events = []
+    first_started = threading.Event()
+
+    def first():
+        with governor.document():
+            first_started.set()
+            time.sleep(0.3)
+            events.append("第一份保存")
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    first_started.wait(timeout=5)
+    assert in_flight_documents() == 1
+
+    try:
+        for _ in governor.admit_each(["第二份"]):
+            events.append("第二份开始")
+    finally:
+        memory_governor.GOVERNOR_CONFIG['poll_seconds'] = poll_seconds
+    thread.join()
+
+    assert events == ["第一份保存", "第二份开始"]
+    assert governor.throttled == 1 and in_flight_documents() == 0
+    assert governor.peak_mb > 1
+
+    # 不限制时不等待
+    unlimited = MemoryGovernor(0)
+    with unlimited.document():
+        assert in_flight_documents() == 1
+    assert unlimited.throttled == 0
+    print("内存上限控制测试通过")
+
+
+def test_dispatch_throttle_uses_worker_reports():
+    """测试派发控制按子进程上报的内存计算总占用"""
+    throttle = DispatchThrottle(10000, workers=3)
+    assert throttle.limit_mb == 40000 and not throttle.over_budget()
+    throttle.report(101, 30000)
+    throttle.report(102, 20000)
+    throttle.report(101, 25000)   # 同一进程以最近一次上报为准
+    assert throttle.worker_rss == {101: 25000, 102: 20000}
+    assert throttle.over_budget()
+    assert not DispatchThrottle(None, workers=3).over_budget()
+    print("派发控制测试通过")
+
+
+if __name__ == "__main__":
+    test_over_budget_waits_for_in_flight_document()
+    test_dispatch_throttle_uses_worker_reports()
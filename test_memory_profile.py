@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试memory_profile.py的按阶段内存分析
+"""
+
+import csv
+import json
+import os
+import tempfile
+
+import tracemalloc
+
+from memory_profile import MemoryProfiler, profiling
+from report_pipeline import ReportPipeline
+
+
+def test_stages_record_allocations():
+    """测试各阶段记录新增内存、代码行和时间线"""
+    print("=== 测试按阶段内存分析 ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        profiler = MemoryProfiler(temp_dir, top_n=5)
+        profiler.start()
+        kept = []
+        with profiler.stage("读取Excel"):
+            kept.append([str(i) * 10 for i in range(20000)])
+        with profiler.stage("填充", "RT-1"):
+            pass
+        paths = profiler.finish()
+
+        assert [(entry['stage'], entry['group']) for entry in profiler.timeline] == [("读取Excel", ""), ("填充", "RT-1")]
+        read_entry = profiler.timeline[0]
+        assert read_entry['delta_mb'] > 0.5 and read_entry['peak_mb'] >= read_entry['current_mb']
+        site, size, count = profiler.top_sites("读取Excel")[0]
+        assert site.startswith(os.path.abspath(__file__)) and size > 500 * 1024 and count >= 20000
+
+        with open(paths['csv'], encoding='utf-8-sig') as f:
+            rows = list(csv.DictReader(f))
+        assert [row['group'] for row in rows] == ["", "RT-1"]
+        with open(paths['json'], encoding='utf-8') as f:
+            data = json.load(f)
+        assert data['stages']['填充']['count'] == 1 and len(data['timeline']) == 2
+        with open(paths['stages'], encoding='utf-8') as f:
+            assert "==== 读取Excel：1次" in f.read()
+    print("按阶段内存分析测试通过")
+
+
+def test_pipeline_profiles_each_stage():
+    """测试流水线为每个分组的准备、填充、写入阶段记录内存"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        profiler = MemoryProfiler(temp_dir)
+        profiler.start()
+        pipeline = ReportPipeline(lambda key: key, lambda key: (bytearray(1024), key),
+                                  write=lambda doc, path: None, writer_count=2, profiler=profiler)
+        report = pipeline.run(["RT-1", "RT-2"])
+        profiler.finish()
+
+    assert report.success_count == 2
+    entries = {(entry['stage'], entry['group']) for entry in profiler.timeline}
+    assert entries == {(stage, key) for stage in ("准备", "填充", "写入") for key in ("RT-1", "RT-2")}
+    print("流水线内存分析测试通过")
+
+
+def test_profiling_finishes_on_error():
+    """测试生成出错时同样停止记录并写出报告"""
+    with profiling(None) as profiler:
+        assert profiler is None
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        try:
+            with profiling(temp_dir) as profiler:
+                with profiler.stage("读取Excel"):
+                    pass
+                raise RuntimeError("生成失败")
+        except RuntimeError:
+            pass
+        assert not tracemalloc.is_tracing()
+        assert sorted(os.listdir(temp_dir)) == ["内存分析_各阶段.txt", "内存分析_时间线.csv", "内存分析_时间线.json"]
+    print("出错时结束内存分析测试通过")
+
+
+if __name__ == "__main__":
+    test_stages_record_allocations()
+    test_pipeline_profiles_each_stage()
+    test_profiling_finishes_on_error()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试output_verifier.py的生成结果校验
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+from docx import Document
+
+from ledger_session import LedgerSession
+from output_verifier import (KIND_CHECKBOX, KIND_ERROR, KIND_PLACEHOLDER, KIND_ROWS, LedgerIndex,
+                             check_document, scan_document, verify_outputs)
+
+
+def _report(path, data_rows, project="测试工程", surface="☑打磨□机加工"):
+    """模拟一份生成的报告：参数表格、数据表格（以下空白、表尾合并行）"""
+    doc = Document()
+    doc.add_paragraph(f"工程名称：{project}")
+    params = doc.add_table(rows=1, cols=4)
+    for cell, text in zip(params.rows[0].cells, ["表面状态", surface, "热处理状态", "□无□"]):
+        cell.text = text
+
+    table = doc.add_table(rows=data_rows + 4, cols=3)
+    for cell, text in zip(table.rows[0].cells, ["检件编号", "焊口编号", "备注"]):
+        cell.text = text
+    for index in range(data_rows):
+        table.cell(index + 1, 0).text = "FRD1"
+        table.cell(index + 1, 1).text = f"{index + 1}R1"
+    table.cell(data_rows + 1, 1).text = "以下空白"
+    footer = table.cell(data_rows + 3, 0).merge(table.cell(data_rows + 3, 2))
+    footer.text = "说明：共检测焊口"
+    doc.save(path)
+
+
+def test_scan_finds_placeholders_rows_and_checkboxes():
+    """测试流式扫描：残留占位符、数据行数、未勾选的必选复选框组"""
+    print("=== 测试报告扫描 ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        good = os.path.join(temp_dir, "good.docx")
+        _report(good, 3)
+        scan = scan_document(good)
+        assert scan.placeholders == [] and scan.data_rows == 3 and scan.unchecked_groups == []
+        assert check_document(good, expected_rows=3) == []
+
+        bad = os.path.join(temp_dir, "bad.docx")
+        _report(bad, 2, project="工程名称值", surface="□打磨□机加工")
+        kinds = {anomaly.kind: anomaly.detail for anomaly in check_document(bad, expected_rows=3)}
+        assert kinds[KIND_PLACEHOLDER] == "工程名称值"
+        assert kinds[KIND_ROWS] == "报告 2 行，台账 3 行"
+        assert kinds[KIND_CHECKBOX] == "表面状态: □打磨□机加工"   # 热处理状态为可不勾选的组
+    print("报告扫描测试通过")
+
+
+def test_parallel_verify_against_ledger():
+    """测试按台账分组核对行数（X/γ射线分组、续表按张数展开），多进程校验结果与单进程相同"""
+    df = pd.DataFrame({
+        '委托单编号': ['RT-1', 'RT-1', 'RT-1', 'RT-2', 'RT-10'],
+        '张数': [1, 3, 2, 1, 1],
+        'γ射线': [None, None, 'γ射线', None, None],
+    })
+    ledger = LedgerIndex("台账.xlsx", session=LedgerSession("台账.xlsx", df))
+    assert ledger.expected_rows("记录_RT-1_X_生成结果.docx") == 2
+    assert ledger.expected_rows("记录_RT-1_γ_生成结果.docx") == 1
+    assert ledger.expected_rows("记录_续_RT-1_X_续表_生成结果.docx") == 4
+    assert ledger.expected_rows("通知单_RT-10_生成结果.docx") == 1
+    assert ledger.expected_rows("通知单_合并.docx") is None
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        _report(os.path.join(temp_dir, "通知单_RT-1_生成结果.docx"), 3)
+        _report(os.path.join(temp_dir, "通知单_RT-2_生成结果.docx"), 2)
+        _report(os.path.join(temp_dir, "通知单_RT-10_生成结果.docx"), 1)
+        with open(os.path.join(temp_dir, "损坏.docx"), 'wb') as f:
+            f.write(b"not a zip")
+
+        serial = verify_outputs([temp_dir], ledger, workers=1, batch_size=1)
+        parallel = verify_outputs([temp_dir], ledger, workers=2, batch_size=1)
+    assert serial.files == parallel.files == 4 and serial.rows_checked == 3
+    assert [(os.path.basename(a.path), a.kind) for a in serial.anomalies] == \
+        [(os.path.basename(a.path), a.kind) for a in parallel.anomalies] == \
+        [("损坏.docx", KIND_ERROR), ("通知单_RT-2_生成结果.docx", KIND_ROWS)]
+    print("台账核对与并行校验测试通过")
+
+
+if __name__ == "__main__":
+    test_scan_finds_placeholders_rows_and_checkboxes()
+    test_parallel_verify_against_ledger()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试report_generator.py的表头解析与表格行数补足
+"""
+
+from docx import Document
+
+from report_generator import ReportGenerator
+from table_builder import TableGrid
+
+
+def build_table(title=None):
+    """(标题行 +) 表头 + 2个模板数据行；表头中没有材质列"""
+    doc = Document()
+    table = doc.add_table(rows=4 if title else 3, cols=6)
+    if title:
+        table.rows[0].cells[0].text = title
+    header = table.rows[-3]
+    for j, text in enumerate(["序号", "检件编号", "焊口编号", "焊工号", "规格", "备注"]):
+        header.cells[j].text = text
+    table.rows[-2].cells[1].text = "A1"
+    return doc, table
+
+
+def test_header_map_and_row_count():
+    """测试表头映射（候选表头、按位置猜测）、表头行查找，以及补足行数时批量克隆的行"""
+    print("=== 测试委托表格表头与行数 ===")
+    generator = ReportGenerator()
+    doc, table = build_table()
+
+    assert generator.build_header_map(table) == {
+        '管道编号': 1, '焊口号': 2, '焊工号': 3, '焊口规格': 4,
+        '焊口材质': 5,   # 没有材质列时使用第6列
+    }
+    assert generator.find_header_row(table) == 0
+    assert generator.find_header_row(build_table("射线检测委托单")[1]) == 1
+
+    grid = TableGrid(table)
+    assert generator.ensure_row_count(table, 10, grid) == 7
+    assert len(table.rows) == len(grid) == 10
+    assert generator.ensure_row_count(table, 8, grid) == 0 and len(table.rows) == 10
+
+    # 克隆的行与表格列数一致、没有文字，原有行不变
+    for row_idx in range(3, 10):
+        assert [cell.text for cell in grid.cells(row_idx)] == [""] * 6
+        assert [cell._tc for cell in grid.cells(row_idx)] == [cell._tc for cell in table.rows[row_idx].cells]
+    assert table.rows[1].cells[1].text == "A1"
+    assert generator.build_header_map(table)['管道编号'] == 1
+    print("委托表格表头与行数测试通过")
+
+
+if __name__ == "__main__":
+    test_header_map_and_row_count()
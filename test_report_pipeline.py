@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试report_pipeline.py的流水线功能
+"""
+
+import io
+import os
+import tempfile
+import threading
+import time
+
+from job_manager import install_stdout_router
+from report_pipeline import ReportPipeline, print_pipeline_report
+
+
+def test_pipeline_order_and_errors():
+    """测试流水线结果顺序、失败分组记录与阶段统计"""
+    print("=== 测试流水线 ===")
+
+    written = []
+    lock = threading.Lock()
+
+    def prepare(key):
+        if key == "skip":
+            return None
+        return {'key': key}
+
+    def fill(prepared):
+        if prepared['key'] == "bad":
+            raise ValueError("填充失败")
+        return prepared['key'], f"{prepared['key']}.docx"
+
+    def write(doc, output_path):
+        with lock:
+            written.append(output_path)
+
+    keys = ["A", "bad", "skip", "B", "C"]
+    report = ReportPipeline(prepare, fill, write=write, writer_count=2, queue_size=1).run(keys)
+    print_pipeline_report(report)
+
+    assert [result.key for result in report.results] == keys
+    assert report.success_count == 3
+    assert sorted(written) == ["A.docx", "B.docx", "C.docx"]
+
+    failed = {result.key: result for result in report.failed_results}
+    assert failed["bad"].stage == "fill"
+    assert failed["skip"].stage is None
+
+    stages = {stats.name: stats for stats in report.stages}
+    assert stages['准备'].items == 5
+    assert stages['填充'].items == 4 and stages['填充'].errors == 1
+    assert stages['写入'].items == 3
+    print("流水线测试通过")
+
+
+def test_pipeline_saves_documents():
+    """测试默认写入函数保存Word文档"""
+    from docx import Document
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        def fill(key):
+            doc = Document()
+            doc.add_paragraph(key)
+            return doc, os.path.join(output_dir, f"{key}.docx")
+
+        report = ReportPipeline(lambda key: key, fill).run(["1", "2", "3"])
+        assert report.success_count == 3
+        for result in report.results:
+            assert os.path.exists(result.output_path)
+            assert Document(result.output_path).paragraphs[0].text == result.key
+
+        # 内容未变化时保留原文件，不输出"文档已保存至"
+        log = io.StringIO()
+        with install_stdout_router().route(log):
+            report = ReportPipeline(lambda key: key, fill).run(["1", "2"])
+        assert report.success_count == 2
+        assert log.getvalue().count("内容未变化，保留原文件") == 2 and "文档已保存至" not in log.getvalue()
+    print("文档保存测试通过")
+
+
+def test_stage_logs_not_interleaved():
+    """测试准备和填充阶段同时运行时，每个分组每个阶段的日志整块输出"""
+    def stage(name):
+        def run(key):
+            for step in range(3):
+                print(f"{name} {key} {step}")
+                time.sleep(0.001)
+            return key
+        return run
+
+    log = io.StringIO()
+    with install_stdout_router().route(log):
+        ReportPipeline(stage("准备"), lambda key: (stage("填充")(key), key), write=lambda doc, path: None,
+                       queue_size=1).run(["A", "B", "C", "D"])
+    lines = [line for line in log.getvalue().splitlines() if line.startswith(("准备", "填充"))]
+    assert len(lines) == 24
+    for index in range(0, 24, 3):
+        block = lines[index:index + 3]
+        assert [line.rsplit(' ', 1)[0] for line in block] == [block[0].rsplit(' ', 1)[0]] * 3
+        assert [line[-1] for line in block] == ['0', '1', '2']
+    print("阶段日志整块输出测试通过")
+
+
+if __name__ == "__main__":
+    test_pipeline_order_and_errors()
+    test_pipeline_saves_documents()
+    test_stage_logs_not_interleaved()
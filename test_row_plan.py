@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试Radio_test_renewal.py的行展开计划与原逐行写法一致
+"""
+
+import numpy as np
+import pandas as pd
+
+from columnar_extract import sheet_count_column
+from Radio_test_renewal import DataRowCalculator
+
+
+def _row_by_row(sheet_counts):
+    """原逐行写法：每个检件按张数生成若干行，并逐行确定片号
+
+    Returns:
+        list: (检件序号, 片号) 列表，每个元素对应一个表格行
+    """
+    rows = []
+    for i, current_sheet_count in enumerate(sheet_counts):
+        if current_sheet_count >= 6 or current_sheet_count in [2, 3]:
+            rows_to_generate = current_sheet_count
+        else:
+            rows_to_generate = 1
+        for current_index_in_group in range(rows_to_generate):
+            film_number = ""
+            if current_sheet_count in [2, 3]:
+                film_number = str(current_index_in_group + 1)
+            elif current_sheet_count >= 6:
+                if current_index_in_group < current_sheet_count - 1:
+                    film_number = f"{current_index_in_group + 1}-{current_index_in_group + 2}"
+                else:
+                    film_number = f"{current_sheet_count}-1"
+            rows.append((i, film_number))
+    return rows
+
+
+def test_row_plan_matches_row_by_row():
+    """张数 0、1、2、3、5、6 与缺失值（按1张）逐个及混合对比"""
+    print("=== 测试行展开计划 ===")
+
+    df = pd.DataFrame({'张数': [0, 1, 2, 3, 5, 6, np.nan]})
+    sheet_counts = sheet_count_column(df, '张数').tolist()
+    assert sheet_counts == [0, 1, 2, 3, 5, 6, 1]
+
+    cases = [[count] for count in sheet_counts] + [sheet_counts, sheet_counts[::-1], [6, 6, 2, 1, 3], []]
+    for counts in cases:
+        plan = DataRowCalculator.build_row_plan(counts)
+        expected = _row_by_row(counts)
+        assert list(zip(plan.inspection_index.tolist(), plan.film_numbers)) == expected, counts
+        assert plan.total_rows == len(expected)
+        assert plan.rows_per_inspection.tolist() == \
+            [DataRowCalculator.calculate_rows_for_inspection(count) for count in counts]
+        assert plan.start_rows.tolist() == [sum(plan.rows_per_inspection[:i]) for i in range(len(counts))]
+
+    assert DataRowCalculator.build_row_plan([6]).film_numbers == ["1-2", "2-3", "3-4", "4-5", "5-6", "6-1"]
+    assert DataRowCalculator.build_row_plan([2, 3]).film_numbers == ["1", "2", "1", "2", "3"]
+    assert DataRowCalculator.build_row_plan([0, 1, 5]).film_numbers == ["", "", ""]
+    print("行展开计划测试通过")
+
+
+if __name__ == "__main__":
+    test_row_plan_matches_row_by_row()
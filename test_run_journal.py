@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试run_journal.py的运行记录（断点续跑、仅重试失败分组）
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+
+from ledger_session import LedgerSession
+from run_journal import STATUS_FAILED, STATUS_SKIPPED, STATUS_SUCCESS, RunJournal, hash_group_input
+
+RADIO_EXCEL = "生成器/Excel/4_生成器台账-射线检测记录.xlsx"
+RADIO_TEMPLATE = "生成器/word/4_射线检测记录.docx"
+
+
+def test_is_completed_tracks_input_hash():
+    """测试只有输入哈希一致且输出文件存在时才视为已完成，参数表内容变化时哈希变化"""
+    print("=== 测试运行记录 ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        params_path = os.path.join(temp_dir, "曝光参数.txt")
+        with open(params_path, 'w', encoding='utf-8') as f:
+            f.write("管电压 200kV")
+        group_df = pd.DataFrame({'焊口编号': ['1R1', '2'], '张数': [1, 2]})
+        input_hash = hash_group_input(group_df, input_files=[params_path], project_name="测试工程")
+        assert input_hash == hash_group_input(group_df.copy(), input_files=[params_path], project_name="测试工程")
+        assert input_hash != hash_group_input(group_df, input_files=[params_path], project_name="其他工程")
+
+        output_path = os.path.join(temp_dir, "报告.docx")
+        journal = RunJournal(os.path.join(temp_dir, "journal.db"))
+        try:
+            run_id = journal.start_run('Radio_test', "台账.xlsx", "模板.docx", temp_dir)
+            journal.record_group(run_id, 'Radio_test', "RT-1_X射线", input_hash, output_path, STATUS_SUCCESS)
+            journal.finish_run(run_id)
+
+            # 输出文件不存在时需要重新生成
+            assert not journal.is_completed('Radio_test', "RT-1_X射线", input_hash, output_path)
+            open(output_path, 'wb').close()
+            assert journal.is_completed('Radio_test', "RT-1_X射线", input_hash, output_path)
+            assert not journal.is_completed('Radio_test', "RT-2_X射线", input_hash, output_path)
+            assert not journal.is_completed('Radio_test', "RT-1_X射线", "其他哈希", output_path)
+
+            # 修改参数表后哈希变化，分组不再视为已完成
+            with open(params_path, 'a', encoding='utf-8') as f:
+                f.write("，焦距 600mm")
+            changed_hash = hash_group_input(group_df, input_files=[params_path], project_name="测试工程")
+            assert changed_hash != input_hash
+            assert not journal.is_completed('Radio_test', "RT-1_X射线", changed_hash, output_path)
+        finally:
+            journal.close()
+    print("运行记录测试通过")
+
+
+def _group_statuses(journal, run_id):
+    return {row['group_key']: row['status'] for row in journal.conn.execute(
+        "SELECT group_key, status FROM group_results WHERE run_id = ?", (run_id,))}
+
+
+def test_resume_and_retry_failed():
+    """测试断点续跑跳过已完成的分组，仅重试失败分组时只处理上次失败的分组"""
+    if not os.path.exists(RADIO_EXCEL):
+        print("跳过: 缺少示例台账")
+        return
+    import Radio_test
+
+    df = pd.read_excel(RADIO_EXCEL)
+    subset = df[df['委托单编号'] == df['委托单编号'].dropna().iloc[-1]].reset_index(drop=True)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_dir = os.path.join(temp_dir, "输出")
+        journal_path = os.path.join(temp_dir, "journal.db")
+
+        def run(**options):
+            return Radio_test.process_excel_to_word(RADIO_EXCEL, RADIO_TEMPLATE, output_dir, project_name="测试工程",
+                                                    session=LedgerSession(RADIO_EXCEL, subset),
+                                                    journal_path=journal_path, **options)
+
+        assert run()
+        journal = RunJournal(journal_path)
+        first_run = journal.last_run_id('Radio_test', RADIO_EXCEL, output_dir)
+        statuses = _group_statuses(journal, first_run)
+        journal.close()
+        assert statuses and set(statuses.values()) == {STATUS_SUCCESS}
+
+        # 断点续跑：输入未变化，全部跳过，不改写已生成的报告
+        mtimes = {name: os.path.getmtime(os.path.join(output_dir, name)) for name in os.listdir(output_dir)}
+        assert run(resume=True)
+        journal = RunJournal(journal_path)
+        resumed_run = journal.last_run_id('Radio_test', RADIO_EXCEL, output_dir)
+        assert _group_statuses(journal, resumed_run) == {key: STATUS_SKIPPED for key in statuses}
+        assert mtimes == {name: os.path.getmtime(os.path.join(output_dir, name)) for name in os.listdir(output_dir)}
+
+        # 模拟上一次运行中一个分组失败：只重试该分组
+        failed_key = sorted(statuses)[0]
+        failed_run = journal.start_run('Radio_test', RADIO_EXCEL, RADIO_TEMPLATE, output_dir)
+        for key in statuses:
+            journal.record_group(failed_run, 'Radio_test', key, None, None,
+                                 STATUS_FAILED if key == failed_key else STATUS_SUCCESS)
+        journal.finish_run(failed_run)
+        journal.close()
+
+        assert run(retry_failed=True)
+        journal = RunJournal(journal_path)
+        retry_run = journal.last_run_id('Radio_test', RADIO_EXCEL, output_dir)
+        assert _group_statuses(journal, retry_run) == {failed_key: STATUS_SUCCESS}
+        journal.close()
+    print("断点续跑与失败重试测试通过")
+
+
+if __name__ == "__main__":
+    test_is_completed_tracks_input_hash()
+    test_resume_and_retry_failed()
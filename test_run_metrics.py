@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试run_metrics.py的运行指标记录与导出
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from docx import Document
+
+import run_metrics
+from docx_writer import save_docx
+
+
+def test_collect_writes_prometheus_and_json_line():
+    """测试一次运行的计数、阶段耗时写出为 Prometheus 文本和JSON行"""
+    print("=== 测试运行指标导出 ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for _ in range(2):
+            with run_metrics.collect('Ray_Detection', temp_dir) as metrics:
+                with run_metrics.stage('read'):
+                    pass
+                run_metrics.count('rows_filled', 12)
+                run_metrics.record_reports(3, failed=1)
+                metrics.success = True
+        # 没有正在记录的运行时不做任何事
+        run_metrics.count('rows_filled', 5)
+        assert run_metrics.current() is None
+
+        with open(os.path.join(temp_dir, "Ray_Detection.prom"), encoding='utf-8') as f:
+            prom = f.read()
+        assert 'report_generator_reports_generated{module="Ray_Detection"} 3\n' in prom
+        assert 'report_generator_reports_failed{module="Ray_Detection"} 1\n' in prom
+        assert 'report_generator_rows_filled{module="Ray_Detection"} 12\n' in prom
+        assert 'report_generator_stage_seconds{module="Ray_Detection",stage="fill"}' in prom
+        assert "# TYPE report_generator_run_success gauge" in prom
+        assert not [name for name in os.listdir(temp_dir) if name.endswith('.tmp')]
+
+        with open(os.path.join(temp_dir, "run_metrics.jsonl"), encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 2
+        assert records[0]['success'] is True and records[0]['reports_generated'] == 3
+        assert set(records[0]['stage_seconds']) == {'read', 'fill'}
+        assert records[0]['peak_rss_mb'] > 0
+    print("运行指标导出测试通过")
+
+
+def test_save_and_child_metrics_are_counted():
+    """测试保存文档记录写入字节数和未变化的报告，子进程指标汇总到当前运行"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "报告.docx")
+        with run_metrics.collect('NDT_result', write=False) as metrics:
+            assert save_docx(Document(), path)
+            assert not save_docx(Document(), path)
+
+            with run_metrics.collect(None, write=False) as child:
+                run_metrics.record_reports(2)
+                run_metrics.count('lookup_cache_hits', 7)
+            run_metrics.merge(child.snapshot())
+
+        assert metrics.counters['bytes_written'] == os.path.getsize(path)
+        assert metrics.counters['reports_unchanged'] == 1
+        assert metrics.counters['reports_generated'] == 2 and metrics.counters['lookup_cache_hits'] == 7
+        assert metrics.stage_seconds['write'] > 0
+        assert not os.path.exists(os.path.join(temp_dir, "NDT_result.prom"))
+    print("保存与子进程指标汇总测试通过")
+
+
+def test_peak_rss_is_per_run():
+    """测试内存峰值只统计本次运行期间，不沿用同一进程更早运行的峰值"""
+    with run_metrics.collect('Ray_Detection', write=False) as large:
+        block = b"\x01" * (300 * 1024 * 1024)
+        time.sleep(0.3)
+        del block
+    with run_metrics.collect('Ray_Detection', write=False) as small:
+        time.sleep(0.3)
+
+    if large.peak_rss_mb is None:
+        print("跳过: 系统不支持读取进程内存")
+        return
+    assert small.peak_rss_mb is not None
+    assert large.peak_rss_mb - small.peak_rss_mb > 200
+    print("运行期间内存峰值测试通过")
+
+
+if __name__ == "__main__":
+    test_collect_writes_prometheus_and_json_line()
+    test_save_and_child_metrics_are_counted()
+    test_peak_rss_is_per_run()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试run_plan.py的列查找和分组规则
+"""
+
+import pandas as pd
+
+from run_plan import GeneratorPlan, PlanEntry, SOURCE_HEADER, SOURCE_MISSING, SOURCE_POSITION, \
+    ray_type_groups, resolve_columns
+
+
+def find_column(df, keyword):
+    matching_cols = [col for col in df.columns if keyword in col]
+    return matching_cols[0] if matching_cols else None
+
+
+def test_resolve_columns_reports_fallback():
+    """测试找不到表头时回退到列位置，并标记来源"""
+    print("=== 测试列查找 ===")
+    df = pd.DataFrame(columns=['序号', '委托单编号', '检测比列'])
+    mapping, sources = resolve_columns(df, {'委托单编号': '委托单编号', '检测比例': '检测比例', '规格': '规格'},
+                                       {'检测比例': 'C', '规格': 'G'}, find_column)
+    assert mapping == {'委托单编号': '委托单编号', '检测比例': '检测比列'}
+    assert [item.source for item in sources] == [SOURCE_HEADER, SOURCE_POSITION, SOURCE_MISSING]
+    plan = GeneratorPlan('test', 'test.xlsx', 0, sources)
+    assert [item.key for item in plan.fallback_columns] == ['检测比例', '规格']
+    print("列查找测试通过")
+
+
+def test_ray_type_groups_order_and_overflow():
+    """测试分组顺序与生成器一致，并统计超出容量的分组"""
+    df = pd.DataFrame({
+        '委托单编号': ['B', 'A', 'B', 'B', None],
+        'γ射线': [None, None, 'Ir192', 'Ir192', 'Se75'],
+    })
+    groups = [(order, ray_type, len(group)) for order, ray_type, group in ray_type_groups(df, '委托单编号', 'γ射线')]
+    assert groups == [('B', 'γ射线', 2), ('B', 'X射线', 1), ('A', 'X射线', 1)]
+
+    plan = GeneratorPlan('test', 'test.xlsx', len(df), [])
+    plan.entries.append(PlanEntry('B', 'γ射线', 40, 'b.docx', 't.docx', capacity=36))
+    plan.entries.append(PlanEntry('A', 'X射线', 10, 'a.docx', 't.docx', table_rows=30, capacity=29))
+    plan.entries.append(PlanEntry('C', 'X射线', 10, 'c.docx', 't.docx'))
+    assert [entry.overflow_rows for entry in plan.entries] == [4, 1, 0]
+    assert len(plan.overflow_entries) == 2
+    print("分组与容量测试通过")
+
+
+if __name__ == "__main__":
+    test_resolve_columns_reports_fallback()
+    test_ray_type_groups_order_and_overflow()
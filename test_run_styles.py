@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试run_styles.py的格式原型与逐项设置生成相同的XML
+"""
+
+from docx import Document
+from docx.oxml.ns import qn
+from docx.shared import Pt
+from lxml import etree
+
+from run_styles import add_styled_run, style_run
+
+
+def _set_one_by_one(run, font_name, font_size, east_asia):
+    run.font.name = font_name
+    run.font.size = Pt(font_size)
+    run._element.rPr.rFonts.set(qn('w:eastAsia'), east_asia)
+
+
+def test_prototype_matches_individual_settings():
+    """测试新文字和已有格式的文字，复制原型与逐项设置的XML相同"""
+    print("=== 测试格式原型 ===")
+
+    expected = Document().add_paragraph()
+    actual = Document().add_paragraph()
+    for text, style in [("A-001", ("楷体", 10.5, "楷体")), ("合格", ("宋体", 9.5, "宋体")),
+                        ("☑", ("楷体", 9, "宋体"))]:
+        _set_one_by_one(expected.add_run(text), *style)
+        add_styled_run(actual, text, *style)
+
+    # 已有格式（加粗）的文字保留原有格式
+    for paragraph in (expected, actual):
+        run = paragraph.add_run("Ⅱ")
+        run.bold = True
+    _set_one_by_one(expected.runs[-1], "楷体", 10.5, "楷体")
+    style_run(actual.runs[-1])
+
+    assert etree.tostring(expected._p) == etree.tostring(actual._p)
+    assert actual.runs[-1].bold and actual.runs[-1].font.size == Pt(10.5)
+
+    # 修改一个文字的格式不影响共享的原型
+    actual.runs[0].font.size = Pt(12)
+    assert add_styled_run(actual, "B").font.size == Pt(10.5)
+    print("格式原型测试通过")
+
+
+if __name__ == "__main__":
+    test_prototype_matches_individual_settings()
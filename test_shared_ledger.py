@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试shared_ledger.py的共享内存台账分区与分区派发
+"""
+
+import numpy as np
+import pandas as pd
+
+from group_scheduler import estimate_group_cost, run_scheduled
+from shared_ledger import SharedLedger
+
+
+def _ledger():
+    return pd.DataFrame({
+        '完成日期': pd.to_datetime(['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05', '2024-01-06', '2024-01-07']),
+        '委托单编号': ['RT-2', 'RT-1', 'RT-2', np.nan, 'RT-1', 'RT-2'],
+        '检件编号': ['管线A', '管线B', None, '管线D', 7, '管线F'],
+        '张数': [1, 2, 3, 4, 5, 6],
+        '合格级别': [np.nan, 'Ⅱ', 'Ⅲ', 'Ⅱ', np.nan, 'Ⅱ'],
+    }, index=[10, 11, 12, 13, 14, 15])
+
+
+def test_partitions_match_groupby():
+    """测试从共享内存解码的分区与 groupby 的分组数据完全相同"""
+    print("=== 测试共享内存台账分区 ===")
+
+    df = _ledger()
+    with SharedLedger.create(df, '委托单编号') as ledger:
+        assert ledger.layout.partitions == {'RT-2': (0, 3), 'RT-1': (3, 5)}
+        worker = SharedLedger.attach(ledger.layout)
+        for key, group in df.groupby('委托单编号', sort=False):
+            frame = worker.partition_frame(key)
+            pd.testing.assert_frame_equal(frame, group)
+        # 解码结果可以修改，不影响共享内存
+        frame.loc[frame.index[0], '检件编号'] = '已修改'
+        assert worker.partition_frame('RT-1')['检件编号'].iloc[0] == '管线B'
+        worker.close()
+    print("共享内存台账分区测试通过")
+
+
+def _check_partition(expected_rows, expected_columns, session=None, only_groups=None):
+    key, = only_groups
+    frame = session.dataframe
+    return (list(frame['委托单编号'].unique()) == [key.split('_')[0]] and len(frame) == expected_rows[key]
+            and list(frame.columns) == expected_columns)
+
+
+def test_run_scheduled_sends_partitions():
+    """测试按分区派发时子进程只收到所属分区、指定列的数据（数据切片和共享内存两种方式）"""
+    df = _ledger()
+    expected_rows = {'RT-1_X射线': 2, 'RT-2_X射线': 3}
+    costs = [estimate_group_cost(key, rows, rows, rows, 21) for key, rows in expected_rows.items()]
+    group_partitions = {'RT-1_X射线': 'RT-1', 'RT-2_X射线': 'RT-2'}
+    for shared_memory in (False, True):
+        for columns, expected_columns in ((None, list(df.columns)), (['委托单编号', '张数', '委托单编号'],
+                                                                     ['委托单编号', '张数'])):
+            results = run_scheduled(costs, _check_partition, args=(expected_rows, expected_columns), workers=2,
+                                    excel_path="台账.xlsx", dataframe=df, partition_column='委托单编号',
+                                    group_partitions=group_partitions, columns=columns,
+                                    shared_memory=shared_memory)
+            assert results == {'RT-1_X射线': True, 'RT-2_X射线': True}, (shared_memory, columns)
+    print("分区派发测试通过")
+
+
+if __name__ == "__main__":
+    test_partitions_match_groupby()
+    test_run_scheduled_sends_partitions()
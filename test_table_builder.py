@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试table_builder.py的大表格行插入
+"""
+
+from docx import Document
+
+from table_builder import TableGrid
+
+
+def build_table():
+    """表头 + 2个数据行 + 签字栏"""
+    doc = Document()
+    table = doc.add_table(rows=4, cols=3)
+    for j, text in enumerate(["检件编号", "焊口编号", "焊工号"]):
+        table.rows[0].cells[j].text = text
+    table.rows[1].cells[0].text = "A1"
+    footer = table.rows[3].cells[0].merge(table.rows[3].cells[2])
+    footer.text = "评片人："
+    return doc, table
+
+
+def test_insert_rows_keeps_footer_last():
+    """测试插入的行位于数据区之后，签字栏仍是最后一行"""
+    print("=== 测试大表格插入行 ===")
+    doc, table = build_table()
+    grid = TableGrid(table)
+    new_rows = grid.insert_rows(2, 1000, prototype_idx=1)
+
+    assert new_rows == list(range(3, 1003))
+    assert len(grid) == len(table.rows) == 1004
+    assert grid.cells(1003)[0].text == "评片人："
+    # 克隆的行不带原型行的文字，单元格结构与原型行一致
+    assert [cell.text for cell in grid.cells(500)] == ["", "", ""]
+    assert [cell.text for cell in grid.cells(1)] == ["A1", "", ""]
+    for row_idx in (0, 1, 500, 1003):
+        assert [cell._tc for cell in grid.cells(row_idx)] == [cell._tc for cell in table.rows[row_idx].cells]
+    print("大表格插入行测试通过")
+
+
+def test_append_grid_rows_matches_add_row():
+    """测试追加的网格行与 table.add_row() 的结构相同"""
+    doc, table = build_table()
+    grid = TableGrid(table)
+    grid.append_grid_rows(3)
+    expected = table.add_row()._tr.xml
+
+    assert len(grid) == 7
+    assert grid.row(6)._tr.xml == expected
+    print("网格行追加测试通过")
+
+
+if __name__ == "__main__":
+    test_insert_rows_keeps_footer_last()
+    test_append_grid_rows_matches_add_row()
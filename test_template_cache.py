@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试template_cache.py的模板转换缓存与内存模板共享
+"""
+
+import os
+import shutil
+import tempfile
+
+from docx import Document
+
+import run_metrics
+import template_cache
+from template_cache import clear_template_cache, converted_template_path, open_template
+
+
+def _template(path, text="模板内容"):
+    doc = Document()
+    doc.add_paragraph(text)
+    doc.save(path)
+
+
+def test_legacy_template_converted_once_per_content():
+    """测试相同内容的 .doc 模板只转换一次，内容变化时重新转换，转换结果写入缓存目录"""
+    print("=== 测试模板转换缓存 ===")
+
+    conversions = []
+    original_document = template_cache.Document
+
+    def counting_document(source):
+        conversions.append(source)
+        return original_document(source)
+
+    clear_template_cache()
+    template_cache.Document = counting_document
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache_dir = os.path.join(temp_dir, "缓存")
+            first = os.path.join(temp_dir, "模板A.doc")
+            second = os.path.join(temp_dir, "副本", "模板A.doc")
+            _template(first)
+            os.makedirs(os.path.dirname(second))
+            shutil.copyfile(first, second)
+
+            target = converted_template_path(first, cache_dir)
+            assert os.path.dirname(target) == cache_dir and target.endswith('.docx')
+            assert converted_template_path(second, cache_dir) == target      # 相同内容、不同路径
+            assert converted_template_path(first, cache_dir) == target
+            assert len(conversions) == 1
+            assert sorted(os.listdir(temp_dir)) == ["副本", "模板A.doc", "缓存"]   # 不写模板目录
+            assert os.listdir(os.path.dirname(second)) == ["模板A.doc"]
+
+            _template(first, "修改后的模板内容")
+            changed = converted_template_path(first, cache_dir)
+            assert changed != target and os.path.dirname(changed) == cache_dir
+            assert len(conversions) == 2
+            assert len(os.listdir(cache_dir)) == 2
+            assert Document(changed).paragraphs[0].text == "修改后的模板内容"
+    finally:
+        template_cache.Document = original_document
+        clear_template_cache()
+    print("模板转换缓存测试通过")
+
+
+def test_open_template_reuses_package():
+    """测试模板包只读取一次，每次打开得到独立的文档对象"""
+    clear_template_cache()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "模板.docx")
+        _template(path)
+        try:
+            with run_metrics.collect('template_cache', write=False) as metrics:
+                first = open_template(path)
+                package = next(iter(template_cache._packages.values()))
+                second = open_template(path)
+                assert next(iter(template_cache._packages.values())) is package
+            assert metrics.counters['template_cache_misses'] == 1
+            assert metrics.counters['template_cache_hits'] == 1
+
+            first.paragraphs[0].text = "已修改"
+            assert second.paragraphs[0].text == "模板内容"
+            assert open_template(path).paragraphs[0].text == "模板内容"
+        finally:
+            clear_template_cache()
+    print("模板包共享测试通过")
+
+
+if __name__ == "__main__":
+    test_legacy_template_converted_once_per_content()
+    test_open_template_reuses_package()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试watch_folder.py的台账文件夹监控
+"""
+
+import contextvars
+import json
+import os
+import tempfile
+import threading
+
+import pandas as pd
+
+from ledger_session import GeneratorJob
+from watch_folder import WATCH_RULES, FolderWatcher, WatchRule, configure_rules, load_job_options
+
+
+def _write_ledger(path, rows):
+    pd.DataFrame(rows, columns=['委托单编号', '焊口编号', '检测结果']).to_excel(path, index=False)
+
+
+def test_only_changed_orders_are_regenerated():
+    """测试文件稳定后才处理、只改修改时间不生成、修改一个委托单只重新生成该委托单"""
+    print("=== 测试台账文件夹监控 ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = os.path.join(temp_dir, "Excel")
+        os.makedirs(folder)
+        ledger = os.path.join(folder, "1_生成器委托.xlsx")
+        rows = [['RT-1', 'W1', '合格'], ['RT-1', 'W2', '合格'], ['RT-2', 'W3', '合格']]
+        _write_ledger(ledger, rows)
+        with open(os.path.join(folder, "~$1_生成器委托.xlsx"), 'wb') as f:
+            f.write(b"lock")
+
+        calls = []
+
+        def runner(session, jobs):
+            calls.append((sorted(session.dataframe['委托单编号'].unique()), [job.module for job in jobs]))
+            return {job.name: True for job in jobs}
+
+        rules = [WatchRule("1_生成器委托.xlsx", [GeneratorJob('委托', 'Ray_Detection', "模板.docx")])]
+        watcher = FolderWatcher(folder, rules, state_path=os.path.join(temp_dir, "state.json"),
+                                log_dir=os.path.join(temp_dir, "日志"), debounce_seconds=5, runner=runner)
+
+        # 第一次发现时只等待，文件稳定后处理全部委托单
+        assert watcher.poll(now=0) == [] and calls == []
+        events = watcher.poll(now=10)
+        assert [event.status for event in events] == ['generated']
+        assert calls == [(['RT-1', 'RT-2'], ['Ray_Detection'])]
+        assert os.path.isfile(events[0].log_path)
+        with open(events[0].log_path, encoding='utf-8') as f:
+            assert "新增或变化2个" in f.read()
+
+        # 只改了修改时间：不生成
+        stat = os.stat(ledger)
+        os.utime(ledger, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        watcher.poll(now=20)
+        assert [event.status for event in watcher.poll(now=30)] == ['unchanged'] and len(calls) == 1
+        assert watcher.poll(now=40) == []
+
+        # 修改RT-2：只重新生成RT-2；重启后状态仍然有效
+        rows[2][2] = '不合格'
+        _write_ledger(ledger, rows)
+        watcher = FolderWatcher(folder, rules, state_path=os.path.join(temp_dir, "state.json"),
+                                log_dir=os.path.join(temp_dir, "日志"), debounce_seconds=0, runner=runner)
+        events = watcher.poll()
+        assert [event.changed_orders for event in events] == [['RT-2']]
+        assert calls[-1] == (['RT-2'], ['Ray_Detection'])
+    print("台账文件夹监控测试通过")
+
+
+def test_failed_event_is_retried_after_next_change():
+    """测试生成失败时不保存状态，文件未再次变化前不重复尝试"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ledger = os.path.join(temp_dir, "2_生成器结果.xlsx")
+        _write_ledger(ledger, [['RT-1', 'W1', '合格']])
+        outcomes = [False, True]
+        rules = [WatchRule("2_生成器结果.xlsx", [GeneratorJob('结果', 'NDT_result', "模板.docx")])]
+        watcher = FolderWatcher(temp_dir, rules, state_path=os.path.join(temp_dir, "state.json"),
+                                log_dir=os.path.join(temp_dir, "日志"), debounce_seconds=0,
+                                runner=lambda session, jobs: {'结果': outcomes.pop(0)})
+
+        assert [event.status for event in watcher.poll()] == ['failed']
+        assert watcher.poll() == [] and '2_生成器结果.xlsx' not in watcher.state
+
+        _write_ledger(ledger, [['RT-1', 'W1', '不合格']])
+        events = watcher.poll()
+        assert [event.status for event in events] == ['generated'] and events[0].changed_orders == ['RT-1']
+    print("失败重试测试通过")
+
+
+def test_rules_receive_generation_options():
+    """测试命令行的工程名称、委托单位和参数文件合并到各任务的参数中"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        options_path = os.path.join(temp_dir, "options.json")
+        with open(options_path, 'w', encoding='utf-8') as f:
+            json.dump({'Ray_Detection': {'inspection_category': "A类"},
+                       '射线检测委托台账_Mode1': {'client_name': "其他单位"}}, f, ensure_ascii=False)
+        rules = configure_rules(WATCH_RULES, "测试工程", "测试单位", load_job_options(options_path))
+
+    options = {job.name: job.options for rule in rules for job in rule.jobs}
+    assert options['射线检测委托台账_Mode2'] == {'project_name': "测试工程", 'inspection_category': "A类"}
+    assert options['射线检测委托台账_Mode1'] == {'project_name': "测试工程", 'client_name': "其他单位"}
+    assert options['射线检测记录'] == {'project_name': "测试工程", 'entrusting_unit': "测试单位"}
+    assert options['RT结果通知单台账_Mode2'] == {'project_name': "测试工程", 'client_name': "测试单位"}
+    assert all(job.options == {} for rule in WATCH_RULES for job in rule.jobs)   # 不修改默认映射
+    print("生成参数合并测试通过")
+
+
+def test_event_log_only_contains_event_output():
+    """测试事件日志包含生成线程的输出，不包含同时运行的其他线程的输出"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ledger = os.path.join(temp_dir, "2_生成器结果.xlsx")
+        _write_ledger(ledger, [['RT-1', 'W1', '合格']])
+        other_ready, other_done = threading.Event(), threading.Event()
+
+        def other_task():
+            other_ready.wait()
+            print("其他任务的输出")
+            other_done.set()
+
+        def runner(session, jobs):
+            worker = threading.Thread(target=contextvars.copy_context().run, args=(print, "流水线线程的输出"))
+            worker.start()
+            worker.join()
+            other_ready.set()
+            other_done.wait()
+            return {job.name: True for job in jobs}
+
+        other = threading.Thread(target=other_task)
+        other.start()
+        rules = [WatchRule("2_生成器结果.xlsx", [GeneratorJob('结果', 'NDT_result', "模板.docx")])]
+        watcher = FolderWatcher(temp_dir, rules, state_path=os.path.join(temp_dir, "state.json"),
+                                log_dir=os.path.join(temp_dir, "日志"), debounce_seconds=0, runner=runner)
+        events = watcher.poll()
+        other.join()
+        with open(events[0].log_path, encoding='utf-8') as f:
+            log = f.read()
+    assert "流水线线程的输出" in log and "其他任务的输出" not in log
+    print("事件日志输出测试通过")
+
+
+if __name__ == "__main__":
+    test_only_changed_orders_are_regenerated()
+    test_failed_event_is_retried_after_next_change()
+    test_rules_receive_generation_options()
+    test_event_log_only_contains_event_output()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试work_queue.py的多进程任务领取与租约过期接手
+"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+
+from work_queue import (QUEUE_CONFIG, STATUS_DONE, STATUS_FAILED, STATUS_LEASED, WorkQueue,
+                        run_worker)
+
+
+def _fake_render(batch, task):
+    """模拟生成：失败分组返回False，其余分组写一个输出文件"""
+    time.sleep(0.05)
+    if task.group_key.startswith('失败'):
+        return False
+    with open(os.path.join(batch.output_dir, f"{task.group_key}.txt"), 'a', encoding='utf-8') as f:
+        f.write(task.worker + '\n')
+    return True
+
+
+def _worker_process(db_path, batch_id, worker):
+    run_worker(db_path, batch_id, worker, render=_fake_render, heartbeat_seconds=0.5, poll_seconds=0.1)
+
+
+def test_workers_share_batch():
+    """测试多个工作进程共同处理一个批次，每个分组只生成一次"""
+    print("=== 测试多进程共享批次 ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, 'queue', 'work_queue.db')
+        queue = WorkQueue(db_path)
+        keys = [f"委托{i:02d}_X射线" for i in range(20)] + ['失败01_γ射线']
+        batch_id = queue.create_batch('Radio_test_renewal', 'ledger.xlsx', 'template.docx', temp_dir,
+                                      [(key, None, float(i)) for i, key in enumerate(keys)])
+
+        processes = [multiprocessing.Process(target=_worker_process, args=(db_path, batch_id, f"w{i}"))
+                     for i in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+            assert process.exitcode == 0
+
+        counts = queue.status_counts(batch_id)
+        assert counts[STATUS_DONE] == 20 and counts[STATUS_FAILED] == 1 and queue.is_finished(batch_id)
+        for key in keys[:-1]:
+            with open(os.path.join(temp_dir, f"{key}.txt"), encoding='utf-8') as f:
+                assert len(f.read().splitlines()) == 1
+        assert queue.tasks(batch_id, STATUS_FAILED)[0]['error'] == "生成器返回失败"
+        print(f"完成情况: {counts}")
+        queue.close()
+    print("多进程共享批次测试通过")
+
+
+def test_expired_lease_is_reclaimed():
+    """测试租约过期后任务被其他工作进程接手，原工作进程不能再续约或记录结果"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        queue = WorkQueue(os.path.join(temp_dir, 'work_queue.db'))
+        batch_id = queue.create_batch('Radio_test', 'ledger.xlsx', 'template.docx', None,
+                                      [('A_X射线', None, 1.0)])
+
+        stale = queue.claim(batch_id, 'w1', lease_seconds=0.2)
+        assert stale is not None and stale.attempts == 1
+        assert queue.claim(batch_id, 'w2') is None
+        time.sleep(0.3)
+
+        task = queue.claim(batch_id, 'w2')
+        assert task.task_id == stale.task_id and task.attempts == 2
+        assert not queue.heartbeat(stale) and not queue.complete(stale, True)
+        assert queue.heartbeat(task) and queue.complete(task, True, 1.0)
+        assert queue.status_counts(batch_id)[STATUS_DONE] == 1
+
+        # 领取次数用完后租约再过期，任务标记为失败
+        batch_id = queue.create_batch('Radio_test', 'ledger.xlsx', 'template.docx', None,
+                                      [('B_X射线', None, 1.0)])
+        for _ in range(QUEUE_CONFIG['max_attempts']):
+            assert queue.claim(batch_id, 'w1', lease_seconds=0) is not None
+            time.sleep(0.01)
+        assert queue.claim(batch_id, 'w1') is None
+        assert queue.status_counts(batch_id)[STATUS_FAILED] == 1 and queue.is_finished(batch_id)
+        assert queue.tasks(batch_id, STATUS_LEASED) == []
+        queue.close()
+    print("租约过期接手测试通过")
+
+
+if __name__ == "__main__":
+    test_workers_share_batch()
+    test_expired_lease_is_reclaimed()
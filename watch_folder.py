@@ -0,0 +1,445 @@
+"""
+台账文件夹监控（自动增量生成）
+
+检测人员白天会多次把更新后的台账放进共享的 生成器/Excel 文件夹，
+每次都需要有人打开GUI逐个点击重新生成。
+
+本模块：
+1. FolderWatcher 定期扫描文件夹，按文件的修改时间和大小发现新增或修改的工作簿；
+   文件在 debounce_seconds 内不再变化（复制/保存完成）后才处理，再按内容哈希排除只改了修改时间的情况
+2. 按 WATCH_RULES 的文件名映射找到该台账对应的生成器（可以是多个）
+3. 按委托单编号计算每个委托单数据的指纹，与上次处理时比较，只把新增或变化的委托单交给生成器
+   （通过 ledger_session.LedgerSession 传入筛选后的数据），未变化的委托单不重新生成
+4. 生成器在监控进程内依次运行，模板缓存、关键字匹配缓存等在多次事件之间保持有效
+5. 每个事件的输出写入单独的日志文件（默认 生成器/运行记录/监控日志），处理状态保存在
+   生成器/运行记录/watch_state.json，重启后不会重复生成已处理过的台账
+6. 生成参数：WATCH_RULES 中的任务不带工程名称、委托单位等参数，监控模式需要通过
+   --project/--client 或 --options 参数文件（JSON，{任务名称或模块名: {参数名: 值}}）提供，
+   否则报告中的这些占位符不会被替换
+
+事件日志通过 job_manager 的按上下文分发输出记录（不替换进程全局的 sys.stdout），
+在 GUI 等同时运行其他任务的进程中也不会把其他任务的输出写进事件日志。
+"""
+
+import argparse
+import dataclasses
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import run_metrics
+from job_manager import current_output, install_stdout_router
+from ledger_session import GeneratorJob, LedgerSession, run_generators
+
+# 文件夹监控配置
+WATCH_CONFIG = {
+    'folder': os.path.join("生成器", "Excel"),                            # 监控的文件夹
+    'poll_seconds': 2.0,                                                  # 扫描间隔
+    'debounce_seconds': 5.0,                                              # 文件不再变化多久后开始处理
+    'state_path': os.path.join("生成器", "运行记录", "watch_state.json"),   # 处理状态
+    'log_dir': os.path.join("生成器", "运行记录", "监控日志"),              # 每个事件的日志
+    'order_keyword': '委托单编号',                                         # 按该列区分委托单
+}
+
+
+@dataclass
+class WatchRule:
+    """台账文件名与生成器的映射
+
+    Attributes:
+        pattern: 文件名匹配模式（fnmatch）
+        jobs: 该台账对应的生成任务
+        sheet_name: 读取的工作表（默认第一个工作表）
+    """
+    pattern: str
+    jobs: List[GeneratorJob]
+    sheet_name: Optional[str] = None
+
+
+# 默认映射：生成器/Excel 中的台账 -> 生成器及模板
+WATCH_RULES = [
+    WatchRule("1_生成器委托.xlsx", [
+        GeneratorJob('射线检测委托台账_Mode2', 'Ray_Detection', "生成器/word/1_射线检测委托台账_Mode2.docx"),
+        GeneratorJob('射线检测委托台账_Mode1', 'Ray_Detection_mode1', "生成器/word/1_射线检测委托台账_Mode1.docx"),
+    ]),
+    WatchRule("2_生成器结果.xlsx", [
+        GeneratorJob('RT结果通知单台账_Mode2', 'NDT_result', "生成器/word/2_RT结果通知台账_Mode2.docx"),
+        GeneratorJob('RT结果通知单台账_Mode1', 'NDT_result_mode1', "生成器/word/2_RT结果通知台账_Mode1.docx"),
+    ]),
+    WatchRule("3_生成器表面结果.xlsx", [
+        GeneratorJob('表面结果通知单台账_Mode2', 'Surface_Defect', "生成器/word/3_表面结果通知单台账_Mode2.docx"),
+        GeneratorJob('表面结果通知单台账_Mode1', 'Surface_Defect_mode1', "生成器/word/3_表面结果通知单台账_Mode1.docx"),
+    ], sheet_name="荣信聚乙烯PT"),
+    WatchRule("4_生成器台账-射线检测记录.xlsx", [
+        GeneratorJob('射线检测记录', 'Radio_test', "生成器/word/4_射线检测记录.docx"),
+    ]),
+    WatchRule("5_生成器评片记录续表模版.xlsx", [
+        GeneratorJob('射线检测记录续', 'Radio_test_renewal', "生成器/word/5_射线检测记录_续.docx"),
+    ]),
+]
+
+
+# 各生成器中委托单位参数的名称（射线检测委托台账Mode2没有该参数）
+CLIENT_OPTION_NAMES = {
+    'Ray_Detection': None,
+    'Radio_test': 'entrusting_unit',
+}
+
+
+def load_job_options(path: str) -> Dict[str, Dict[str, Any]]:
+    """读取生成参数文件（JSON: {任务名称或模块名: {参数名: 值}}）"""
+    with open(path, encoding='utf-8') as f:
+        options = json.load(f)
+    if not isinstance(options, dict) or not all(isinstance(value, dict) for value in options.values()):
+        raise ValueError(f"生成参数文件格式应为 {{任务名称或模块名: {{参数名: 值}}}}: {path}")
+    return options
+
+
+def configure_rules(rules: List[WatchRule], project_name: Optional[str] = None, client_name: Optional[str] = None,
+                    job_options: Optional[Dict[str, Dict[str, Any]]] = None) -> List[WatchRule]:
+    """返回合并了生成参数的映射副本
+
+    工程名称和委托单位应用到所有任务（按 CLIENT_OPTION_NAMES 换成各生成器的参数名），
+    参数文件中按模块名、再按任务名称指定的参数覆盖前者。
+
+    Args:
+        rules: 文件名与生成器的映射
+        project_name: 工程名称
+        client_name: 委托单位
+        job_options: 参数文件内容（load_job_options）
+
+    Returns:
+        list: 新的映射列表（不修改传入的映射）
+    """
+    job_options = job_options or {}
+    configured = []
+    for rule in rules:
+        jobs = []
+        for job in rule.jobs:
+            options = dict(job.options)
+            if project_name:
+                options['project_name'] = project_name
+            client_option = CLIENT_OPTION_NAMES.get(job.module, 'client_name')
+            if client_name and client_option:
+                options[client_option] = client_name
+            options.update(job_options.get(job.module, {}))
+            options.update(job_options.get(job.name, {}))
+            jobs.append(dataclasses.replace(job, options=options))
+        configured.append(dataclasses.replace(rule, jobs=jobs))
+    return configured
+
+
+@dataclass
+class WatchEvent:
+    """一次台账变化的处理结果"""
+    path: str
+    status: str                                   # 'generated' / 'unchanged' / 'failed'
+    changed_orders: List[str] = field(default_factory=list)
+    removed_orders: List[str] = field(default_factory=list)
+    results: Dict[str, bool] = field(default_factory=dict)
+    log_path: Optional[str] = None
+
+
+def file_digest(path: str) -> str:
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_order_column(df: pd.DataFrame, keyword: Optional[str] = None) -> Optional[str]:
+    """返回列名包含委托单编号关键字的第一列"""
+    keyword = keyword or WATCH_CONFIG['order_keyword']
+    for column in df.columns:
+        if keyword in str(column):
+            return column
+    return None
+
+
+def order_fingerprints(df: pd.DataFrame, order_column: str) -> Dict[str, str]:
+    """计算每个委托单数据的指纹 {委托单编号: 哈希}，列名变化时所有委托单的指纹都会变化"""
+    header = "\x1f".join(str(column) for column in df.columns).encode('utf-8')
+    fingerprints = {}
+    for order, group in df.groupby(order_column, sort=False):
+        digest = hashlib.sha256(header)
+        digest.update(pd.util.hash_pandas_object(group.astype(str), index=False).values.tobytes())
+        fingerprints[str(order)] = digest.hexdigest()
+    return fingerprints
+
+
+class _Tee:
+    """同时写入控制台和事件日志"""
+
+    def __init__(self, *streams):
+        self.streams = [stream for stream in streams if stream is not None]
+
+    def write(self, text):
+        for stream in self.streams:
+            stream.write(text)
+        return len(text)
+
+    def flush(self):
+        for stream in self.streams:
+            stream.flush()
+
+
+class FolderWatcher:
+    """监控台账文件夹，台账变化后只重新生成变化的委托单
+
+    Args:
+        folder: 监控的文件夹（默认: WATCH_CONFIG['folder']）
+        rules: 文件名与生成器的映射（默认: WATCH_RULES）
+        state_path: 处理状态文件（默认: WATCH_CONFIG['state_path']）
+        log_dir: 事件日志目录（默认: WATCH_CONFIG['log_dir']）
+        debounce_seconds: 文件不再变化多久后开始处理（默认: WATCH_CONFIG['debounce_seconds']）
+        runner: 运行生成任务的函数，参数为 (会话, 任务列表)，返回 {任务名称: 是否成功}
+                （默认在本进程内依次运行 ledger_session.run_generators）
+    """
+
+    def __init__(self, folder: Optional[str] = None, rules: Optional[List[WatchRule]] = None,
+                 state_path: Optional[str] = None, log_dir: Optional[str] = None,
+                 debounce_seconds: Optional[float] = None,
+                 runner: Optional[Callable[[LedgerSession, List[GeneratorJob]], Dict[str, bool]]] = None):
+        self.folder = folder or WATCH_CONFIG['folder']
+        self.rules = WATCH_RULES if rules is None else rules
+        self.state_path = state_path or WATCH_CONFIG['state_path']
+        self.log_dir = log_dir or WATCH_CONFIG['log_dir']
+        self.debounce_seconds = WATCH_CONFIG['debounce_seconds'] if debounce_seconds is None else debounce_seconds
+        self.runner = runner or (lambda session, jobs: run_generators(session, jobs, parallel=False))
+        self.state: Dict[str, Dict[str, Any]] = self._load_state()
+        self._pending: Dict[str, Tuple[Tuple[int, int], float]] = {}   # 文件名 -> (签名, 首次发现时间)
+        self._failed: Dict[str, Tuple[int, int]] = {}                  # 处理失败的文件签名，文件再次变化前不重试
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.isfile(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"警告: 无法读取监控状态 {self.state_path}，将重新处理全部台账: {e}")
+            return {}
+
+    def _save_state(self):
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.state_path)
+
+    def rule_for(self, name: str) -> Optional[WatchRule]:
+        """返回文件名对应的映射（Excel打开时生成的 ~$ 临时文件不处理）"""
+        if name.startswith('~$'):
+            return None
+        for rule in self.rules:
+            if fnmatch.fnmatch(name, rule.pattern):
+                return rule
+        return None
+
+    def poll(self, now: Optional[float] = None) -> List[WatchEvent]:
+        """扫描一次文件夹，处理已经稳定的新增或修改的台账
+
+        Args:
+            now: 当前时间（time.monotonic()，测试时可指定）
+
+        Returns:
+            list: 本次处理的事件
+        """
+        now = time.monotonic() if now is None else now
+        events = []
+        if not os.path.isdir(self.folder):
+            return events
+        for name in sorted(os.listdir(self.folder)):
+            rule = self.rule_for(name)
+            path = os.path.join(self.folder, name)
+            if rule is None or not os.path.isfile(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            recorded = self.state.get(name)
+            if (recorded and (recorded['mtime_ns'], recorded['size']) == signature) or self._failed.get(name) == signature:
+                self._pending.pop(name, None)
+                continue
+            pending = self._pending.get(name)
+            if pending is None or pending[0] != signature:
+                # 新发现的变化（或仍在写入）：等待文件稳定
+                self._pending[name] = (signature, now)
+                if self.debounce_seconds > 0:
+                    continue
+            elif now - pending[1] < self.debounce_seconds:
+                continue
+            del self._pending[name]
+            events.append(self.process(path, rule, signature))
+        return events
+
+    def process(self, path: str, rule: WatchRule, signature: Optional[Tuple[int, int]] = None) -> WatchEvent:
+        """处理一个台账：按内容哈希和委托单指纹找出变化的委托单并重新生成"""
+        name = os.path.basename(path)
+        if signature is None:
+            stat = os.stat(path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        recorded = self.state.get(name, {})
+        digest = file_digest(path)
+        if digest == recorded.get('sha256'):
+            print(f"台账内容未变化（只更新了修改时间）: {name}")
+            self.state[name] = dict(recorded, mtime_ns=signature[0], size=signature[1])
+            self._save_state()
+            return WatchEvent(path, 'unchanged')
+
+        os.makedirs(self.log_dir, exist_ok=True)
+        stem = os.path.splitext(name)[0]
+        log_path = os.path.join(self.log_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{stem}.log")
+        router = install_stdout_router()
+        with open(log_path, 'w', encoding='utf-8') as log, router.route(_Tee(current_output(), log)):
+            event = self._generate(path, rule, recorded, digest, signature)
+        event.log_path = log_path
+        print(f"事件日志已写入: {log_path}")
+        return event
+
+    def _generate(self, path, rule, recorded, digest, signature) -> WatchEvent:
+        name = os.path.basename(path)
+        start = time.perf_counter()
+        print(f"==== {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 台账变化: {name} ====")
+        print(f"内容哈希: {digest}")
+        try:
+            df = pd.read_excel(path, sheet_name=rule.sheet_name or 0)
+        except Exception as e:
+            print(f"错误: 无法读取台账 {name}: {e}")
+            self._failed[name] = signature
+            return WatchEvent(path, 'failed')
+
+        order_column = find_order_column(df)
+        if order_column is None:
+            print(f"错误: 台账 {name} 中没有包含'{WATCH_CONFIG['order_keyword']}'的列")
+            self._failed[name] = signature
+            return WatchEvent(path, 'failed')
+
+        fingerprints = order_fingerprints(df, order_column)
+        previous = recorded.get('orders', {})
+        changed = [order for order, value in fingerprints.items() if previous.get(order) != value]
+        removed = [order for order in previous if order not in fingerprints]
+        print(f"共{len(fingerprints)}个委托单，新增或变化{len(changed)}个，删除{len(removed)}个")
+        if removed:
+            print(f"台账中已删除的委托单（已生成的报告保留不变）: {', '.join(removed)}")
+
+        results = {}
+        if changed:
+            print(f"重新生成的委托单: {', '.join(changed)}")
+            affected = df[df[order_column].astype(str).isin(changed)]
+            session = LedgerSession(path, affected, sheet_name=rule.sheet_name)
+            with run_metrics.collect('watch_folder') as metrics:
+                results = self.runner(session, rule.jobs)
+                metrics.success = all(results.values())
+
+        if results and not all(results.values()):
+            failed = [job for job, success in results.items() if not success]
+            print(f"错误: 生成失败: {', '.join(failed)}，台账再次修改或监控重启后重试")
+            self._failed[name] = signature
+            status = 'failed'
+        else:
+            self.state[name] = {'mtime_ns': signature[0], 'size': signature[1], 'sha256': digest,
+                                'orders': fingerprints, 'processed_at': datetime.now().isoformat(timespec='seconds')}
+            self._save_state()
+            status = 'generated' if changed else 'unchanged'
+        print(f"处理完成，耗时 {time.perf_counter() - start:.2f} 秒")
+        return WatchEvent(path, status, changed, removed, results)
+
+    def mark_current(self):
+        """把文件夹中现有台账记为已处理（不生成），之后只处理新的变化"""
+        for name in sorted(os.listdir(self.folder)):
+            rule = self.rule_for(name)
+            path = os.path.join(self.folder, name)
+            if rule is None or not os.path.isfile(path):
+                continue
+            df = pd.read_excel(path, sheet_name=rule.sheet_name or 0)
+            order_column = find_order_column(df)
+            stat = os.stat(path)
+            self.state[name] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': file_digest(path),
+                                'orders': order_fingerprints(df, order_column) if order_column else {},
+                                'processed_at': datetime.now().isoformat(timespec='seconds')}
+            print(f"已记录现有台账: {name}")
+        self._save_state()
+
+    def run_forever(self, poll_seconds: Optional[float] = None):
+        """持续监控，按 Ctrl+C 停止"""
+        poll_seconds = WATCH_CONFIG['poll_seconds'] if poll_seconds is None else poll_seconds
+        print(f"开始监控文件夹: {os.path.abspath(self.folder)}（每{poll_seconds}秒扫描一次，"
+              f"文件稳定{self.debounce_seconds}秒后处理）")
+        try:
+            while True:
+                self.poll()
+                time.sleep(poll_seconds)
+        except KeyboardInterrupt:
+            print("\n已停止监控")
+
+
+def main():
+    # 创建命令行参数解析器
+    parser = argparse.ArgumentParser(description='监控台账文件夹，台账新增或修改后自动重新生成变化的委托单')
+    parser.add_argument('-f', '--folder', default=WATCH_CONFIG['folder'],
+                        help=f"监控的文件夹 (默认: {WATCH_CONFIG['folder']})")
+    parser.add_argument('--poll', type=float, default=WATCH_CONFIG['poll_seconds'],
+                        help=f"扫描间隔（秒） (默认: {WATCH_CONFIG['poll_seconds']})")
+    parser.add_argument('--debounce', type=float, default=WATCH_CONFIG['debounce_seconds'],
+                        help=f"文件不再变化多久后开始处理（秒） (默认: {WATCH_CONFIG['debounce_seconds']})")
+    parser.add_argument('--state', default=WATCH_CONFIG['state_path'],
+                        help=f"处理状态文件 (默认: {WATCH_CONFIG['state_path']})")
+    parser.add_argument('--log-dir', default=WATCH_CONFIG['log_dir'],
+                        help=f"事件日志目录 (默认: {WATCH_CONFIG['log_dir']})")
+    parser.add_argument('--once', action='store_true',
+                        help='只扫描一次并处理所有变化（不等待文件稳定），然后退出')
+    parser.add_argument('--skip-existing', action='store_true',
+                        help='把文件夹中现有台账记为已处理，不生成，之后只处理新的变化')
+    parser.add_argument('-p', '--project',
+                        help='工程名称，用于替换所有报告中的工程名称占位符')
+    parser.add_argument('-c', '--client',
+                        help='委托单位，用于替换报告中的委托单位占位符（射线检测委托台账Mode2没有该参数）')
+    parser.add_argument('--options',
+                        help='生成参数文件（JSON，{任务名称或模块名: {参数名: 值}}），覆盖 --project/--client')
+
+    # 解析命令行参数
+    args = parser.parse_args()
+
+    try:
+        job_options = load_job_options(args.options) if args.options else None
+    except (OSError, ValueError) as e:
+        print(f"错误: 无法读取生成参数文件: {e}")
+        sys.exit(1)
+    rules = configure_rules(WATCH_RULES, args.project, args.client, job_options)
+    unconfigured = [job.name for rule in rules for job in rule.jobs if not job.options.get('project_name')]
+    if unconfigured:
+        print(f"警告: 以下任务没有设置工程名称（使用 --project 或 --options），报告中的占位符不会被替换: "
+              f"{', '.join(unconfigured)}")
+
+    watcher = FolderWatcher(args.folder, rules, state_path=args.state, log_dir=args.log_dir,
+                            debounce_seconds=0 if args.once else args.debounce)
+    success = True
+    if args.skip_existing:
+        watcher.mark_current()
+    if args.once:
+        events = watcher.poll()
+        print(f"处理了{len(events)}个台账变化")
+        success = all(event.status != 'failed' for event in events)
+    else:
+        watcher.run_forever(args.poll)
+
+    # 返回状态码
+    sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
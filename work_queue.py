@@ -0,0 +1,537 @@
+"""
+共享工作队列
+
+把一个大台账拆成分组任务放入共享目录中的SQLite队列，多个工作进程（可以在不同机器上，
+通过网络共享目录访问同一个队列文件）各自领取分组、调用现有生成器生成报告并记录结果。
+
+1. 协调者（create）：用生成器的 plan_excel_to_word 对台账分组，每个分组（委托单编号_射线类型）
+   一个任务，按成本模型估算的耗时从大到小排列
+2. 工作进程（work）：领取任务时获得一个有时限的租约，生成过程中由心跳线程定期续约；
+   工作进程崩溃或断网后租约过期，任务会被其他工作进程重新领取（超过最大尝试次数后标记失败）
+3. 状态查询（status）：各状态的任务数以及失败任务的错误信息
+
+队列数据库使用SQLite默认的回滚日志模式（WAL模式依赖共享内存，不能用于网络共享目录），
+领取任务在 BEGIN IMMEDIATE 事务中完成，同一任务不会被两个工作进程同时领取。
+租约时间使用各机器的系统时间，多台机器需要保持时钟同步。
+"""
+
+import argparse
+import importlib
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import run_metrics
+from group_scheduler import estimate_group_cost
+from run_metrics import METRICS_CONFIG
+
+# 默认队列数据库路径（多台机器共用时指向网络共享目录）
+DEFAULT_QUEUE_PATH = os.path.join("生成器", "工作队列", "work_queue.db")
+
+# 工作队列配置
+QUEUE_CONFIG = {
+    'lease_seconds': 300,      # 租约时长（秒），超过该时间没有心跳的任务可被其他工作进程领取
+    'heartbeat_seconds': 60,   # 心跳间隔（秒）
+    'max_attempts': 3,         # 每个任务最多被领取的次数（租约过期后重新领取计入次数）
+    'poll_seconds': 5,         # 没有可领取的任务但仍有任务在其他进程处理中时的等待间隔（秒）
+    'busy_timeout': 30,        # 数据库被其他进程锁定时的等待时间（秒）
+}
+
+# 支持按分组领取任务的生成器（模块需提供 plan_excel_to_word，process_excel_to_word 支持 only_groups）
+QUEUE_GENERATORS = ('Radio_test', 'Radio_test_renewal')
+
+STATUS_PENDING = 'pending'
+STATUS_LEASED = 'leased'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    generator TEXT NOT NULL,
+    excel_path TEXT NOT NULL,
+    word_template_path TEXT NOT NULL,
+    output_dir TEXT,
+    params TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id INTEGER NOT NULL REFERENCES batches(id),
+    group_key TEXT NOT NULL,
+    output_path TEXT,
+    cost REAL DEFAULT 0,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    heartbeat_at REAL,
+    attempts INTEGER DEFAULT 0,
+    duration REAL,
+    error TEXT,
+    finished_at TEXT,
+    UNIQUE (batch_id, group_key)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_claim
+    ON tasks (batch_id, status, cost);
+"""
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def default_worker_id() -> str:
+    """默认的工作进程标识：主机名-进程号"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+@dataclass
+class Batch:
+    """一批分组任务（对应一次台账生成）"""
+    batch_id: int
+    generator: str
+    excel_path: str
+    word_template_path: str
+    output_dir: Optional[str]
+    params: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Task:
+    """一个已领取的分组任务"""
+    task_id: int
+    batch_id: int
+    group_key: str
+    output_path: Optional[str]
+    worker: str
+    attempts: int
+
+
+class WorkQueue:
+    """SQLite工作队列
+
+    每个线程需要使用自己的 WorkQueue 实例（SQLite连接不能跨线程使用）。
+
+    Args:
+        db_path: 队列数据库文件路径（默认: 生成器/工作队列/work_queue.db）
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or DEFAULT_QUEUE_PATH
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        # isolation_level=None：由本类显式控制事务
+        self.conn = sqlite3.connect(self.db_path, timeout=QUEUE_CONFIG['busy_timeout'], isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self):
+        return _ImmediateTransaction(self.conn)
+
+    def create_batch(self, generator: str, excel_path: str, word_template_path: str,
+                     output_dir: Optional[str], tasks: Sequence[Tuple[str, Optional[str], float]],
+                     params: Optional[Dict[str, Any]] = None) -> int:
+        """登记一批任务
+
+        Args:
+            generator: 生成器模块名（如 Radio_test_renewal）
+            excel_path: Excel台账路径（各工作进程都能访问的路径）
+            word_template_path: Word模板路径
+            output_dir: 输出目录（None 表示使用生成器的默认输出目录）
+            tasks: (分组键, 输出文件路径, 估算耗时) 列表
+            params: 传给生成器的其他参数（工程名称等）
+
+        Returns:
+            int: 批次ID
+        """
+        with self._transaction():
+            cursor = self.conn.execute(
+                "INSERT INTO batches (generator, excel_path, word_template_path, output_dir, params, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (generator, excel_path, word_template_path, output_dir,
+                 json.dumps(params or {}, ensure_ascii=False), _now()))
+            batch_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tasks (batch_id, group_key, output_path, cost, status) VALUES (?, ?, ?, ?, ?)",
+                [(batch_id, str(key), output_path, cost, STATUS_PENDING) for key, output_path, cost in tasks])
+        return batch_id
+
+    def batch(self, batch_id: int) -> Optional[Batch]:
+        """查询批次信息，批次不存在时返回None"""
+        row = self.conn.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        return Batch(row['id'], row['generator'], row['excel_path'], row['word_template_path'],
+                     row['output_dir'], json.loads(row['params'] or '{}'))
+
+    def last_batch_id(self) -> Optional[int]:
+        """最近登记的批次ID"""
+        row = self.conn.execute("SELECT id FROM batches ORDER BY id DESC LIMIT 1").fetchone()
+        return row['id'] if row else None
+
+    def claim(self, batch_id: int, worker: str, lease_seconds: Optional[float] = None) -> Optional[Task]:
+        """领取一个任务：等待中的任务或租约已过期的任务，估算耗时大的优先
+
+        Args:
+            batch_id: 批次ID
+            worker: 工作进程标识
+            lease_seconds: 租约时长（默认: QUEUE_CONFIG['lease_seconds']）
+
+        Returns:
+            Task: 领取到的任务，没有可领取的任务时返回None
+        """
+        lease_seconds = QUEUE_CONFIG['lease_seconds'] if lease_seconds is None else lease_seconds
+        now = time.time()
+        with self._transaction():
+            # 租约过期且领取次数已用完的任务不再重试
+            self.conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, finished_at = ? "
+                "WHERE batch_id = ? AND status = ? AND lease_expires < ? AND attempts >= ?",
+                (STATUS_FAILED, f"租约过期，已领取{QUEUE_CONFIG['max_attempts']}次", _now(),
+                 batch_id, STATUS_LEASED, now, QUEUE_CONFIG['max_attempts']))
+            row = self.conn.execute(
+                "SELECT id, group_key, output_path, attempts FROM tasks "
+                "WHERE batch_id = ? AND (status = ? OR (status = ? AND lease_expires < ?)) "
+                "ORDER BY cost DESC, id LIMIT 1",
+                (batch_id, STATUS_PENDING, STATUS_LEASED, now)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE tasks SET status = ?, worker = ?, lease_expires = ?, heartbeat_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (STATUS_LEASED, worker, now + lease_seconds, now, row['id']))
+        return Task(row['id'], batch_id, row['group_key'], row['output_path'], worker, row['attempts'] + 1)
+
+    def heartbeat(self, task: Task, lease_seconds: Optional[float] = None) -> bool:
+        """续约，返回False表示租约已过期并被其他工作进程领取"""
+        lease_seconds = QUEUE_CONFIG['lease_seconds'] if lease_seconds is None else lease_seconds
+        now = time.time()
+        cursor = self.conn.execute(
+            "UPDATE tasks SET lease_expires = ?, heartbeat_at = ? "
+            "WHERE id = ? AND worker = ? AND status = ? AND attempts = ?",
+            (now + lease_seconds, now, task.task_id, task.worker, STATUS_LEASED, task.attempts))
+        return cursor.rowcount == 1
+
+    def complete(self, task: Task, success: bool, duration: float = 0.0, error: Optional[str] = None) -> bool:
+        """记录任务结果，返回False表示租约已丢失（结果由重新领取该任务的工作进程记录）"""
+        cursor = self.conn.execute(
+            "UPDATE tasks SET status = ?, duration = ?, error = ?, lease_expires = NULL, finished_at = ? "
+            "WHERE id = ? AND worker = ? AND status = ? AND attempts = ?",
+            (STATUS_DONE if success else STATUS_FAILED, duration, error, _now(),
+             task.task_id, task.worker, STATUS_LEASED, task.attempts))
+        return cursor.rowcount == 1
+
+    def requeue_failed(self, batch_id: int) -> int:
+        """把失败的任务重新放回队列，返回重新排队的任务数"""
+        cursor = self.conn.execute(
+            "UPDATE tasks SET status = ?, worker = NULL, lease_expires = NULL, attempts = 0, "
+            "error = NULL, finished_at = NULL WHERE batch_id = ? AND status = ?",
+            (STATUS_PENDING, batch_id, STATUS_FAILED))
+        return cursor.rowcount
+
+    def status_counts(self, batch_id: int) -> Dict[str, int]:
+        """各状态的任务数"""
+        counts = {status: 0 for status in (STATUS_PENDING, STATUS_LEASED, STATUS_DONE, STATUS_FAILED)}
+        for row in self.conn.execute(
+                "SELECT status, COUNT(*) AS count FROM tasks WHERE batch_id = ? GROUP BY status", (batch_id,)):
+            counts[row['status']] = row['count']
+        return counts
+
+    def is_finished(self, batch_id: int) -> bool:
+        """批次中的任务是否都已结束（完成或失败）"""
+        counts = self.status_counts(batch_id)
+        return counts[STATUS_PENDING] == 0 and counts[STATUS_LEASED] == 0
+
+    def tasks(self, batch_id: int, status: Optional[str] = None) -> List[Dict]:
+        """查询批次中的任务"""
+        query = "SELECT * FROM tasks WHERE batch_id = ?"
+        params: List = [batch_id]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        return [dict(row) for row in self.conn.execute(query + " ORDER BY id", params)]
+
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE 事务：开始时即取得写锁，其他进程的写事务等待到提交为止"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
+
+
+def _generator_module(generator: str):
+    if generator not in QUEUE_GENERATORS:
+        raise ValueError(f"生成器 {generator} 不支持工作队列，可选: {', '.join(QUEUE_GENERATORS)}")
+    return importlib.import_module(generator)
+
+
+def enqueue_ledger(queue: WorkQueue, generator: str, excel_path: str, word_template_path: str,
+                   output_dir: Optional[str] = None, params: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """协调者：对台账分组，每个分组登记为一个任务
+
+    Args:
+        queue: 工作队列
+        generator: 生成器模块名（QUEUE_GENERATORS之一）
+        excel_path: Excel台账路径
+        word_template_path: Word模板路径
+        output_dir: 输出目录（默认使用生成器的默认输出目录）
+        params: 传给生成器的其他参数（工程名称等）
+
+    Returns:
+        int: 批次ID，台账无法分组时返回None
+    """
+    plan = _generator_module(generator).plan_excel_to_word(excel_path, word_template_path, output_dir)
+    if plan is None:
+        return None
+
+    # 同一委托单有多个γ射线源时分组键相同，生成器按分组键一起处理，合并为一个任务
+    tasks: Dict[str, List] = {}
+    for entry in plan.entries:
+        key = f"{entry.order_number}_{entry.ray_type}"
+        cost = estimate_group_cost(key, entry.data_rows, entry.total_sheets or 0,
+                                   entry.table_rows if entry.table_rows is not None else entry.data_rows,
+                                   entry.capacity or 0, entry.template_type == '续表模板').cost
+        if key in tasks:
+            tasks[key][2] += cost
+        else:
+            tasks[key] = [key, entry.output_file, cost]
+
+    batch_id = queue.create_batch(generator, excel_path, word_template_path, output_dir,
+                                  [tuple(task) for task in tasks.values()], params)
+    print(f"已登记批次 {batch_id}: {generator}，共{len(tasks)}个分组任务")
+    return batch_id
+
+
+class GeneratorRenderer:
+    """调用批次对应的生成器生成一个分组，同一工作进程内每个台账只读取一次"""
+
+    def __init__(self):
+        self._sessions = {}
+
+    def __call__(self, batch: Batch, task: Task) -> bool:
+        from ledger_session import LedgerSession
+
+        module = _generator_module(batch.generator)
+        session = self._sessions.get(batch.excel_path)
+        if session is None:
+            session = self._sessions[batch.excel_path] = LedgerSession(batch.excel_path)
+        return bool(module.process_excel_to_word(batch.excel_path, batch.word_template_path, batch.output_dir,
+                                                 session=session, only_groups={task.group_key},
+                                                 **batch.params))
+
+
+class LeaseHeartbeat:
+    """生成期间定期续约的后台线程（使用独立的数据库连接）
+
+    Args:
+        db_path: 队列数据库路径
+        task: 已领取的任务
+        lease_seconds: 每次续约的租约时长
+        interval: 心跳间隔
+    """
+
+    def __init__(self, db_path: str, task: Task, lease_seconds: Optional[float] = None,
+                 interval: Optional[float] = None):
+        self.db_path = db_path
+        self.task = task
+        self.lease_seconds = lease_seconds
+        self.interval = QUEUE_CONFIG['heartbeat_seconds'] if interval is None else interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{task.task_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        queue = WorkQueue(self.db_path)
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    if not queue.heartbeat(self.task, self.lease_seconds):
+                        self.lost = True
+                        print(f"警告: 分组 {self.task.group_key} 的租约已被其他工作进程接手")
+                        return
+                except sqlite3.OperationalError as e:
+                    # 共享目录暂时不可用时下次心跳再试，租约在过期前仍然有效
+                    print(f"警告: 分组 {self.task.group_key} 续约失败: {e}")
+        finally:
+            queue.close()
+
+
+def run_worker(db_path: str, batch_id: int, worker: Optional[str] = None,
+               render: Optional[Callable[[Batch, Task], bool]] = None,
+               lease_seconds: Optional[float] = None, heartbeat_seconds: Optional[float] = None,
+               poll_seconds: Optional[float] = None) -> Dict[str, int]:
+    """工作进程：循环领取任务并生成，直到批次中的任务全部结束
+
+    Args:
+        db_path: 队列数据库路径
+        batch_id: 批次ID
+        worker: 工作进程标识（默认: 主机名-进程号）
+        render: 生成一个分组的函数，参数为 (批次, 任务)，返回是否成功（默认调用批次的生成器）
+        lease_seconds: 租约时长（默认: QUEUE_CONFIG['lease_seconds']）
+        heartbeat_seconds: 心跳间隔（默认: QUEUE_CONFIG['heartbeat_seconds']）
+        poll_seconds: 等待其他工作进程时的轮询间隔（默认: QUEUE_CONFIG['poll_seconds']）
+
+    Returns:
+        dict: 本进程完成、失败以及租约丢失的任务数
+    """
+    worker = worker or default_worker_id()
+    render = render or GeneratorRenderer()
+    poll_seconds = QUEUE_CONFIG['poll_seconds'] if poll_seconds is None else poll_seconds
+    counts = {STATUS_DONE: 0, STATUS_FAILED: 0, 'lost': 0}
+
+    queue = WorkQueue(db_path)
+    try:
+        batch = queue.batch(batch_id)
+        if batch is None:
+            print(f"错误: 批次不存在: {batch_id}")
+            return counts
+        print(f"工作进程 {worker} 开始处理批次 {batch_id}（{batch.generator}）")
+
+        while True:
+            task = queue.claim(batch_id, worker, lease_seconds)
+            if task is None:
+                if queue.is_finished(batch_id):
+                    break
+                # 剩余任务都在其他工作进程处理中，等待完成或租约过期
+                time.sleep(poll_seconds)
+                continue
+
+            print(f"[{worker}] 领取分组 {task.group_key}（第{task.attempts}次）")
+            heartbeat = LeaseHeartbeat(db_path, task, lease_seconds, heartbeat_seconds)
+            heartbeat.start()
+            start = time.perf_counter()
+            error = None
+            try:
+                success = bool(render(batch, task))
+                if not success:
+                    error = "生成器返回失败"
+            except Exception as e:
+                success = False
+                error = str(e)
+            finally:
+                heartbeat.stop()
+            duration = time.perf_counter() - start
+
+            if queue.complete(task, success, duration, error):
+                counts[STATUS_DONE if success else STATUS_FAILED] += 1
+                print(f"[{worker}] 分组 {task.group_key} {'完成' if success else '失败: ' + error}，"
+                      f"用时 {duration:.2f} 秒")
+            else:
+                counts['lost'] += 1
+                print(f"[{worker}] 分组 {task.group_key} 的租约已丢失，结果不记录")
+    finally:
+        queue.close()
+
+    print(f"工作进程 {worker} 结束: 完成{counts[STATUS_DONE]}个，失败{counts[STATUS_FAILED]}个，"
+          f"租约丢失{counts['lost']}个")
+    return counts
+
+
+def print_batch_status(queue: WorkQueue, batch_id: int):
+    """输出批次的任务状态"""
+    batch = queue.batch(batch_id)
+    if batch is None:
+        print(f"批次不存在: {batch_id}")
+        return
+    counts = queue.status_counts(batch_id)
+    print(f"批次 {batch_id}: {batch.generator}  {batch.excel_path}")
+    print(f"等待中 {counts[STATUS_PENDING]}  处理中 {counts[STATUS_LEASED]}  "
+          f"完成 {counts[STATUS_DONE]}  失败 {counts[STATUS_FAILED]}")
+    now = time.time()
+    for task in queue.tasks(batch_id, STATUS_LEASED):
+        print(f"  处理中: {task['group_key']}  {task['worker']}  租约剩余 {task['lease_expires'] - now:.0f} 秒")
+    for task in queue.tasks(batch_id, STATUS_FAILED):
+        print(f"  失败: {task['group_key']}  {task['worker'] or ''}  {task['error'] or ''}")
+
+
+def _parse_params(items: Optional[List[str]]) -> Dict[str, str]:
+    params = {}
+    for item in items or []:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"参数格式应为 名称=值: {item}")
+        params[key.strip()] = value
+    return params
+
+
+def main():
+    # 创建命令行参数解析器
+    parser = argparse.ArgumentParser(description='多进程/多机共享的报告生成工作队列')
+    parser.add_argument('-d', '--db', default=DEFAULT_QUEUE_PATH,
+                        help=f'队列数据库路径，多台机器共用时放在共享目录 (默认: {DEFAULT_QUEUE_PATH})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    create_parser = subparsers.add_parser('create', help='协调者：对台账分组并登记任务')
+    create_parser.add_argument('-g', '--generator', required=True, choices=QUEUE_GENERATORS, help='生成器')
+    create_parser.add_argument('-e', '--excel', required=True, help='Excel台账路径')
+    create_parser.add_argument('-w', '--word', required=True, help='Word模板路径')
+    create_parser.add_argument('-o', '--output', help='输出目录（默认使用生成器的默认输出目录）')
+    create_parser.add_argument('-p', '--param', action='append',
+                               help='传给生成器的参数，格式 名称=值，可重复 (如 project_name=某工程)')
+
+    work_parser = subparsers.add_parser('work', help='工作进程：领取并生成分组，直到批次结束')
+    work_parser.add_argument('-b', '--batch', type=int, help='批次ID（默认: 最近登记的批次）')
+    work_parser.add_argument('--worker-id', help='工作进程标识（默认: 主机名-进程号）')
+    work_parser.add_argument('--metrics-dir', default=METRICS_CONFIG['output_dir'],
+                             help=f"运行指标输出目录 (默认: {METRICS_CONFIG['output_dir']})")
+
+    status_parser = subparsers.add_parser('status', help='查询批次状态')
+    status_parser.add_argument('-b', '--batch', type=int, help='批次ID（默认: 最近登记的批次）')
+    status_parser.add_argument('--requeue-failed', action='store_true', help='把失败的任务重新放回队列')
+
+    # 解析命令行参数
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.db)
+    success = True
+    try:
+        if args.command == 'create':
+            batch_id = enqueue_ledger(queue, args.generator, args.excel, args.word, args.output,
+                                      _parse_params(args.param))
+            success = batch_id is not None
+        else:
+            batch_id = args.batch or queue.last_batch_id()
+            if batch_id is None:
+                print("队列中没有批次")
+                success = False
+            elif args.command == 'work':
+                with run_metrics.collect('work_queue', args.metrics_dir) as metrics:
+                    counts = run_worker(args.db, batch_id, args.worker_id)
+                    success = metrics.success = counts[STATUS_FAILED] == 0
+            else:
+                if args.requeue_failed:
+                    print(f"重新排队 {queue.requeue_failed(batch_id)} 个失败任务")
+                print_batch_status(queue, batch_id)
+    finally:
+        queue.close()
+
+    sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()